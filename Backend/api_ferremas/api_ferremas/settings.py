@@ -68,6 +68,7 @@ INSTALLED_APPS = [
     "finanza_app",
     "bitacora_app",
     "configuracion_app",
+    "archivo_app",
 ]
 
 MIDDLEWARE = [
@@ -148,6 +149,10 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Archivos subidos (imágenes de productos, archivos de importación de stock, etc.)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -214,6 +219,10 @@ CSRF_TRUSTED_ORIGINS = [
 CORS_ALLOW_CREDENTIALS = True # <--- AÑADE ESTA LÍNEA
 
 
+# Antigüedad (días desde su último cambio) a partir de la cual los pedidos cerrados y los
+# registros de bitácora se mueven a las tablas de archivo (comando archivar_historial)
+ARCHIVO_DIAS_RETENCION = int(os.getenv('ARCHIVO_DIAS_RETENCION', 365))
+
 FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:5173') # Puerto por defecto de Vite
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend' # Muestra emails en la consola
@@ -48,6 +48,7 @@ def api_root(request):
         'configuracion_global': reverse('configuracion_app:configuracionglobal-actual', request=request), # Enlace a la acción 'actual'
         'configuraciones_api_externa': reverse('integracion_app:configuracionapi-list', request=request),
         'mensajes_contacto': reverse('contacto_app:mensajecontacto-list', request=request),
+        'eventos_stream': reverse('bitacora_app:eventos-stream', request=request),
         # 'detalles_traspaso': reverse('inventario_app:detalletraspasostock-list', request=request), # Opcional si se accede directamente
     })  
 
@@ -84,6 +85,10 @@ urlpatterns = [
     path('api/reportes/', include('reporte_app.api.urls')), # Asumiendo que reporte_app.api.urls define app_name
     # URLs de la app de integracion
     path('api/integraciones/', include('integracion_app.api.urls')), # Asumiendo que integracion_app.api.urls define app_name
+    # Stream de eventos en tiempo real (SSE)
+    path('api/bitacora/', include('bitacora_app.api.urls')),
+    # Consulta de solo lectura del historial archivado
+    path('api/archivo/', include('archivo_app.api.urls')),
 ]
 
 # Servir archivos multimedia durante el desarrollo
@@ -0,0 +1,30 @@
+from django.contrib import admin
+from .models import PedidoClienteArchivado, RegistroActividadArchivado
+
+
+class ArchivoSoloLecturaAdmin(admin.ModelAdmin):
+    """Las tablas de archivo solo se escriben con el comando archivar_historial."""
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PedidoClienteArchivado)
+class PedidoClienteArchivadoAdmin(ArchivoSoloLecturaAdmin):
+    list_display = ('id', 'cliente_id', 'sucursal_despacho_id', 'estado', 'fecha_pedido', 'total_pedido', 'fecha_archivado')
+    list_filter = ('estado', 'periodo')
+    search_fields = ('id',)
+    date_hierarchy = 'fecha_pedido'
+
+
+@admin.register(RegistroActividadArchivado)
+class RegistroActividadArchivadoAdmin(ArchivoSoloLecturaAdmin):
+    list_display = ('fecha_hora', 'usuario_id', 'accion', 'content_type_id', 'object_id', 'fecha_archivado')
+    list_filter = ('accion', 'periodo')
+    search_fields = ('accion', 'descripcion')
+    date_hierarchy = 'fecha_hora'
@@ -0,0 +1,30 @@
+from rest_framework import serializers
+from ..models import PedidoClienteArchivado, RegistroActividadArchivado
+
+
+class PedidoClienteArchivadoListSerializer(serializers.ModelSerializer):
+    """Columnas resumidas del pedido archivado, para listas."""
+    class Meta:
+        model = PedidoClienteArchivado
+        fields = [
+            'id', 'cliente_id', 'sucursal_despacho_id', 'estado', 'fecha_pedido', 'fecha_entregado',
+            'total_pedido', 'periodo', 'fecha_archivado',
+        ]
+        read_only_fields = fields
+
+
+class PedidoClienteArchivadoSerializer(PedidoClienteArchivadoListSerializer):
+    """Pedido archivado con sus datos completos (líneas, pagos y snapshot de entrega)."""
+    class Meta(PedidoClienteArchivadoListSerializer.Meta):
+        fields = PedidoClienteArchivadoListSerializer.Meta.fields + ['datos']
+        read_only_fields = fields
+
+
+class RegistroActividadArchivadoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RegistroActividadArchivado
+        fields = [
+            'id', 'usuario_id', 'fecha_hora', 'accion', 'descripcion', 'content_type_id', 'object_id',
+            'ip_address', 'periodo', 'fecha_archivado',
+        ]
+        read_only_fields = fields
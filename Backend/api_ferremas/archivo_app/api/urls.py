@@ -0,0 +1,13 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import PedidoClienteArchivadoViewSet, RegistroActividadArchivadoViewSet
+
+app_name = 'archivo_app'
+
+router = DefaultRouter()
+router.register(r'pedidos-cliente', PedidoClienteArchivadoViewSet, basename='pedidoclientearchivado')
+router.register(r'registros-actividad', RegistroActividadArchivadoViewSet, basename='registroactividadarchivado')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
@@ -0,0 +1,71 @@
+from django.utils.dateparse import parse_date
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import viewsets, permissions
+from rest_framework.exceptions import ValidationError
+
+from pedido_app.api.pagination import CustomPagination
+from usuario_app.api.permissions import EsAdministrador, ROL_ADMINISTRADOR, ROL_VENDEDOR, ROL_CONTABLE
+from ..models import PedidoClienteArchivado, RegistroActividadArchivado
+from .serializers import (
+    PedidoClienteArchivadoListSerializer, PedidoClienteArchivadoSerializer, RegistroActividadArchivadoSerializer,
+)
+
+
+def _filtrar_por_rango(queryset, request, campo):
+    """Aplica los parámetros opcionales 'desde' y 'hasta' (fechas ISO, inclusivas) sobre 'campo'."""
+    for parametro, lookup in (('desde', 'gte'), ('hasta', 'lte')):
+        valor = request.query_params.get(parametro)
+        if not valor:
+            continue
+        fecha = parse_date(valor)
+        if fecha is None:
+            raise ValidationError({parametro: "Formato de fecha inválido. Use AAAA-MM-DD."})
+        queryset = queryset.filter(**{f'{campo}__date__{lookup}': fecha})
+    return queryset
+
+
+class PedidoClienteArchivadoViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Consulta de solo lectura de los pedidos de cliente archivados (comando archivar_historial).
+    El personal administrativo ve todos; un cliente, solo los suyos.
+    Filtros: cliente_id, sucursal_despacho_id, estado, periodo y el rango 'desde'/'hasta' de fecha_pedido.
+    """
+    pagination_class = CustomPagination
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['cliente_id', 'sucursal_despacho_id', 'estado', 'periodo']
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return PedidoClienteArchivadoListSerializer
+        return PedidoClienteArchivadoSerializer
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = PedidoClienteArchivado.objects.order_by('-fecha_pedido', '-id')
+        if self.action == 'list':
+            queryset = queryset.defer('datos')
+        if hasattr(user, 'perfil_personal'):
+            if user.perfil_personal.rol not in [ROL_ADMINISTRADOR, ROL_VENDEDOR, ROL_CONTABLE]:
+                return queryset.none()
+        elif hasattr(user, 'perfil_cliente'):
+            queryset = queryset.filter(cliente_id=user.perfil_cliente.pk)
+        else:
+            return queryset.none()
+        return _filtrar_por_rango(queryset, self.request, 'fecha_pedido')
+
+
+class RegistroActividadArchivadoViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Consulta de solo lectura de la bitácora archivada, para administradores.
+    Filtros: usuario_id, accion, content_type_id, object_id, periodo y el rango 'desde'/'hasta' de fecha_hora.
+    """
+    serializer_class = RegistroActividadArchivadoSerializer
+    pagination_class = CustomPagination
+    permission_classes = [permissions.IsAuthenticated, EsAdministrador]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['usuario_id', 'accion', 'content_type_id', 'object_id', 'periodo']
+
+    def get_queryset(self):
+        queryset = RegistroActividadArchivado.objects.order_by('-fecha_hora', '-id')
+        return _filtrar_por_rango(queryset, self.request, 'fecha_hora')
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from archivo_app.services import archivar_historial, TAMANO_LOTE_ARCHIVO
+
+
+class Command(BaseCommand):
+    help = 'Mueve a las tablas de archivo los pedidos cerrados y los registros de bitácora antiguos (por lotes, reanudable)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=int, default=settings.ARCHIVO_DIAS_RETENCION,
+            help='Antigüedad mínima en días (por defecto ARCHIVO_DIAS_RETENCION).'
+        )
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE_ARCHIVO, help='Filas movidas por transacción.')
+        parser.add_argument('--max-lotes', type=int, help='Máximo de lotes de cada tipo en esta ejecución.')
+
+    def handle(self, *args, **options):
+        if options['dias'] < 0 or options['lote'] < 1:
+            raise CommandError('--dias no puede ser negativo y --lote debe ser mayor que cero.')
+
+        totales = {'pedidos': 0, 'registros': 0}
+        for tipo, cantidad in archivar_historial(options['dias'], options['lote'], options['max_lotes']):
+            totales[tipo] += cantidad
+            self.stdout.write(f'Lote de {tipo} archivado: {cantidad}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archivo completado. {totales['pedidos']} pedidos y {totales['registros']} registros de bitácora archivados."
+        ))
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:03
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PedidoClienteArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID del Pedido')),
+                ('cliente_id', models.BigIntegerField(verbose_name='ID del Cliente')),
+                ('sucursal_despacho_id', models.BigIntegerField(blank=True, null=True, verbose_name='ID de la Sucursal de Despacho')),
+                ('estado', models.CharField(max_length=30, verbose_name='Estado del Pedido')),
+                ('fecha_pedido', models.DateTimeField(verbose_name='Fecha del Pedido')),
+                ('fecha_entregado', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Entrega Real')),
+                ('total_pedido', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Total del Pedido')),
+                ('periodo', models.DateField(verbose_name='Mes del Pedido')),
+                ('datos', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Datos Archivados')),
+                ('fecha_archivado', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Archivado')),
+            ],
+            options={
+                'verbose_name': 'Pedido de Cliente Archivado',
+                'verbose_name_plural': 'Pedidos de Clientes Archivados',
+                'ordering': ['-fecha_pedido'],
+                'indexes': [models.Index(fields=['periodo'], name='archivo_pedido_periodo_idx'), models.Index(fields=['cliente_id', '-fecha_pedido'], name='archivo_pedido_cliente_idx'), models.Index(fields=['sucursal_despacho_id', '-fecha_pedido'], name='archivo_pedido_sucursal_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RegistroActividadArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID del Registro')),
+                ('usuario_id', models.BigIntegerField(blank=True, null=True, verbose_name='ID del Usuario')),
+                ('fecha_hora', models.DateTimeField(verbose_name='Fecha y Hora')),
+                ('accion', models.CharField(max_length=100, verbose_name='Acción Realizada')),
+                ('descripcion', models.TextField(blank=True, null=True, verbose_name='Descripción Detallada')),
+                ('content_type_id', models.IntegerField(blank=True, null=True, verbose_name='ID del Tipo de Objeto Relacionado')),
+                ('object_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='ID del Objeto Relacionado')),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True, verbose_name='Dirección IP')),
+                ('periodo', models.DateField(verbose_name='Mes del Registro')),
+                ('fecha_archivado', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Archivado')),
+            ],
+            options={
+                'verbose_name': 'Registro de Actividad Archivado',
+                'verbose_name_plural': 'Registros de Actividad Archivados',
+                'ordering': ['-fecha_hora'],
+                'indexes': [models.Index(fields=['periodo'], name='archivo_registro_periodo_idx'), models.Index(fields=['usuario_id', '-fecha_hora'], name='archivo_registro_usuario_idx'), models.Index(fields=['content_type_id', 'object_id'], name='archivo_registro_objeto_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+# Tablas de archivo: copias de solo lectura de filas históricas movidas fuera de las tablas
+# operativas (ver archivo_app.services). Conservan el ID original y guardan las referencias
+# como IDs simples, sin claves foráneas, para no bloquear cambios en las tablas vivas.
+# 'periodo' (primer día del mes) es la clave de partición mensual de cada tabla.
+
+
+class PedidoClienteArchivado(models.Model):
+    """
+    Pedido de cliente cerrado y archivado. 'datos' contiene la fila del pedido y, debajo,
+    sus líneas, pagos, el snapshot de entrega (si lo tenía) y los IDs de traspasos asociados.
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID del Pedido")
+    cliente_id = models.BigIntegerField(verbose_name="ID del Cliente")
+    sucursal_despacho_id = models.BigIntegerField(null=True, blank=True, verbose_name="ID de la Sucursal de Despacho")
+    estado = models.CharField(max_length=30, verbose_name="Estado del Pedido")
+    fecha_pedido = models.DateTimeField(verbose_name="Fecha del Pedido")
+    fecha_entregado = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de Entrega Real")
+    total_pedido = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Total del Pedido")
+    periodo = models.DateField(verbose_name="Mes del Pedido")
+    datos = models.JSONField(encoder=DjangoJSONEncoder, verbose_name="Datos Archivados")
+    fecha_archivado = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Archivado")
+
+    class Meta:
+        verbose_name = "Pedido de Cliente Archivado"
+        verbose_name_plural = "Pedidos de Clientes Archivados"
+        ordering = ['-fecha_pedido']
+        indexes = [
+            models.Index(fields=['periodo'], name='archivo_pedido_periodo_idx'),
+            models.Index(fields=['cliente_id', '-fecha_pedido'], name='archivo_pedido_cliente_idx'),
+            models.Index(fields=['sucursal_despacho_id', '-fecha_pedido'], name='archivo_pedido_sucursal_idx'),
+        ]
+
+    def __str__(self):
+        return f"Pedido Cliente archivado #{self.id} ({self.estado})"
+
+
+class RegistroActividadArchivado(models.Model):
+    """Registro de la bitácora (bitacora_app.RegistroActividad) archivado."""
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID del Registro")
+    usuario_id = models.BigIntegerField(null=True, blank=True, verbose_name="ID del Usuario")
+    fecha_hora = models.DateTimeField(verbose_name="Fecha y Hora")
+    accion = models.CharField(max_length=100, verbose_name="Acción Realizada")
+    descripcion = models.TextField(blank=True, null=True, verbose_name="Descripción Detallada")
+    content_type_id = models.IntegerField(null=True, blank=True, verbose_name="ID del Tipo de Objeto Relacionado")
+    object_id = models.PositiveIntegerField(null=True, blank=True, verbose_name="ID del Objeto Relacionado")
+    ip_address = models.GenericIPAddressField(null=True, blank=True, verbose_name="Dirección IP")
+    periodo = models.DateField(verbose_name="Mes del Registro")
+    fecha_archivado = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Archivado")
+
+    class Meta:
+        verbose_name = "Registro de Actividad Archivado"
+        verbose_name_plural = "Registros de Actividad Archivados"
+        ordering = ['-fecha_hora']
+        indexes = [
+            models.Index(fields=['periodo'], name='archivo_registro_periodo_idx'),
+            models.Index(fields=['usuario_id', '-fecha_hora'], name='archivo_registro_usuario_idx'),
+            models.Index(fields=['content_type_id', 'object_id'], name='archivo_registro_objeto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha_hora:%Y-%m-%d %H:%M:%S} - {self.accion} (archivado)"
@@ -0,0 +1,138 @@
+"""
+Archivo de historial: mueve los pedidos de cliente cerrados (con sus líneas, pagos y snapshot
+de entrega) y los registros de la bitácora más antiguos que la retención configurada a las
+tablas de archivo, para que las consultas operativas no recorran años de historia.
+
+El traslado se hace por lotes; cada lote copia y elimina en una sola transacción, así que un
+proceso interrumpido se retoma volviendo a ejecutarlo (lo ya movido ya no es elegible).
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from bitacora_app.models import RegistroActividad
+from inventario_app.models import TraspasoInternoStock
+from pago_app.models import Pago
+from pedido_app.models import PedidoCliente, DetallePedidoCliente, EstadoPedidoCliente, SnapshotPedidoEntregado
+from pedido_app.services import ESTADOS_TRASPASO_VIGENTES
+from .models import PedidoClienteArchivado, RegistroActividadArchivado
+
+ESTADOS_PEDIDO_CERRADOS = [
+    EstadoPedidoCliente.ENTREGADO,
+    EstadoPedidoCliente.CANCELADO,
+    EstadoPedidoCliente.RECHAZADO_STOCK,
+    EstadoPedidoCliente.FALLIDO,
+]
+TAMANO_LOTE_ARCHIVO = 500
+
+
+def fecha_corte_archivo(dias=None):
+    """Instante antes del cual los datos se archivan (por defecto settings.ARCHIVO_DIAS_RETENCION)."""
+    return timezone.now() - timedelta(days=settings.ARCHIVO_DIAS_RETENCION if dias is None else dias)
+
+
+def _periodo(fecha):
+    return timezone.localtime(fecha).date().replace(day=1)
+
+
+def pedidos_archivables(antes_de):
+    """
+    Pedidos cerrados sin cambios desde 'antes_de'. Se excluyen los que tienen un documento
+    financiero asociado (se perdería el vínculo) o traspasos aún vigentes.
+    """
+    return PedidoCliente.objects.filter(
+        estado__in=ESTADOS_PEDIDO_CERRADOS, fecha_actualizacion__lt=antes_de,
+    ).exclude(
+        documentos_financieros__isnull=False,
+    ).exclude(
+        traspasos_generados__estado__in=ESTADOS_TRASPASO_VIGENTES,
+    )
+
+
+def archivar_lote_pedidos(antes_de, tamano_lote=TAMANO_LOTE_ARCHIVO):
+    """
+    Mueve al archivo un lote de hasta 'tamano_lote' pedidos archivables, los más antiguos
+    primero. Retorna la cantidad de pedidos archivados (0 cuando no quedan).
+    """
+    with transaction.atomic():
+        ids = list(pedidos_archivables(antes_de).order_by('pk').values_list('pk', flat=True)[:tamano_lote])
+        if not ids:
+            return 0
+        # Bloquear y volver a verificar: un pedido pudo cambiar entre la selección y el bloqueo
+        ids = list(pedidos_archivables(antes_de).select_for_update().filter(pk__in=ids).values_list('pk', flat=True))
+        pedidos = list(PedidoCliente.objects.filter(pk__in=ids).order_by('pk').values())
+
+        detalles, pagos, traspasos = defaultdict(list), defaultdict(list), defaultdict(list)
+        for detalle in DetallePedidoCliente.objects.filter(pedido_cliente_id__in=ids).order_by('pk').values():
+            detalles[detalle['pedido_cliente_id']].append(detalle)
+        for pago in Pago.objects.filter(pedido_cliente_id__in=ids).order_by('pk').values():
+            pagos[pago['pedido_cliente_id']].append(pago)
+        for pedido_id, traspaso_id in TraspasoInternoStock.objects.filter(
+            pedido_cliente_origen_id__in=ids
+        ).order_by('pk').values_list('pedido_cliente_origen_id', 'pk'):
+            traspasos[pedido_id].append(traspaso_id)
+        snapshots = {s.pedido_id: s.datos for s in SnapshotPedidoEntregado.objects.filter(pedido_id__in=ids)}
+
+        PedidoClienteArchivado.objects.bulk_create([
+            PedidoClienteArchivado(
+                id=pedido['id'],
+                cliente_id=pedido['cliente_id'],
+                sucursal_despacho_id=pedido['sucursal_despacho_id'],
+                estado=pedido['estado'],
+                fecha_pedido=pedido['fecha_pedido'],
+                fecha_entregado=pedido['fecha_entregado'],
+                total_pedido=pedido['total_pedido'],
+                periodo=_periodo(pedido['fecha_pedido']),
+                datos={
+                    'pedido': pedido,
+                    'detalles': detalles[pedido['id']],
+                    'pagos': pagos[pedido['id']],
+                    'snapshot_entrega': snapshots.get(pedido['id']),
+                    'traspasos_ids': traspasos[pedido['id']],
+                },
+            )
+            for pedido in pedidos
+        ])
+        # Los pagos protegen al pedido: se eliminan primero. Las líneas y el snapshot se
+        # eliminan en cascada y los traspasos quedan sin pedido de origen (SET_NULL).
+        Pago.objects.filter(pedido_cliente_id__in=ids).delete()
+        PedidoCliente.objects.filter(pk__in=ids).delete()
+    return len(pedidos)
+
+
+def archivar_lote_registros(antes_de, tamano_lote=TAMANO_LOTE_ARCHIVO):
+    """
+    Mueve al archivo un lote de registros de la bitácora anteriores a 'antes_de'.
+    Retorna la cantidad archivada (0 cuando no quedan).
+    """
+    with transaction.atomic():
+        registros = list(
+            RegistroActividad.objects.select_for_update().filter(fecha_hora__lt=antes_de).order_by('pk').values()[:tamano_lote]
+        )
+        if not registros:
+            return 0
+        RegistroActividadArchivado.objects.bulk_create([
+            RegistroActividadArchivado(periodo=_periodo(registro['fecha_hora']), **registro) for registro in registros
+        ])
+        RegistroActividad.objects.filter(pk__in=[registro['id'] for registro in registros]).delete()
+    return len(registros)
+
+
+def archivar_historial(dias=None, tamano_lote=TAMANO_LOTE_ARCHIVO, max_lotes=None):
+    """
+    Archiva por lotes los pedidos cerrados y los registros de la bitácora más antiguos que
+    'dias' (por defecto la retención configurada). 'max_lotes' limita los lotes de cada tipo
+    por ejecución. Genera (tipo, cantidad) por cada lote movido.
+    """
+    antes_de = fecha_corte_archivo(dias)
+    for tipo, archivar_lote in (('pedidos', archivar_lote_pedidos), ('registros', archivar_lote_registros)):
+        lotes = 0
+        while max_lotes is None or lotes < max_lotes:
+            cantidad = archivar_lote(antes_de, tamano_lote)
+            if not cantidad:
+                break
+            lotes += 1
+            yield tipo, cantidad
@@ -0,0 +1,102 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from archivo_app.models import PedidoClienteArchivado, RegistroActividadArchivado
+from bitacora_app.models import RegistroActividad
+from inventario_app.models import TraspasoInternoStock
+from pago_app.models import Pago
+from pedido_app.models import PedidoCliente, EstadoPedidoCliente
+from pedido_app.tests.base import PedidoTestCase
+
+
+class ArchivoHistorialTestCase(PedidoTestCase):
+    """Pruebas del archivo por lotes de pedidos cerrados y registros de bitácora antiguos"""
+
+    def setUp(self):
+        super().setUp()
+        self.hace_un_anio = timezone.now() - timedelta(days=400)
+
+    def crear_pedido_cerrado(self, estado=EstadoPedidoCliente.ENTREGADO, antiguo=True, cliente=None):
+        pedido = self.crear_pedido(EstadoPedidoCliente.ENVIADO, cliente=cliente, lineas=((0, 2),))
+        Pago.objects.create(pedido_cliente=pedido, monto_pagado=Decimal('1800'), metodo_pago='EFECTIVO', estado_pago='COMPLETADO')
+        pedido.refresh_from_db()
+        pedido.estado = estado
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido.save()
+        if antiguo:
+            PedidoCliente.objects.filter(pk=pedido.pk).update(fecha_actualizacion=self.hace_un_anio, fecha_pedido=self.hace_un_anio)
+        return pedido
+
+    def archivar(self, *args):
+        call_command('archivar_historial', *args, stdout=StringIO())
+
+    def test_archiva_solo_pedidos_cerrados_antiguos_por_lotes(self):
+        antiguos = [self.crear_pedido_cerrado() for _ in range(3)]
+        cancelado = self.crear_pedido_cerrado(EstadoPedidoCliente.CANCELADO)
+        reciente = self.crear_pedido_cerrado(antiguo=False)
+        activo = self.crear_pedido(EstadoPedidoCliente.PAGADO)
+        PedidoCliente.objects.filter(pk=activo.pk).update(fecha_actualizacion=self.hace_un_anio)
+
+        self.archivar('--lote', '2', '--max-lotes', '1')
+        self.assertEqual(PedidoClienteArchivado.objects.count(), 2)
+
+        self.archivar('--lote', '2')  # Se retoma donde quedó
+        self.assertEqual(
+            sorted(PedidoClienteArchivado.objects.values_list('pk', flat=True)),
+            sorted(p.pk for p in antiguos + [cancelado]),
+        )
+        self.assertEqual(sorted(PedidoCliente.objects.values_list('pk', flat=True)), sorted([reciente.pk, activo.pk]))
+        self.assertEqual(Pago.objects.count(), 1)
+
+        archivado = PedidoClienteArchivado.objects.get(pk=antiguos[0].pk)
+        self.assertEqual(archivado.periodo, timezone.localtime(self.hace_un_anio).date().replace(day=1))
+        self.assertEqual((len(archivado.datos['detalles']), len(archivado.datos['pagos'])), (1, 1))
+        self.assertEqual(archivado.datos['snapshot_entrega']['id'], antiguos[0].pk)
+
+    def test_pedidos_con_traspasos_vigentes_esperan_a_que_terminen(self):
+        pedido = self.crear_pedido_cerrado()
+        traspaso = TraspasoInternoStock.objects.create(
+            sucursal_origen=self.otra_sucursal, sucursal_destino=self.sucursal, pedido_cliente_origen=pedido,
+            motivo=TraspasoInternoStock.MotivoTraspaso.PARA_COMPLETAR_PEDIDO,
+        )
+
+        self.archivar()
+        self.assertTrue(PedidoCliente.objects.filter(pk=pedido.pk).exists())
+
+        TraspasoInternoStock.objects.filter(pk=traspaso.pk).update(estado=TraspasoInternoStock.EstadoTraspaso.COMPLETADO)
+        self.archivar()
+        traspaso.refresh_from_db()
+        self.assertIsNone(traspaso.pedido_cliente_origen_id)
+        self.assertEqual(PedidoClienteArchivado.objects.get(pk=pedido.pk).datos['traspasos_ids'], [traspaso.pk])
+
+    def test_archiva_registros_de_bitacora_antiguos(self):
+        RegistroActividad.objects.all().delete()
+        RegistroActividad.objects.create(accion='RECIENTE')
+        RegistroActividad.objects.bulk_create([RegistroActividad(accion='ANTIGUO', fecha_hora=self.hace_un_anio) for _ in range(3)])
+
+        self.archivar('--lote', '2')
+
+        self.assertEqual(list(RegistroActividad.objects.values_list('accion', flat=True)), ['RECIENTE'])
+        self.assertEqual(RegistroActividadArchivado.objects.filter(accion='ANTIGUO').count(), 3)
+
+    def test_api_de_consulta_del_archivo(self):
+        propio = self.crear_pedido_cerrado()
+        otro_cliente = self.crear_cliente('otro')
+        self.crear_pedido_cerrado(EstadoPedidoCliente.CANCELADO, cliente=otro_cliente)
+        self.archivar()
+        administrador = APIClient()
+        administrador.force_authenticate(self.crear_personal('admin', 'ADMINISTRADOR'))
+        cliente = APIClient()
+        cliente.force_authenticate(self.cliente.usuario)
+
+        self.assertEqual(administrador.get('/api/archivo/pedidos-cliente/').data['count'], 2)
+        self.assertEqual(administrador.get('/api/archivo/pedidos-cliente/', {'estado': 'CANCELADO'}).data['count'], 1)
+        self.assertEqual([p['id'] for p in cliente.get('/api/archivo/pedidos-cliente/').data['results']], [propio.pk])
+        self.assertEqual(cliente.get('/api/archivo/registros-actividad/').status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(administrador.post('/api/archivo/pedidos-cliente/', {}).status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
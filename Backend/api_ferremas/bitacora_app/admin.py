@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import RegistroActividad
+from .models import RegistroActividad, SolicitudIdempotente, EventoOutbox
+from .outbox import reintentar_eventos_fallidos
 
 # Register your models here.
 
@@ -20,3 +21,31 @@ class RegistroActividadAdmin(admin.ModelAdmin):
     def descripcion_corta(self, obj):
         return (obj.descripcion[:75] + '...') if obj.descripcion and len(obj.descripcion) > 75 else obj.descripcion
     descripcion_corta.short_description = 'Descripción'
+
+
+@admin.register(SolicitudIdempotente)
+class SolicitudIdempotenteAdmin(admin.ModelAdmin):
+    list_display = ('fecha_creacion', 'usuario', 'endpoint', 'clave', 'estado', 'codigo_respuesta', 'fecha_expiracion')
+    list_filter = ('estado', 'endpoint')
+    search_fields = ('clave', 'usuario__email', 'endpoint')
+    readonly_fields = (
+        'usuario', 'clave', 'endpoint', 'hash_solicitud', 'estado', 'codigo_respuesta', 'respuesta',
+        'hash_respuesta', 'fecha_creacion', 'fecha_expiracion',
+    )
+
+
+@admin.register(EventoOutbox)
+class EventoOutboxAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'estado', 'intentos', 'disponible_desde', 'fecha_creacion', 'fecha_procesado')
+    list_filter = ('estado', 'tipo')
+    search_fields = ('tipo', 'ultimo_error')
+    readonly_fields = (
+        'tipo', 'payload', 'estado', 'intentos', 'disponible_desde', 'reservado_por', 'ultimo_error',
+        'fecha_creacion', 'fecha_procesado',
+    )
+    actions = ['reintentar']
+
+    @admin.action(description="Reintentar los eventos fallidos seleccionados")
+    def reintentar(self, request, queryset):
+        reactivados = reintentar_eventos_fallidos(queryset)
+        self.message_user(request, f"{reactivados} eventos devueltos a la cola.")
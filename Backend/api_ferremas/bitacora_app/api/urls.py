@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import EventosStreamView
+
+app_name = 'bitacora_app'
+
+urlpatterns = [
+    path('eventos/stream/', EventosStreamView.as_view(), name='eventos-stream'),
+]
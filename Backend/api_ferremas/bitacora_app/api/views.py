@@ -0,0 +1,128 @@
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework import permissions
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.views import APIView
+
+from usuario_app.api.permissions import EsPersonalAutorizadoParaPedidos
+from usuario_app.models import Personal
+from ..eventos import bus_eventos, CANALES
+
+INTERVALO_LATIDO = 15  # Segundos sin eventos antes de enviar un comentario de keep-alive
+DURACION_MAXIMA_WSGI = 300  # Bajo WSGI cada conexión ocupa un hilo: se cierra y el cliente se reconecta
+RETRY_MS = 3000
+
+
+class RenderizadorEventos(BaseRenderer):
+    """Permite negociar 'text/event-stream'; los errores se envían como un evento 'error'."""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return f"event: error\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n".encode(self.charset)
+
+
+def _formatear(evento):
+    datos = json.dumps(evento.datos, cls=DjangoJSONEncoder)
+    return f"id: {evento.id}\nevent: {evento.canal}\ndata: {datos}\n\n"
+
+
+def _inicio_stream(perdidos, completo):
+    partes = [f"retry: {RETRY_MS}\n\n"]
+    if not completo:
+        # El ID recibido ya se purgó, no es válido o quedan más eventos de los que se reenvían
+        partes.append("event: reinicio\ndata: {}\n\n")
+    partes.extend(_formatear(evento) for evento in perdidos)
+    return partes
+
+
+def _stream_sincrono(canales, sucursal_id, ultimo_id):
+    suscripcion, perdidos, completo = bus_eventos.suscribir(canales, sucursal_id, ultimo_id)
+    try:
+        yield from _inicio_stream(perdidos, completo)
+        fin = time.monotonic() + DURACION_MAXIMA_WSGI
+        while time.monotonic() < fin:
+            eventos = suscripcion.esperar(INTERVALO_LATIDO)
+            if suscripcion.desbordada:
+                return  # Cliente demasiado lento: se reconecta y retoma desde su último ID
+            if not eventos:
+                yield ": ping\n\n"
+            for evento in eventos:
+                yield _formatear(evento)
+    finally:
+        bus_eventos.cancelar(suscripcion)
+
+
+async def _stream_asincrono(canales, sucursal_id, ultimo_id):
+    loop = asyncio.get_running_loop()
+    suscripcion, perdidos, completo = await sync_to_async(bus_eventos.suscribir)(
+        canales, sucursal_id, ultimo_id, loop=loop
+    )
+    try:
+        for parte in _inicio_stream(perdidos, completo):
+            yield parte
+        while True:
+            eventos = await suscripcion.esperar_async(INTERVALO_LATIDO)
+            if suscripcion.desbordada:
+                return
+            if not eventos:
+                yield ": ping\n\n"
+            for evento in eventos:
+                yield _formatear(evento)
+    finally:
+        bus_eventos.cancelar(suscripcion)
+
+
+class EventosStreamView(APIView):
+    """
+    Stream de eventos (Server-Sent Events) con los cambios de stock, de estado de pedidos
+    de cliente y de traspasos, a medida que se confirman.
+
+    Parámetros: ?canales=stock,pedidos,traspasos (por defecto todos) y ?sucursal=<id>
+    (el personal con sucursal asignada, salvo administradores, solo recibe la suya).
+    Para retomar tras una desconexión se envía el último ID recibido en la cabecera
+    Last-Event-ID (EventSource lo hace solo) o en ?ultimo_evento=. Si el evento 'reinicio'
+    llega, el cliente debe recargar su estado completo porque hubo eventos que no se pueden reenviar.
+
+    Los eventos se leen de la tabla EventoTiempoReal, así que incluyen los que se originan en
+    otros procesos (worker de importaciones, outbox, comandos) y el ID sirve contra cualquier
+    proceso del servidor. Conviene servirlo con ASGI (asgi.py): cada conexión queda en espera
+    sin ocupar un hilo.
+    """
+    permission_classes = [permissions.IsAuthenticated, EsPersonalAutorizadoParaPedidos]
+    renderer_classes = [RenderizadorEventos, JSONRenderer]
+
+    def _sucursal(self, request):
+        perfil = request.user.perfil_personal
+        if perfil.rol != Personal.Roles.ADMINISTRADOR and perfil.sucursal_id:
+            return perfil.sucursal_id
+        sucursal = request.query_params.get('sucursal')
+        if sucursal in (None, ''):
+            return None
+        if not sucursal.isdigit():
+            raise ValidationError({"sucursal": "Debe ser un ID numérico."})
+        return int(sucursal)
+
+    def get(self, request, *args, **kwargs):
+        canales = [c for c in request.query_params.get('canales', '').split(',') if c] or list(CANALES)
+        desconocidos = set(canales) - set(CANALES)
+        if desconocidos:
+            raise ValidationError({"canales": f"Canales no válidos: {', '.join(sorted(desconocidos))}."})
+        sucursal_id = self._sucursal(request)
+        ultimo_id = request.headers.get('Last-Event-ID') or request.query_params.get('ultimo_evento')
+
+        generador = _stream_asincrono if isinstance(request._request, ASGIRequest) else _stream_sincrono
+        response = StreamingHttpResponse(
+            generador(canales, sucursal_id, ultimo_id), content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Evita que un proxy nginx acumule el stream
+        return response
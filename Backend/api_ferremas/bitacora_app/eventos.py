@@ -0,0 +1,243 @@
+"""
+Eventos en tiempo real (stock, pedidos, traspasos) para el stream SSE.
+
+Las rutas de escritura publican con `publicar_al_confirmar(...)`, que guarda el evento en
+la tabla EventoTiempoReal cuando se confirma la transacción. Así llegan también los eventos
+que se originan fuera del servidor web (worker de importaciones, outbox, comandos).
+
+En cada proceso web, `bus_eventos` reparte esos eventos a los clientes conectados
+(`EventosStreamView`): un hilo consulta la tabla mientras haya suscripciones. El ID de cada
+evento es el de su fila, así que un cliente que se reconecta (a este u otro proceso) retoma
+desde su Last-Event-ID leyendo la tabla.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import timedelta
+
+from django.db import close_old_connections, transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CANAL_STOCK = 'stock'
+CANAL_PEDIDOS = 'pedidos'
+CANAL_TRASPASOS = 'traspasos'
+CANALES = (CANAL_STOCK, CANAL_PEDIDOS, CANAL_TRASPASOS)
+
+TAMANO_HISTORIAL = 1000  # Eventos que se reenvían como máximo al reanudar una conexión
+MAX_PENDIENTES_SUSCRIPCION = 500  # Si un cliente acumula más, se le pide resincronizar
+INTERVALO_CONSULTA = 0.5  # Segundos entre lecturas de la tabla de eventos
+LOTE_CONSULTA = 500
+# Un ID que falta entre dos leídos es una inserción aún sin confirmar (los IDs se asignan
+# antes del commit): se sigue buscando durante este tiempo antes de darla por perdida.
+ESPERA_HUECO = 5
+MAX_HUECOS = 1000
+RETENCION_EVENTOS = timedelta(days=1)
+
+# 'sucursales' es el conjunto de sucursales a las que afecta el evento (para filtrar).
+Evento = namedtuple('Evento', ['id', 'canal', 'datos', 'sucursales'])
+
+
+class Suscripcion:
+    """Cola de eventos de un cliente conectado. Se alimenta desde cualquier hilo."""
+
+    def __init__(self, canales, sucursal_id=None, loop=None):
+        self.canales = frozenset(canales)
+        self.sucursal_id = sucursal_id
+        self.desbordada = False
+        self._pendientes = deque()
+        self._condicion = threading.Condition()
+        self._loop = loop
+        self._aviso = asyncio.Event() if loop else None
+        self._hasta = 0
+        self._omitidos = set()
+
+    def omitir(self, hasta, ids):
+        """No volver a entregar los eventos hasta el ID 'hasta' ni los de 'ids' (ya enviados)."""
+        with self._condicion:
+            self._hasta = hasta
+            self._omitidos = set(ids)
+
+    def acepta(self, evento):
+        if evento.canal not in self.canales:
+            return False
+        return self.sucursal_id is None or self.sucursal_id in evento.sucursales
+
+    def entregar(self, evento):
+        with self._condicion:
+            if len(self._pendientes) >= MAX_PENDIENTES_SUSCRIPCION:
+                self.desbordada = True
+                self._pendientes.clear()
+            else:
+                self._pendientes.append(evento)
+            self._condicion.notify()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._aviso.set)
+
+    def _extraer(self):
+        with self._condicion:
+            eventos = [
+                e for e in self._pendientes if e.id > self._hasta and e.id not in self._omitidos
+            ]
+            self._pendientes.clear()
+            return eventos
+
+    def esperar(self, timeout):
+        """Bloquea hasta que haya eventos o venza el timeout (servidor WSGI)."""
+        with self._condicion:
+            if not self._pendientes and not self.desbordada:
+                self._condicion.wait(timeout)
+        return self._extraer()
+
+    async def esperar_async(self, timeout):
+        """Igual que esperar(), sin ocupar un hilo (servidor ASGI)."""
+        try:
+            await asyncio.wait_for(self._aviso.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._aviso.clear()
+        return self._extraer()
+
+
+class BusEventos:
+    """Reparte a las suscripciones de este proceso los eventos guardados en la tabla."""
+
+    def __init__(self):
+        self._suscripciones = set()
+        self._lock = threading.Lock()
+        self._hay_suscripciones = threading.Condition(self._lock)
+        self._hilo = None
+        self._ultimo_leido = None  # Se fija al (re)activar la lectura
+        self._huecos = {}  # ID faltante -> instante (monotónico) en que se deja de buscar
+
+    @staticmethod
+    def _evento(fila):
+        evento_id, canal, datos, sucursales = fila
+        return Evento(id=evento_id, canal=canal, datos=datos, sucursales=frozenset(sucursales))
+
+    def repartir(self, evento):
+        with self._lock:
+            destinatarios = [s for s in self._suscripciones if s.acepta(evento)]
+        for suscripcion in destinatarios:
+            suscripcion.entregar(evento)
+
+    def leer_nuevos(self):
+        """
+        Lee los eventos confirmados desde la última lectura (y los huecos pendientes) y los
+        reparte. Lo llama el hilo lector; retorna la cantidad de eventos repartidos.
+        """
+        from .models import EventoTiempoReal  # Importación local: el módulo se importa antes que los modelos
+
+        if self._ultimo_leido is None:
+            self._ultimo_leido = EventoTiempoReal.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0
+            self._huecos.clear()
+            return 0
+        ahora = time.monotonic()
+        self._huecos = {i: limite for i, limite in self._huecos.items() if limite > ahora}
+        filtro = Q(id__gt=self._ultimo_leido)
+        if self._huecos:
+            filtro |= Q(id__in=list(self._huecos))
+        filas = list(
+            EventoTiempoReal.objects.filter(filtro).order_by('id')
+            .values_list('id', 'canal', 'datos', 'sucursales')[:LOTE_CONSULTA]
+        )
+        for fila in filas:
+            evento_id = fila[0]
+            if evento_id in self._huecos:
+                del self._huecos[evento_id]
+            elif evento_id > self._ultimo_leido:
+                faltantes = range(self._ultimo_leido + 1, evento_id)
+                if len(faltantes) <= MAX_HUECOS:
+                    self._huecos.update(dict.fromkeys(faltantes, ahora + ESPERA_HUECO))
+                self._ultimo_leido = evento_id
+            self.repartir(self._evento(fila))
+        return len(filas)
+
+    def _leer_en_bucle(self):
+        while True:
+            with self._lock:
+                if not self._suscripciones:
+                    # Sin clientes no se lee; al volver se retoma desde el último evento guardado
+                    self._ultimo_leido = None
+                while not self._suscripciones:
+                    self._hay_suscripciones.wait()
+            try:
+                close_old_connections()
+                if self.leer_nuevos() >= LOTE_CONSULTA:
+                    continue
+            except Exception:
+                logger.exception("Error al leer los eventos en tiempo real")
+            time.sleep(INTERVALO_CONSULTA)
+
+    def _iniciar_lector(self):
+        if self._hilo is None or not self._hilo.is_alive():
+            self._hilo = threading.Thread(target=self._leer_en_bucle, name='lector-eventos', daemon=True)
+            self._hilo.start()
+
+    def suscribir(self, canales=CANALES, sucursal_id=None, ultimo_id=None, loop=None):
+        """
+        Registra una suscripción y devuelve (suscripcion, eventos_perdidos, completo).
+        'eventos_perdidos' son los guardados después de 'ultimo_id'; 'completo' es False
+        si ese ID no es válido o ya se purgó y el cliente debe resincronizar su estado.
+        Consulta la base de datos: desde código asíncrono se llama con sync_to_async.
+        """
+        from .models import EventoTiempoReal
+
+        suscripcion = Suscripcion(canales, sucursal_id=sucursal_id, loop=loop)
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+            self._hay_suscripciones.notify()
+            self._iniciar_lector()
+        if not ultimo_id:
+            return suscripcion, [], True
+        numero = int(ultimo_id) if str(ultimo_id).isdigit() else None
+        if numero is None:
+            return suscripcion, [], False
+
+        primero = EventoTiempoReal.objects.aggregate(primero=Min('id'))['primero']
+        filas = list(
+            EventoTiempoReal.objects.filter(id__gt=numero, canal__in=suscripcion.canales).order_by('id')
+            .values_list('id', 'canal', 'datos', 'sucursales')[:TAMANO_HISTORIAL + 1]
+        )
+        completo = (primero is None or numero >= primero - 1) and len(filas) <= TAMANO_HISTORIAL
+        perdidos = [e for e in map(self._evento, filas[:TAMANO_HISTORIAL]) if suscripcion.acepta(e)]
+        # El lector puede entregar otra vez los reenviados, o eventos que el cliente ya tenía
+        suscripcion.omitir(numero, {e.id for e in perdidos})
+        return suscripcion, perdidos, completo
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+
+bus_eventos = BusEventos()
+
+
+def _guardar_evento(canal, datos, sucursales):
+    from .models import EventoTiempoReal
+
+    try:
+        EventoTiempoReal.objects.create(
+            canal=canal, datos=datos, sucursales=sorted({s for s in sucursales if s is not None}),
+        )
+    except Exception:
+        # Corre después del commit: un fallo aquí no debe convertir en error una operación ya confirmada
+        logger.exception("No se pudo guardar el evento en tiempo real del canal %s", canal)
+
+
+def publicar_al_confirmar(canal, datos, sucursales=()):
+    """Guarda el evento cuando se confirme la transacción en curso (nunca si se revierte)."""
+    sucursales = list(sucursales)
+    transaction.on_commit(lambda: _guardar_evento(canal, datos, sucursales))
+
+
+def purgar_eventos_tiempo_real(retencion=RETENCION_EVENTOS):
+    """Elimina los eventos más antiguos que 'retencion'. Retorna la cantidad eliminada."""
+    from .models import EventoTiempoReal
+
+    eliminados, _ = EventoTiempoReal.objects.filter(fecha_creacion__lt=timezone.now() - retencion).delete()
+    return eliminados
@@ -0,0 +1,169 @@
+"""
+Soporte de la cabecera Idempotency-Key para endpoints que crean pedidos o inician pagos.
+
+Los clientes móviles reintentan las solicitudes cuando vence el timeout. Con `@idempotente`
+sobre el método de la vista, el primer envío de una clave registra una fila EN_PROCESO (la
+restricción única resuelve la carrera entre duplicados concurrentes) y, en la misma
+transacción que el trabajo de la vista, guarda la respuesta. Los reintentos con la misma
+clave reciben la respuesta guardada sin volver a ejecutar la operación.
+
+La cabecera es opcional: sin ella la vista se comporta como siempre.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils import encoders
+
+from .models import SolicitudIdempotente
+
+CABECERA_IDEMPOTENCIA = 'Idempotency-Key'
+VIGENCIA_CLAVE = timedelta(hours=24)
+TIEMPO_MAXIMO_EN_PROCESO = timedelta(minutes=5)  # Una clave EN_PROCESO más antigua se considera abandonada
+LARGO_MAXIMO_CLAVE = 255
+
+
+def _hash(datos):
+    if hasattr(datos, 'lists'):  # QueryDict (formularios): conservar todos los valores de cada campo
+        datos = dict(datos.lists())
+    return hashlib.sha256(json.dumps(datos, cls=DjangoJSONEncoder, sort_keys=True).encode()).hexdigest()
+
+
+def _respuesta_guardada(solicitud):
+    respuesta = Response(solicitud.respuesta, status=solicitud.codigo_respuesta)
+    respuesta['Idempotent-Replayed'] = 'true'
+    return respuesta
+
+
+def reclamar_clave_idempotencia(usuario, endpoint, clave, hash_solicitud):
+    """
+    Registra la clave como EN_PROCESO (confirmada de inmediato, para que los duplicados la vean).
+    Retorna (solicitud, None) si esta solicitud debe ejecutarse, o (None, respuesta) con la
+    respuesta guardada, un 409 si la original sigue en proceso o un 422 si la clave se usó
+    con otro cuerpo. Las claves vencidas o abandonadas se reemplazan.
+    """
+    for _ in range(2):
+        ahora = timezone.now()
+        try:
+            with transaction.atomic():
+                solicitud = SolicitudIdempotente.objects.create(
+                    usuario=usuario, endpoint=endpoint, clave=clave, hash_solicitud=hash_solicitud,
+                    fecha_expiracion=ahora + VIGENCIA_CLAVE,
+                )
+            return solicitud, None
+        except IntegrityError:
+            existente = SolicitudIdempotente.objects.filter(usuario=usuario, endpoint=endpoint, clave=clave).first()
+        if existente is None:
+            continue  # Se eliminó entre el INSERT y la lectura
+        en_proceso = existente.estado == SolicitudIdempotente.EstadoSolicitud.EN_PROCESO
+        if existente.fecha_expiracion <= ahora or (en_proceso and existente.fecha_creacion < ahora - TIEMPO_MAXIMO_EN_PROCESO):
+            # Borrado condicional: si otro proceso ya la reemplazó, el siguiente INSERT vuelve a chocar
+            SolicitudIdempotente.objects.filter(pk=existente.pk, estado=existente.estado).delete()
+            continue
+        if existente.hash_solicitud != hash_solicitud:
+            return None, Response(
+                {"error": "La clave de idempotencia ya se usó con una solicitud distinta."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        if en_proceso:
+            return None, Response(
+                {"error": "Una solicitud con esta clave de idempotencia aún está en proceso. Reintente en unos segundos."},
+                status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'},
+            )
+        return None, _respuesta_guardada(existente)
+    return None, Response(
+        {"error": "No se pudo registrar la clave de idempotencia. Reintente."},
+        status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'},
+    )
+
+
+def _completar_solicitud(solicitud, respuesta):
+    """Guarda la respuesta (si no es 5xx) y deja la clave COMPLETADA."""
+    if respuesta.status_code >= 500 or not hasattr(respuesta, 'data'):
+        return
+    # Con el encoder de DRF, la respuesta repetida se renderiza igual que la original
+    datos = json.loads(json.dumps(respuesta.data, cls=encoders.JSONEncoder))
+    solicitud.estado = SolicitudIdempotente.EstadoSolicitud.COMPLETADA
+    solicitud.codigo_respuesta = respuesta.status_code
+    solicitud.respuesta = datos
+    solicitud.hash_respuesta = _hash(datos)
+    solicitud.save(update_fields=['estado', 'codigo_respuesta', 'respuesta', 'hash_respuesta'])
+
+
+def guardar_respuesta_idempotente(request, respuesta):
+    """
+    Para vistas con @idempotente(transaccion=False): guarda la respuesta dentro de la
+    transacción de la vista, junto con sus escrituras. Sin clave de idempotencia (o en una
+    vista llamada desde otra) no hace nada. Retorna la misma respuesta.
+    """
+    solicitud = getattr(request, '_solicitud_idempotente_pendiente', None)
+    if solicitud is not None:
+        _completar_solicitud(solicitud, respuesta)
+    return respuesta
+
+
+def idempotente(metodo=None, *, transaccion=True):
+    """
+    Decorador para métodos de vistas DRF (post/create). Debe ir por fuera de
+    @transaction.atomic: la clave se registra en su propia transacción antes de ejecutar la vista.
+    Las respuestas 5xx y las excepciones liberan la clave para que el cliente pueda reintentar.
+
+    Por defecto la vista completa corre en una transacción junto con el guardado de la respuesta.
+    Con transaccion=False la vista corre fuera de ella, para no mantener una transacción abierta
+    durante llamadas lentas a servicios externos (ej. Transbank): la vista abre su propio
+    atomic para sus escrituras y guarda ahí la respuesta con guardar_respuesta_idempotente().
+    Las respuestas que no pasan por ahí (ej. validaciones) se guardan al terminar la vista.
+    """
+    if metodo is None:
+        return functools.partial(idempotente, transaccion=transaccion)
+
+    @functools.wraps(metodo)
+    def envoltura(vista, request, *args, **kwargs):
+        clave = request.headers.get(CABECERA_IDEMPOTENCIA)
+        # Las vistas idempotentes llamadas desde otra (ej. iniciar el pago al crear el pedido)
+        # quedan cubiertas por la clave de la solicitud original
+        if not clave or not request.user.is_authenticated or getattr(request, '_solicitud_idempotente', None):
+            return metodo(vista, request, *args, **kwargs)
+        if len(clave) > LARGO_MAXIMO_CLAVE:
+            return Response(
+                {"error": f"La cabecera {CABECERA_IDEMPOTENCIA} no puede superar {LARGO_MAXIMO_CLAVE} caracteres."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        solicitud, respuesta = reclamar_clave_idempotencia(
+            request.user, f"{request.method} {request.path}", clave, _hash(request.data)
+        )
+        if respuesta is not None:
+            return respuesta
+
+        request._solicitud_idempotente = solicitud
+        try:
+            if transaccion:
+                with transaction.atomic():
+                    respuesta = metodo(vista, request, *args, **kwargs)
+                    # Se guarda junto con el trabajo de la vista: o quedan ambos o ninguno
+                    _completar_solicitud(solicitud, respuesta)
+            else:
+                request._solicitud_idempotente_pendiente = solicitud
+                respuesta = metodo(vista, request, *args, **kwargs)
+                if solicitud.estado != SolicitudIdempotente.EstadoSolicitud.COMPLETADA:
+                    _completar_solicitud(solicitud, respuesta)
+        except Exception:
+            solicitud.delete()
+            raise
+        if respuesta.status_code >= 500 or solicitud.estado != SolicitudIdempotente.EstadoSolicitud.COMPLETADA:
+            solicitud.delete()
+        return respuesta
+    return envoltura
+
+
+def purgar_claves_idempotencia():
+    """Elimina las claves vencidas. Retorna la cantidad eliminada."""
+    eliminadas, _ = SolicitudIdempotente.objects.filter(fecha_expiracion__lte=timezone.now()).delete()
+    return eliminadas
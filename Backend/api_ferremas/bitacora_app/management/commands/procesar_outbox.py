@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from bitacora_app.outbox import procesar_lote, purgar_eventos_completados
+
+
+class Command(BaseCommand):
+    help = 'Procesa los eventos pendientes del outbox (efectos secundarios diferidos de pedidos y pagos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Quedar escuchando nuevos eventos.')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos de espera entre revisiones en modo --loop.')
+        parser.add_argument('--lote', type=int, default=100, help='Eventos que se reservan por vuelta.')
+        parser.add_argument(
+            '--purgar-dias', type=int,
+            help='Al terminar cada vuelta sin eventos, eliminar los completados hace más de N días.'
+        )
+
+    def handle(self, *args, **options):
+        totales = {'procesados': 0, 'reintentos': 0, 'fallidos': 0}
+        while True:
+            resultado = procesar_lote(options['lote'])
+            for clave, valor in resultado.items():
+                totales[clave] += valor
+            if any(resultado.values()):
+                continue  # Puede haber más eventos disponibles
+            if options['purgar_dias'] is not None:
+                purgar_eventos_completados(options['purgar_dias'])
+            if not options['loop']:
+                break
+            time.sleep(options['intervalo'])
+
+        if totales['fallidos']:
+            self.stdout.write(self.style.WARNING(
+                f"{totales['fallidos']} eventos agotaron sus reintentos (estado FALLIDO, se pueden reintentar desde el admin)."
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f"{totales['procesados']} eventos procesados, {totales['reintentos']} reprogramados para reintento."
+        ))
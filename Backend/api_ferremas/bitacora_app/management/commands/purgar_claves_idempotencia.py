@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from bitacora_app.idempotencia import purgar_claves_idempotencia
+
+
+class Command(BaseCommand):
+    help = 'Elimina las claves de idempotencia (Idempotency-Key) vencidas y sus respuestas guardadas'
+
+    def handle(self, *args, **options):
+        eliminadas = purgar_claves_idempotencia()
+        self.stdout.write(self.style.SUCCESS(f'{eliminadas} claves de idempotencia purgadas.'))
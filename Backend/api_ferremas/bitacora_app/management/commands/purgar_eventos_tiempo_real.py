@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from bitacora_app.eventos import purgar_eventos_tiempo_real
+
+
+class Command(BaseCommand):
+    help = 'Elimina los eventos del stream en tiempo real más antiguos que el período de retención'
+
+    def handle(self, *args, **options):
+        eliminados = purgar_eventos_tiempo_real()
+        self.stdout.write(self.style.SUCCESS(f'{eliminados} eventos en tiempo real purgados.'))
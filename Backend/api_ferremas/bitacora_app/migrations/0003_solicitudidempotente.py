@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:42
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bitacora_app', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolicitudIdempotente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=255, verbose_name='Clave de Idempotencia')),
+                ('endpoint', models.CharField(help_text='Método y ruta de la solicitud.', max_length=255, verbose_name='Endpoint')),
+                ('hash_solicitud', models.CharField(max_length=64, verbose_name='Hash del Cuerpo de la Solicitud')),
+                ('estado', models.CharField(choices=[('EN_PROCESO', 'En Proceso'), ('COMPLETADA', 'Completada')], default='EN_PROCESO', max_length=20, verbose_name='Estado')),
+                ('codigo_respuesta', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Código HTTP de la Respuesta')),
+                ('respuesta', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='Respuesta Guardada')),
+                ('hash_respuesta', models.CharField(blank=True, max_length=64, verbose_name='Hash de la Respuesta Guardada')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_expiracion', models.DateTimeField(db_index=True, verbose_name='Fecha de Expiración')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='solicitudes_idempotentes', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Solicitud Idempotente',
+                'verbose_name_plural': 'Solicitudes Idempotentes',
+                'ordering': ['-fecha_creacion'],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'endpoint', 'clave'), name='solicitud_idempotente_unica')],
+            },
+        ),
+    ]
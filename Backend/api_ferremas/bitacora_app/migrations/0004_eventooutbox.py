@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:45
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bitacora_app', '0003_solicitudidempotente'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='registroactividad',
+            name='fecha_hora',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha y Hora'),
+        ),
+        migrations.CreateModel(
+            name='EventoOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=100, verbose_name='Tipo de Evento')),
+                ('payload', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Datos del Evento')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('COMPLETADO', 'Completado'), ('FALLIDO', 'Fallido')], default='PENDIENTE', max_length=20, verbose_name='Estado')),
+                ('intentos', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('disponible_desde', models.DateTimeField(default=django.utils.timezone.now, help_text='Próximo intento si está pendiente; vencimiento de la reserva si está en proceso.', verbose_name='Disponible Desde')),
+                ('reservado_por', models.CharField(blank=True, max_length=36, verbose_name='Reservado Por')),
+                ('ultimo_error', models.TextField(blank=True, verbose_name='Último Error')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_procesado', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Procesamiento')),
+            ],
+            options={
+                'verbose_name': 'Evento Outbox',
+                'verbose_name_plural': 'Eventos Outbox',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['estado', 'disponible_desde'], name='outbox_estado_disponible_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:28
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bitacora_app', '0004_eventooutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoTiempoReal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('canal', models.CharField(max_length=20, verbose_name='Canal')),
+                ('datos', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Datos del Evento')),
+                ('sucursales', models.JSONField(default=list, verbose_name='Sucursales Afectadas')),
+                ('fecha_creacion', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Fecha de Creación')),
+            ],
+            options={
+                'verbose_name': 'Evento en Tiempo Real',
+                'verbose_name_plural': 'Eventos en Tiempo Real',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 
 # Create your models here.
 
@@ -12,7 +14,8 @@ class RegistroActividad(models.Model):
         null=True, blank=True, # Puede haber acciones del sistema no ligadas a un usuario específico
         verbose_name="Usuario"
     )
-    fecha_hora = models.DateTimeField(auto_now_add=True, verbose_name="Fecha y Hora")
+    # Los registros diferidos (outbox) conservan el instante del evento, no el de su procesamiento
+    fecha_hora = models.DateTimeField(default=timezone.now, verbose_name="Fecha y Hora")
     
     # Tipo de acción realizada (ej: CREAR, ACTUALIZAR, ELIMINAR, LOGIN, LOGOUT, VER_REPORTE)
     # Podrías usar TextChoices si tienes un conjunto fijo de acciones
@@ -42,3 +45,99 @@ class RegistroActividad(models.Model):
     def __str__(self):
         usuario_str = str(self.usuario) if self.usuario else "Sistema"
         return f"{self.fecha_hora.strftime('%Y-%m-%d %H:%M:%S')} - {usuario_str} - {self.accion}"
+
+
+class SolicitudIdempotente(models.Model):
+    """
+    Respuesta guardada de una solicitud enviada con la cabecera Idempotency-Key.
+    Un reintento con la misma clave (mismo usuario y endpoint) recibe la respuesta
+    guardada sin volver a ejecutar la operación. Las filas vencen según 'fecha_expiracion'.
+    """
+    class EstadoSolicitud(models.TextChoices):
+        EN_PROCESO = 'EN_PROCESO', 'En Proceso'
+        COMPLETADA = 'COMPLETADA', 'Completada'
+
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="solicitudes_idempotentes",
+        verbose_name="Usuario"
+    )
+    clave = models.CharField(max_length=255, verbose_name="Clave de Idempotencia")
+    endpoint = models.CharField(max_length=255, verbose_name="Endpoint", help_text="Método y ruta de la solicitud.")
+    hash_solicitud = models.CharField(max_length=64, verbose_name="Hash del Cuerpo de la Solicitud")
+    estado = models.CharField(max_length=20, choices=EstadoSolicitud.choices, default=EstadoSolicitud.EN_PROCESO, verbose_name="Estado")
+    codigo_respuesta = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Código HTTP de la Respuesta")
+    respuesta = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder, verbose_name="Respuesta Guardada")
+    hash_respuesta = models.CharField(max_length=64, blank=True, verbose_name="Hash de la Respuesta Guardada")
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
+    fecha_expiracion = models.DateTimeField(db_index=True, verbose_name="Fecha de Expiración")
+
+    class Meta:
+        verbose_name = "Solicitud Idempotente"
+        verbose_name_plural = "Solicitudes Idempotentes"
+        ordering = ['-fecha_creacion']
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'endpoint', 'clave'], name='solicitud_idempotente_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} [{self.clave}] ({self.get_estado_display()})"
+
+
+class EventoOutbox(models.Model):
+    """
+    Efecto secundario pendiente (bitácora, cancelación de traspasos, etc.), escrito en la
+    misma transacción que el cambio que lo origina. El comando `procesar_outbox` lo ejecuta
+    fuera de la solicitud HTTP, con reintentos: la entrega es al menos una vez.
+    """
+    class EstadoEvento(models.TextChoices):
+        PENDIENTE = 'PENDIENTE', 'Pendiente'
+        PROCESANDO = 'PROCESANDO', 'Procesando'
+        COMPLETADO = 'COMPLETADO', 'Completado'
+        FALLIDO = 'FALLIDO', 'Fallido'  # Agotó los reintentos; se puede reintentar desde el admin
+
+    tipo = models.CharField(max_length=100, verbose_name="Tipo de Evento")
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder, verbose_name="Datos del Evento")
+    estado = models.CharField(max_length=20, choices=EstadoEvento.choices, default=EstadoEvento.PENDIENTE, verbose_name="Estado")
+    intentos = models.PositiveSmallIntegerField(default=0, verbose_name="Intentos")
+    disponible_desde = models.DateTimeField(
+        default=timezone.now, verbose_name="Disponible Desde",
+        help_text="Próximo intento si está pendiente; vencimiento de la reserva si está en proceso."
+    )
+    reservado_por = models.CharField(max_length=36, blank=True, verbose_name="Reservado Por")
+    ultimo_error = models.TextField(blank=True, verbose_name="Último Error")
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
+    fecha_procesado = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de Procesamiento")
+
+    class Meta:
+        verbose_name = "Evento Outbox"
+        verbose_name_plural = "Eventos Outbox"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['estado', 'disponible_desde'], name='outbox_estado_disponible_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.tipo} ({self.get_estado_display()})"
+
+
+class EventoTiempoReal(models.Model):
+    """
+    Evento del stream en tiempo real (stock, pedidos, traspasos). Se guarda al confirmarse la
+    transacción que lo origina, desde cualquier proceso (servidor web, outbox, comandos), y
+    cada proceso web lo reparte a sus clientes conectados. El ID es el que recibe el cliente
+    en Last-Event-ID para retomar la conexión, incluso contra otro proceso.
+    """
+    canal = models.CharField(max_length=20, verbose_name="Canal")
+    datos = models.JSONField(default=dict, encoder=DjangoJSONEncoder, verbose_name="Datos del Evento")
+    sucursales = models.JSONField(default=list, verbose_name="Sucursales Afectadas")
+    fecha_creacion = models.DateTimeField(default=timezone.now, db_index=True, verbose_name="Fecha de Creación")
+
+    class Meta:
+        verbose_name = "Evento en Tiempo Real"
+        verbose_name_plural = "Eventos en Tiempo Real"
+        ordering = ['id']
+
+    def __str__(self):
+        return f"#{self.id} {self.canal}"
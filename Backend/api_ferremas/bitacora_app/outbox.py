@@ -0,0 +1,136 @@
+"""
+Outbox transaccional para los efectos secundarios que no deben ejecutarse dentro de la
+solicitud HTTP (registro en bitácora, cancelación de traspasos, etc.).
+
+Las rutas de escritura llaman a `registrar_evento(tipo, payload)` dentro de su transacción:
+el evento queda guardado solo si el cambio se confirma. El comando `procesar_outbox`
+reserva lotes de eventos y ejecuta el manejador registrado para cada tipo con
+`@manejador_outbox(tipo)`. Un evento cuyo manejador falla se reintenta con espera
+exponencial; uno reservado por un procesador que murió vuelve a estar disponible al
+vencer la reserva. La entrega es al menos una vez, por lo que los manejadores deben
+tolerar repetirse (el manejador y la marca de completado comparten transacción, así que
+solo se repiten los efectos externos a la base de datos).
+"""
+import uuid
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import EventoOutbox
+
+MAX_INTENTOS = 8
+ESPERA_BASE_REINTENTO = timedelta(seconds=30)  # Se duplica en cada intento fallido
+ESPERA_MAXIMA_REINTENTO = timedelta(hours=1)
+DURACION_RESERVA = timedelta(minutes=5)  # Una reserva más antigua se considera abandonada
+LARGO_MAXIMO_ERROR = 2000
+
+# tipo -> función que recibe el EventoOutbox
+MANEJADORES = {}
+
+
+def manejador_outbox(tipo):
+    """Registra la función que procesa los eventos de 'tipo'."""
+    def decorador(funcion):
+        MANEJADORES[tipo] = funcion
+        return funcion
+    return decorador
+
+
+def registrar_evento(tipo, payload=None):
+    """
+    Guarda el evento en la transacción en curso (si se revierte, el evento no existe).
+    'payload' debe ser serializable a JSON; conviene enviar IDs y no instancias.
+    """
+    return EventoOutbox.objects.create(tipo=tipo, payload=payload or {})
+
+
+def registrar_eventos(tipo, payloads):
+    """Como registrar_evento, para varios eventos del mismo tipo con un solo INSERT."""
+    return EventoOutbox.objects.bulk_create([EventoOutbox(tipo=tipo, payload=payload) for payload in payloads])
+
+
+def _espera_reintento(intentos):
+    return min(ESPERA_BASE_REINTENTO * 2 ** (intentos - 1), ESPERA_MAXIMA_REINTENTO)
+
+
+def reservar_eventos(limite=100):
+    """
+    Reserva hasta 'limite' eventos disponibles (pendientes cuyo próximo intento venció, o en
+    proceso con la reserva vencida) y los retorna. La reserva es un UPDATE condicional con
+    un identificador propio: dos procesadores concurrentes nunca obtienen el mismo evento.
+    """
+    ahora = timezone.now()
+    disponibles = Q(
+        estado__in=[EventoOutbox.EstadoEvento.PENDIENTE, EventoOutbox.EstadoEvento.PROCESANDO],
+        disponible_desde__lte=ahora,
+    )
+    ids = list(EventoOutbox.objects.filter(disponibles).order_by('id').values_list('id', flat=True)[:limite])
+    if not ids:
+        return []
+    reserva = uuid.uuid4().hex
+    EventoOutbox.objects.filter(disponibles, id__in=ids).update(
+        estado=EventoOutbox.EstadoEvento.PROCESANDO,
+        reservado_por=reserva,
+        disponible_desde=ahora + DURACION_RESERVA,
+        intentos=F('intentos') + 1,
+    )
+    return list(EventoOutbox.objects.filter(reservado_por=reserva, estado=EventoOutbox.EstadoEvento.PROCESANDO).order_by('id'))
+
+
+def _ejecutar(evento):
+    """Ejecuta el manejador del evento y lo marca como completado en la misma transacción."""
+    manejador = MANEJADORES.get(evento.tipo)
+    if manejador is None:
+        raise LookupError(f"No hay manejador registrado para el tipo de evento '{evento.tipo}'.")
+    with transaction.atomic():
+        manejador(evento)
+        # Condicionado a la reserva: si venció y otro procesador tomó el evento, el estado lo registra ese otro
+        EventoOutbox.objects.filter(pk=evento.pk, reservado_por=evento.reservado_por).update(
+            estado=EventoOutbox.EstadoEvento.COMPLETADO,
+            fecha_procesado=timezone.now(),
+            ultimo_error='',
+        )
+
+
+def _registrar_fallo(evento, error):
+    agotado = evento.intentos >= MAX_INTENTOS
+    EventoOutbox.objects.filter(pk=evento.pk, reservado_por=evento.reservado_por).update(
+        estado=EventoOutbox.EstadoEvento.FALLIDO if agotado else EventoOutbox.EstadoEvento.PENDIENTE,
+        disponible_desde=timezone.now() + _espera_reintento(evento.intentos),
+        ultimo_error=f"{type(error).__name__}: {error}"[:LARGO_MAXIMO_ERROR],
+    )
+    return agotado
+
+
+def procesar_lote(limite=100):
+    """
+    Reserva y procesa un lote de eventos. Cada evento se ejecuta en su propia transacción:
+    un fallo no afecta al resto del lote. Retorna un dict con los contadores del lote.
+    """
+    resultado = {'procesados': 0, 'reintentos': 0, 'fallidos': 0}
+    for evento in reservar_eventos(limite):
+        try:
+            _ejecutar(evento)
+        except Exception as error:
+            resultado['fallidos' if _registrar_fallo(evento, error) else 'reintentos'] += 1
+        else:
+            resultado['procesados'] += 1
+    return resultado
+
+
+def reintentar_eventos_fallidos(queryset):
+    """Devuelve a la cola los eventos FALLIDO del queryset. Retorna la cantidad reactivada."""
+    return queryset.filter(estado=EventoOutbox.EstadoEvento.FALLIDO).update(
+        estado=EventoOutbox.EstadoEvento.PENDIENTE, intentos=0, disponible_desde=timezone.now(), reservado_por='',
+    )
+
+
+def purgar_eventos_completados(dias=7):
+    """Elimina los eventos completados hace más de 'dias' días. Retorna la cantidad eliminada."""
+    eliminados, _ = EventoOutbox.objects.filter(
+        estado=EventoOutbox.EstadoEvento.COMPLETADO,
+        fecha_procesado__lt=timezone.now() - timedelta(days=dias),
+    ).delete()
+    return eliminados
@@ -0,0 +1,158 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from bitacora_app import eventos
+from bitacora_app.eventos import (
+    CANAL_PEDIDOS, CANAL_STOCK, BusEventos, publicar_al_confirmar, purgar_eventos_tiempo_real,
+)
+from bitacora_app.models import EventoTiempoReal
+from sucursal_app.models import Sucursal
+from ubicacion_app.models import Region, Comuna
+from usuario_app.models import Personal
+
+
+class EventosTiempoRealTestCase(TestCase):
+    """Pruebas del bus de eventos en tiempo real y del stream SSE"""
+
+    url = '/api/bitacora/eventos/stream/'
+
+    def setUp(self):
+        region = Region.objects.create(nombre='Región Metropolitana')
+        comuna = Comuna.objects.create(nombre='Santiago', region=region)
+        self.sucursal = Sucursal.objects.create(nombre='Sucursal Centro', region=region, comuna=comuna, direccion='Alameda 100')
+        self.otra_sucursal = Sucursal.objects.create(nombre='Sucursal Norte', region=region, comuna=comuna, direccion='Norte 200')
+        # Un bus propio por prueba y sin hilo lector: las lecturas se hacen a mano con leer_nuevos()
+        self.bus = BusEventos()
+        lector = mock.patch.object(BusEventos, '_iniciar_lector')
+        lector.start()
+        self.addCleanup(lector.stop)
+
+    def guardar(self, canal=CANAL_STOCK, sucursales=None, **datos):
+        sucursales = [self.sucursal.id] if sucursales is None else sucursales
+        return EventoTiempoReal.objects.create(canal=canal, datos=datos, sucursales=sucursales)
+
+    def crear_personal(self, nombre, rol, sucursal=None):
+        usuario = get_user_model().objects.create_user(username=nombre, email=f'{nombre}@ferremas.cl', password='x')
+        Personal.objects.create(usuario=usuario, rol=rol, sucursal=sucursal)
+        return usuario
+
+    def abrir_stream(self, usuario, partes, **parametros):
+        """Abre el stream y retorna sus primeras 'partes' (sin esperar eventos nuevos)."""
+        client = APIClient()
+        client.force_authenticate(usuario)
+        previas = set(self.bus._suscripciones)
+        with mock.patch('bitacora_app.api.views.bus_eventos', self.bus):
+            respuesta = client.get(self.url, parametros.pop('query', {}), **parametros)
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+            contenido = iter(respuesta.streaming_content)
+            leidas = [self._texto(next(contenido)) for _ in range(partes)]
+            respuesta.close()
+        self.assertEqual(self.bus._suscripciones, previas)  # Al cerrar se cancela la suscripción del stream
+        return leidas
+
+    @staticmethod
+    def _texto(parte):
+        return parte.decode() if isinstance(parte, bytes) else parte
+
+    def test_solo_se_publica_al_confirmar_y_nunca_tras_un_rollback(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            publicar_al_confirmar(CANAL_STOCK, {'cantidad': 5}, [self.sucursal.id, None])
+            self.assertFalse(EventoTiempoReal.objects.exists())  # Todavía sin confirmar
+        evento = EventoTiempoReal.objects.get()
+        self.assertEqual((evento.canal, evento.datos, evento.sucursales), (CANAL_STOCK, {'cantidad': 5}, [self.sucursal.id]))
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    publicar_al_confirmar(CANAL_STOCK, {'cantidad': 6}, [self.sucursal.id])
+                    raise RuntimeError('rollback')
+        self.assertEqual(callbacks, [])
+        self.assertEqual(EventoTiempoReal.objects.count(), 1)
+
+    def test_el_lector_reparte_los_eventos_nuevos_a_las_suscripciones(self):
+        self.guardar(cantidad=1)
+        suscripcion, perdidos, completo = self.bus.suscribir([CANAL_STOCK])
+        self.assertEqual((perdidos, completo), ([], True))
+        self.assertEqual(self.bus.leer_nuevos(), 0)  # La primera lectura solo fija el punto de partida
+
+        nuevo = self.guardar(cantidad=2)
+        self.guardar(canal=CANAL_PEDIDOS, estado='PAGADO')
+        self.assertEqual(self.bus.leer_nuevos(), 2)
+        self.assertEqual([e.id for e in suscripcion.esperar(0)], [nuevo.id])  # Solo su canal
+
+    def test_reanudar_desde_un_id_entrega_los_eventos_perdidos(self):
+        vistos = [self.guardar(cantidad=i) for i in range(2)]
+        perdidos_esperados = [self.guardar(cantidad=i) for i in range(2, 5)]
+        self.bus.leer_nuevos()
+
+        suscripcion, perdidos, completo = self.bus.suscribir([CANAL_STOCK], ultimo_id=str(vistos[-1].id))
+        self.assertTrue(completo)
+        self.assertEqual([e.id for e in perdidos], [e.id for e in perdidos_esperados])
+        self.assertEqual(perdidos[0].datos, {'cantidad': 2})
+
+        # El lector no vuelve a entregar lo reenviado ni lo que el cliente ya tenía
+        self.bus._ultimo_leido = vistos[0].id  # El lector va atrasado respecto de la reanudación
+        self.bus.leer_nuevos()
+        self.assertEqual(suscripcion.esperar(0), [])
+
+    def test_id_purgado_o_invalido_pide_reinicio(self):
+        eventos_guardados = [self.guardar(cantidad=i) for i in range(3)]
+        EventoTiempoReal.objects.filter(pk=eventos_guardados[0].pk).update(fecha_creacion=timezone.now() - timedelta(days=2))
+        self.assertEqual(purgar_eventos_tiempo_real(), 1)
+
+        _, perdidos, completo = self.bus.suscribir([CANAL_STOCK], ultimo_id='no-es-un-id')
+        self.assertEqual((perdidos, completo), ([], False))
+        # El evento siguiente al último recibido ya no existe
+        _, perdidos, completo = self.bus.suscribir([CANAL_STOCK], ultimo_id=str(eventos_guardados[0].id - 1))
+        self.assertFalse(completo)
+        self.assertEqual([e.id for e in perdidos], [e.id for e in eventos_guardados[1:]])
+        # Con más eventos pendientes de los que se reenvían tampoco se puede retomar
+        with mock.patch.object(eventos, 'TAMANO_HISTORIAL', 1):
+            _, perdidos, completo = self.bus.suscribir([CANAL_STOCK], ultimo_id=str(eventos_guardados[0].id))
+        self.assertFalse(completo)
+        self.assertEqual(len(perdidos), 1)
+
+        partes = self.abrir_stream(
+            self.crear_personal('admin', Personal.Roles.ADMINISTRADOR), 2, HTTP_LAST_EVENT_ID='no-es-un-id'
+        )
+        self.assertEqual(partes[1], "event: reinicio\ndata: {}\n\n")
+
+    def test_el_personal_con_sucursal_solo_recibe_la_suya(self):
+        primero = self.guardar(cantidad=1)
+        otro = self.guardar(cantidad=2, sucursales=[self.otra_sucursal.id])
+        ambos = self.guardar(cantidad=3, sucursales=[self.sucursal.id, self.otra_sucursal.id])
+        desde = str(primero.id - 1)
+
+        bodeguero = self.crear_personal('bodeguero', Personal.Roles.BODEGUERO, self.sucursal)
+        # Pedir otra sucursal no cambia nada: el personal no administrador queda en la suya
+        partes = self.abrir_stream(bodeguero, 3, HTTP_LAST_EVENT_ID=desde, query={'sucursal': self.otra_sucursal.id})
+        self.assertEqual(partes[0], "retry: 3000\n\n")
+        self.assertTrue(partes[1].startswith(f"id: {primero.id}\nevent: stock\n"))
+        self.assertTrue(partes[2].startswith(f"id: {ambos.id}\n"))
+
+        administrador = self.crear_personal('admin', Personal.Roles.ADMINISTRADOR, self.sucursal)
+        partes = self.abrir_stream(administrador, 3, query={'ultimo_evento': desde, 'sucursal': self.otra_sucursal.id})
+        self.assertTrue(partes[1].startswith(f"id: {otro.id}\n"))
+        self.assertTrue(partes[2].startswith(f"id: {ambos.id}\n"))
+
+        # Lo que llega después también se filtra por sucursal
+        suscripcion, _, _ = self.bus.suscribir(sucursal_id=self.sucursal.id)
+        self.bus.leer_nuevos()
+        self.guardar(cantidad=4, sucursales=[self.otra_sucursal.id])
+        propio = self.guardar(cantidad=5)
+        self.bus.leer_nuevos()
+        self.assertEqual([e.id for e in suscripcion.esperar(0)], [propio.id])
+
+    def test_canal_no_valido_responde_error(self):
+        client = APIClient()
+        client.force_authenticate(self.crear_personal('admin', Personal.Roles.ADMINISTRADOR))
+        respuesta = client.get(self.url, {'canales': 'stock,otro'}, HTTP_ACCEPT='application/json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('canales', respuesta.json())
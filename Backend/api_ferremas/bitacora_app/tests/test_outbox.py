@@ -0,0 +1,106 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from bitacora_app import outbox
+from bitacora_app.models import EventoOutbox
+from bitacora_app.outbox import (
+    MAX_INTENTOS, procesar_lote, registrar_evento, reintentar_eventos_fallidos, reservar_eventos,
+)
+
+EVENTO_PRUEBA = 'prueba.evento'
+
+
+class OutboxTestCase(TestCase):
+    """Pruebas del outbox transaccional y su procesador"""
+
+    def setUp(self):
+        self.ejecutados = []
+        manejadores = mock.patch.dict(outbox.MANEJADORES, {EVENTO_PRUEBA: self.ejecutados.append})
+        manejadores.start()
+        self.addCleanup(manejadores.stop)
+
+    def test_el_evento_solo_existe_si_la_transaccion_se_confirma(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                registrar_evento(EVENTO_PRUEBA, {'a': 1})
+                raise RuntimeError('rollback')
+        self.assertFalse(EventoOutbox.objects.exists())
+
+    def test_procesar_lote_ejecuta_el_manejador_y_marca_completado(self):
+        evento = registrar_evento(EVENTO_PRUEBA, {'a': 1})
+
+        self.assertEqual(procesar_lote(), {'procesados': 1, 'reintentos': 0, 'fallidos': 0})
+
+        evento.refresh_from_db()
+        self.assertEqual(evento.estado, EventoOutbox.EstadoEvento.COMPLETADO)
+        self.assertEqual([e.payload for e in self.ejecutados], [{'a': 1}])
+        self.assertEqual(procesar_lote(), {'procesados': 0, 'reintentos': 0, 'fallidos': 0})
+
+    def test_reservas_concurrentes_no_comparten_eventos(self):
+        for _ in range(5):
+            registrar_evento(EVENTO_PRUEBA)
+
+        primera = reservar_eventos(3)
+        segunda = reservar_eventos(10)
+
+        self.assertEqual((len(primera), len(segunda)), (3, 2))
+        self.assertFalse({e.id for e in primera} & {e.id for e in segunda})
+        self.assertEqual(reservar_eventos(), [])
+
+    def test_reserva_abandonada_vuelve_a_estar_disponible_al_vencer(self):
+        registrar_evento(EVENTO_PRUEBA)
+        reservado, = reservar_eventos()
+        EventoOutbox.objects.filter(pk=reservado.pk).update(disponible_desde=timezone.now() - timedelta(seconds=1))
+
+        retomado, = reservar_eventos()
+        self.assertEqual(retomado.intentos, 2)
+
+        # El procesador original ya no puede marcarlo: su reserva dejó de ser la vigente
+        outbox._ejecutar(reservado)
+        retomado.refresh_from_db()
+        self.assertEqual(retomado.estado, EventoOutbox.EstadoEvento.PROCESANDO)
+
+    def test_fallos_se_reintentan_con_espera_y_terminan_en_fallido(self):
+        evento = registrar_evento('sin.manejador')
+
+        self.assertEqual(procesar_lote()['reintentos'], 1)
+        evento.refresh_from_db()
+        self.assertEqual(evento.estado, EventoOutbox.EstadoEvento.PENDIENTE)
+        self.assertGreater(evento.disponible_desde, timezone.now() + timedelta(seconds=20))
+        self.assertIn('LookupError', evento.ultimo_error)
+
+        for _ in range(MAX_INTENTOS - 1):
+            EventoOutbox.objects.filter(pk=evento.pk).update(disponible_desde=timezone.now())
+            procesar_lote()
+        evento.refresh_from_db()
+        self.assertEqual((evento.estado, evento.intentos), (EventoOutbox.EstadoEvento.FALLIDO, MAX_INTENTOS))
+
+        self.assertEqual(reintentar_eventos_fallidos(EventoOutbox.objects.all()), 1)
+        evento.refresh_from_db()
+        self.assertEqual((evento.estado, evento.intentos), (EventoOutbox.EstadoEvento.PENDIENTE, 0))
+
+    def test_fallo_del_manejador_no_deja_efectos_parciales(self):
+        def manejador_que_falla(evento):
+            registrar_evento(EVENTO_PRUEBA, {'efecto': True})
+            raise ValueError('falla')
+
+        registrar_evento('prueba.falla')
+        with mock.patch.dict(outbox.MANEJADORES, {'prueba.falla': manejador_que_falla}):
+            procesar_lote()
+        self.assertFalse(EventoOutbox.objects.filter(payload={'efecto': True}).exists())
+
+    def test_comando_procesar_outbox_vacia_la_cola(self):
+        for _ in range(5):
+            registrar_evento(EVENTO_PRUEBA)
+        salida = StringIO()
+
+        call_command('procesar_outbox', '--lote', '2', stdout=salida)
+
+        self.assertEqual(len(self.ejecutados), 5)
+        self.assertIn('5 eventos procesados', salida.getvalue())
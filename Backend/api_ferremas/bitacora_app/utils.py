@@ -1,5 +1,6 @@
 from django.contrib.contenttypes.models import ContentType
 from .models import RegistroActividad
+from .outbox import manejador_outbox, registrar_evento
 
 def get_client_ip(request):
     """Obtiene la IP del cliente desde el request."""
@@ -31,4 +32,32 @@ def crear_registro_actividad(usuario, accion, descripcion="", objeto_relacionado
         content_type=content_type,
         object_id=object_id,
         ip_address=ip_address
-    )
\ No newline at end of file
+    )
+
+EVENTO_REGISTRAR_ACTIVIDAD = 'bitacora.registrar_actividad'
+
+
+def registrar_actividad_diferida(usuario, accion, descripcion="", objeto_relacionado=None, request=None):
+    """
+    Igual que crear_registro_actividad, pero el registro lo escribe el procesador del outbox
+    fuera de la solicitud. Se guarda con la transacción en curso y conserva su fecha y hora.
+    """
+    content_type_id = None
+    object_id = None
+    if objeto_relacionado:
+        content_type_id = ContentType.objects.get_for_model(objeto_relacionado.__class__).id  # En caché
+        object_id = objeto_relacionado.pk
+
+    registrar_evento(EVENTO_REGISTRAR_ACTIVIDAD, {
+        'usuario_id': usuario.pk if usuario and usuario.is_authenticated else None,
+        'accion': accion,
+        'descripcion': descripcion,
+        'content_type_id': content_type_id,
+        'object_id': object_id,
+        'ip_address': get_client_ip(request),
+    })
+
+
+@manejador_outbox(EVENTO_REGISTRAR_ACTIVIDAD)
+def _escribir_registro_actividad(evento):
+    RegistroActividad.objects.create(fecha_hora=evento.fecha_creacion, **evento.payload)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import InventarioSucursal, DetalleInventarioBodega, TraspasoInternoStock, DetalleTraspasoStock
+from .models import InventarioSucursal, DetalleInventarioBodega, TraspasoInternoStock, DetalleTraspasoStock, ImportacionStock, AlertaStock, ConteoCiclico, MovimientoStock, SnapshotInventario, CapaCosto, ValorizacionStock
 
 # Register your models here.
 
@@ -38,3 +38,62 @@ class TraspasoInternoStockAdmin(admin.ModelAdmin):
     autocomplete_fields = ['sucursal_origen', 'sucursal_destino', 'creado_por', 'pedido_cliente_origen']
     inlines = [DetalleTraspasoStockInline]
     date_hierarchy = 'fecha_pedido'
+
+
+@admin.register(ImportacionStock)
+class ImportacionStockAdmin(admin.ModelAdmin):
+    list_display = ('id', 'nombre_archivo_original', 'estado', 'total_filas', 'filas_procesadas', 'filas_fallidas', 'lotes_completados', 'fecha_creacion')
+    list_filter = ('estado',)
+    search_fields = ('nombre_archivo_original',)
+    readonly_fields = ('fecha_creacion', 'fecha_inicio', 'fecha_fin', 'fecha_actualizacion')
+
+
+
+@admin.register(AlertaStock)
+class AlertaStockAdmin(admin.ModelAdmin):
+    list_display = ('id', 'producto', 'bodega', 'tipo', 'estado', 'cantidad', 'umbral', 'fecha_creacion', 'fecha_resolucion')
+    list_filter = ('estado', 'tipo', 'bodega__sucursal')
+    search_fields = ('producto__nombre', 'producto__sku')
+    readonly_fields = ('fecha_creacion', 'fecha_resolucion', 'fecha_revision')
+
+
+@admin.register(ConteoCiclico)
+class ConteoCiclicoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'bodega', 'realizado_por', 'total_lineas', 'lineas_con_diferencia', 'unidades_sobrantes', 'unidades_faltantes', 'valor_diferencia', 'fecha_creacion')
+    list_filter = ('bodega__sucursal', 'conteo_completo')
+    readonly_fields = ('fecha_creacion',)
+
+
+@admin.register(MovimientoStock)
+class MovimientoStockAdmin(admin.ModelAdmin):
+    list_display = ('id', 'producto', 'bodega', 'tipo', 'cantidad', 'cantidad_anterior', 'cantidad_resultante', 'usuario', 'fecha')
+    list_filter = ('tipo', 'bodega__sucursal')
+    search_fields = ('producto__nombre', 'producto__sku', 'motivo')
+    readonly_fields = ('fecha',)
+
+
+@admin.register(SnapshotInventario)
+class SnapshotInventarioAdmin(admin.ModelAdmin):
+    list_display = ('id', 'descripcion', 'estado', 'fecha_corte', 'total_filas', 'total_unidades', 'valor_total', 'fecha_creacion')
+    list_filter = ('estado',)
+    search_fields = ('descripcion',)
+    readonly_fields = (
+        'fecha_corte', 'archivo', 'tamano_bytes', 'checksum_sha256', 'total_filas', 'total_unidades',
+        'valor_total', 'totales_por_sucursal', 'fecha_creacion', 'fecha_inicio', 'fecha_fin',
+    )
+
+
+@admin.register(ValorizacionStock)
+class ValorizacionStockAdmin(admin.ModelAdmin):
+    list_display = ('id', 'producto', 'bodega', 'cantidad', 'costo_promedio', 'valor_promedio', 'valor_fifo', 'fecha_actualizacion')
+    list_filter = ('bodega__sucursal',)
+    search_fields = ('producto__nombre', 'producto__sku')
+    readonly_fields = ('cantidad', 'costo_promedio', 'valor_promedio', 'valor_fifo', 'fecha_actualizacion')
+
+
+@admin.register(CapaCosto)
+class CapaCostoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'producto', 'bodega', 'cantidad_restante', 'costo_unitario', 'origen', 'fecha_ingreso')
+    list_filter = ('origen', 'bodega__sucursal')
+    search_fields = ('producto__nombre', 'producto__sku')
+    readonly_fields = ('fecha_ingreso',)
@@ -1,5 +1,5 @@
 import django_filters
-from ..models import InventarioSucursal, DetalleInventarioBodega, TraspasoInternoStock
+from ..models import InventarioSucursal, DetalleInventarioBodega, TraspasoInternoStock, AlertaStock
 from sucursal_app.models import Sucursal, Bodega
 from producto_app.models import Producto
 
@@ -24,5 +24,18 @@ class DetalleInventarioBodegaFilter(django_filters.FilterSet):
         model = DetalleInventarioBodega
         fields = ['sucursal', 'bodega', 'producto']
 
+class AlertaStockFilter(django_filters.FilterSet):
+    sucursal = django_filters.ModelChoiceFilter(
+        field_name='bodega__sucursal',
+        queryset=Sucursal.objects.all(),
+        label="Sucursal"
+    )
+    desde = django_filters.DateTimeFilter(field_name='fecha_creacion', lookup_expr='gte', label="Creadas desde")
+    revisada = django_filters.BooleanFilter(field_name='fecha_revision', lookup_expr='isnull', exclude=True, label="Revisada")
+
+    class Meta:
+        model = AlertaStock
+        fields = ['estado', 'tipo', 'producto', 'bodega', 'sucursal', 'desde', 'revisada']
+
 # Podrías añadir filtros para TraspasoInternoStock aquí si es necesario
 # por ejemplo, por sucursal_origen, sucursal_destino, estado, etc.
\ No newline at end of file
@@ -3,51 +3,40 @@ from ..models import (
     InventarioSucursal,
     DetalleInventarioBodega,
     TraspasoInternoStock,
-    DetalleTraspasoStock
+    DetalleTraspasoStock,
+    ImportacionStock,
+    AlertaStock,
+    ConteoCiclico,
+    MovimientoStock,
+    SnapshotInventario
 )
 from producto_app.api.serializers import ProductoSerializer # Para mostrar info del producto
 from sucursal_app.api.serializers import SucursalSerializer, BodegaSerializer # Para mostrar info
+from sucursal_app.models import Bodega
 from usuario_app.api.serializers import UsuarioSerializer # Para el 'creado_por'
 from ..models import DetalleInventarioBodega # Asegurar importación para el ListSerializer
+from ..services import agrupar_cargas_stock, sumar_stock_en_bloque
+import pandas as pd
 
 class DetalleInventarioBodegaListSerializer(serializers.ListSerializer):
     def create(self, validated_data):
-        # validated_data es una lista de diccionarios
-        # La vista cargar_stock_excel ya usa @transaction.atomic
-        # por lo que no es estrictamente necesario aquí, pero no hace daño.
-        # from django.db import transaction
-        # with transaction.atomic():
-        result_instances = []
-        for item_data in validated_data:
-            inventario_sucursal = item_data.get('inventario_sucursal')
-            producto = item_data.get('producto')
-            bodega = item_data.get('bodega')
-            cantidad_a_agregar = item_data.get('cantidad', 0)
-            stock_minimo = item_data.get('stock_minimo')
-            stock_maximo = item_data.get('stock_maximo')
-
-            # Lógica de get_or_create y actualización
-            obj, created = DetalleInventarioBodega.objects.get_or_create(
-                inventario_sucursal=inventario_sucursal,
-                producto=producto,
-                bodega=bodega,
-                defaults={
-                    'cantidad': cantidad_a_agregar,
-                    'stock_minimo': stock_minimo,
-                    'stock_maximo': stock_maximo
-                }
-            )
-            if not created:
-                obj.cantidad += cantidad_a_agregar
-                # Actualizar stock_minimo y stock_maximo si se proporcionan en el Excel
-                # y son diferentes de None (para no sobrescribir con None si no vienen)
-                if stock_minimo is not None:
-                    obj.stock_minimo = stock_minimo
-                if stock_maximo is not None:
-                    obj.stock_maximo = stock_maximo
-                obj.save()
-            result_instances.append(obj)
-        return result_instances
+        # validated_data es una lista de diccionarios.
+        # Se agrupan las filas repetidas y se escriben todas en bloque: la cantidad se suma
+        # al stock existente y stock_minimo/stock_maximo solo se sobrescriben si vienen informados.
+        if not validated_data:
+            return []
+        df = pd.DataFrame.from_records([
+            {
+                'inventario_sucursal_id': item_data['inventario_sucursal'].id,
+                'producto_id': item_data['producto'].id,
+                'bodega_id': item_data['bodega'].id,
+                'cantidad': item_data.get('cantidad', 0),
+                'stock_minimo': item_data.get('stock_minimo'),
+                'stock_maximo': item_data.get('stock_maximo'),
+            }
+            for item_data in validated_data
+        ])
+        return sumar_stock_en_bloque(agrupar_cargas_stock(df))
     # No necesitas un método update aquí a menos que planees hacer bulk updates
     # a través de este ListSerializer de una manera específica.
 
@@ -183,61 +172,212 @@ class TraspasoInternoStockSerializer(serializers.ModelSerializer):
         return traspaso
 
     def update(self, instance, validated_data):
-        print(f"DEBUG SERIALIZER UPDATE (START): instance ID: {instance.id}, validated_data: {validated_data}")
         detalles_data = validated_data.pop('detalles_traspaso', None)
-        print(f"DEBUG SERIALIZER UPDATE: detalles_data after pop: {detalles_data}")
         # El estado se actualiza a través de super().update si está en validated_data
-        # instance.estado reflejará el estado *antes* de esta actualización aquí.
-        # El nuevo estado solicitado está en validated_data.get('estado')
-
-        # Actualizar los campos del TraspasoInternoStock principal
-        print(f"DEBUG SERIALIZER UPDATE: Calling super().update for instance ID: {instance.id} with data: {validated_data}")
         instance = super().update(instance, validated_data)
 
         if detalles_data: # Si el frontend envió detalles para actualizar
+            # No se permite crear nuevos detalles en una actualización del traspaso principal
+            detalles_data = [d for d in detalles_data if d.get('id')]
+            detalles_existentes = DetalleTraspasoStock.objects.in_bulk(
+                [d['id'] for d in detalles_data], field_name='id'
+            )
+            modificados = {}
             for detalle_data_item in detalles_data:
-                detalle_id = detalle_data_item.pop('id', None) # Usamos pop para quitarlo del dict para **kwargs
-                
-                if not detalle_id:
-                    # No se debería permitir crear nuevos detalles en una actualización del traspaso principal
-                    # a menos que sea un caso de uso específico.
-                    continue
-
-                try:
-                    detalle_obj = DetalleTraspasoStock.objects.get(id=detalle_id, traspaso=instance)
-                    
-                    fields_to_update_in_detalle = []
-                    
-                    # Actualizar cantidad_enviada si se proporciona
-                    if 'cantidad_enviada' in detalle_data_item and detalle_data_item['cantidad_enviada'] is not None:
-                        print(f"DEBUG SERIALIZER: Processing 'cantidad_enviada' for Detalle ID {detalle_id}. Value from payload: {detalle_data_item['cantidad_enviada']}")
-                        nueva_cantidad_enviada = detalle_data_item['cantidad_enviada']
-                        if nueva_cantidad_enviada > detalle_obj.cantidad_solicitada:
-                            raise serializers.ValidationError(f"Detalle ID {detalle_id}: Cantidad enviada ({nueva_cantidad_enviada}) no puede ser mayor que la solicitada ({detalle_obj.cantidad_solicitada}).")
-                        detalle_obj.cantidad_enviada = nueva_cantidad_enviada
-                        fields_to_update_in_detalle.append('cantidad_enviada')
-                    elif 'cantidad_enviada' in detalle_data_item: # Presente en payload pero es None
-                        print(f"DEBUG SERIALIZER: 'cantidad_enviada' for Detalle ID {detalle_id} is present in payload but is None. Not updating field, will remain: {detalle_obj.cantidad_enviada}")
-                    else: # No presente en payload
-                        print(f"DEBUG SERIALIZER: 'cantidad_enviada' for Detalle ID {detalle_id} not in payload. Not updating field, will remain: {detalle_obj.cantidad_enviada}")
-
-                    
-                    # Actualizar cantidad_recibida si se proporciona
-                    if 'cantidad_recibida' in detalle_data_item and detalle_data_item['cantidad_recibida'] is not None:
-                        print(f"DEBUG SERIALIZER: Processing 'cantidad_recibida' for Detalle ID {detalle_id}. Value from payload: {detalle_data_item['cantidad_recibida']}")
-                        nueva_cantidad_recibida = detalle_data_item['cantidad_recibida']
-                        if detalle_obj.cantidad_enviada is not None and nueva_cantidad_recibida > detalle_obj.cantidad_enviada:
-                            raise serializers.ValidationError(f"Detalle ID {detalle_id}: Cantidad recibida ({nueva_cantidad_recibida}) no puede ser mayor que la enviada ({detalle_obj.cantidad_enviada}).")
-                        detalle_obj.cantidad_recibida = nueva_cantidad_recibida
-                        fields_to_update_in_detalle.append('cantidad_recibida')
-                    # Similar logging for cantidad_recibida if needed
-
-                    if fields_to_update_in_detalle:
-                        print(f"DEBUG SERIALIZER: Fields to update for Detalle ID {detalle_id}: {fields_to_update_in_detalle}")
-                        detalle_obj.save(update_fields=fields_to_update_in_detalle)
-                        print(f"DEBUG SERIALIZER: Saved DetalleTraspasoStock ID {detalle_obj.id}, cantidad_enviada: {detalle_obj.cantidad_enviada}, cantidad_recibida: {detalle_obj.cantidad_recibida}")
-                        
-                except DetalleTraspasoStock.DoesNotExist:
+                detalle_id = detalle_data_item['id']
+                detalle_obj = detalles_existentes.get(detalle_id)
+                if detalle_obj is None or detalle_obj.traspaso_id != instance.id:
                     raise serializers.ValidationError(f"Detalle con ID {detalle_id} no encontrado para este traspaso.")
 
-        return instance
\ No newline at end of file
+                # Actualizar cantidad_enviada si se proporciona
+                if detalle_data_item.get('cantidad_enviada') is not None:
+                    nueva_cantidad_enviada = detalle_data_item['cantidad_enviada']
+                    if nueva_cantidad_enviada > detalle_obj.cantidad_solicitada:
+                        raise serializers.ValidationError(f"Detalle ID {detalle_id}: Cantidad enviada ({nueva_cantidad_enviada}) no puede ser mayor que la solicitada ({detalle_obj.cantidad_solicitada}).")
+                    detalle_obj.cantidad_enviada = nueva_cantidad_enviada
+                    modificados[detalle_id] = detalle_obj
+
+                # Actualizar cantidad_recibida si se proporciona
+                if detalle_data_item.get('cantidad_recibida') is not None:
+                    nueva_cantidad_recibida = detalle_data_item['cantidad_recibida']
+                    if detalle_obj.cantidad_enviada is not None and nueva_cantidad_recibida > detalle_obj.cantidad_enviada:
+                        raise serializers.ValidationError(f"Detalle ID {detalle_id}: Cantidad recibida ({nueva_cantidad_recibida}) no puede ser mayor que la enviada ({detalle_obj.cantidad_enviada}).")
+                    detalle_obj.cantidad_recibida = nueva_cantidad_recibida
+                    modificados[detalle_id] = detalle_obj
+
+            if modificados:
+                DetalleTraspasoStock.objects.bulk_update(
+                    list(modificados.values()), ['cantidad_enviada', 'cantidad_recibida']
+                )
+
+        return instance
+
+
+class ImportacionStockSerializer(serializers.ModelSerializer):
+    estado_display = serializers.CharField(source='get_estado_display', read_only=True)
+    filas_restantes = serializers.IntegerField(read_only=True, allow_null=True)
+    creado_por_email = serializers.EmailField(source='creado_por.email', read_only=True, allow_null=True)
+
+    class Meta:
+        model = ImportacionStock
+        fields = [
+            'id', 'archivo', 'nombre_archivo_original', 'estado', 'estado_display',
+            'tamano_lote', 'total_filas', 'filas_procesadas', 'filas_fallidas', 'filas_restantes',
+            'lotes_completados', 'errores', 'mensaje_error',
+            'creado_por', 'creado_por_email',
+            'fecha_creacion', 'fecha_inicio', 'fecha_fin', 'fecha_actualizacion',
+        ]
+        read_only_fields = (
+            'nombre_archivo_original', 'estado', 'total_filas', 'filas_procesadas', 'filas_fallidas',
+            'lotes_completados', 'errores', 'mensaje_error', 'creado_por',
+            'fecha_creacion', 'fecha_inicio', 'fecha_fin', 'fecha_actualizacion',
+        )
+        extra_kwargs = {
+            'archivo': {'write_only': True},
+            'tamano_lote': {'required': False, 'min_value': 100, 'max_value': 50000},
+        }
+
+    def validate_archivo(self, archivo):
+        if not archivo.name.lower().endswith(('.csv', '.xlsx')):
+            raise serializers.ValidationError("Las importaciones por lotes aceptan archivos .csv o .xlsx.")
+        return archivo
+
+    def create(self, validated_data):
+        validated_data['nombre_archivo_original'] = validated_data['archivo'].name
+        return super().create(validated_data)
+
+
+class ProgresoImportacionStockSerializer(serializers.ModelSerializer):
+    """Vista liviana del avance de una importación, pensada para consultas frecuentes (polling)."""
+    estado_display = serializers.CharField(source='get_estado_display', read_only=True)
+    filas_restantes = serializers.IntegerField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = ImportacionStock
+        fields = [
+            'id', 'estado', 'estado_display', 'total_filas', 'filas_procesadas',
+            'filas_fallidas', 'filas_restantes', 'lotes_completados', 'mensaje_error', 'fecha_actualizacion',
+        ]
+        read_only_fields = fields
+
+
+class ResumenStockSerializer(serializers.Serializer):
+    """
+    Fila del resumen de stock del dashboard del bodeguero. Sirve tanto para
+    ResumenStockProducto como para ResumenStockSucursal (mismas columnas).
+    """
+    id = serializers.IntegerField(source='producto_id', read_only=True)
+    nombre = serializers.CharField(source='producto.nombre', read_only=True)
+    stockDisponible = serializers.IntegerField(source='cantidad_total', read_only=True)
+    umbralMinimo = serializers.SerializerMethodField()
+
+    def get_umbralMinimo(self, obj):
+        return obj.umbral_minimo if obj.umbral_minimo is not None else 0
+
+
+class AlertaStockSerializer(serializers.ModelSerializer):
+    producto_nombre = serializers.CharField(source='producto.nombre', read_only=True)
+    producto_sku = serializers.CharField(source='producto.sku', read_only=True)
+    sucursal = serializers.IntegerField(source='bodega.sucursal_id', read_only=True)
+    tipo_display = serializers.CharField(source='get_tipo_display', read_only=True)
+    estado_display = serializers.CharField(source='get_estado_display', read_only=True)
+
+    class Meta:
+        model = AlertaStock
+        fields = [
+            'id', 'producto', 'producto_nombre', 'producto_sku', 'bodega', 'sucursal',
+            'tipo', 'tipo_display', 'estado', 'estado_display',
+            'cantidad', 'umbral', 'cantidad_resolucion',
+            'revisada_por', 'fecha_revision', 'fecha_creacion', 'fecha_resolucion',
+        ]
+        read_only_fields = fields
+
+
+class LineaConteoSerializer(serializers.Serializer):
+    sku = serializers.CharField(max_length=100)
+    cantidad = serializers.IntegerField(min_value=0)
+
+
+class ConteoCiclicoCrearSerializer(serializers.Serializer):
+    """Entrada de un conteo cíclico: el conjunto contado de una bodega."""
+    bodega = serializers.PrimaryKeyRelatedField(queryset=Bodega.objects.all())
+    motivo = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+    conteo_completo = serializers.BooleanField(default=True)
+    simular = serializers.BooleanField(default=False, help_text="Solo calcula las diferencias, sin ajustar el stock.")
+    lineas = LineaConteoSerializer(many=True, allow_empty=True)
+
+    def validate(self, data):
+        if not data['lineas'] and not data['conteo_completo']:
+            raise serializers.ValidationError("Un conteo parcial debe incluir al menos una línea.")
+        return data
+
+
+class ItemAjusteStockSerializer(serializers.Serializer):
+    producto_identificador = serializers.CharField(max_length=255, help_text="SKU o nombre del producto.")
+    bodega_id = serializers.IntegerField()
+    cantidad = serializers.IntegerField(help_text="Ajuste (+/-), distinto de cero.")
+    motivo = serializers.CharField(max_length=255)
+
+    def validate_cantidad(self, value):
+        if value == 0:
+            raise serializers.ValidationError("La cantidad no puede ser cero.")
+        return value
+
+
+class AjusteStockLoteSerializer(serializers.Serializer):
+    """Entrada del ajuste manual de stock en bloque."""
+    items = ItemAjusteStockSerializer(many=True, allow_empty=False, max_length=5000)
+    permitir_parcial = serializers.BooleanField(
+        default=False, help_text="Aplicar los ítems válidos aunque otros sean rechazados."
+    )
+
+
+class MovimientoStockSerializer(serializers.ModelSerializer):
+    producto_sku = serializers.CharField(source='producto.sku', read_only=True)
+    producto_nombre = serializers.CharField(source='producto.nombre', read_only=True)
+    tipo_display = serializers.CharField(source='get_tipo_display', read_only=True)
+
+    class Meta:
+        model = MovimientoStock
+        fields = [
+            'id', 'producto', 'producto_sku', 'producto_nombre', 'bodega', 'tipo', 'tipo_display',
+            'cantidad', 'cantidad_anterior', 'cantidad_resultante', 'motivo', 'conteo', 'usuario', 'fecha',
+        ]
+        read_only_fields = fields
+
+
+class ConteoCiclicoSerializer(serializers.ModelSerializer):
+    realizado_por_email = serializers.EmailField(source='realizado_por.email', read_only=True, allow_null=True)
+
+    class Meta:
+        model = ConteoCiclico
+        fields = [
+            'id', 'bodega', 'realizado_por', 'realizado_por_email', 'motivo', 'conteo_completo',
+            'total_lineas', 'lineas_con_diferencia', 'unidades_sobrantes', 'unidades_faltantes',
+            'valor_diferencia', 'fecha_creacion',
+        ]
+        read_only_fields = fields
+
+
+class ConteoCiclicoDetalleSerializer(ConteoCiclicoSerializer):
+    """Conteo con sus movimientos de ajuste (solo para el detalle, no para el listado)."""
+    movimientos = MovimientoStockSerializer(many=True, read_only=True)
+
+    class Meta(ConteoCiclicoSerializer.Meta):
+        fields = ConteoCiclicoSerializer.Meta.fields + ['movimientos']
+        read_only_fields = fields
+
+
+class SnapshotInventarioSerializer(serializers.ModelSerializer):
+    estado_display = serializers.CharField(source='get_estado_display', read_only=True)
+    creado_por_email = serializers.EmailField(source='creado_por.email', read_only=True, allow_null=True)
+
+    class Meta:
+        model = SnapshotInventario
+        fields = [
+            'id', 'descripcion', 'estado', 'estado_display', 'fecha_corte',
+            'tamano_bytes', 'checksum_sha256', 'total_filas', 'total_unidades', 'valor_total',
+            'totales_por_sucursal', 'mensaje_error', 'creado_por', 'creado_por_email',
+            'fecha_creacion', 'fecha_inicio', 'fecha_fin',
+        ]
+        read_only_fields = [campo for campo in fields if campo != 'descripcion']
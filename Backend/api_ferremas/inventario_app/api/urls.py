@@ -5,8 +5,15 @@ from .views import (
     DetalleInventarioBodegaViewSet,
     TraspasoInternoStockViewSet,
     DetalleTraspasoStockViewSet,
+    ImportacionStockViewSet,
+    AlertaStockViewSet,
+    ConteoCiclicoViewSet,
+    SnapshotInventarioViewSet,
     ResumenStockBodegueroView, # Nueva importación
-    AjusteManualStockView
+    AjusteManualStockView,
+    AjusteStockLoteView,
+    ValorizacionInventarioView,
+    SincronizacionDeltaView
 )
 
 app_name = 'inventario_app'
@@ -16,9 +23,16 @@ router.register(r'inventarios-sucursal', InventarioSucursalViewSet, basename='in
 router.register(r'detalles-inventario-bodega', DetalleInventarioBodegaViewSet, basename='detalleinventariobodega')
 router.register(r'traspasos-internos', TraspasoInternoStockViewSet, basename='traspasointernostock')
 router.register(r'detalles-traspaso', DetalleTraspasoStockViewSet, basename='detalletraspasostock')
+router.register(r'importaciones-stock', ImportacionStockViewSet, basename='importacionstock')
+router.register(r'alertas-stock', AlertaStockViewSet, basename='alertastock')
+router.register(r'conteos-ciclicos', ConteoCiclicoViewSet, basename='conteociclico')
+router.register(r'snapshots-inventario', SnapshotInventarioViewSet, basename='snapshotinventario')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('resumen-stock-bodeguero/', ResumenStockBodegueroView.as_view(), name='resumen-stock-bodeguero'), # Nueva URL
     path('ajuste-manual-stock/', AjusteManualStockView.as_view(), name='ajuste-manual-stock'),
+    path('ajuste-manual-stock/lote/', AjusteStockLoteView.as_view(), name='ajuste-stock-lote'),
+    path('valorizacion/', ValorizacionInventarioView.as_view(), name='valorizacion-inventario'),
+    path('sincronizacion/', SincronizacionDeltaView.as_view(), name='sincronizacion-delta'),
 ]
\ No newline at end of file
@@ -1,15 +1,22 @@
-from rest_framework import viewsets, permissions, status
+from rest_framework import viewsets, permissions, status, mixins, generics
 from rest_framework.response import Response
 from rest_framework import filters as drf_filters
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db import transaction
-from rest_framework.exceptions import ValidationError # Ya está importado, solo verificar
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_date
+from django.http import FileResponse
+from django.core.paginator import Paginator, InvalidPage
+from rest_framework.exceptions import ValidationError, NotFound
 from . import serializers # Importar el módulo de serializers
 
 from rest_framework.decorators import action # Para acciones personalizadas
-from rest_framework.parsers import MultiPartParser # Para subida de archivos
-from django.db.models import Q, Sum, Min # Para agregar stock y obtener umbrales
+from rest_framework.parsers import MultiPartParser, FormParser # Para subida de archivos
+from django.db.models import Q, Prefetch
 from rest_framework.views import APIView # Para la nueva vista de resumen
+import os
+from datetime import datetime, time
+
 import pandas as pd
 
 
@@ -17,7 +24,14 @@ from ..models import (
     InventarioSucursal,
     DetalleInventarioBodega,
     TraspasoInternoStock,
-    DetalleTraspasoStock
+    DetalleTraspasoStock,
+    ImportacionStock,
+    ResumenStockSucursal,
+    ResumenStockProducto,
+    AlertaStock,
+    ConteoCiclico,
+    MovimientoStock,
+    SnapshotInventario
 )
 from sucursal_app.models import Bodega # Para buscar bodegas
 from producto_app.models import Producto # Para buscar productos
@@ -26,9 +40,36 @@ from .serializers import (
     InventarioSucursalSerializer,
     DetalleInventarioBodegaSerializer,
     TraspasoInternoStockSerializer,
-    DetalleTraspasoStockSerializer
+    DetalleTraspasoStockSerializer,
+    ImportacionStockSerializer,
+    ProgresoImportacionStockSerializer,
+    ResumenStockSerializer,
+    AlertaStockSerializer,
+    ConteoCiclicoSerializer,
+    ConteoCiclicoDetalleSerializer,
+    ConteoCiclicoCrearSerializer,
+    SnapshotInventarioSerializer,
+    AjusteStockLoteSerializer
+)
+from .filters import InventarioSucursalFilter, DetalleInventarioBodegaFilter, AlertaStockFilter
+from usuario_app.api.permissions import EsAdministrador, EsBodeguero, EsContable
+from pedido_app.api.pagination import CustomPagination
+from bitacora_app.utils import crear_registro_actividad
+from ..services import (
+    COLUMNAS_REQUERIDAS_CARGA,
+    normalizar_columnas_carga,
+    columnas_faltantes_carga,
+    cargar_stock_desde_dataframe,
+    aplicar_stock_traspaso,
+    obtener_cambios_sincronizacion,
+    aplicar_conteo_ciclico,
+    obtener_snapshot_al,
+    leer_snapshot_inventario,
+    aplicar_ajustes_stock_en_bloque,
+    valorizacion_agrupada,
+    AGRUPACIONES_VALORIZACION,
+    LIMITE_SINCRONIZACION,
 )
-from .filters import InventarioSucursalFilter, DetalleInventarioBodegaFilter
 
 class InventarioSucursalViewSet(viewsets.ModelViewSet):
     """
@@ -65,156 +106,100 @@ class DetalleInventarioBodegaViewSet(viewsets.ModelViewSet):
         return super().get_serializer(*args, **kwargs)
 
     @action(detail=False, methods=['post'], parser_classes=[MultiPartParser], url_path='cargar-excel')
-    @transaction.atomic
     def cargar_stock_excel(self, request, *args, **kwargs):
         """
-        Permite la carga masiva de stock desde un archivo Excel.
-        Columnas esperadas en el Excel (los nombres deben ser exactos o normalizados):
+        Permite la carga masiva de stock desde un archivo Excel o CSV.
+        Columnas esperadas en el archivo (los nombres deben ser exactos o normalizados):
         - producto_sku (SKU único del producto)
         - bodega_id (ID numérico de la bodega)
         - cantidad (Número entero)
         - stock_minimo (Opcional, número entero)
         - stock_maximo (Opcional, número entero)
+        La validación se hace por columnas, las referencias se resuelven con una consulta
+        por tipo y el stock se escribe en bloque (ver inventario_app.services).
         """
         file_obj = request.FILES.get('archivo_excel')
 
         if not file_obj:
             return Response({"error": "No se proporcionó ningún archivo Excel ('archivo_excel')."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not file_obj.name.endswith(('.xls', '.xlsx')):
-            return Response({"error": "El archivo no es un formato Excel válido (.xls o .xlsx)."}, status=status.HTTP_400_BAD_REQUEST)
+        if not file_obj.name.endswith(('.xls', '.xlsx', '.csv')):
+            return Response({"error": "El archivo no es un formato válido (.xls, .xlsx o .csv)."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            df = pd.read_excel(file_obj, engine='openpyxl' if file_obj.name.endswith('.xlsx') else None)
-            df.columns = [str(col).strip().lower().replace(' ', '_') for col in df.columns] # Normalizar nombres de columnas
+            if file_obj.name.endswith('.csv'):
+                df = pd.read_csv(file_obj, dtype=str)
+            else:
+                df = pd.read_excel(file_obj, engine='openpyxl' if file_obj.name.endswith('.xlsx') else None)
+            normalizar_columnas_carga(df)
         except Exception as e:
             return Response({"error": f"Error al leer el archivo Excel: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
 
-        expected_columns = ['producto_sku', 'bodega_id', 'cantidad']
-        missing_columns = [col for col in expected_columns if col not in df.columns]
+        missing_columns = columnas_faltantes_carga(df)
         if missing_columns:
             return Response(
-                {"error": f"Columnas faltantes en el Excel: {', '.join(missing_columns)}. Se esperan: {', '.join(expected_columns)}."},
+                {"error": f"Columnas faltantes en el Excel: {', '.join(missing_columns)}. Se esperan: {', '.join(COLUMNAS_REQUERIDAS_CARGA)}."},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        stock_data_list = []
-        errors_list = []
-        processed_rows_count = 0
-
-        for index, row in df.iterrows():
-            processed_rows_count += 1
-            row_num_for_error = index + 2 # +1 para índice base 1, +1 para la fila de encabezado
-            try:
-                producto_sku = str(row['producto_sku']).strip()
-                bodega_id_str = str(row['bodega_id']).strip()
-                cantidad_str = str(row['cantidad']).strip()
-
-                if not producto_sku or not bodega_id_str or not cantidad_str:
-                    errors_list.append(f"Fila {row_num_for_error}: producto_sku, bodega_id o cantidad no pueden estar vacíos.")
-                    continue
-
-                try:
-                    cantidad = int(float(cantidad_str))
-                    if cantidad < 0: raise ValueError("Cantidad no puede ser negativa.")
-                except ValueError:
-                    errors_list.append(f"Fila {row_num_for_error}: Cantidad '{cantidad_str}' inválida.")
-                    continue
-
-                try: bodega_id = int(bodega_id_str)
-                except ValueError:
-                    errors_list.append(f"Fila {row_num_for_error}: ID de Bodega '{bodega_id_str}' inválido.")
-                    continue
-
-                producto_obj = Producto.objects.filter(sku=producto_sku).first()
-                if not producto_obj:
-                    errors_list.append(f"Fila {row_num_for_error}: Producto con SKU '{producto_sku}' no encontrado.")
-                    continue
-
-                bodega_obj = Bodega.objects.select_related('sucursal').filter(id=bodega_id).first()
-                if not bodega_obj:
-                    errors_list.append(f"Fila {row_num_for_error}: Bodega con ID '{bodega_id}' no encontrada.")
-                    continue
-                if not bodega_obj.sucursal:
-                    errors_list.append(f"Fila {row_num_for_error}: Bodega '{bodega_obj.direccion}' (ID: {bodega_id}) no tiene sucursal asignada.")
-                    continue
-
-                inventario_sucursal_obj, _ = InventarioSucursal.objects.get_or_create(sucursal=bodega_obj.sucursal)
-
-                item_data = {
-                    'producto': producto_obj.id,
-                    'bodega': bodega_obj.id,
-                    'inventario_sucursal': inventario_sucursal_obj.id,
-                    'cantidad': cantidad,
-                }
-
-                if 'stock_minimo' in df.columns and pd.notna(row.get('stock_minimo')):
-                    try: item_data['stock_minimo'] = int(float(row['stock_minimo']))
-                    except (ValueError, TypeError): errors_list.append(f"Fila {row_num_for_error}: Stock Mínimo '{row['stock_minimo']}' inválido.")
-                if 'stock_maximo' in df.columns and pd.notna(row.get('stock_maximo')):
-                    try: item_data['stock_maximo'] = int(float(row['stock_maximo']))
-                    except (ValueError, TypeError): errors_list.append(f"Fila {row_num_for_error}: Stock Máximo '{row['stock_maximo']}' inválido.")
-
-                if not any(err.startswith(f"Fila {row_num_for_error}:") for err in errors_list): # Si no hubo errores para esta fila
-                    stock_data_list.append(item_data)
-
-            except Exception as e:
-                errors_list.append(f"Fila {row_num_for_error}: Error inesperado procesando fila - {str(e)}.")
-
-        # print(f"DEBUG: stock_data_list (antes de agregar): {stock_data_list}") # NUEVO PRINT
-
-        if not stock_data_list and errors_list: # Si solo hubo errores y no datos válidos
-            return Response({"message": "No se encontraron datos válidos en el Excel para cargar.", "errores_excel": errors_list, "filas_procesadas": processed_rows_count}, status=status.HTTP_400_BAD_REQUEST)
-        elif not stock_data_list: # Si el excel estaba vacío o no produjo datos ni errores (caso raro)
-             return Response({"message": "El archivo Excel no contenía datos procesables.", "errores_excel": errors_list, "filas_procesadas": processed_rows_count}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Pre-procesamiento para agrupar cantidades por combinaciones únicas
-        aggregated_stock_data = {}
-        for item in stock_data_list:
-            # Asegurarse de que los componentes de la clave no sean None si no deberían serlo
-            if item.get('inventario_sucursal') is None or \
-               item.get('producto') is None or \
-               item.get('bodega') is None:
-                error_msg = f"Error interno: Faltan datos clave para agregación en el item: producto_id={item.get('producto')}, bodega_id={item.get('bodega')}, inv_suc_id={item.get('inventario_sucursal')}. Item completo: {item}"
-                print(f"DEBUG: {error_msg}")
-                if not any(error_msg in e for e in errors_list): # Evitar duplicar este error específico
-                    errors_list.append(error_msg)
-                continue # Saltar este item si los datos clave son incompletos
-
-            key = (item['inventario_sucursal'], item['producto'], item['bodega'])
-            print(f"DEBUG: Agregando item con key: {key}, cantidad: {item.get('cantidad')}") # NUEVO PRINT
-            if key not in aggregated_stock_data:
-                aggregated_stock_data[key] = {
-                    'producto': item['producto'],
-                    'bodega': item['bodega'],
-                    'inventario_sucursal': item['inventario_sucursal'],
-                    'cantidad': 0,
-                    # Mantener stock_minimo y stock_maximo del último encontrado o el primero
-                    # Esta parte puede necesitar una lógica más definida si varían en el Excel
-                    'stock_minimo': item.get('stock_minimo'),
-                    'stock_maximo': item.get('stock_maximo')
-                }
-            aggregated_stock_data[key]['cantidad'] += item['cantidad']
-            # Actualizar stock_minimo/maximo si se desea (ej. tomar el último no nulo)
-            if item.get('stock_minimo') is not None:
-                 aggregated_stock_data[key]['stock_minimo'] = item.get('stock_minimo')
-            if item.get('stock_maximo') is not None:
-                 aggregated_stock_data[key]['stock_maximo'] = item.get('stock_maximo')
-
-        final_stock_data_list = list(aggregated_stock_data.values())
-
-        if not final_stock_data_list: # Después de agregar, si todo se canceló por alguna razón
-             return Response({"message": "No quedaron datos válidos después de la agregación.", "errores_excel": errors_list, "filas_procesadas": processed_rows_count}, status=status.HTTP_400_BAD_REQUEST)
-
-        serializer = self.get_serializer(data=final_stock_data_list, many=True)
+        processed_rows_count = len(df)
         try:
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response({"message": f"Carga masiva completada. {len(serializer.data)} registros de stock procesados/actualizados.", "errores_excel_previos": errors_list if errors_list else "Ninguno.", "filas_excel_procesadas": processed_rows_count}, status=status.HTTP_201_CREATED if not errors_list else status.HTTP_207_MULTI_STATUS)
-        except ValidationError as e: # Usar la ValidationError importada directamente
-            return Response({"message": "Errores de validación al guardar el stock.", "errores_serializer": e.detail, "errores_excel_previos": errors_list, "filas_excel_procesadas": processed_rows_count}, status=status.HTTP_400_BAD_REQUEST)
+            registros, errors_list = cargar_stock_desde_dataframe(df)
         except Exception as e:
-            return Response({"message": "Error inesperado durante el guardado del stock.", "error_detalle": str(e), "errores_excel_previos": errors_list}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return Response({"message": "Error inesperado durante el guardado del stock.", "error_detalle": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        if not registros and errors_list: # Si solo hubo errores y no datos válidos
+            return Response({"message": "No se encontraron datos válidos en el Excel para cargar.", "errores_excel": errors_list, "filas_procesadas": processed_rows_count}, status=status.HTTP_400_BAD_REQUEST)
+        elif not registros: # Si el archivo estaba vacío
+            return Response({"message": "El archivo Excel no contenía datos procesables.", "errores_excel": errors_list, "filas_procesadas": processed_rows_count}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {
+                "message": f"Carga masiva completada. {len(registros)} registros de stock procesados/actualizados.",
+                "errores_excel_previos": errors_list if errors_list else "Ninguno.",
+                "filas_excel_procesadas": processed_rows_count
+            },
+            status=status.HTTP_201_CREATED if not errors_list else status.HTTP_207_MULTI_STATUS
+        )
+
+class ImportacionStockViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet para las importaciones masivas de stock por lotes.
+    El POST solo guarda el archivo en disco y crea el trabajo (respuesta 202);
+    el procesamiento lo realiza el comando `procesar_importaciones_stock`.
+    """
+    queryset = ImportacionStock.objects.select_related('creado_por').all()
+    serializer_class = ImportacionStockSerializer
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [MultiPartParser, FormParser]
+    filter_backends = [DjangoFilterBackend, drf_filters.OrderingFilter]
+    filterset_fields = ['estado']
+    ordering_fields = ['fecha_creacion', 'estado']
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(creado_por=request.user)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def progreso(self, request, pk=None):
+        """Filas procesadas, con error y restantes de la importación."""
+        importacion = self.get_object()
+        return Response(ProgresoImportacionStockSerializer(importacion).data)
+
+    @action(detail=True, methods=['post'])
+    def reintentar(self, request, pk=None):
+        """
+        Vuelve a encolar una importación FALLIDA. El worker la reanuda desde el
+        último lote confirmado, sin repetir los lotes ya aplicados.
+        """
+        actualizadas = ImportacionStock.objects.filter(
+            pk=pk, estado=ImportacionStock.EstadoImportacion.FALLIDO
+        ).update(estado=ImportacionStock.EstadoImportacion.PENDIENTE, mensaje_error=None)
+        if not actualizadas:
+            return Response({"error": "Solo se pueden reintentar importaciones en estado FALLIDO."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(ProgresoImportacionStockSerializer(self.get_object()).data)
 
 class TraspasoInternoStockViewSet(viewsets.ModelViewSet):
     """
@@ -234,107 +219,30 @@ class TraspasoInternoStockViewSet(viewsets.ModelViewSet):
         # Asignar el usuario que crea el traspaso automáticamente
         serializer.save(creado_por=self.request.user)
 
+    @transaction.atomic
     def perform_update(self, serializer):
         """
-        Sobrescribe para manejar la lógica de actualización de stock
-        cuando el estado del traspaso cambia a COMPLETADO.
+        Sobrescribe para manejar la lógica de actualización de stock según la transición de estado:
+        PENDIENTE -> EN_TRANSITO descuenta lo enviado de las bodegas de origen y
+        RECIBIDO_PENDIENTE_VERIFICACION -> COMPLETADO suma lo recibido en las de destino.
+        El cambio de estado y el movimiento de stock se confirman juntos o no se aplican.
         """
-        traspaso_instance = serializer.instance
-        estado_anterior = traspaso_instance.estado
-        nuevo_estado = serializer.validated_data.get('estado', traspaso_instance.estado)
+        # Bloquear el traspaso para que dos actualizaciones simultáneas no apliquen el stock dos veces
+        estado_anterior = TraspasoInternoStock.objects.select_for_update().values_list(
+            'estado', flat=True
+        ).get(pk=serializer.instance.pk)
+        nuevo_estado = serializer.validated_data.get('estado', estado_anterior)
 
-        print(f"DEBUG VIEWS: perform_update called. Traspaso ID: {traspaso_instance.id}, Estado Anterior: {estado_anterior}, Nuevo Estado Solicitado: {nuevo_estado}")
-
-        # Guardar el traspaso primero
         updated_traspaso = serializer.save()
-        # Refrescar el objeto desde la BD para asegurar que los detalles anidados actualizados se carguen
-        updated_traspaso.refresh_from_db() 
-        print(f"DEBUG VIEWS: Traspaso object AFTER refresh_from_db: ID {updated_traspaso.id}, Estado Actual: {updated_traspaso.estado}")
-
-        # Inspeccionar el primer detalle inmediatamente después de refresh_from_db
-        if updated_traspaso.detalles_traspaso.exists():
-            first_detail_after_refresh = updated_traspaso.detalles_traspaso.first()
-            print(f"DEBUG VIEWS: First detail (ID: {first_detail_after_refresh.id}) AFTER refresh_from_db - cantidad_enviada: {first_detail_after_refresh.cantidad_enviada}, cantidad_recibida: {first_detail_after_refresh.cantidad_recibida}")
-        else:
-            print("DEBUG VIEWS: No details found for traspaso AFTER refresh_from_db.")
-        
-
-        # El serializer.save() llama a TraspasoInternoStockSerializer.update(), 
-        # donde también tienes un print: "DEBUG SERIALIZER: Saved DetalleTraspasoStock ID..."
-        # Ese print debería aparecer si los detalles se actualizan.
-        print(f"DEBUG VIEWS: Traspaso object after serializer.save(): ID {updated_traspaso.id}, Estado Actual (desde DB): {updated_traspaso.estado}")
-        # Nota: updated_traspaso.estado aquí será el *nuevo* estado si 'estado' estaba en validated_data y se guardó.
 
-        # Lógica para cuando el traspaso se marca como EN_TRANSITO (descontar de origen)
         if nuevo_estado == TraspasoInternoStock.EstadoTraspaso.EN_TRANSITO and \
-           estado_anterior == TraspasoInternoStock.EstadoTraspaso.PENDIENTE: # O desde otros estados si aplica
-            print(f"DEBUG VIEWS: Entering EN_TRANSITO logic for Traspaso ID {updated_traspaso.id}")
-            try:
-                with transaction.atomic():
-                    for detalle_traspaso in updated_traspaso.detalles_traspaso.all():
-                        cantidad_a_descontar = detalle_traspaso.cantidad_enviada
-                        print(f"DEBUG VIEWS (EN_TRANSITO): Detail ID: {detalle_traspaso.id}, Prod: {detalle_traspaso.producto.nombre}, Cantidad Enviada (cantidad_a_descontar): {cantidad_a_descontar}")
-                        if cantidad_a_descontar is None or cantidad_a_descontar <= 0:
-                            raise ValidationError(
-                                f"No se especificó la cantidad enviada para el producto '{detalle_traspaso.producto.nombre}' en el traspaso ID {updated_traspaso.id}."
-                            )
-
-                        inventario_origen, _ = InventarioSucursal.objects.get_or_create(sucursal=updated_traspaso.sucursal_origen)
-                        stock_origen, _ = DetalleInventarioBodega.objects.get_or_create(
-                            inventario_sucursal=inventario_origen,
-                            producto=detalle_traspaso.producto,
-                            bodega=detalle_traspaso.bodega_origen,
-                            defaults={'cantidad': 0}
-                        )
-                        if stock_origen.cantidad < cantidad_a_descontar:
-                            raise ValidationError(
-                                f"Stock insuficiente para '{detalle_traspaso.producto.nombre}' en bodega origen '{detalle_traspaso.bodega_origen}'. Stock: {stock_origen.cantidad}, Necesario: {cantidad_a_descontar}."
-                            )
-                        stock_origen.cantidad -= cantidad_a_descontar
-                        stock_origen.save()
-            except Exception as e:
-                # Considerar revertir el estado del traspaso si falla el descuento
-                print(f"DEBUG VIEWS (EN_TRANSITO ERROR): Exception: {str(e)}")
-                raise ValidationError(f"Error al descontar stock de origen para traspaso EN TRÁNSITO: {str(e)}")
-
-        # Lógica para cuando el traspaso se marca como COMPLETADO (sumar a destino)
-        # Esto ahora sucede después de que la sucursal destino lo marca como verificado.
+           estado_anterior == TraspasoInternoStock.EstadoTraspaso.PENDIENTE:
+            aplicar_stock_traspaso(updated_traspaso, descontar_origen=True)
+
+        # Esto sucede después de que la sucursal destino lo marca como verificado.
         elif nuevo_estado == TraspasoInternoStock.EstadoTraspaso.COMPLETADO and \
              estado_anterior == TraspasoInternoStock.EstadoTraspaso.RECIBIDO_PENDIENTE_VERIFICACION:
-            print(f"DEBUG VIEWS: Entering COMPLETADO logic for Traspaso ID {updated_traspaso.id}")
-            try:
-                with transaction.atomic():
-                    for detalle_traspaso in updated_traspaso.detalles_traspaso.all():
-                        cantidad_a_sumar = detalle_traspaso.cantidad_recibida
-                        # Mover este print ANTES de la validación
-                        print(f"DEBUG: Attempting to sum. Detail ID: {detalle_traspaso.id}, Product: {detalle_traspaso.producto.nombre}, Cantidad Recibida (cantidad_a_sumar): {cantidad_a_sumar}")
-                        if cantidad_a_sumar is None or cantidad_a_sumar <= 0:
-                            raise ValidationError(
-                                f"No se especificó la cantidad recibida o es inválida para el producto '{detalle_traspaso.producto.nombre}' en el traspaso ID {updated_traspaso.id}."
-                            )
-
-                        # Añadir a la bodega de destino
-                        # Debug prints
-
-                        inventario_destino, _ = InventarioSucursal.objects.get_or_create(sucursal=updated_traspaso.sucursal_destino)
-                        stock_destino, detalle_created_flag = DetalleInventarioBodega.objects.get_or_create(
-                            inventario_sucursal=inventario_destino,
-                            producto=detalle_traspaso.producto,
-                            bodega=detalle_traspaso.bodega_destino,
-                            defaults={'cantidad': 0}
-                        )
-                        print(f"DEBUG: Got/Created DetalleInventarioBodega: {stock_destino} (Created: {detalle_created_flag}) - Current quantity: {stock_destino.cantidad}")
-
-                        stock_destino.cantidad += cantidad_a_sumar
-                        stock_destino.save()
-                        print(f"DEBUG: Stock updated. New quantity: {stock_destino.cantidad}")
-            except Exception as e:
-                # Considerar revertir el estado del traspaso si falla la suma
-                print(f"DEBUG VIEWS (COMPLETADO ERROR): Exception: {str(e)}")
-                raise ValidationError(f"Error al sumar stock a destino para traspaso COMPLETADO: {str(e)}")
-        
-        else:
-            print(f"DEBUG VIEWS: No specific stock update logic for state transition from {estado_anterior} to {nuevo_estado} for Traspaso ID {updated_traspaso.id}. Current Traspaso state: {updated_traspaso.estado}")
+            aplicar_stock_traspaso(updated_traspaso, descontar_origen=False)
         # No hay cambios de stock cuando pasa a RECIBIDO_PENDIENTE_VERIFICACION, solo se actualiza el estado.
         # La sucursal destino debe verificar las cantidades y actualizar 'cantidad_recibida' en los detalles
         # antes de marcar el traspaso como COMPLETADO.
@@ -349,35 +257,265 @@ class DetalleTraspasoStockViewSet(viewsets.ReadOnlyModelViewSet): # Generalmente
     permission_classes = [permissions.IsAdminUser] # O ajusta
     # Podrías añadir filtros si se accede directamente
 
-class ResumenStockBodegueroView(APIView):
+class ResumenStockBodegueroView(generics.ListAPIView):
     """
     Vista para obtener un resumen del stock disponible y umbrales mínimos.
     Ideal para el dashboard del bodeguero.
+    Lee las tablas de resumen mantenidas por deltas (no agrega DetalleInventarioBodega
+    en cada consulta). Paginada y ordenada con el stock más bajo respecto al mínimo primero.
+    Filtros: ?sucursal=<id>, ?bajo_minimo=true, ?search=<nombre o SKU>, ?ordering=nombre.
     """
     permission_classes = [permissions.IsAuthenticated] # Ajusta el permiso si es necesario (ej. EsBodeguero)
+    serializer_class = ResumenStockSerializer
+    pagination_class = CustomPagination
+    filter_backends = [drf_filters.SearchFilter]
+    search_fields = ['producto__nombre', '=producto__sku']
+
+    def get_queryset(self):
+        sucursal_id = self.request.query_params.get('sucursal')
+        if sucursal_id:
+            if not sucursal_id.isdigit():
+                raise ValidationError({"sucursal": "Debe ser un ID numérico."})
+            queryset = ResumenStockSucursal.objects.filter(sucursal_id=sucursal_id)
+        else:
+            queryset = ResumenStockProducto.objects.all()
+
+        if self.request.query_params.get('bajo_minimo', '').lower() in ('true', '1'):
+            queryset = queryset.filter(umbral_minimo__isnull=False, holgura__lte=0)
+
+        if self.request.query_params.get('ordering') == 'nombre':
+            orden = ['producto__nombre']
+        else:
+            orden = ['holgura', 'producto__nombre']
+        return queryset.select_related('producto').order_by(*orden)
+
+class AlertaStockViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Feed de alertas de stock (cruces de stock mínimo/máximo por producto y bodega).
+    Las alertas se abren y resuelven solas al modificarse el stock; aquí solo se consultan
+    y se marcan como revisadas.
+    """
+    queryset = AlertaStock.objects.select_related('producto', 'bodega').all()
+    serializer_class = AlertaStockSerializer
+    permission_classes = [permissions.IsAuthenticated, (EsBodeguero | EsAdministrador)]
+    pagination_class = CustomPagination
+    filter_backends = [DjangoFilterBackend, drf_filters.OrderingFilter]
+    filterset_class = AlertaStockFilter
+    ordering_fields = ['fecha_creacion', 'cantidad']
+    ordering = ['-fecha_creacion']
+
+    @action(detail=True, methods=['post'], url_path='marcar-revisada')
+    def marcar_revisada(self, request, pk=None):
+        alerta = self.get_object()
+        if alerta.fecha_revision is None:
+            alerta.revisada_por = request.user
+            alerta.fecha_revision = timezone.now()
+            alerta.save(update_fields=['revisada_por', 'fecha_revision'])
+        return Response(self.get_serializer(alerta).data)
+
+class ConteoCiclicoViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Conteos cíclicos de bodega. El POST recibe el conjunto contado completo de una bodega
+    (miles de SKU en una sola petición), lo compara con el stock en una consulta, ajusta las
+    diferencias en bloque con su movimiento de stock y responde el reporte de diferencias.
+    Con 'simular': true solo devuelve el reporte.
+    """
+    queryset = ConteoCiclico.objects.select_related('realizado_por')
+    permission_classes = [permissions.IsAuthenticated, (EsBodeguero | EsAdministrador)]
+    pagination_class = CustomPagination
+    filter_backends = [DjangoFilterBackend, drf_filters.OrderingFilter]
+    filterset_fields = ['bodega', 'bodega__sucursal']
+    ordering_fields = ['fecha_creacion', 'lineas_con_diferencia']
+
+    def get_serializer_class(self):
+        if self.action == 'create':
+            return ConteoCiclicoCrearSerializer
+        if self.action == 'retrieve':
+            return ConteoCiclicoDetalleSerializer
+        return ConteoCiclicoSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            queryset = queryset.prefetch_related(
+                Prefetch('movimientos', queryset=MovimientoStock.objects.select_related('producto'))
+            )
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        conteo, reporte = aplicar_conteo_ciclico(
+            datos['bodega'], datos['lineas'],
+            usuario=request.user,
+            motivo=datos['motivo'],
+            conteo_completo=datos['conteo_completo'],
+            aplicar=not datos['simular'],
+        )
+        if conteo is not None:
+            crear_registro_actividad(
+                request.user, "CONTEO_CICLICO",
+                f"Conteo cíclico #{conteo.id} en bodega {conteo.bodega_id}: {conteo.lineas_con_diferencia} "
+                f"productos con diferencia ({conteo.unidades_sobrantes} sobrantes, {conteo.unidades_faltantes} faltantes).",
+                objeto_relacionado=conteo, request=request,
+            )
+        return Response(reporte, status=status.HTTP_200_OK if conteo is None else status.HTTP_201_CREATED)
+
+def _filtro_entero(request, nombre):
+    """ID numérico opcional de la query string (None si no viene)."""
+    valor = request.query_params.get(nombre)
+    if valor in (None, ''):
+        return None
+    if not valor.isdigit():
+        raise ValidationError({nombre: "Debe ser un ID numérico."})
+    return int(valor)
+
+
+class SnapshotInventarioViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Snapshots del inventario para cierres. El POST crea el trabajo (respuesta 202) y el
+    comando `generar_snapshot_inventario` lo procesa. Las consultas históricas
+    ('stock' y 'al-corte') leen el archivo del snapshot, no las tablas vivas.
+    """
+    queryset = SnapshotInventario.objects.select_related('creado_por').all()
+    serializer_class = SnapshotInventarioSerializer
+    permission_classes = [permissions.IsAuthenticated, (EsAdministrador | EsContable)]
+    pagination_class = CustomPagination
+    filter_backends = [DjangoFilterBackend, drf_filters.OrderingFilter]
+    filterset_fields = ['estado']
+    ordering_fields = ['fecha_corte', 'fecha_creacion']
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(creado_por=request.user)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    def _responder_filas(self, snapshot):
+        if snapshot.estado != SnapshotInventario.EstadoSnapshot.COMPLETADO:
+            return Response({"error": "El snapshot aún no está completado."}, status=status.HTTP_409_CONFLICT)
+        # El archivo se recorre una vez: se cuenta el total y se extrae solo la página pedida
+        paginador = self.paginator
+        tamano = paginador.get_page_size(self.request)
+        numero = self.request.query_params.get(paginador.page_query_param) or 1
+        try:
+            numero = int(numero)
+            if numero < 1:
+                raise ValueError
+        except ValueError:
+            raise NotFound("Página inválida.")
+        total, pagina = leer_snapshot_inventario(
+            snapshot,
+            sucursal_id=_filtro_entero(self.request, 'sucursal'),
+            bodega_id=_filtro_entero(self.request, 'bodega'),
+            producto_id=_filtro_entero(self.request, 'producto'),
+            desde=(numero - 1) * tamano,
+            limite=tamano,
+        )
+        try:
+            paginador.page = Paginator(range(total), tamano).page(numero)
+        except InvalidPage:
+            raise NotFound("Página inválida.")
+        paginador.request = self.request
+        pagina = pagina.astype(object).where(pagina.notna(), None)
+        respuesta = paginador.get_paginated_response(pagina.to_dict('records'))
+        respuesta.data['snapshot'] = SnapshotInventarioSerializer(snapshot).data
+        return respuesta
+
+    @action(detail=True, methods=['get'])
+    def stock(self, request, pk=None):
+        """Stock del snapshot. Filtros: ?sucursal=, ?bodega=, ?producto=."""
+        return self._responder_filas(self.get_object())
+
+    @action(detail=False, methods=['get'], url_path='al-corte')
+    def al_corte(self, request):
+        """
+        Stock histórico a una fecha: usa el último snapshot completado con corte hasta
+        ?fecha= (ISO 8601; una fecha sin hora se toma hasta el final de ese día).
+        Acepta los mismos filtros que 'stock'.
+        """
+        valor = (request.query_params.get('fecha') or '').replace(' ', '+')
+        fecha = parse_datetime(valor)
+        if fecha is None and parse_date(valor):
+            fecha = datetime.combine(parse_date(valor), time.max)
+        if fecha is None:
+            raise ValidationError({"fecha": "Formato de fecha inválido. Use ISO 8601."})
+        if timezone.is_naive(fecha):
+            fecha = timezone.make_aware(fecha)
+        snapshot = obtener_snapshot_al(fecha)
+        if snapshot is None:
+            return Response({"error": "No hay snapshots completados hasta esa fecha."}, status=status.HTTP_404_NOT_FOUND)
+        return self._responder_filas(snapshot)
+
+    @action(detail=True, methods=['get'])
+    def descargar(self, request, pk=None):
+        """Descarga el CSV comprimido (gzip) del snapshot."""
+        snapshot = self.get_object()
+        if snapshot.estado != SnapshotInventario.EstadoSnapshot.COMPLETADO:
+            return Response({"error": "El snapshot aún no está completado."}, status=status.HTTP_409_CONFLICT)
+        return FileResponse(
+            snapshot.archivo.open('rb'), as_attachment=True,
+            filename=os.path.basename(snapshot.archivo.name), content_type='application/gzip',
+        )
+
+class ValorizacionInventarioView(APIView):
+    """
+    Valorización del inventario por FIFO y por promedio ponderado, agregada por
+    ?agrupar=sucursal|bodega|producto (por defecto sucursal). Filtros: ?sucursal=, ?bodega=, ?producto=.
+    Lee la valorización mantenida por deltas (capas de costo), no el historial de movimientos.
+    """
+    permission_classes = [permissions.IsAuthenticated, (EsAdministrador | EsContable)]
 
     def get(self, request, *args, **kwargs):
-        # Esta consulta agrupa por producto y suma las cantidades de todas las bodegas.
-        # También toma el umbral mínimo (podrías necesitar una lógica más específica para el umbral si varía por bodega)
-        stock_summary = DetalleInventarioBodega.objects.values(
-            'producto__id', 
-            'producto__nombre'
-        ).annotate(
-            stock_disponible_total=Sum('cantidad'),
-            umbral_minimo_relevante=Min('stock_minimo') # O la lógica que prefieras para el umbral
-        ).order_by('producto__nombre')
-
-        resultado = []
-        for item in stock_summary:
-            resultado.append({
-                "id": item['producto__id'],
-                "nombre": item['producto__nombre'],
-                "stockDisponible": item['stock_disponible_total'] or 0,
-                "umbralMinimo": item['umbral_minimo_relevante'] if item['umbral_minimo_relevante'] is not None else 0 
-            })
-        
-        return Response(resultado)
-    # Podrías añadir filtros si se accede directamente
+        agrupar = request.query_params.get('agrupar', 'sucursal')
+        if agrupar not in AGRUPACIONES_VALORIZACION:
+            raise ValidationError({"agrupar": f"Debe ser uno de: {', '.join(AGRUPACIONES_VALORIZACION)}."})
+        grupos, totales = valorizacion_agrupada(
+            agrupar,
+            sucursal_id=_filtro_entero(request, 'sucursal'),
+            bodega_id=_filtro_entero(request, 'bodega'),
+            producto_id=_filtro_entero(request, 'producto'),
+        )
+        paginador = CustomPagination()
+        respuesta = paginador.get_paginated_response(paginador.paginate_queryset(grupos, request, view=self))
+        respuesta.data['totales'] = totales
+        return respuesta
+
+class SincronizacionDeltaView(APIView):
+    """
+    Feed de cambios para dispositivos con catálogo local (POS / handhelds de bodega).
+    GET ?desde=<marca ISO 8601>&sucursal=<id>&limite=<n>&cursor=<cursor>
+    Devuelve productos, filas de stock y promociones modificados después de 'desde', más
+    las eliminaciones del período. Si 'hay_mas' es True el cliente debe volver a llamar de
+    inmediato con el mismo 'desde' y el 'cursor' recibido; cuando 'hay_mas' es False guarda
+    'marca' y la envía como 'desde' en la siguiente sincronización. Si
+    'sincronizacion_completa' es True el cliente debe reemplazar sus datos locales.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    LIMITE_MAXIMO = 5000
+
+    def get(self, request, *args, **kwargs):
+        desde = None
+        desde_param = request.query_params.get('desde')
+        if desde_param:
+            desde = parse_datetime(desde_param.replace(' ', '+'))  # '+' llega como espacio si no se codifica
+            if desde is None:
+                raise ValidationError({"desde": "Formato de fecha inválido. Use ISO 8601."})
+            if timezone.is_naive(desde):
+                desde = timezone.make_aware(desde)
+
+        sucursal_id = request.query_params.get('sucursal')
+        if sucursal_id and not sucursal_id.isdigit():
+            raise ValidationError({"sucursal": "Debe ser un ID numérico."})
+
+        try:
+            limite = int(request.query_params.get('limite', LIMITE_SINCRONIZACION))
+        except ValueError:
+            raise ValidationError({"limite": "Debe ser un número entero."})
+        limite = max(1, min(limite, self.LIMITE_MAXIMO))
+
+        return Response(obtener_cambios_sincronizacion(desde, limite, sucursal_id, request.query_params.get('cursor')))
 
 class AjusteManualStockView(APIView):
     """
@@ -431,7 +569,8 @@ class AjusteManualStockView(APIView):
 
         inventario_sucursal, _ = InventarioSucursal.objects.get_or_create(sucursal=bodega.sucursal)
 
-        stock_detalle, _ = DetalleInventarioBodega.objects.get_or_create(
+        # Fila bloqueada: dos ajustes simultáneos no pueden partir del mismo stock y pisarse
+        stock_detalle, _ = DetalleInventarioBodega.objects.select_for_update().get_or_create(
             inventario_sucursal=inventario_sucursal,
             producto=producto,
             bodega=bodega,
@@ -452,4 +591,33 @@ class AjusteManualStockView(APIView):
         return Response(
             {'detail': 'Ajuste de stock realizado con éxito.', 'nuevo_stock': stock_detalle.cantidad},
             status=status.HTTP_200_OK
-        )
\ No newline at end of file
+        )
+
+
+class AjusteStockLoteView(APIView):
+    """
+    Ajuste manual de stock de muchos ítems en una sola petición (ej. recepción de un pallet
+    mixto). Recibe {"items": [{producto_identificador, bodega_id, cantidad, motivo}, ...]} y
+    responde el resultado de cada ítem. Si alguno es rechazado no se aplica ninguno (400),
+    salvo que se envíe "permitir_parcial": true.
+    """
+    permission_classes = [permissions.IsAuthenticated, (EsBodeguero | EsAdministrador)]
+
+    def post(self, request, *args, **kwargs):
+        serializer = AjusteStockLoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        resultado = aplicar_ajustes_stock_en_bloque(
+            serializer.validated_data['items'],
+            usuario=request.user,
+            permitir_parcial=serializer.validated_data['permitir_parcial'],
+        )
+        if not resultado['aplicado']:
+            return Response(resultado, status=status.HTTP_400_BAD_REQUEST)
+
+        crear_registro_actividad(
+            request.user, "AJUSTE_STOCK_LOTE",
+            f"Ajuste de stock en bloque: {resultado['items_aplicados']} ítems aplicados, "
+            f"{resultado['items_rechazados']} rechazados.",
+            request=request,
+        )
+        return Response(resultado, status=status.HTTP_200_OK)
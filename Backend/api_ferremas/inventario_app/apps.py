@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class InventarioAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventario_app'
+
+    def ready(self):
+        import inventario_app.signals # Importar las señales para que se registren
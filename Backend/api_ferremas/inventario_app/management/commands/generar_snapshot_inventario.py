@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from inventario_app.models import SnapshotInventario
+from inventario_app.services import reclamar_snapshot_inventario, generar_snapshot_inventario
+
+
+class Command(BaseCommand):
+    help = 'Genera los snapshots de inventario pendientes (o uno nuevo con --crear, ej. desde el cron de cierre de mes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--crear', action='store_true', help='Crear un snapshot nuevo y generarlo de inmediato.')
+        parser.add_argument('--descripcion', default='', help='Descripción del snapshot creado con --crear.')
+        parser.add_argument(
+            '--incluir-interrumpidos', action='store_true',
+            help='Retomar también snapshots que quedaron en PROCESANDO (ej. tras una caída del worker).'
+        )
+
+    def handle(self, *args, **options):
+        if options['crear']:
+            SnapshotInventario.objects.create(descripcion=options['descripcion'])
+
+        estados = [SnapshotInventario.EstadoSnapshot.PENDIENTE]
+        if options['incluir_interrumpidos']:
+            estados.append(SnapshotInventario.EstadoSnapshot.PROCESANDO)
+        pendientes = SnapshotInventario.objects.filter(estado__in=estados).order_by('fecha_creacion')
+
+        for snapshot_id in pendientes.values_list('id', flat=True):
+            snapshot = reclamar_snapshot_inventario(snapshot_id, options['incluir_interrumpidos'])
+            if snapshot is None:
+                continue  # Otro worker lo tomó
+            self.stdout.write(f'Generando snapshot #{snapshot.id}...')
+            snapshot = generar_snapshot_inventario(snapshot)
+            if snapshot.estado == SnapshotInventario.EstadoSnapshot.FALLIDO:
+                self.stdout.write(self.style.ERROR(f'Snapshot #{snapshot.id} falló: {snapshot.mensaje_error}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Snapshot #{snapshot.id}: {snapshot.total_filas} filas, {snapshot.total_unidades} unidades '
+                    f'al {timezone.localtime(snapshot.fecha_corte):%Y-%m-%d %H:%M:%S} ({snapshot.archivo.name}).'
+                ))
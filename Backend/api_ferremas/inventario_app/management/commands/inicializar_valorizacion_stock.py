@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from inventario_app.services import inicializar_valorizacion_stock
+
+
+class Command(BaseCommand):
+    help = ('Crea capas de saldo inicial para el stock aún no valorizado, al costo promedio vigente '
+            'del producto o al precio de su última compra')
+
+    def handle(self, *args, **options):
+        resumen = inicializar_valorizacion_stock()
+        self.stdout.write(self.style.SUCCESS(
+            f"Valorización inicializada: {resumen['filas_inicializadas']} filas, "
+            f"{resumen['unidades_inicializadas']} unidades."
+        ))
+        if resumen['productos_sin_costo']:
+            self.stdout.write(self.style.WARNING(
+                f"{len(resumen['productos_sin_costo'])} productos sin costo de referencia quedaron a costo 0: "
+                f"{', '.join(map(str, resumen['productos_sin_costo'][:50]))}"
+            ))
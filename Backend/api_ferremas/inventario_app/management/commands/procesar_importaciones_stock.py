@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from inventario_app.services import importaciones_reclamables, reclamar_importacion_stock, procesar_importacion_stock
+
+
+class Command(BaseCommand):
+    help = 'Procesa por lotes las importaciones de stock pendientes (worker de cargas masivas)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--id', type=int, help='Procesar solo la importación con este ID.')
+        parser.add_argument('--loop', action='store_true', help='Quedar escuchando nuevas importaciones.')
+        parser.add_argument('--intervalo', type=float, default=5.0, help='Segundos de espera entre revisiones en modo --loop.')
+        parser.add_argument(
+            '--incluir-interrumpidas', action='store_true',
+            help='Retomar también importaciones en PROCESANDO sin avances recientes (ej. tras una caída del worker).'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            procesadas = self._procesar_pendientes(options)
+            if not options['loop']:
+                break
+            if not procesadas:
+                time.sleep(options['intervalo'])
+
+        self.stdout.write(self.style.SUCCESS('Worker de importaciones de stock finalizado.'))
+
+    def _procesar_pendientes(self, options):
+        pendientes = importaciones_reclamables(options['incluir_interrumpidas']).order_by('fecha_creacion')
+        if options['id']:
+            pendientes = pendientes.filter(id=options['id'])
+
+        procesadas = 0
+        for importacion_id in pendientes.values_list('id', flat=True):
+            importacion = reclamar_importacion_stock(importacion_id, options['incluir_interrumpidas'])
+            if importacion is None:
+                continue  # Otro worker la tomó
+            self.stdout.write(f'Procesando importación #{importacion.id} ({importacion.nombre_archivo_original})...')
+            importacion = procesar_importacion_stock(importacion)
+            procesadas += 1
+            self.stdout.write(
+                f'Importación #{importacion.id}: {importacion.get_estado_display()}. '
+                f'{importacion.filas_procesadas} filas procesadas, {importacion.filas_fallidas} con error.'
+            )
+        return procesadas
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from inventario_app.services import purgar_registros_eliminacion, RETENCION_ELIMINACIONES
+
+
+class Command(BaseCommand):
+    help = 'Elimina las marcas de borrado de la sincronización incremental más antiguas que la retención'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=int, default=RETENCION_ELIMINACIONES.days,
+            help='Días de retención (mínimo: la retención usada por el endpoint de sincronización).'
+        )
+
+    def handle(self, *args, **options):
+        if options['dias'] < RETENCION_ELIMINACIONES.days:
+            # Los clientes con marcas dentro de la retención perderían eliminaciones
+            raise CommandError(f'La retención mínima es de {RETENCION_ELIMINACIONES.days} días.')
+        eliminados = purgar_registros_eliminacion(timedelta(days=options['dias']))
+        self.stdout.write(self.style.SUCCESS(f'{eliminados} registros de eliminación purgados.'))
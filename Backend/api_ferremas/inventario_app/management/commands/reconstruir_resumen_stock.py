@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from inventario_app.models import ResumenStockSucursal, ResumenStockProducto
+from inventario_app.services import reconstruir_resumen_stock
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde cero los resúmenes de stock (por sucursal y por producto) a partir del stock en bodegas'
+
+    def handle(self, *args, **options):
+        reconstruir_resumen_stock()
+        self.stdout.write(self.style.SUCCESS(
+            f'Resumen reconstruido: {ResumenStockProducto.objects.count()} productos, '
+            f'{ResumenStockSucursal.objects.count()} registros por sucursal.'
+        ))
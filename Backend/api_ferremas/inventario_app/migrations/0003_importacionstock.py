@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario_app', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportacionStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('archivo', models.FileField(upload_to='importaciones_stock/%Y/%m/', verbose_name='Archivo de Stock')),
+                ('nombre_archivo_original', models.CharField(max_length=255, verbose_name='Nombre Original del Archivo')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('COMPLETADO', 'Completado'), ('COMPLETADO_CON_ERRORES', 'Completado con Errores'), ('FALLIDO', 'Fallido')], default='PENDIENTE', max_length=25, verbose_name='Estado de la Importación')),
+                ('tamano_lote', models.PositiveIntegerField(default=5000, verbose_name='Filas por Lote')),
+                ('total_filas', models.PositiveIntegerField(blank=True, null=True, verbose_name='Total de Filas')),
+                ('filas_procesadas', models.PositiveIntegerField(default=0, verbose_name='Filas Procesadas')),
+                ('filas_fallidas', models.PositiveIntegerField(default=0, verbose_name='Filas con Error')),
+                ('lotes_completados', models.PositiveIntegerField(default=0, verbose_name='Lotes Completados')),
+                ('errores', models.JSONField(blank=True, default=list, verbose_name='Errores por Fila (muestra)')),
+                ('mensaje_error', models.TextField(blank=True, null=True, verbose_name='Error del Proceso')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True, verbose_name='Inicio del Procesamiento')),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fin del Procesamiento')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, verbose_name='Última Actualización')),
+                ('creado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='importaciones_stock', to=settings.AUTH_USER_MODEL, verbose_name='Creado Por')),
+            ],
+            options={
+                'verbose_name': 'Importación de Stock',
+                'verbose_name_plural': 'Importaciones de Stock',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['estado', 'fecha_creacion'], name='inventario__estado_6dceac_idx')],
+            },
+        ),
+    ]
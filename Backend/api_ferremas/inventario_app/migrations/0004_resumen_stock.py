@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum, Min
+
+
+def poblar_resumen_stock(apps, schema_editor):
+    DetalleInventarioBodega = apps.get_model('inventario_app', 'DetalleInventarioBodega')
+    ResumenStockSucursal = apps.get_model('inventario_app', 'ResumenStockSucursal')
+    ResumenStockProducto = apps.get_model('inventario_app', 'ResumenStockProducto')
+
+    por_sucursal = DetalleInventarioBodega.objects.values('producto_id', 'bodega__sucursal_id').annotate(
+        total=Sum('cantidad'), umbral=Min('stock_minimo')
+    ).order_by()
+    ResumenStockSucursal.objects.bulk_create([
+        ResumenStockSucursal(
+            producto_id=fila['producto_id'], sucursal_id=fila['bodega__sucursal_id'],
+            cantidad_total=fila['total'] or 0, umbral_minimo=fila['umbral'],
+            holgura=(fila['total'] or 0) - (fila['umbral'] or 0),
+        )
+        for fila in por_sucursal
+    ], batch_size=1000)
+
+    por_producto = DetalleInventarioBodega.objects.values('producto_id').annotate(
+        total=Sum('cantidad'), umbral=Min('stock_minimo')
+    ).order_by()
+    ResumenStockProducto.objects.bulk_create([
+        ResumenStockProducto(
+            producto_id=fila['producto_id'],
+            cantidad_total=fila['total'] or 0, umbral_minimo=fila['umbral'],
+            holgura=(fila['total'] or 0) - (fila['umbral'] or 0),
+        )
+        for fila in por_producto
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario_app', '0003_importacionstock'),
+        ('producto_app', '0001_initial'),
+        ('sucursal_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenStockProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad_total', models.IntegerField(default=0, verbose_name='Stock Total')),
+                ('umbral_minimo', models.PositiveIntegerField(blank=True, null=True, verbose_name='Umbral Mínimo (menor stock mínimo)')),
+                ('holgura', models.IntegerField(default=0, verbose_name='Holgura (stock - umbral)')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, verbose_name='Última Actualización')),
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='resumen_stock', to='producto_app.producto')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Stock por Producto',
+                'verbose_name_plural': 'Resúmenes de Stock por Producto',
+                'ordering': ['holgura', 'producto__nombre'],
+                'indexes': [models.Index(fields=['holgura'], name='resumen_prod_holgura_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenStockSucursal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad_total', models.IntegerField(default=0, verbose_name='Stock Total en Sucursal')),
+                ('umbral_minimo', models.PositiveIntegerField(blank=True, null=True, verbose_name='Umbral Mínimo (menor stock mínimo)')),
+                ('holgura', models.IntegerField(default=0, verbose_name='Holgura (stock - umbral)')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, verbose_name='Última Actualización')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumen_stock_sucursales', to='producto_app.producto')),
+                ('sucursal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumen_stock', to='sucursal_app.sucursal')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Stock por Sucursal',
+                'verbose_name_plural': 'Resúmenes de Stock por Sucursal',
+                'ordering': ['holgura', 'producto__nombre'],
+                'indexes': [models.Index(fields=['sucursal', 'holgura'], name='resumen_suc_holgura_idx')],
+                'unique_together': {('producto', 'sucursal')},
+            },
+        ),
+        migrations.RunPython(poblar_resumen_stock, migrations.RunPython.noop),
+    ]
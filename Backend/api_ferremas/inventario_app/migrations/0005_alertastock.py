@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario_app', '0004_resumen_stock'),
+        ('producto_app', '0001_initial'),
+        ('sucursal_app', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('BAJO_MINIMO', 'Stock bajo el mínimo'), ('SOBRE_MAXIMO', 'Stock sobre el máximo')], max_length=20, verbose_name='Tipo de Alerta')),
+                ('estado', models.CharField(choices=[('ACTIVA', 'Activa'), ('RESUELTA', 'Resuelta')], default='ACTIVA', max_length=20, verbose_name='Estado')),
+                ('cantidad', models.IntegerField(verbose_name='Cantidad al Detectar')),
+                ('umbral', models.PositiveIntegerField(verbose_name='Umbral Cruzado')),
+                ('cantidad_resolucion', models.IntegerField(blank=True, null=True, verbose_name='Cantidad al Resolver')),
+                ('fecha_revision', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Revisión')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_resolucion', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Resolución')),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertas_stock', to='sucursal_app.bodega')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertas_stock', to='producto_app.producto')),
+                ('revisada_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='alertas_stock_revisadas', to=settings.AUTH_USER_MODEL, verbose_name='Revisada Por')),
+            ],
+            options={
+                'verbose_name': 'Alerta de Stock',
+                'verbose_name_plural': 'Alertas de Stock',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['estado', 'fecha_creacion'], name='inventario__estado_55f7ee_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('estado', 'ACTIVA')), fields=('producto', 'bodega', 'tipo'), name='alerta_stock_activa_unica')],
+            },
+        ),
+    ]
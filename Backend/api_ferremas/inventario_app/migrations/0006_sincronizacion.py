@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario_app', '0005_alertastock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroEliminacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entidad', models.CharField(choices=[('PRODUCTO', 'Producto'), ('STOCK', 'Stock en Bodega'), ('PROMOCION', 'Promoción')], max_length=20, verbose_name='Entidad')),
+                ('objeto_id', models.PositiveBigIntegerField(verbose_name='ID del Objeto Eliminado')),
+                ('datos', models.JSONField(blank=True, default=dict, verbose_name='Claves Adicionales')),
+                ('fecha_eliminacion', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Fecha de Eliminación')),
+            ],
+            options={
+                'verbose_name': 'Registro de Eliminación',
+                'verbose_name_plural': 'Registros de Eliminación',
+                'ordering': ['fecha_eliminacion'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='detalleinventariobodega',
+            name='ultima_actualizacion',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Última Actualización'),
+        ),
+    ]
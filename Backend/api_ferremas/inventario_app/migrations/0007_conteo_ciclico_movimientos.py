@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario_app', '0006_sincronizacion'),
+        ('producto_app', '0002_producto_fecha_actualizacion_index'),
+        ('sucursal_app', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConteoCiclico',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('motivo', models.CharField(blank=True, max_length=255, verbose_name='Motivo / Observaciones')),
+                ('conteo_completo', models.BooleanField(default=True, help_text='Si es completo, los productos de la bodega que no aparecen en el conteo quedan en cero.', verbose_name='¿Conteo Completo?')),
+                ('total_lineas', models.PositiveIntegerField(default=0, verbose_name='Productos Comparados')),
+                ('lineas_con_diferencia', models.PositiveIntegerField(default=0, verbose_name='Productos con Diferencia')),
+                ('unidades_sobrantes', models.PositiveIntegerField(default=0, verbose_name='Unidades Sobrantes')),
+                ('unidades_faltantes', models.PositiveIntegerField(default=0, verbose_name='Unidades Faltantes')),
+                ('valor_diferencia', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Valor Neto de la Diferencia')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha del Conteo')),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='conteos_ciclicos', to='sucursal_app.bodega', verbose_name='Bodega')),
+                ('realizado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='conteos_ciclicos', to=settings.AUTH_USER_MODEL, verbose_name='Realizado Por')),
+            ],
+            options={
+                'verbose_name': 'Conteo Cíclico',
+                'verbose_name_plural': 'Conteos Cíclicos',
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('CONTEO_CICLICO', 'Ajuste por Conteo Cíclico'), ('AJUSTE_MANUAL', 'Ajuste Manual')], max_length=30, verbose_name='Tipo de Movimiento')),
+                ('cantidad', models.IntegerField(verbose_name='Cantidad (+/-)')),
+                ('cantidad_anterior', models.PositiveIntegerField(verbose_name='Stock Anterior')),
+                ('cantidad_resultante', models.PositiveIntegerField(verbose_name='Stock Resultante')),
+                ('motivo', models.CharField(blank=True, max_length=255, verbose_name='Motivo')),
+                ('fecha', models.DateTimeField(auto_now_add=True, verbose_name='Fecha')),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos_stock', to='sucursal_app.bodega')),
+                ('conteo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='inventario_app.conteociclico', verbose_name='Conteo Cíclico')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos_stock', to='producto_app.producto')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_stock', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Movimiento de Stock',
+                'verbose_name_plural': 'Movimientos de Stock',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['producto', 'bodega', 'fecha'], name='inventario__product_c22984_idx')],
+            },
+        ),
+    ]
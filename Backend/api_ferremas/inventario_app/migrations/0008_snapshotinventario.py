@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario_app', '0007_conteo_ciclico_movimientos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('descripcion', models.CharField(blank=True, help_text='Ej: Cierre septiembre 2026', max_length=255, verbose_name='Descripción')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('COMPLETADO', 'Completado'), ('FALLIDO', 'Fallido')], default='PENDIENTE', max_length=15, verbose_name='Estado')),
+                ('fecha_corte', models.DateTimeField(blank=True, help_text='Instante al que corresponde el stock leído.', null=True, verbose_name='Fecha de Corte')),
+                ('archivo', models.FileField(blank=True, upload_to='snapshots_inventario/%Y/%m/', verbose_name='Archivo (CSV comprimido)')),
+                ('tamano_bytes', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Tamaño del Archivo')),
+                ('checksum_sha256', models.CharField(blank=True, max_length=64, verbose_name='SHA-256 del Archivo')),
+                ('total_filas', models.PositiveIntegerField(blank=True, null=True, verbose_name='Filas')),
+                ('total_unidades', models.BigIntegerField(blank=True, null=True, verbose_name='Unidades Totales')),
+                ('valor_total', models.DecimalField(blank=True, decimal_places=2, max_digits=16, null=True, verbose_name='Valor Total (a precio de venta)')),
+                ('totales_por_sucursal', models.JSONField(blank=True, default=dict, verbose_name='Totales por Sucursal')),
+                ('mensaje_error', models.TextField(blank=True, null=True, verbose_name='Error del Proceso')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True, verbose_name='Inicio del Procesamiento')),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fin del Procesamiento')),
+                ('creado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='snapshots_inventario', to=settings.AUTH_USER_MODEL, verbose_name='Creado Por')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Inventario',
+                'verbose_name_plural': 'Snapshots de Inventario',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['estado', 'fecha_corte'], name='inventario__estado_ca5f21_idx')],
+            },
+        ),
+    ]
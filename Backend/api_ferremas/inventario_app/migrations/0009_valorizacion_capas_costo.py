@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario_app', '0008_snapshotinventario'),
+        ('producto_app', '0002_producto_fecha_actualizacion_index'),
+        ('sucursal_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CapaCosto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad_restante', models.PositiveIntegerField(verbose_name='Cantidad Restante')),
+                ('costo_unitario', models.DecimalField(decimal_places=4, max_digits=14, verbose_name='Costo Unitario')),
+                ('origen', models.CharField(choices=[('COMPRA', 'Recepción de Compra'), ('TRASPASO', 'Ingreso sin Costo Propio (traspaso, ajuste)'), ('INICIAL', 'Saldo Inicial')], max_length=10, verbose_name='Origen')),
+                ('fecha_ingreso', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Ingreso')),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='capas_costo', to='sucursal_app.bodega')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='capas_costo', to='producto_app.producto')),
+            ],
+            options={
+                'verbose_name': 'Capa de Costo',
+                'verbose_name_plural': 'Capas de Costo',
+                'ordering': ['producto', 'bodega', 'id'],
+                'indexes': [models.Index(fields=['producto', 'bodega', 'id'], name='capa_costo_fifo_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ValorizacionStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField(default=0, verbose_name='Cantidad Valorizada')),
+                ('costo_promedio', models.DecimalField(decimal_places=4, default=0, max_digits=14, verbose_name='Costo Promedio Ponderado')),
+                ('valor_promedio', models.DecimalField(decimal_places=4, default=0, max_digits=18, verbose_name='Valor (Promedio Ponderado)')),
+                ('valor_fifo', models.DecimalField(decimal_places=4, default=0, max_digits=18, verbose_name='Valor (FIFO)')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, verbose_name='Última Actualización')),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='valorizaciones_stock', to='sucursal_app.bodega')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='valorizaciones_stock', to='producto_app.producto')),
+            ],
+            options={
+                'verbose_name': 'Valorización de Stock',
+                'verbose_name_plural': 'Valorizaciones de Stock',
+                'indexes': [models.Index(fields=['bodega'], name='valorizacion_bodega_idx')],
+                'unique_together': {('producto', 'bodega')},
+            },
+        ),
+    ]
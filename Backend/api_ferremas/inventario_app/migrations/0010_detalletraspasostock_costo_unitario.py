@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario_app', '0009_valorizacion_capas_costo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detalletraspasostock',
+            name='costo_unitario',
+            field=models.DecimalField(blank=True, decimal_places=4, help_text='Costo FIFO de lo que salió de la bodega de origen; el ingreso en destino se valoriza a este costo.', max_digits=14, null=True, verbose_name='Costo Unitario de Salida'),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from producto_app.models import Producto
 from sucursal_app.models import Sucursal, Bodega
 from django.conf import settings # Para la ForeignKey a User (Personal)
@@ -78,7 +78,7 @@ class DetalleInventarioBodega(models.Model):
     cantidad = models.PositiveIntegerField(default=0, verbose_name="Cantidad en Stock")
     stock_minimo = models.PositiveIntegerField(null=True, blank=True, verbose_name="Stock Mínimo")
     stock_maximo = models.PositiveIntegerField(null=True, blank=True, verbose_name="Stock Máximo")
-    ultima_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Última Actualización")
+    ultima_actualizacion = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Última Actualización")
 
     class Meta:
         verbose_name = "Detalle de Stock en Bodega"
@@ -88,9 +88,18 @@ class DetalleInventarioBodega(models.Model):
         unique_together = ('inventario_sucursal', 'producto', 'bodega')
         ordering = ['inventario_sucursal', 'bodega', 'producto']
 
+    CAMPOS_STOCK = ('cantidad', 'stock_minimo', 'stock_maximo')
+
     def __str__(self):
         return f"{self.cantidad} x {self.producto.nombre} en Bodega {self.bodega.tipo_bodega.tipo} (Suc: {self.inventario_sucursal.sucursal.nombre})"
 
+    def save(self, *args, **kwargs):
+        # Atómico para que la señal pre_save pueda bloquear la fila al leer los valores anteriores:
+        # dos instancias desactualizadas que se guardan una sobre otra calculan su diferencia contra
+        # lo que realmente está en la base y el resumen no se desvía
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class TraspasoInternoStock(models.Model):
     # id_pedido_interno es automático (id)
@@ -181,6 +190,10 @@ class DetalleTraspasoStock(models.Model):
     cantidad_solicitada = models.PositiveIntegerField(verbose_name="Cantidad Solicitada")
     cantidad_enviada = models.PositiveIntegerField(null=True, blank=True, verbose_name="Cantidad Enviada")
     cantidad_recibida = models.PositiveIntegerField(null=True, blank=True, verbose_name="Cantidad Recibida")
+    costo_unitario = models.DecimalField(
+        max_digits=14, decimal_places=4, null=True, blank=True, verbose_name="Costo Unitario de Salida",
+        help_text="Costo FIFO de lo que salió de la bodega de origen; el ingreso en destino se valoriza a este costo."
+    )
     
     # Bodegas específicas para este ítem del traspaso.
     # Asumimos que estas bodegas pertenecen a sucursal_origen y sucursal_destino del Traspaso padre.
@@ -202,4 +215,347 @@ class DetalleTraspasoStock(models.Model):
         unique_together = ('traspaso', 'producto') # Para no repetir el mismo producto en un traspaso
 
     def __str__(self):
-        return f"{self.cantidad_solicitada} x {self.producto.nombre} (Traspaso ID: {self.traspaso.id})"
\ No newline at end of file
+        return f"{self.cantidad_solicitada} x {self.producto.nombre} (Traspaso ID: {self.traspaso.id})"
+
+class ImportacionStock(models.Model):
+    """
+    Trabajo asíncrono de carga masiva de stock. El archivo se guarda en disco al subirlo
+    y un worker (comando procesar_importaciones_stock) lo procesa por lotes,
+    confirmando cada lote y registrando el avance para poder reanudar tras un fallo.
+    """
+    class EstadoImportacion(models.TextChoices):
+        PENDIENTE = 'PENDIENTE', 'Pendiente'
+        PROCESANDO = 'PROCESANDO', 'Procesando'
+        COMPLETADO = 'COMPLETADO', 'Completado'
+        COMPLETADO_CON_ERRORES = 'COMPLETADO_CON_ERRORES', 'Completado con Errores'
+        FALLIDO = 'FALLIDO', 'Fallido'
+
+    archivo = models.FileField(upload_to='importaciones_stock/%Y/%m/', verbose_name="Archivo de Stock")
+    nombre_archivo_original = models.CharField(max_length=255, verbose_name="Nombre Original del Archivo")
+    estado = models.CharField(
+        max_length=25,
+        choices=EstadoImportacion.choices,
+        default=EstadoImportacion.PENDIENTE,
+        verbose_name="Estado de la Importación"
+    )
+    tamano_lote = models.PositiveIntegerField(default=5000, verbose_name="Filas por Lote")
+    total_filas = models.PositiveIntegerField(null=True, blank=True, verbose_name="Total de Filas")
+    filas_procesadas = models.PositiveIntegerField(default=0, verbose_name="Filas Procesadas")
+    filas_fallidas = models.PositiveIntegerField(default=0, verbose_name="Filas con Error")
+    lotes_completados = models.PositiveIntegerField(default=0, verbose_name="Lotes Completados")
+    errores = models.JSONField(default=list, blank=True, verbose_name="Errores por Fila (muestra)")
+    mensaje_error = models.TextField(blank=True, null=True, verbose_name="Error del Proceso")
+
+    creado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name="importaciones_stock",
+        verbose_name="Creado Por"
+    )
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
+    fecha_inicio = models.DateTimeField(null=True, blank=True, verbose_name="Inicio del Procesamiento")
+    fecha_fin = models.DateTimeField(null=True, blank=True, verbose_name="Fin del Procesamiento")
+    fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Última Actualización")
+
+    class Meta:
+        verbose_name = "Importación de Stock"
+        verbose_name_plural = "Importaciones de Stock"
+        ordering = ['-fecha_creacion']
+        indexes = [models.Index(fields=['estado', 'fecha_creacion'])]
+
+    def __str__(self):
+        return f"Importación #{self.id} - {self.nombre_archivo_original} ({self.get_estado_display()})"
+
+    @property
+    def filas_restantes(self):
+        if self.total_filas is None:
+            return None
+        return max(self.total_filas - self.filas_procesadas - self.filas_fallidas, 0)
+
+
+class ResumenStockSucursal(models.Model):
+    """
+    Stock agregado por (producto, sucursal), mantenido por deltas desde la señal
+    stock_modificado. Evita recalcular SUM/MIN sobre DetalleInventarioBodega en cada consulta.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="resumen_stock_sucursales")
+    sucursal = models.ForeignKey(Sucursal, on_delete=models.CASCADE, related_name="resumen_stock")
+    cantidad_total = models.IntegerField(default=0, verbose_name="Stock Total en Sucursal")
+    umbral_minimo = models.PositiveIntegerField(null=True, blank=True, verbose_name="Umbral Mínimo (menor stock mínimo)")
+    holgura = models.IntegerField(default=0, verbose_name="Holgura (stock - umbral)")
+    fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Última Actualización")
+
+    class Meta:
+        verbose_name = "Resumen de Stock por Sucursal"
+        verbose_name_plural = "Resúmenes de Stock por Sucursal"
+        unique_together = ('producto', 'sucursal')
+        ordering = ['holgura', 'producto__nombre']
+        indexes = [models.Index(fields=['sucursal', 'holgura'], name='resumen_suc_holgura_idx')]
+
+    def __str__(self):
+        return f"{self.producto.nombre} en {self.sucursal.nombre}: {self.cantidad_total}"
+
+
+class ResumenStockProducto(models.Model):
+    """Stock agregado de un producto en todas las sucursales, mantenido por deltas."""
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, related_name="resumen_stock")
+    cantidad_total = models.IntegerField(default=0, verbose_name="Stock Total")
+    umbral_minimo = models.PositiveIntegerField(null=True, blank=True, verbose_name="Umbral Mínimo (menor stock mínimo)")
+    holgura = models.IntegerField(default=0, verbose_name="Holgura (stock - umbral)")
+    fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Última Actualización")
+
+    class Meta:
+        verbose_name = "Resumen de Stock por Producto"
+        verbose_name_plural = "Resúmenes de Stock por Producto"
+        ordering = ['holgura', 'producto__nombre']
+        indexes = [models.Index(fields=['holgura'], name='resumen_prod_holgura_idx')]
+
+    def __str__(self):
+        return f"{self.producto.nombre}: {self.cantidad_total}"
+
+
+class AlertaStock(models.Model):
+    """
+    Alerta generada cuando el stock de un producto en una bodega cruza su stock mínimo
+    o máximo. Solo puede existir una alerta ACTIVA por (producto, bodega, tipo); al volver
+    el stock a rango la alerta pasa a RESUELTA.
+    """
+    class TipoAlerta(models.TextChoices):
+        BAJO_MINIMO = 'BAJO_MINIMO', 'Stock bajo el mínimo'
+        SOBRE_MAXIMO = 'SOBRE_MAXIMO', 'Stock sobre el máximo'
+
+    class EstadoAlerta(models.TextChoices):
+        ACTIVA = 'ACTIVA', 'Activa'
+        RESUELTA = 'RESUELTA', 'Resuelta'
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="alertas_stock")
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name="alertas_stock")
+    tipo = models.CharField(max_length=20, choices=TipoAlerta.choices, verbose_name="Tipo de Alerta")
+    estado = models.CharField(
+        max_length=20, choices=EstadoAlerta.choices, default=EstadoAlerta.ACTIVA, verbose_name="Estado"
+    )
+    cantidad = models.IntegerField(verbose_name="Cantidad al Detectar")
+    umbral = models.PositiveIntegerField(verbose_name="Umbral Cruzado")
+    cantidad_resolucion = models.IntegerField(null=True, blank=True, verbose_name="Cantidad al Resolver")
+    revisada_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name="alertas_stock_revisadas",
+        verbose_name="Revisada Por"
+    )
+    fecha_revision = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de Revisión")
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
+    fecha_resolucion = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de Resolución")
+
+    class Meta:
+        verbose_name = "Alerta de Stock"
+        verbose_name_plural = "Alertas de Stock"
+        ordering = ['-fecha_creacion']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['producto', 'bodega', 'tipo'],
+                condition=models.Q(estado='ACTIVA'),
+                name='alerta_stock_activa_unica',
+            ),
+        ]
+        indexes = [models.Index(fields=['estado', 'fecha_creacion'])]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()}: {self.producto.nombre} en bodega {self.bodega_id} ({self.get_estado_display()})"
+
+
+class RegistroEliminacion(models.Model):
+    """
+    Marca de borrado ("tombstone") para la sincronización incremental de dispositivos:
+    al eliminar un producto, una fila de stock o una promoción se registra aquí para
+    que los clientes que sincronizan por marca de tiempo también la borren localmente.
+    """
+    class Entidad(models.TextChoices):
+        PRODUCTO = 'PRODUCTO', 'Producto'
+        STOCK = 'STOCK', 'Stock en Bodega'
+        PROMOCION = 'PROMOCION', 'Promoción'
+
+    entidad = models.CharField(max_length=20, choices=Entidad.choices, verbose_name="Entidad")
+    objeto_id = models.PositiveBigIntegerField(verbose_name="ID del Objeto Eliminado")
+    datos = models.JSONField(default=dict, blank=True, verbose_name="Claves Adicionales")
+    fecha_eliminacion = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Fecha de Eliminación")
+
+    class Meta:
+        verbose_name = "Registro de Eliminación"
+        verbose_name_plural = "Registros de Eliminación"
+        ordering = ['fecha_eliminacion']
+
+    def __str__(self):
+        return f"{self.get_entidad_display()} #{self.objeto_id} eliminado"
+
+
+class ConteoCiclico(models.Model):
+    """Conteo físico de una bodega aplicado en bloque, con el resumen de sus diferencias."""
+    bodega = models.ForeignKey(Bodega, on_delete=models.PROTECT, related_name="conteos_ciclicos", verbose_name="Bodega")
+    realizado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name="conteos_ciclicos",
+        verbose_name="Realizado Por"
+    )
+    motivo = models.CharField(max_length=255, blank=True, verbose_name="Motivo / Observaciones")
+    conteo_completo = models.BooleanField(
+        default=True, verbose_name="¿Conteo Completo?",
+        help_text="Si es completo, los productos de la bodega que no aparecen en el conteo quedan en cero."
+    )
+    total_lineas = models.PositiveIntegerField(default=0, verbose_name="Productos Comparados")
+    lineas_con_diferencia = models.PositiveIntegerField(default=0, verbose_name="Productos con Diferencia")
+    unidades_sobrantes = models.PositiveIntegerField(default=0, verbose_name="Unidades Sobrantes")
+    unidades_faltantes = models.PositiveIntegerField(default=0, verbose_name="Unidades Faltantes")
+    valor_diferencia = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Valor Neto de la Diferencia")
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha del Conteo")
+
+    class Meta:
+        verbose_name = "Conteo Cíclico"
+        verbose_name_plural = "Conteos Cíclicos"
+        ordering = ['-fecha_creacion']
+
+    def __str__(self):
+        return f"Conteo #{self.id} - Bodega {self.bodega_id} ({self.lineas_con_diferencia} diferencias)"
+
+
+class MovimientoStock(models.Model):
+    """Libro de movimientos de stock: cada ajuste deja la cantidad anterior, el delta y la resultante."""
+    class TipoMovimiento(models.TextChoices):
+        CONTEO_CICLICO = 'CONTEO_CICLICO', 'Ajuste por Conteo Cíclico'
+        AJUSTE_MANUAL = 'AJUSTE_MANUAL', 'Ajuste Manual'
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="movimientos_stock")
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name="movimientos_stock")
+    tipo = models.CharField(max_length=30, choices=TipoMovimiento.choices, verbose_name="Tipo de Movimiento")
+    cantidad = models.IntegerField(verbose_name="Cantidad (+/-)")
+    cantidad_anterior = models.PositiveIntegerField(verbose_name="Stock Anterior")
+    cantidad_resultante = models.PositiveIntegerField(verbose_name="Stock Resultante")
+    motivo = models.CharField(max_length=255, blank=True, verbose_name="Motivo")
+    conteo = models.ForeignKey(
+        ConteoCiclico, on_delete=models.CASCADE, null=True, blank=True,
+        related_name="movimientos", verbose_name="Conteo Cíclico"
+    )
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name="movimientos_stock",
+        verbose_name="Usuario"
+    )
+    fecha = models.DateTimeField(auto_now_add=True, verbose_name="Fecha")
+
+    class Meta:
+        verbose_name = "Movimiento de Stock"
+        verbose_name_plural = "Movimientos de Stock"
+        ordering = ['-fecha']
+        indexes = [models.Index(fields=['producto', 'bodega', 'fecha'])]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()}: {self.cantidad:+d} {self.producto.nombre} (Bodega {self.bodega_id})"
+
+
+class SnapshotInventario(models.Model):
+    """
+    Foto del inventario completo en un instante (ej. cierre de mes). El worker
+    (comando generar_snapshot_inventario) lee todo DetalleInventarioBodega en una sola
+    transacción de lectura consistente y lo guarda como CSV comprimido; las consultas
+    históricas leen ese archivo en vez de las tablas vivas.
+    """
+    class EstadoSnapshot(models.TextChoices):
+        PENDIENTE = 'PENDIENTE', 'Pendiente'
+        PROCESANDO = 'PROCESANDO', 'Procesando'
+        COMPLETADO = 'COMPLETADO', 'Completado'
+        FALLIDO = 'FALLIDO', 'Fallido'
+
+    descripcion = models.CharField(max_length=255, blank=True, verbose_name="Descripción", help_text="Ej: Cierre septiembre 2026")
+    estado = models.CharField(
+        max_length=15,
+        choices=EstadoSnapshot.choices,
+        default=EstadoSnapshot.PENDIENTE,
+        verbose_name="Estado"
+    )
+    fecha_corte = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de Corte", help_text="Instante al que corresponde el stock leído.")
+    archivo = models.FileField(upload_to='snapshots_inventario/%Y/%m/', blank=True, verbose_name="Archivo (CSV comprimido)")
+    tamano_bytes = models.PositiveBigIntegerField(null=True, blank=True, verbose_name="Tamaño del Archivo")
+    checksum_sha256 = models.CharField(max_length=64, blank=True, verbose_name="SHA-256 del Archivo")
+    total_filas = models.PositiveIntegerField(null=True, blank=True, verbose_name="Filas")
+    total_unidades = models.BigIntegerField(null=True, blank=True, verbose_name="Unidades Totales")
+    valor_total = models.DecimalField(max_digits=16, decimal_places=2, null=True, blank=True, verbose_name="Valor Total (a precio de venta)")
+    totales_por_sucursal = models.JSONField(default=dict, blank=True, verbose_name="Totales por Sucursal")
+    mensaje_error = models.TextField(blank=True, null=True, verbose_name="Error del Proceso")
+
+    creado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name="snapshots_inventario",
+        verbose_name="Creado Por"
+    )
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
+    fecha_inicio = models.DateTimeField(null=True, blank=True, verbose_name="Inicio del Procesamiento")
+    fecha_fin = models.DateTimeField(null=True, blank=True, verbose_name="Fin del Procesamiento")
+
+    class Meta:
+        verbose_name = "Snapshot de Inventario"
+        verbose_name_plural = "Snapshots de Inventario"
+        ordering = ['-fecha_creacion']
+        indexes = [models.Index(fields=['estado', 'fecha_corte'])]
+
+    def __str__(self):
+        return f"Snapshot #{self.id} - {self.descripcion or self.fecha_corte} ({self.get_estado_display()})"
+
+
+class CapaCosto(models.Model):
+    """
+    Capa de costo FIFO de un (producto, bodega): unidades que entraron juntas a un mismo
+    costo unitario. Se consumen de la más antigua a la más nueva y se eliminan al agotarse,
+    por lo que solo se guardan las capas con saldo.
+    """
+    class OrigenCapa(models.TextChoices):
+        COMPRA = 'COMPRA', 'Recepción de Compra'
+        TRASPASO = 'TRASPASO', 'Ingreso sin Costo Propio (traspaso, ajuste)'
+        INICIAL = 'INICIAL', 'Saldo Inicial'
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="capas_costo")
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name="capas_costo")
+    cantidad_restante = models.PositiveIntegerField(verbose_name="Cantidad Restante")
+    costo_unitario = models.DecimalField(max_digits=14, decimal_places=4, verbose_name="Costo Unitario")
+    origen = models.CharField(max_length=10, choices=OrigenCapa.choices, verbose_name="Origen")
+    fecha_ingreso = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Ingreso")
+
+    class Meta:
+        verbose_name = "Capa de Costo"
+        verbose_name_plural = "Capas de Costo"
+        ordering = ['producto', 'bodega', 'id']
+        indexes = [models.Index(fields=['producto', 'bodega', 'id'], name='capa_costo_fifo_idx')]
+
+    def __str__(self):
+        return f"{self.cantidad_restante} x {self.producto_id} @ {self.costo_unitario} (Bodega {self.bodega_id})"
+
+
+class ValorizacionStock(models.Model):
+    """
+    Valorización vigente de un (producto, bodega), mantenida por deltas desde la señal
+    stock_modificado: costo promedio ponderado y valor FIFO (suma de sus capas). Los
+    reportes de valorización agregan estas filas en vez de recorrer el historial.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="valorizaciones_stock")
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name="valorizaciones_stock")
+    cantidad = models.PositiveIntegerField(default=0, verbose_name="Cantidad Valorizada")
+    costo_promedio = models.DecimalField(max_digits=14, decimal_places=4, default=0, verbose_name="Costo Promedio Ponderado")
+    valor_promedio = models.DecimalField(max_digits=18, decimal_places=4, default=0, verbose_name="Valor (Promedio Ponderado)")
+    valor_fifo = models.DecimalField(max_digits=18, decimal_places=4, default=0, verbose_name="Valor (FIFO)")
+    fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Última Actualización")
+
+    class Meta:
+        verbose_name = "Valorización de Stock"
+        verbose_name_plural = "Valorizaciones de Stock"
+        unique_together = ('producto', 'bodega')
+        indexes = [models.Index(fields=['bodega'], name='valorizacion_bodega_idx')]
+
+    def __str__(self):
+        return f"{self.producto_id} en Bodega {self.bodega_id}: {self.cantidad} u., FIFO {self.valor_fifo}"
@@ -0,0 +1,1587 @@
+import base64
+import csv
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from django.core.files import File
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Min, Count, Value, When
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .models import (
+    InventarioSucursal,
+    DetalleInventarioBodega,
+    ImportacionStock,
+    ResumenStockSucursal,
+    ResumenStockProducto,
+    AlertaStock,
+    DetalleTraspasoStock,
+    RegistroEliminacion,
+    ConteoCiclico,
+    MovimientoStock,
+    SnapshotInventario,
+    CapaCosto,
+    ValorizacionStock,
+)
+from .signals import CambioStock, stock_modificado
+from sucursal_app.models import Bodega
+from producto_app.models import Producto
+from promocion_app.models import Promocion
+
+COLUMNAS_REQUERIDAS_CARGA = ['producto_sku', 'bodega_id', 'cantidad']
+COLUMNAS_OPCIONALES_CARGA = ['stock_minimo', 'stock_maximo']
+CLAVE_DETALLE_STOCK = ['inventario_sucursal_id', 'producto_id', 'bodega_id']
+TAMANO_LOTE_UPSERT = 1000
+MAX_ERRORES_REGISTRADOS = 500  # Muestra de errores guardada en la importación; el conteo es completo
+
+
+def normalizar_columnas_carga(df):
+    """Normaliza los nombres de columnas del archivo (minúsculas, sin espacios)."""
+    df.columns = [str(col).strip().lower().replace(' ', '_') for col in df.columns]
+    return df
+
+
+def columnas_faltantes_carga(df):
+    return [col for col in COLUMNAS_REQUERIDAS_CARGA if col not in df.columns]
+
+
+def _registrar_errores(errores, df, mascara, mensaje):
+    """
+    Agrega un mensaje de error por cada fila marcada en la máscara.
+    'mensaje' recibe la fila (namedtuple) y devuelve el texto sin el prefijo de fila.
+    """
+    if not mascara.any():
+        return
+    for fila in df.loc[mascara].itertuples():
+        errores.append((fila.Index, f"Fila {fila.fila_excel}: {mensaje(fila)}"))
+
+
+def _a_entero(serie):
+    """Convierte una columna a numérica; lo que no sea número queda como NaN."""
+    return np.trunc(pd.to_numeric(serie, errors='coerce'))
+
+
+def validar_dataframe_stock(df):
+    """
+    Valida por columnas (sin iterar fila a fila) un DataFrame de carga de stock.
+    Retorna (df_valido, errores) donde errores es una lista de tuplas (indice, mensaje).
+    El DataFrame válido contiene las columnas producto_sku, bodega_id, cantidad,
+    stock_minimo y stock_maximo ya tipadas.
+    """
+    errores = []
+    df = df.copy()
+    df['fila_excel'] = df.index + 2  # +1 para índice base 1, +1 para la fila de encabezado
+
+    texto = {
+        col: df[col].astype('string').str.strip().fillna('')
+        for col in COLUMNAS_REQUERIDAS_CARGA
+    }
+    df['producto_sku'] = texto['producto_sku']
+    df['bodega_id_texto'] = texto['bodega_id']
+    df['cantidad_texto'] = texto['cantidad']
+
+    vacias = (texto['producto_sku'] == '') | (texto['bodega_id'] == '') | (texto['cantidad'] == '')
+    _registrar_errores(errores, df, vacias, lambda f: "producto_sku, bodega_id o cantidad no pueden estar vacíos.")
+    pendientes = ~vacias
+
+    cantidad = _a_entero(df['cantidad'])
+    cantidad_invalida = pendientes & (cantidad.isna() | (cantidad < 0))
+    _registrar_errores(errores, df, cantidad_invalida, lambda f: f"Cantidad '{f.cantidad_texto}' inválida.")
+    pendientes &= ~cantidad_invalida
+
+    bodega_num = pd.to_numeric(df['bodega_id'], errors='coerce')
+    bodega_invalida = pendientes & (bodega_num.isna() | (bodega_num != np.trunc(bodega_num)))
+    _registrar_errores(errores, df, bodega_invalida, lambda f: f"ID de Bodega '{f.bodega_id_texto}' inválido.")
+    pendientes &= ~bodega_invalida
+
+    df['cantidad'] = cantidad
+    df['bodega_id'] = bodega_num
+
+    etiquetas = {'stock_minimo': 'Stock Mínimo', 'stock_maximo': 'Stock Máximo'}
+    for col in COLUMNAS_OPCIONALES_CARGA:
+        if col not in df.columns:
+            df[col] = np.nan
+            continue
+        original = df[col]
+        convertida = _a_entero(original)
+        invalida = pendientes & original.notna() & convertida.isna()
+        df[f'{col}_texto'] = original.astype('string')
+        _registrar_errores(
+            errores, df, invalida,
+            lambda f, c=col: f"{etiquetas[c]} '{getattr(f, f'{c}_texto')}' inválido."
+        )
+        pendientes &= ~invalida
+        df[col] = convertida
+
+    columnas = ['fila_excel', 'producto_sku', 'bodega_id', 'cantidad'] + COLUMNAS_OPCIONALES_CARGA
+    df_valido = df.loc[pendientes, columnas].astype({'bodega_id': 'int64', 'cantidad': 'int64'})
+    return df_valido, errores
+
+
+def resolver_referencias_stock(df):
+    """
+    Resuelve SKUs, bodegas e inventarios de sucursal con una consulta IN por cada uno
+    y los une al DataFrame mediante merge. Crea en bloque los InventarioSucursal faltantes.
+    Retorna (df_resuelto, errores).
+    """
+    errores = []
+    if df.empty:
+        return df.assign(producto_id=pd.Series(dtype='int64'), sucursal_id=pd.Series(dtype='int64'),
+                         inventario_sucursal_id=pd.Series(dtype='int64')), errores
+
+    productos = pd.DataFrame.from_records(
+        Producto.objects.filter(sku__in=df['producto_sku'].unique().tolist()).values('id', 'sku'),
+        columns=['id', 'sku']
+    ).rename(columns={'id': 'producto_id', 'sku': 'producto_sku'})
+    df = df.reset_index().merge(productos, on='producto_sku', how='left').set_index('index')
+    sin_producto = df['producto_id'].isna()
+    _registrar_errores(errores, df, sin_producto, lambda f: f"Producto con SKU '{f.producto_sku}' no encontrado.")
+    df = df.loc[~sin_producto]
+
+    bodegas = pd.DataFrame.from_records(
+        Bodega.objects.filter(id__in=df['bodega_id'].unique().tolist()).values('id', 'sucursal_id'),
+        columns=['id', 'sucursal_id']
+    ).rename(columns={'id': 'bodega_id'})
+    df = df.reset_index().merge(bodegas, on='bodega_id', how='left').set_index('index')
+    sin_bodega = df['sucursal_id'].isna()
+    _registrar_errores(errores, df, sin_bodega, lambda f: f"Bodega con ID '{f.bodega_id}' no encontrada.")
+    df = df.loc[~sin_bodega]
+
+    sucursales_ids = df['sucursal_id'].astype('int64').unique().tolist()
+    inventarios = dict(
+        InventarioSucursal.objects.filter(sucursal_id__in=sucursales_ids).values_list('sucursal_id', 'id')
+    )
+    faltantes = [s for s in sucursales_ids if s not in inventarios]
+    if faltantes:
+        InventarioSucursal.objects.bulk_create(
+            [InventarioSucursal(sucursal_id=s) for s in faltantes], ignore_conflicts=True
+        )
+        inventarios.update(
+            InventarioSucursal.objects.filter(sucursal_id__in=faltantes).values_list('sucursal_id', 'id')
+        )
+    df = df.assign(
+        producto_id=df['producto_id'].astype('int64'),
+        sucursal_id=df['sucursal_id'].astype('int64'),
+    )
+    df['inventario_sucursal_id'] = df['sucursal_id'].map(inventarios).astype('int64')
+    return df, errores
+
+
+def agrupar_cargas_stock(df):
+    """
+    Agrupa las filas por (inventario_sucursal, producto, bodega): suma las cantidades y
+    conserva el último stock_minimo/stock_maximo no nulo.
+    """
+    return df.groupby(CLAVE_DETALLE_STOCK, as_index=False, sort=False).agg(
+        cantidad=('cantidad', 'sum'),
+        stock_minimo=('stock_minimo', 'last'),
+        stock_maximo=('stock_maximo', 'last'),
+    )
+
+
+def _entero_o_none(valor):
+    return None if pd.isna(valor) else int(valor)
+
+
+def _valor_por_fila(df, columna, por_defecto):
+    """
+    CASE que asigna a cada fila (por 'id') el valor de 'columna'. Las filas se agrupan por
+    valor (un WHEN id IN (...) por valor distinto), así una carga con pocas cantidades
+    distintas genera un CASE corto aunque el lote tenga miles de filas.
+    """
+    ramas = [
+        When(pk__in=ids.astype('int64').tolist(), then=Value(_entero_o_none(valor)))
+        for valor, ids in df.groupby(columna, sort=False)['id']
+    ]
+    return Case(*ramas, default=por_defecto, output_field=IntegerField())
+
+
+@transaction.atomic
+def sumar_stock_en_bloque(df, tamano_lote=TAMANO_LOTE_UPSERT, origen_costo=None):
+    """
+    Suma cantidades al stock de bodega en bloque.
+    'df' debe tener una fila por (inventario_sucursal_id, producto_id, bodega_id) con la
+    cantidad a sumar y, opcionalmente, stock_minimo/stock_maximo (NaN = no modificar).
+    Una columna opcional 'costo_unitario' indica el costo de los ingresos (ej. recepciones
+    de compra) para la valorización; sin ella el ingreso se valoriza al costo vigente.
+    'origen_costo' es el origen de las capas creadas con esos costos (por defecto, compra).
+    Las filas que no existen se insertan primero con cantidad 0 (ignore_conflicts) y luego
+    se bloquean todas; la suma se escribe con UPDATE ... SET cantidad = cantidad + delta
+    por lotes, sin calcular cantidades absolutas en Python, así dos cargas concurrentes
+    (incluso sobre filas nuevas) no pierden incrementos.
+    Retorna la lista de instancias DetalleInventarioBodega escritas (con los valores finales).
+    """
+    if df.empty:
+        return []
+
+    filtro = Q(
+        bodega_id__in=df['bodega_id'].unique().tolist(),
+        producto_id__in=df['producto_id'].unique().tolist(),
+    )
+    claves = list(df[CLAVE_DETALLE_STOCK].itertuples(index=False, name=None))
+    previas = set(DetalleInventarioBodega.objects.filter(filtro).values_list(*CLAVE_DETALLE_STOCK))
+    faltantes = [clave for clave in claves if clave not in previas]
+    if faltantes:
+        DetalleInventarioBodega.objects.bulk_create(
+            [
+                DetalleInventarioBodega(inventario_sucursal_id=int(i), producto_id=int(p), bodega_id=int(b), cantidad=0)
+                for i, p, b in faltantes
+            ],
+            ignore_conflicts=True, batch_size=tamano_lote,
+        )
+
+    existentes = pd.DataFrame.from_records(
+        DetalleInventarioBodega.objects.select_for_update().filter(filtro).values(
+            'id', *CLAVE_DETALLE_STOCK, 'cantidad', 'stock_minimo', 'stock_maximo'
+        ),
+        columns=['id'] + CLAVE_DETALLE_STOCK + ['cantidad', 'stock_minimo', 'stock_maximo'],
+    )
+    df = df.merge(existentes, on=CLAVE_DETALLE_STOCK, how='inner', suffixes=('', '_actual'))
+    df['es_nueva'] = [clave not in previas for clave in df[CLAVE_DETALLE_STOCK].itertuples(index=False, name=None)]
+    df['cantidad'] = df['cantidad'].astype('int64')
+    df['cantidad_actual'] = df['cantidad_actual'].astype('int64')
+    # Las filas están bloqueadas: el valor final es exactamente el leído más el delta
+    df['cantidad_nueva'] = df['cantidad_actual'] + df['cantidad']
+    for col in COLUMNAS_OPCIONALES_CARGA:
+        df[f'{col}_informado'] = df[col].notna()
+        df[col] = df[col].astype('float64').fillna(df[f'{col}_actual'].astype('float64'))
+
+    ahora = timezone.now()
+    for inicio in range(0, len(df), tamano_lote):
+        lote = df.iloc[inicio:inicio + tamano_lote]
+        cambios = {
+            'cantidad': F('cantidad') + _valor_por_fila(lote, 'cantidad', Value(0)),
+            'ultima_actualizacion': ahora,
+        }
+        for col in COLUMNAS_OPCIONALES_CARGA:
+            informados = lote[lote[f'{col}_informado']]
+            if not informados.empty:
+                cambios[col] = _valor_por_fila(informados, col, F(col))
+        DetalleInventarioBodega.objects.filter(pk__in=lote['id'].astype('int64').tolist()).update(**cambios)
+
+    instancias = [
+        DetalleInventarioBodega(
+            id=int(fila.id),
+            inventario_sucursal_id=int(fila.inventario_sucursal_id),
+            producto_id=int(fila.producto_id),
+            bodega_id=int(fila.bodega_id),
+            cantidad=int(fila.cantidad_nueva),
+            stock_minimo=_entero_o_none(fila.stock_minimo),
+            stock_maximo=_entero_o_none(fila.stock_maximo),
+            ultima_actualizacion=ahora,
+        )
+        for fila in df.itertuples(index=False)
+    ]
+
+    costos = {}
+    if 'costo_unitario' in df.columns:
+        costos = {
+            (int(fila.producto_id), int(fila.bodega_id)): Decimal(str(fila.costo_unitario))
+            for fila in df[df['costo_unitario'].notna()].itertuples(index=False)
+        }
+    stock_modificado.send(sender=DetalleInventarioBodega, costos=costos, origen=origen_costo, cambios=[
+        CambioStock(
+            producto_id=int(fila.producto_id),
+            bodega_id=int(fila.bodega_id),
+            cantidad_anterior=None if fila.es_nueva else int(fila.cantidad_actual),
+            cantidad_nueva=int(fila.cantidad_nueva),
+            stock_minimo_anterior=_entero_o_none(fila.stock_minimo_actual),
+            stock_minimo_nuevo=_entero_o_none(fila.stock_minimo),
+            stock_maximo_anterior=_entero_o_none(fila.stock_maximo_actual),
+            stock_maximo_nuevo=_entero_o_none(fila.stock_maximo),
+            eliminado=False,
+        )
+        for fila in df.itertuples(index=False)
+    ])
+    return instancias
+
+
+@transaction.atomic
+def cargar_stock_desde_dataframe(df):
+    """
+    Pipeline completo de carga masiva: valida por columnas, resuelve referencias,
+    agrupa y aplica el upsert en bloque.
+    Retorna (registros_escritos, errores) con errores como lista de strings ordenada por fila.
+    """
+    df_valido, errores = validar_dataframe_stock(df)
+    df_resuelto, errores_referencias = resolver_referencias_stock(df_valido)
+    errores.extend(errores_referencias)
+    errores = [mensaje for _, mensaje in sorted(errores, key=lambda e: e[0])]
+
+    if df_resuelto.empty:
+        return [], errores
+    registros = sumar_stock_en_bloque(agrupar_cargas_stock(df_resuelto))
+    return registros, errores
+
+
+# --- Efectos de traspasos en el stock ---
+
+@transaction.atomic
+def aplicar_stock_traspaso(traspaso, descontar_origen):
+    """
+    Aplica en bloque el efecto en stock de un cambio de estado de un traspaso:
+    - descontar_origen=True (PENDIENTE -> EN_TRANSITO): resta 'cantidad_enviada' de cada bodega de origen.
+    - descontar_origen=False (-> COMPLETADO): suma 'cantidad_recibida' en cada bodega de destino.
+    Carga las líneas con una consulta, bloquea las filas de stock afectadas con otra y
+    escribe todas las cantidades con un único upsert (sumar_stock_en_bloque).
+    """
+    if descontar_origen:
+        sucursal, campo_cantidad, campo_bodega = traspaso.sucursal_origen_id, 'cantidad_enviada', 'bodega_origen'
+        etiqueta = "enviada"
+    else:
+        sucursal, campo_cantidad, campo_bodega = traspaso.sucursal_destino_id, 'cantidad_recibida', 'bodega_destino'
+        etiqueta = "recibida"
+
+    detalles = list(
+        DetalleTraspasoStock.objects.filter(traspaso=traspaso).select_related('producto', campo_bodega)
+    )
+    sin_cantidad = [d.producto.nombre for d in detalles if not getattr(d, campo_cantidad)]
+    if sin_cantidad:
+        raise ValidationError(
+            f"No se especificó la cantidad {etiqueta} o es inválida para: {', '.join(sin_cantidad)} (traspaso ID {traspaso.id})."
+        )
+    if not detalles:
+        return []
+
+    inventario, _ = InventarioSucursal.objects.get_or_create(sucursal_id=sucursal)
+    signo = -1 if descontar_origen else 1
+    movimientos = pd.DataFrame.from_records(
+        [
+            (inventario.id, d.producto_id, getattr(d, f'{campo_bodega}_id'), signo * getattr(d, campo_cantidad))
+            for d in detalles
+        ],
+        columns=CLAVE_DETALLE_STOCK + ['cantidad'],
+    ).groupby(CLAVE_DETALLE_STOCK, as_index=False, sort=False)['cantidad'].sum()
+
+    if descontar_origen:
+        disponibles = {
+            (producto_id, bodega_id): cantidad
+            for producto_id, bodega_id, cantidad in DetalleInventarioBodega.objects.select_for_update().filter(
+                inventario_sucursal=inventario,
+                producto_id__in=movimientos['producto_id'].unique().tolist(),
+                bodega_id__in=movimientos['bodega_id'].unique().tolist(),
+            ).values_list('producto_id', 'bodega_id', 'cantidad')
+        }
+        nombres = {d.producto_id: d.producto.nombre for d in detalles}
+        bodegas = {d.bodega_origen_id: d.bodega_origen for d in detalles}
+        insuficientes = [
+            f"'{nombres[fila.producto_id]}' en bodega origen '{bodegas[fila.bodega_id]}'. "
+            f"Stock: {disponibles.get((fila.producto_id, fila.bodega_id), 0)}, Necesario: {-fila.cantidad}"
+            for fila in movimientos.itertuples(index=False)
+            if disponibles.get((fila.producto_id, fila.bodega_id), 0) < -fila.cantidad
+        ]
+        if insuficientes:
+            raise ValidationError(f"Stock insuficiente para {'; '.join(insuficientes)}.")
+        # El costo de lo que sale viaja con el traspaso: el ingreso en destino se valoriza a ese costo
+        costos = costos_salida_fifo({
+            (fila.producto_id, fila.bodega_id): -fila.cantidad for fila in movimientos.itertuples(index=False)
+        })
+        for d in detalles:
+            d.costo_unitario = costos.get((d.producto_id, d.bodega_origen_id))
+        DetalleTraspasoStock.objects.bulk_update(detalles, ['costo_unitario'])
+    else:
+        costos = {(d.producto_id, d.bodega_destino_id): d.costo_unitario for d in detalles}
+        movimientos['costo_unitario'] = [
+            costos.get((fila.producto_id, fila.bodega_id)) for fila in movimientos.itertuples(index=False)
+        ]
+
+    movimientos['stock_minimo'] = np.nan
+    movimientos['stock_maximo'] = np.nan
+    return sumar_stock_en_bloque(movimientos, origen_costo=CapaCosto.OrigenCapa.TRASPASO)
+
+
+# --- Conteos cíclicos ---
+
+@transaction.atomic
+def aplicar_conteo_ciclico(bodega, lineas, usuario=None, motivo='', conteo_completo=True, aplicar=True):
+    """
+    Compara un conteo físico de una bodega con el stock del sistema y, si 'aplicar' es True,
+    ajusta todas las diferencias en bloque dejando un MovimientoStock por producto.
+    'lineas' es una lista de dicts {'sku', 'cantidad'}; los SKU repetidos se suman.
+    Con conteo_completo, los productos con stock en la bodega que no aparecen en el conteo
+    se consideran contados en cero.
+    Retorna (conteo_o_None, reporte) con el detalle de diferencias ordenado por magnitud.
+    """
+    contado_por_sku = defaultdict(int)
+    for linea in lineas:
+        contado_por_sku[linea['sku'].strip()] += linea['cantidad']
+
+    productos = {
+        p['sku']: p
+        for p in Producto.objects.filter(sku__in=list(contado_por_sku)).values('id', 'sku', 'nombre', 'precio')
+    }
+    desconocidos = sorted(set(contado_por_sku) - set(productos))
+    if desconocidos:
+        raise ValidationError({"lineas": [f"SKU no encontrado: {sku}" for sku in desconocidos]})
+
+    inventario, _ = InventarioSucursal.objects.get_or_create(sucursal_id=bodega.sucursal_id)
+    en_sistema = DetalleInventarioBodega.objects.select_for_update().filter(inventario_sucursal=inventario, bodega=bodega)
+    if not conteo_completo:
+        en_sistema = en_sistema.filter(producto_id__in=[p['id'] for p in productos.values()])
+    stock_sistema = dict(en_sistema.values_list('producto_id', 'cantidad'))
+
+    contado = {productos[sku]['id']: cantidad for sku, cantidad in contado_por_sku.items()}
+    if conteo_completo:
+        no_contados = [producto_id for producto_id, cantidad in stock_sistema.items() if producto_id not in contado and cantidad]
+        info_no_contados = Producto.objects.filter(id__in=no_contados).values('id', 'sku', 'nombre', 'precio')
+        productos.update({p['sku']: p for p in info_no_contados})
+        contado.update({producto_id: 0 for producto_id in no_contados})
+    info_por_id = {p['id']: p for p in productos.values()}
+
+    diferencias = []
+    for producto_id, cantidad_contada in contado.items():
+        cantidad_sistema = stock_sistema.get(producto_id, 0)
+        if cantidad_contada != cantidad_sistema:
+            info = info_por_id[producto_id]
+            diferencias.append({
+                'producto_id': producto_id,
+                'sku': info['sku'],
+                'nombre': info['nombre'],
+                'stock_sistema': cantidad_sistema,
+                'contado': cantidad_contada,
+                'diferencia': cantidad_contada - cantidad_sistema,
+                'valor_diferencia': (cantidad_contada - cantidad_sistema) * info['precio'],
+            })
+    diferencias.sort(key=lambda d: (-abs(d['diferencia']), d['sku']))
+
+    reporte = {
+        'bodega': bodega.id,
+        'total_lineas': len(contado),
+        'lineas_con_diferencia': len(diferencias),
+        'unidades_sobrantes': sum(d['diferencia'] for d in diferencias if d['diferencia'] > 0),
+        'unidades_faltantes': -sum(d['diferencia'] for d in diferencias if d['diferencia'] < 0),
+        'valor_diferencia': sum((d['valor_diferencia'] for d in diferencias), Decimal('0')),
+        'diferencias': diferencias,
+    }
+    if not aplicar:
+        return None, reporte
+
+    conteo = ConteoCiclico.objects.create(
+        bodega=bodega,
+        realizado_por=usuario,
+        motivo=motivo,
+        conteo_completo=conteo_completo,
+        **{campo: reporte[campo] for campo in (
+            'total_lineas', 'lineas_con_diferencia', 'unidades_sobrantes', 'unidades_faltantes', 'valor_diferencia'
+        )},
+    )
+    if diferencias:
+        sumar_stock_en_bloque(pd.DataFrame({
+            'inventario_sucursal_id': inventario.id,
+            'producto_id': [d['producto_id'] for d in diferencias],
+            'bodega_id': bodega.id,
+            'cantidad': [d['diferencia'] for d in diferencias],
+            'stock_minimo': np.nan,
+            'stock_maximo': np.nan,
+        }))
+        MovimientoStock.objects.bulk_create([
+            MovimientoStock(
+                producto_id=d['producto_id'],
+                bodega=bodega,
+                tipo=MovimientoStock.TipoMovimiento.CONTEO_CICLICO,
+                cantidad=d['diferencia'],
+                cantidad_anterior=d['stock_sistema'],
+                cantidad_resultante=d['contado'],
+                motivo=motivo,
+                conteo=conteo,
+                usuario=usuario,
+            )
+            for d in diferencias
+        ], batch_size=TAMANO_LOTE_UPSERT)
+    reporte['conteo'] = conteo.id
+    return conteo, reporte
+
+
+# --- Ajustes manuales en bloque ---
+
+AJUSTE_APLICADO = 'APLICADO'
+AJUSTE_RECHAZADO = 'RECHAZADO'
+AJUSTE_OMITIDO = 'OMITIDO'  # Válido, pero no aplicado porque otros ítems del lote fueron rechazados
+
+
+def _resolver_productos_por_identificador(identificadores):
+    """
+    Resuelve en una consulta identificadores de producto (SKU o nombre, sin distinguir
+    mayúsculas). Si un identificador coincide con el SKU de un producto y el nombre de
+    otro, gana el SKU. Retorna {identificador_en_minúsculas: {'id', 'sku', 'nombre'}}.
+    """
+    coincidencias = Producto.objects.annotate(sku_min=Lower('sku'), nombre_min=Lower('nombre')).filter(
+        Q(sku_min__in=identificadores) | Q(nombre_min__in=identificadores)
+    ).order_by('id').values('id', 'sku', 'nombre', 'sku_min', 'nombre_min')
+    por_sku, por_nombre = {}, {}
+    for producto in coincidencias:
+        por_sku[producto['sku_min']] = producto
+        por_nombre.setdefault(producto['nombre_min'], producto)
+    return {
+        identificador: por_sku.get(identificador) or por_nombre[identificador]
+        for identificador in identificadores
+        if identificador in por_sku or identificador in por_nombre
+    }
+
+
+@transaction.atomic
+def aplicar_ajustes_stock_en_bloque(items, usuario=None, permitir_parcial=False):
+    """
+    Aplica muchos ajustes manuales de stock (ej. la recepción de un pallet mixto) en una
+    sola transacción. 'items' es una lista de dicts {'producto_identificador', 'bodega_id',
+    'cantidad', 'motivo'}.
+
+    Los productos y bodegas se resuelven en una consulta cada uno y el stock actual se lee
+    (bloqueado) en otra. La regla de stock no negativo se valida por (producto, bodega)
+    sobre el ajuste neto de todos sus ítems. Los cambios se escriben con
+    sumar_stock_en_bloque y cada ítem deja su MovimientoStock de tipo AJUSTE_MANUAL.
+
+    Si algún ítem es rechazado no se aplica nada, salvo con permitir_parcial=True, en cuyo
+    caso se aplican los válidos. Retorna un dict con el resultado por ítem (en el orden recibido).
+    """
+    resultados = [
+        {
+            'indice': indice,
+            'producto_identificador': item['producto_identificador'],
+            'producto_id': None,
+            'bodega_id': item['bodega_id'],
+            'cantidad': item['cantidad'],
+            'estado': None,
+            'error': None,
+            'stock_resultante': None,
+        }
+        for indice, item in enumerate(items)
+    ]
+
+    def rechazar(resultado, error):
+        resultado['estado'] = AJUSTE_RECHAZADO
+        resultado['error'] = error
+
+    productos = _resolver_productos_por_identificador(
+        {item['producto_identificador'].strip().lower() for item in items}
+    )
+    bodegas = {
+        bodega['id']: bodega
+        for bodega in Bodega.objects.filter(id__in={item['bodega_id'] for item in items}).values('id', 'sucursal_id', 'is_active')
+    }
+    for item, resultado in zip(items, resultados):
+        producto = productos.get(item['producto_identificador'].strip().lower())
+        bodega = bodegas.get(item['bodega_id'])
+        if producto is None:
+            rechazar(resultado, f"Producto con identificador '{item['producto_identificador']}' no encontrado.")
+        elif bodega is None:
+            rechazar(resultado, f"Bodega con ID '{item['bodega_id']}' no encontrada.")
+        elif not bodega['is_active'] or not bodega['sucursal_id']:
+            rechazar(resultado, f"La bodega con ID '{item['bodega_id']}' no está activa o no tiene sucursal.")
+        else:
+            resultado['producto_id'] = producto['id']
+
+    # Regla de stock no negativo, por conjunto: stock actual + ajuste neto de la clave
+    validos = [resultado for resultado in resultados if resultado['estado'] is None]
+    neto = defaultdict(int)
+    for resultado in validos:
+        neto[(resultado['producto_id'], resultado['bodega_id'])] += resultado['cantidad']
+    stock_actual = {}
+    if neto:
+        stock_actual = {
+            (producto_id, bodega_id): cantidad
+            for producto_id, bodega_id, cantidad in DetalleInventarioBodega.objects.select_for_update().filter(
+                producto_id__in={producto_id for producto_id, _ in neto},
+                bodega_id__in={bodega_id for _, bodega_id in neto},
+            ).values_list('producto_id', 'bodega_id', 'cantidad')
+        }
+    claves_negativas = {clave for clave, delta in neto.items() if stock_actual.get(clave, 0) + delta < 0}
+    for resultado in validos:
+        clave = (resultado['producto_id'], resultado['bodega_id'])
+        if clave in claves_negativas:
+            rechazar(resultado, (
+                f"El stock no puede quedar negativo. Stock actual: {stock_actual.get(clave, 0)}, "
+                f"ajuste neto del lote: {neto[clave]}."
+            ))
+
+    validos = [resultado for resultado in resultados if resultado['estado'] is None]
+    rechazados = len(resultados) - len(validos)
+    aplicar = bool(validos) and (permitir_parcial or not rechazados)
+    if not aplicar:
+        for resultado in validos:
+            resultado['estado'] = AJUSTE_OMITIDO
+        return {'aplicado': False, 'items_aplicados': 0, 'items_rechazados': rechazados, 'resultados': resultados}
+
+    sucursales = {bodegas[resultado['bodega_id']]['sucursal_id'] for resultado in validos}
+    InventarioSucursal.objects.bulk_create(
+        [InventarioSucursal(sucursal_id=sucursal_id) for sucursal_id in sucursales], ignore_conflicts=True
+    )
+    inventario_por_sucursal = dict(
+        InventarioSucursal.objects.filter(sucursal_id__in=sucursales).values_list('sucursal_id', 'id')
+    )
+
+    neto = defaultdict(int)
+    movimientos = []
+    for resultado in validos:
+        clave = (resultado['producto_id'], resultado['bodega_id'])
+        anterior = stock_actual.get(clave, 0) + neto[clave]
+        neto[clave] += resultado['cantidad']
+        resultado['estado'] = AJUSTE_APLICADO
+        resultado['stock_resultante'] = anterior + resultado['cantidad']
+        movimientos.append(MovimientoStock(
+            producto_id=resultado['producto_id'],
+            bodega_id=resultado['bodega_id'],
+            tipo=MovimientoStock.TipoMovimiento.AJUSTE_MANUAL,
+            cantidad=resultado['cantidad'],
+            cantidad_anterior=anterior,
+            cantidad_resultante=resultado['stock_resultante'],
+            motivo=items[resultado['indice']]['motivo'],
+            usuario=usuario,
+        ))
+
+    sumar_stock_en_bloque(pd.DataFrame({
+        'inventario_sucursal_id': [inventario_por_sucursal[bodegas[bodega_id]['sucursal_id']] for _, bodega_id in neto],
+        'producto_id': [producto_id for producto_id, _ in neto],
+        'bodega_id': [bodega_id for _, bodega_id in neto],
+        'cantidad': list(neto.values()),
+        'stock_minimo': np.nan,
+        'stock_maximo': np.nan,
+    }))
+    MovimientoStock.objects.bulk_create(movimientos, batch_size=TAMANO_LOTE_UPSERT)
+    return {'aplicado': True, 'items_aplicados': len(validos), 'items_rechazados': rechazados, 'resultados': resultados}
+
+
+# --- Importaciones asíncronas por lotes ---
+
+TAMANO_LECTURA_CONTEO = 50000
+IMPORTACION_SIN_ACTIVIDAD = timedelta(minutes=15)  # Una importación PROCESANDO sin avances por más tiempo se considera interrumpida
+
+def contar_filas_archivo_stock(ruta):
+    """
+    Cuenta las filas de datos (sin encabezado) recorriendo el archivo en streaming.
+    En CSV se cuentan las filas que entrega pandas (omite las líneas en blanco), las mismas
+    que luego se procesan. Retorna None si no se puede determinar sin cargar el archivo completo.
+    """
+    if ruta.endswith('.csv'):
+        return sum(len(lote) for lote in pd.read_csv(ruta, dtype=str, usecols=[0], chunksize=TAMANO_LECTURA_CONTEO))
+
+    import openpyxl
+    libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        hoja = libro.active
+        return max(hoja.max_row - 1, 0) if hoja.max_row else None
+    finally:
+        libro.close()
+
+
+def leer_archivo_stock_por_lotes(ruta, tamano_lote, filas_omitidas=0):
+    """
+    Genera DataFrames de a lo más 'tamano_lote' filas, sin cargar el archivo completo en memoria.
+    CSV se lee con pandas por chunks; XLSX con openpyxl en modo read-only.
+    'filas_omitidas' permite reanudar desde un lote ya confirmado. El índice de cada lote
+    es la posición de la fila entre las filas de datos (base 0), así los errores conservan su número de fila.
+    """
+    inicio = filas_omitidas
+    if ruta.endswith('.csv'):
+        # Se omiten filas ya leídas por pandas (no líneas del archivo): las líneas en blanco
+        # no cuentan, así que el punto de reanudación coincide con lo ya confirmado
+        por_omitir = filas_omitidas
+        for lote in pd.read_csv(ruta, dtype=str, chunksize=tamano_lote):
+            if por_omitir >= len(lote):
+                por_omitir -= len(lote)
+                continue
+            lote = lote.iloc[por_omitir:]
+            por_omitir = 0
+            lote.index = pd.RangeIndex(inicio, inicio + len(lote))
+            inicio += len(lote)
+            yield normalizar_columnas_carga(lote)
+        return
+
+    import openpyxl
+    libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        encabezado = next(filas, None)
+        if encabezado is None:
+            return
+        for _ in range(filas_omitidas):
+            if next(filas, None) is None:
+                return
+        buffer = []
+        for fila in filas:
+            buffer.append(fila)
+            if len(buffer) == tamano_lote:
+                yield normalizar_columnas_carga(pd.DataFrame(buffer, columns=encabezado, index=pd.RangeIndex(inicio, inicio + len(buffer))))
+                inicio += len(buffer)
+                buffer = []
+        if buffer:
+            yield normalizar_columnas_carga(pd.DataFrame(buffer, columns=encabezado, index=pd.RangeIndex(inicio, inicio + len(buffer))))
+    finally:
+        libro.close()
+
+
+def importaciones_reclamables(incluir_interrumpidas=False):
+    """
+    Importaciones que un worker puede tomar: las PENDIENTE y, con 'incluir_interrumpidas',
+    las PROCESANDO sin actividad desde hace IMPORTACION_SIN_ACTIVIDAD. Cada lote confirmado
+    actualiza 'fecha_actualizacion', así que una importación que sigue avanzando no se retoma.
+    """
+    reclamables = Q(estado=ImportacionStock.EstadoImportacion.PENDIENTE)
+    if incluir_interrumpidas:
+        reclamables |= Q(
+            estado=ImportacionStock.EstadoImportacion.PROCESANDO,
+            fecha_actualizacion__lt=timezone.now() - IMPORTACION_SIN_ACTIVIDAD,
+        )
+    return ImportacionStock.objects.filter(reclamables)
+
+
+def reclamar_importacion_stock(importacion_id, incluir_interrumpidas=False):
+    """
+    Marca la importación como PROCESANDO con un UPDATE condicional, de modo que
+    dos workers no tomen el mismo trabajo. Retorna la instancia o None si otro la tomó.
+    """
+    tomadas = importaciones_reclamables(incluir_interrumpidas).filter(id=importacion_id).update(
+        estado=ImportacionStock.EstadoImportacion.PROCESANDO,
+        fecha_inicio=timezone.now(),
+        mensaje_error=None,
+        fecha_actualizacion=timezone.now(),
+    )
+    return ImportacionStock.objects.get(id=importacion_id) if tomadas else None
+
+
+def procesar_importacion_stock(importacion):
+    """
+    Procesa una importación ya reclamada. Cada lote se aplica y se registra en la
+    misma transacción, por lo que un fallo solo pierde el lote en curso y el
+    siguiente intento reanuda desde 'lotes_completados'.
+    """
+    ruta = importacion.archivo.path
+    try:
+        if importacion.total_filas is None:
+            importacion.total_filas = contar_filas_archivo_stock(ruta)
+            importacion.save(update_fields=['total_filas', 'fecha_actualizacion'])
+
+        filas_omitidas = importacion.lotes_completados * importacion.tamano_lote
+        for lote in leer_archivo_stock_por_lotes(ruta, importacion.tamano_lote, filas_omitidas):
+            faltantes = columnas_faltantes_carga(lote)
+            if faltantes:
+                raise ValueError(f"Columnas faltantes en el archivo: {', '.join(faltantes)}.")
+
+            with transaction.atomic():
+                registros, errores = cargar_stock_desde_dataframe(lote)
+                filas_con_error = len(errores)  # Cada fila inválida genera un único error
+                espacio = MAX_ERRORES_REGISTRADOS - len(importacion.errores)
+                if espacio > 0 and errores:
+                    importacion.errores = importacion.errores + errores[:espacio]
+                    ImportacionStock.objects.filter(id=importacion.id).update(errores=importacion.errores)
+                ImportacionStock.objects.filter(id=importacion.id).update(
+                    filas_procesadas=F('filas_procesadas') + (len(lote) - filas_con_error),
+                    filas_fallidas=F('filas_fallidas') + filas_con_error,
+                    lotes_completados=F('lotes_completados') + 1,
+                    fecha_actualizacion=timezone.now(),
+                )
+    except Exception as e:
+        ImportacionStock.objects.filter(id=importacion.id).update(
+            estado=ImportacionStock.EstadoImportacion.FALLIDO,
+            mensaje_error=str(e),
+            fecha_actualizacion=timezone.now(),
+        )
+        importacion.refresh_from_db()
+        return importacion
+
+    importacion.refresh_from_db()
+    importacion.estado = (
+        ImportacionStock.EstadoImportacion.COMPLETADO_CON_ERRORES if importacion.filas_fallidas
+        else ImportacionStock.EstadoImportacion.COMPLETADO
+    )
+    importacion.fecha_fin = timezone.now()
+    if importacion.total_filas is None or importacion.total_filas < importacion.filas_procesadas + importacion.filas_fallidas:
+        importacion.total_filas = importacion.filas_procesadas + importacion.filas_fallidas
+    importacion.save(update_fields=['estado', 'fecha_fin', 'total_filas', 'fecha_actualizacion'])
+    return importacion
+
+
+# --- Resumen de stock mantenido por deltas ---
+
+def _holgura(cantidad_total, umbral_minimo):
+    return cantidad_total - (umbral_minimo or 0)
+
+
+def _umbrales_y_conteos(productos_ids):
+    """
+    Recalcula MIN(stock_minimo) y la cantidad de filas de detalle por (producto, sucursal)
+    solo para los productos indicados. Retorna un dict {(producto_id, sucursal_id): (umbral, filas)}.
+    """
+    if not productos_ids:
+        return {}
+    agregados = DetalleInventarioBodega.objects.filter(producto_id__in=productos_ids).values(
+        'producto_id', 'bodega__sucursal_id'
+    ).annotate(umbral=Min('stock_minimo'), filas=Count('id')).order_by()
+    return {
+        (fila['producto_id'], fila['bodega__sucursal_id']): (fila['umbral'], fila['filas'])
+        for fila in agregados
+    }
+
+
+@transaction.atomic
+def actualizar_resumen_stock(cambios, tamano_lote=TAMANO_LOTE_UPSERT):
+    """
+    Aplica una lista de CambioStock a ResumenStockSucursal y ResumenStockProducto.
+    Las cantidades se ajustan por delta (nuevo - anterior); el umbral mínimo solo se
+    recalcula para los productos cuyo stock_minimo cambió o que perdieron filas.
+    Los resúmenes sin filas de detalle restantes se eliminan.
+    """
+    if not cambios:
+        return
+
+    sucursal_por_bodega = dict(
+        Bodega.objects.filter(id__in={c.bodega_id for c in cambios}).values_list('id', 'sucursal_id')
+    )
+    deltas = defaultdict(int)
+    claves_con_filas = set()
+    productos_a_recalcular = set()
+    for cambio in cambios:
+        sucursal_id = sucursal_por_bodega.get(cambio.bodega_id)
+        if sucursal_id is None:
+            continue
+        clave = (cambio.producto_id, sucursal_id)
+        deltas[clave] += (cambio.cantidad_nueva or 0) - (cambio.cantidad_anterior or 0)
+        if not cambio.eliminado:
+            claves_con_filas.add(clave)
+        if cambio.eliminado or cambio.stock_minimo_anterior != cambio.stock_minimo_nuevo:
+            productos_a_recalcular.add(cambio.producto_id)
+    if not deltas:
+        return
+
+    productos_ids = {producto_id for producto_id, _ in deltas}
+    sucursales_ids = {sucursal_id for _, sucursal_id in deltas}
+
+    # Asegurar que existan los resúmenes de las filas nuevas antes de bloquearlos
+    if claves_con_filas:
+        ResumenStockSucursal.objects.bulk_create(
+            [ResumenStockSucursal(producto_id=p, sucursal_id=s) for p, s in claves_con_filas],
+            ignore_conflicts=True, batch_size=tamano_lote,
+        )
+        ResumenStockProducto.objects.bulk_create(
+            [ResumenStockProducto(producto_id=p) for p in {p for p, _ in claves_con_filas}],
+            ignore_conflicts=True, batch_size=tamano_lote,
+        )
+
+    recalculados = _umbrales_y_conteos(productos_a_recalcular)
+    ahora = timezone.now()
+
+    resumenes_sucursal = [
+        r for r in ResumenStockSucursal.objects.select_for_update().filter(
+            producto_id__in=productos_ids, sucursal_id__in=sucursales_ids
+        )
+        if (r.producto_id, r.sucursal_id) in deltas
+    ]
+    a_eliminar = []
+    for resumen in resumenes_sucursal:
+        clave = (resumen.producto_id, resumen.sucursal_id)
+        resumen.cantidad_total += deltas[clave]
+        if resumen.producto_id in productos_a_recalcular:
+            umbral, filas = recalculados.get(clave, (None, 0))
+            if not filas:
+                a_eliminar.append(resumen.id)
+            resumen.umbral_minimo = umbral
+        resumen.holgura = _holgura(resumen.cantidad_total, resumen.umbral_minimo)
+        resumen.fecha_actualizacion = ahora
+    ResumenStockSucursal.objects.bulk_update(
+        resumenes_sucursal, ['cantidad_total', 'umbral_minimo', 'holgura', 'fecha_actualizacion'],
+        batch_size=tamano_lote,
+    )
+    if a_eliminar:
+        ResumenStockSucursal.objects.filter(id__in=a_eliminar).delete()
+
+    deltas_producto = defaultdict(int)
+    for (producto_id, _), delta in deltas.items():
+        deltas_producto[producto_id] += delta
+    umbrales_producto = {}
+    filas_producto = defaultdict(int)
+    for (producto_id, _), (umbral, filas) in recalculados.items():
+        filas_producto[producto_id] += filas
+        if umbral is not None:
+            umbrales_producto[producto_id] = min(umbral, umbrales_producto.get(producto_id, umbral))
+
+    resumenes_producto = list(
+        ResumenStockProducto.objects.select_for_update().filter(producto_id__in=productos_ids)
+    )
+    a_eliminar = []
+    for resumen in resumenes_producto:
+        resumen.cantidad_total += deltas_producto[resumen.producto_id]
+        if resumen.producto_id in productos_a_recalcular:
+            if not filas_producto[resumen.producto_id]:
+                a_eliminar.append(resumen.id)
+            resumen.umbral_minimo = umbrales_producto.get(resumen.producto_id)
+        resumen.holgura = _holgura(resumen.cantidad_total, resumen.umbral_minimo)
+        resumen.fecha_actualizacion = ahora
+    ResumenStockProducto.objects.bulk_update(
+        resumenes_producto, ['cantidad_total', 'umbral_minimo', 'holgura', 'fecha_actualizacion'],
+        batch_size=tamano_lote,
+    )
+    if a_eliminar:
+        ResumenStockProducto.objects.filter(id__in=a_eliminar).delete()
+
+
+@transaction.atomic
+def reconstruir_resumen_stock(tamano_lote=TAMANO_LOTE_UPSERT):
+    """
+    Recalcula desde cero ambos resúmenes a partir de DetalleInventarioBodega.
+    Útil para la carga inicial o para reparar desviaciones tras escrituras
+    que no enviaron la señal stock_modificado.
+    """
+    por_sucursal = DetalleInventarioBodega.objects.values('producto_id', 'bodega__sucursal_id').annotate(
+        total=Sum('cantidad'), umbral=Min('stock_minimo')
+    ).order_by()
+    por_producto = DetalleInventarioBodega.objects.values('producto_id').annotate(
+        total=Sum('cantidad'), umbral=Min('stock_minimo')
+    ).order_by()
+
+    ResumenStockSucursal.objects.all().delete()
+    ResumenStockProducto.objects.all().delete()
+    ResumenStockSucursal.objects.bulk_create([
+        ResumenStockSucursal(
+            producto_id=fila['producto_id'], sucursal_id=fila['bodega__sucursal_id'],
+            cantidad_total=fila['total'] or 0, umbral_minimo=fila['umbral'],
+            holgura=_holgura(fila['total'] or 0, fila['umbral']),
+        )
+        for fila in por_sucursal
+    ], batch_size=tamano_lote)
+    ResumenStockProducto.objects.bulk_create([
+        ResumenStockProducto(
+            producto_id=fila['producto_id'],
+            cantidad_total=fila['total'] or 0, umbral_minimo=fila['umbral'],
+            holgura=_holgura(fila['total'] or 0, fila['umbral']),
+        )
+        for fila in por_producto
+    ], batch_size=tamano_lote)
+
+
+# --- Valorización de inventario (FIFO y promedio ponderado) ---
+
+PRECISION_COSTO = Decimal('0.0001')
+AGRUPACIONES_VALORIZACION = {
+    'sucursal': ['bodega__sucursal_id', 'bodega__sucursal__nombre'],
+    'bodega': ['bodega_id', 'bodega__sucursal_id', 'bodega__tipo_bodega__tipo'],
+    'producto': ['producto_id', 'producto__sku', 'producto__nombre'],
+}
+
+
+def _costos_referencia(productos_ids):
+    """
+    Costo de referencia de cada producto para ingresos sin costo propio: el promedio
+    ponderado vigente entre todas sus bodegas o, si no tiene stock valorizado, el precio
+    de su última compra. Retorna {producto_id: costo}; los productos sin ninguno quedan fuera.
+    """
+    if not productos_ids:
+        return {}
+    costos = {
+        fila['producto_id']: fila['valor'] / fila['unidades']
+        for fila in ValorizacionStock.objects.filter(producto_id__in=productos_ids, cantidad__gt=0).values(
+            'producto_id'
+        ).annotate(valor=Sum('valor_promedio'), unidades=Sum('cantidad')).order_by()
+    }
+    faltantes = set(productos_ids) - set(costos)
+    if faltantes:
+        from pedido_app.models import PedidoProveedor, DetallePedidoProveedor  # Importación local para evitar ciclos
+
+        compras = DetallePedidoProveedor.objects.filter(producto_id__in=faltantes).exclude(
+            pedido_proveedor__estado__in=[PedidoProveedor.EstadoPedido.BORRADOR, PedidoProveedor.EstadoPedido.CANCELADO]
+        ).order_by('producto_id', '-pedido_proveedor__fecha_pedido', '-id').values_list(
+            'producto_id', 'precio_unitario_compra'
+        )
+        for producto_id, precio in compras:
+            costos.setdefault(producto_id, precio)
+    return costos
+
+
+def costos_salida_fifo(salidas):
+    """
+    Costo unitario FIFO de las unidades que van a salir de cada (producto_id, bodega_id) de
+    'salidas' {clave: unidades}, recorriendo sus capas (bloqueadas) de la más antigua a la
+    más nueva, igual que las consumirá la valorización. Retorna {clave: costo}; las claves
+    sin stock valorizado quedan fuera.
+    """
+    pendientes = {clave: unidades for clave, unidades in salidas.items() if unidades > 0}
+    if not pendientes:
+        return {}
+    valores = defaultdict(Decimal)
+    consumidas = defaultdict(int)
+    for capa in CapaCosto.objects.select_for_update().filter(
+        producto_id__in={producto_id for producto_id, _ in pendientes},
+        bodega_id__in={bodega_id for _, bodega_id in pendientes},
+    ).order_by('id'):
+        clave = (capa.producto_id, capa.bodega_id)
+        consumo = min(pendientes.get(clave, 0), capa.cantidad_restante)
+        if consumo:
+            pendientes[clave] -= consumo
+            valores[clave] += consumo * capa.costo_unitario
+            consumidas[clave] += consumo
+    return {clave: (valores[clave] / unidades).quantize(PRECISION_COSTO) for clave, unidades in consumidas.items()}
+
+
+@transaction.atomic
+def actualizar_valorizacion_stock(cambios, costos=None, origen=CapaCosto.OrigenCapa.COMPRA,
+                                  tamano_lote=TAMANO_LOTE_UPSERT):
+    """
+    Aplica una lista de CambioStock a la valorización por delta neto de cada (producto, bodega).
+    Las salidas consumen las capas FIFO de la más antigua a la más nueva y descuentan el
+    costo promedio vigente. Los ingresos crean una capa al costo indicado en 'costos'
+    {(producto_id, bodega_id): costo_unitario} (compras; traspasos, con el costo guardado
+    al despacharlos) o, si no lo traen, al costo de lo que salió del mismo producto en este
+    lote, al promedio vigente de la bodega o al costo de referencia del producto (ajustes
+    manuales y traspasos cuyo origen no estaba valorizado). Las salidas de stock no
+    valorizado no consumen capas.
+    Se ejecuta dentro de la transacción que modificó el stock, una vez por cada señal
+    stock_modificado: las rutas masivas envían una sola señal con todos sus cambios.
+    """
+    costos = costos or {}
+    deltas = defaultdict(int)
+    for cambio in cambios:
+        deltas[(cambio.producto_id, cambio.bodega_id)] += (cambio.cantidad_nueva or 0) - (cambio.cantidad_anterior or 0)
+    deltas = {clave: delta for clave, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    productos_ids = {producto_id for producto_id, _ in deltas}
+    bodegas_ids = {bodega_id for _, bodega_id in deltas}
+    # Solo los ingresos crean filas: una salida sin valorización no tiene nada que descontar
+    ValorizacionStock.objects.bulk_create(
+        [ValorizacionStock(producto_id=p, bodega_id=b) for (p, b), delta in deltas.items() if delta > 0],
+        ignore_conflicts=True, batch_size=tamano_lote,
+    )
+    valorizaciones = {
+        (v.producto_id, v.bodega_id): v
+        for v in ValorizacionStock.objects.select_for_update().filter(
+            producto_id__in=productos_ids, bodega_id__in=bodegas_ids
+        )
+        if (v.producto_id, v.bodega_id) in deltas
+    }
+    capas = defaultdict(list)
+    for capa in CapaCosto.objects.select_for_update().filter(
+        producto_id__in=productos_ids, bodega_id__in=bodegas_ids
+    ).order_by('id'):
+        if (capa.producto_id, capa.bodega_id) in deltas:
+            capas[(capa.producto_id, capa.bodega_id)].append(capa)
+
+    capas_agotadas = []
+    capas_modificadas = {}
+    salidas_por_producto = defaultdict(lambda: [0, Decimal(0), Decimal(0)])  # producto_id -> [unidades, valor FIFO, valor promedio]
+    for clave, delta in deltas.items():
+        valorizacion = valorizaciones.get(clave)
+        if delta > 0 or valorizacion is None:
+            continue
+        unidades = pendiente = min(-delta, valorizacion.cantidad)
+        valor = Decimal(0)
+        while pendiente and capas[clave]:
+            capa = capas[clave][0]
+            consumo = min(pendiente, capa.cantidad_restante)
+            capa.cantidad_restante -= consumo
+            valor += consumo * capa.costo_unitario
+            pendiente -= consumo
+            if capa.cantidad_restante:
+                capas_modificadas[capa.id] = capa
+            else:
+                capas[clave].pop(0)
+                capas_agotadas.append(capa.id)
+                capas_modificadas.pop(capa.id, None)
+        valor_promedio = unidades * valorizacion.costo_promedio
+        valorizacion.cantidad -= unidades
+        valorizacion.valor_fifo -= valor
+        valorizacion.valor_promedio -= valor_promedio
+        if not valorizacion.cantidad:
+            valorizacion.valor_fifo = valorizacion.valor_promedio = Decimal(0)  # Sin residuos de redondeo
+        if not unidades:
+            continue
+        salida = salidas_por_producto[valorizacion.producto_id]
+        salida[0] += unidades
+        salida[1] += valor
+        salida[2] += valor_promedio
+
+    entradas = {clave: delta for clave, delta in deltas.items() if delta > 0}
+    referencias = _costos_referencia({
+        clave[0] for clave in entradas
+        if clave not in costos and clave[0] not in salidas_por_producto and not valorizaciones[clave].costo_promedio
+    })
+    capas_nuevas = []
+    for clave, delta in entradas.items():
+        producto_id, bodega_id = clave
+        valorizacion = valorizaciones[clave]
+        origen_capa = origen
+        if clave in costos:
+            costo = costo_medio = costos[clave]
+        else:
+            origen_capa = CapaCosto.OrigenCapa.TRASPASO
+            if producto_id in salidas_por_producto:
+                # Lo que entra llega al costo con que salió, según cada método
+                unidades_salida, valor_fifo_salida, valor_promedio_salida = salidas_por_producto[producto_id]
+                costo = valor_fifo_salida / unidades_salida
+                costo_medio = valor_promedio_salida / unidades_salida
+            elif valorizacion.costo_promedio:
+                costo = costo_medio = valorizacion.costo_promedio
+            else:
+                costo = costo_medio = referencias.get(producto_id, 0)
+        costo = Decimal(costo).quantize(PRECISION_COSTO)
+        costo_medio = Decimal(costo_medio).quantize(PRECISION_COSTO)
+
+        ultima = capas[clave][-1] if capas[clave] else None
+        if ultima is not None and ultima.costo_unitario == costo and ultima.origen == origen_capa:
+            ultima.cantidad_restante += delta  # Mismo costo que la última capa: se fusiona
+            if ultima.id:
+                capas_modificadas[ultima.id] = ultima
+        else:
+            capa = CapaCosto(
+                producto_id=producto_id, bodega_id=bodega_id, cantidad_restante=delta,
+                costo_unitario=costo, origen=origen_capa,
+            )
+            capas[clave].append(capa)
+            capas_nuevas.append(capa)
+        valorizacion.cantidad += delta
+        valorizacion.valor_fifo += delta * costo
+        valorizacion.valor_promedio += delta * costo_medio
+        valorizacion.costo_promedio = (valorizacion.valor_promedio / valorizacion.cantidad).quantize(PRECISION_COSTO)
+
+    # Las filas ya bloqueadas se reescriben con upsert por id (bulk_update arma un CASE por fila)
+    if capas_agotadas:
+        CapaCosto.objects.filter(id__in=capas_agotadas).delete()
+    CapaCosto.objects.bulk_create(
+        list(capas_modificadas.values()), update_conflicts=True, unique_fields=['id'],
+        update_fields=['cantidad_restante'], batch_size=tamano_lote,
+    )
+    CapaCosto.objects.bulk_create(capas_nuevas, batch_size=tamano_lote)
+    ValorizacionStock.objects.bulk_create(
+        list(valorizaciones.values()), update_conflicts=True, unique_fields=['id'],
+        update_fields=['cantidad', 'costo_promedio', 'valor_promedio', 'valor_fifo', 'fecha_actualizacion'],
+        batch_size=tamano_lote,
+    )
+
+
+@transaction.atomic
+def inicializar_valorizacion_stock(tamano_lote=TAMANO_LOTE_UPSERT):
+    """
+    Crea capas de saldo inicial para el stock que todavía no está valorizado (al activar la
+    valorización, o tras escrituras que no enviaron la señal stock_modificado), al costo de
+    referencia de cada producto. Retorna un resumen con los productos que quedaron a costo 0.
+    """
+    valorizado = dict(
+        ((p, b), cantidad)
+        for p, b, cantidad in ValorizacionStock.objects.values_list('producto_id', 'bodega_id', 'cantidad')
+    )
+    stock = DetalleInventarioBodega.objects.values('producto_id', 'bodega_id').annotate(total=Sum('cantidad')).order_by()
+    cambios = [
+        CambioStock(
+            producto_id=fila['producto_id'], bodega_id=fila['bodega_id'],
+            cantidad_anterior=valorizado.get((fila['producto_id'], fila['bodega_id']), 0),
+            cantidad_nueva=fila['total'],
+            stock_minimo_anterior=None, stock_minimo_nuevo=None,
+            stock_maximo_anterior=None, stock_maximo_nuevo=None, eliminado=False,
+        )
+        for fila in stock
+        if fila['total'] > valorizado.get((fila['producto_id'], fila['bodega_id']), 0)
+    ]
+    referencias = _costos_referencia({c.producto_id for c in cambios})
+    costos = {
+        (c.producto_id, c.bodega_id): referencias[c.producto_id]
+        for c in cambios if c.producto_id in referencias
+    }
+    actualizar_valorizacion_stock(cambios, costos, origen=CapaCosto.OrigenCapa.INICIAL, tamano_lote=tamano_lote)
+    return {
+        'filas_inicializadas': len(cambios),
+        'unidades_inicializadas': sum(c.cantidad_nueva - c.cantidad_anterior for c in cambios),
+        'productos_sin_costo': sorted({c.producto_id for c in cambios} - set(referencias)),
+    }
+
+
+def valorizacion_agrupada(agrupar='sucursal', sucursal_id=None, bodega_id=None, producto_id=None):
+    """
+    Valorización del inventario agregada por sucursal, bodega o producto sobre ValorizacionStock
+    (sin recorrer movimientos). Retorna (grupos, totales): 'grupos' es un queryset de dicts con
+    las unidades y el valor FIFO y promedio ponderado de cada grupo; 'totales', los del conjunto.
+    """
+    queryset = ValorizacionStock.objects.filter(cantidad__gt=0)
+    if sucursal_id is not None:
+        queryset = queryset.filter(bodega__sucursal_id=sucursal_id)
+    if bodega_id is not None:
+        queryset = queryset.filter(bodega_id=bodega_id)
+    if producto_id is not None:
+        queryset = queryset.filter(producto_id=producto_id)
+    campos = AGRUPACIONES_VALORIZACION[agrupar]
+    sumas = {
+        'total_unidades': Sum('cantidad'),
+        'valor_total_fifo': Sum('valor_fifo'),
+        'valor_total_promedio': Sum('valor_promedio'),
+    }
+    grupos = queryset.values(*campos).annotate(**sumas).order_by(campos[0])
+    totales = {campo: valor or 0 for campo, valor in queryset.aggregate(**sumas).items()}
+    return grupos, totales
+
+
+# --- Alertas por cruce de umbrales ---
+
+def _alertas_aplicables(cantidad, stock_minimo, stock_maximo):
+    """Tipos de alerta que corresponden a una fila con estos valores (conjunto vacío si está en rango)."""
+    tipos = set()
+    if cantidad is None:
+        return tipos
+    if stock_minimo is not None and cantidad <= stock_minimo:
+        tipos.add(AlertaStock.TipoAlerta.BAJO_MINIMO)
+    if stock_maximo is not None and cantidad > stock_maximo:
+        tipos.add(AlertaStock.TipoAlerta.SOBRE_MAXIMO)
+    return tipos
+
+
+@transaction.atomic
+def evaluar_alertas_stock(cambios):
+    """
+    Evalúa cruces de umbral solo para las filas tocadas, comparando el estado anterior
+    con el nuevo de cada CambioStock. Abre alertas al entrar en alerta y resuelve las
+    activas al volver a rango; si un mismo (producto, bodega) cambia varias veces en
+    la lista, se compara el primer estado anterior con el último estado nuevo.
+    """
+    estados = {}
+    for cambio in cambios:
+        clave = (cambio.producto_id, cambio.bodega_id)
+        cantidad_nueva = None if cambio.eliminado else cambio.cantidad_nueva
+        nuevo = (
+            _alertas_aplicables(cantidad_nueva, cambio.stock_minimo_nuevo, cambio.stock_maximo_nuevo),
+            cantidad_nueva, cambio.stock_minimo_nuevo, cambio.stock_maximo_nuevo,
+        )
+        if clave in estados:
+            estados[clave] = (estados[clave][0], nuevo)
+        else:
+            anterior = _alertas_aplicables(
+                cambio.cantidad_anterior, cambio.stock_minimo_anterior, cambio.stock_maximo_anterior
+            )
+            estados[clave] = (anterior, nuevo)
+
+    aperturas, cierres = {}, {}
+    for clave, (anterior, (tipos_nuevos, cantidad, minimo, maximo)) in estados.items():
+        for tipo in tipos_nuevos - anterior:
+            umbral = minimo if tipo == AlertaStock.TipoAlerta.BAJO_MINIMO else maximo
+            aperturas[clave + (tipo,)] = (cantidad, umbral)
+        for tipo in anterior - tipos_nuevos:
+            cierres[clave + (tipo,)] = cantidad
+    if not aperturas and not cierres:
+        return
+
+    claves = set(aperturas) | set(cierres)
+    activas = {
+        (alerta.producto_id, alerta.bodega_id, alerta.tipo): alerta
+        for alerta in AlertaStock.objects.select_for_update().filter(
+            estado=AlertaStock.EstadoAlerta.ACTIVA,
+            producto_id__in={c[0] for c in claves},
+            bodega_id__in={c[1] for c in claves},
+        )
+    }
+
+    ahora = timezone.now()
+    resueltas = []
+    for clave, cantidad in cierres.items():
+        alerta = activas.get(clave)
+        if alerta is None:
+            continue
+        alerta.estado = AlertaStock.EstadoAlerta.RESUELTA
+        alerta.cantidad_resolucion = cantidad
+        alerta.fecha_resolucion = ahora
+        resueltas.append(alerta)
+    AlertaStock.objects.bulk_update(resueltas, ['estado', 'cantidad_resolucion', 'fecha_resolucion'])
+
+    # ignore_conflicts respeta la unicidad de alertas activas ante escrituras concurrentes
+    AlertaStock.objects.bulk_create([
+        AlertaStock(producto_id=producto_id, bodega_id=bodega_id, tipo=tipo, cantidad=cantidad, umbral=umbral)
+        for (producto_id, bodega_id, tipo), (cantidad, umbral) in aperturas.items()
+        if (producto_id, bodega_id, tipo) not in activas
+    ], ignore_conflicts=True)
+
+
+# --- Sincronización incremental para dispositivos (POS / handhelds) ---
+
+LIMITE_SINCRONIZACION = 1000
+# Las transacciones en curso pueden confirmar filas con una marca anterior a la consulta;
+# la marca devuelta retrocede este margen para volver a enviarlas (el cliente hace upsert).
+MARGEN_SINCRONIZACION = timedelta(seconds=10)
+RETENCION_ELIMINACIONES = timedelta(days=90)
+
+CAMPOS_SYNC_PRODUCTO = ['id', 'sku', 'nombre', 'descripcion', 'precio', 'marca_id', 'categoria_id', 'imagen', 'fecha_actualizacion']
+CAMPOS_SYNC_STOCK = ['id', 'producto_id', 'bodega_id', 'cantidad', 'stock_minimo', 'stock_maximo', 'ultima_actualizacion']
+CAMPOS_SYNC_PROMOCION = [
+    'id', 'titulo', 'tipo_promocion', 'valor', 'fecha_inicio', 'fecha_fin', 'activo',
+    'object_id', 'codigo_promocional', 'producto_regalo_id', 'fecha_actualizacion',
+]
+
+
+ENTIDADES_SINCRONIZACION = ('productos', 'stock', 'promociones')
+
+
+def _cambios_desde(queryset, campo, desde, limite, campos, posicion=None):
+    """
+    Filas con 'campo' posterior a 'desde', ordenadas por (campo, id) y limitadas a 'limite'.
+    'posicion' es la última (marca, id) ya enviada en esta pasada; se continúa justo después.
+    Retorna (filas, posicion_siguiente), con posicion_siguiente None si no quedan filas.
+    """
+    if desde is not None:
+        queryset = queryset.filter(**{f'{campo}__gt': desde})
+    if posicion is not None:
+        marca, ultimo_id = posicion
+        queryset = queryset.filter(Q(**{f'{campo}__gt': marca}) | Q(**{campo: marca, 'id__gt': ultimo_id}))
+    filas = list(queryset.order_by(campo, 'id').values(*campos)[:limite + 1])
+    if len(filas) <= limite:
+        return filas, None
+    filas = filas[:limite]
+    return filas, (filas[-1][campo], filas[-1]['id'])
+
+
+def _codificar_cursor_sincronizacion(inicio, posiciones):
+    datos = {
+        'inicio': inicio.isoformat(),
+        'posiciones': {entidad: [marca.isoformat(), id_] for entidad, (marca, id_) in posiciones.items()},
+    }
+    return base64.urlsafe_b64encode(json.dumps(datos).encode()).decode()
+
+
+def _leer_cursor_sincronizacion(cursor):
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        inicio = parse_datetime(datos['inicio'])
+        posiciones = {
+            entidad: (parse_datetime(marca), int(id_))
+            for entidad, (marca, id_) in datos['posiciones'].items() if entidad in ENTIDADES_SINCRONIZACION
+        }
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise ValidationError({'cursor': "Cursor de sincronización inválido."})
+    marcas = [inicio] + [marca for marca, _ in posiciones.values()]
+    # Los cursores emitidos siempre llevan zona horaria: una marca sin ella no se puede comparar
+    if any(marca is None or timezone.is_naive(marca) for marca in marcas):
+        raise ValidationError({'cursor': "Cursor de sincronización inválido."})
+    return inicio, posiciones
+
+
+def obtener_cambios_sincronizacion(desde=None, limite=LIMITE_SINCRONIZACION, sucursal_id=None, cursor=None):
+    """
+    Cambios de productos, stock y promociones posteriores a la marca 'desde' (None = todo),
+    más las eliminaciones registradas en ese intervalo. Si la marca es más antigua que la
+    retención de eliminaciones se responde una sincronización completa.
+    'sucursal_id' limita el stock a las bodegas de esa sucursal.
+
+    Si algún conjunto supera 'limite', 'hay_mas' es True y se devuelve un 'cursor' con la
+    última (marca, id) enviada de cada conjunto: la página siguiente se pide con el mismo
+    'desde' y ese cursor, sin repetir ni omitir filas aunque compartan marca. Al terminar la
+    pasada, la 'marca' a guardar es el inicio de la pasada menos MARGEN_SINCRONIZACION, de
+    modo que lo confirmado tarde durante la pasada se vuelve a leer en la siguiente (el
+    cliente hace upsert). Mientras 'hay_mas' es True la marca no avanza.
+    """
+    ahora = timezone.now()
+    completa = desde is None or desde < ahora - RETENCION_ELIMINACIONES
+    if completa:
+        desde = None
+    if cursor:
+        inicio, posiciones = _leer_cursor_sincronizacion(cursor)
+        pendientes = set(posiciones)  # Los conjuntos ausentes del cursor ya terminaron
+    else:
+        inicio, posiciones, pendientes = ahora, {}, set(ENTIDADES_SINCRONIZACION)
+
+    stock = DetalleInventarioBodega.objects.all()
+    if sucursal_id:
+        stock = stock.filter(bodega__sucursal_id=sucursal_id)
+    consultas = {
+        'productos': (Producto.objects.all(), 'fecha_actualizacion', CAMPOS_SYNC_PRODUCTO),
+        'stock': (stock, 'ultima_actualizacion', CAMPOS_SYNC_STOCK),
+        'promociones': (
+            Promocion.objects.annotate(tipo_objetivo=F('content_type__model')),
+            'fecha_actualizacion', CAMPOS_SYNC_PROMOCION + ['tipo_objetivo'],
+        ),
+    }
+    resultados, siguientes = {}, {}
+    for entidad, (queryset, campo, campos) in consultas.items():
+        if entidad not in pendientes:
+            resultados[entidad] = []
+            continue
+        resultados[entidad], posicion = _cambios_desde(queryset, campo, desde, limite, campos, posiciones.get(entidad))
+        if posicion is not None:
+            siguientes[entidad] = posicion
+
+    hay_mas = bool(siguientes)
+    siguiente_marca = desde if hay_mas else inicio - MARGEN_SINCRONIZACION
+    if desde is not None and (siguiente_marca is None or siguiente_marca < desde):
+        siguiente_marca = desde
+
+    eliminados = {entidad: [] for entidad in RegistroEliminacion.Entidad.values}
+    if not completa and not cursor:  # Las eliminaciones de la pasada van en su primera página
+        registros = RegistroEliminacion.objects.filter(fecha_eliminacion__gt=desde).values_list('entidad', 'objeto_id', 'datos')
+        for entidad, objeto_id, datos in registros:
+            eliminados[entidad].append({'id': objeto_id, **datos})
+
+    return {
+        'marca': siguiente_marca,
+        'sincronizacion_completa': completa,
+        'hay_mas': hay_mas,
+        'cursor': _codificar_cursor_sincronizacion(inicio, siguientes) if hay_mas else None,
+        'productos': resultados['productos'],
+        'stock': resultados['stock'],
+        'promociones': resultados['promociones'],
+        'eliminados': {
+            'productos': eliminados[RegistroEliminacion.Entidad.PRODUCTO],
+            'stock': eliminados[RegistroEliminacion.Entidad.STOCK],
+            'promociones': eliminados[RegistroEliminacion.Entidad.PROMOCION],
+        },
+    }
+
+
+def purgar_registros_eliminacion(retencion=RETENCION_ELIMINACIONES):
+    """Elimina las marcas de borrado más antiguas que la retención. Retorna la cantidad eliminada."""
+    eliminados, _ = RegistroEliminacion.objects.filter(fecha_eliminacion__lt=timezone.now() - retencion).delete()
+    return eliminados
+
+
+# --- Snapshots de inventario (cierres) ---
+
+COLUMNAS_SNAPSHOT_INVENTARIO = [
+    'detalle_id', 'sucursal_id', 'bodega_id', 'tipo_bodega', 'producto_id', 'sku', 'producto',
+    'cantidad', 'stock_minimo', 'stock_maximo', 'precio', 'ultima_actualizacion',
+]
+TAMANO_LECTURA_SNAPSHOT = 5000
+
+
+def _iniciar_lectura_consistente():
+    """
+    Fija el aislamiento de la transacción en curso para que todas sus lecturas vean el
+    mismo estado aunque sigan entrando ventas. En PostgreSQL se pide REPEATABLE READ
+    (solo lectura); en SQLite una transacción de lectura ya es consistente por sí misma.
+    Se llama como primera sentencia de una transacción propia (ver _escribir_snapshot).
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+
+
+def reclamar_snapshot_inventario(snapshot_id, incluir_interrumpidos=False):
+    """Igual que reclamar_importacion_stock: toma el trabajo con un UPDATE condicional."""
+    estados = [SnapshotInventario.EstadoSnapshot.PENDIENTE]
+    if incluir_interrumpidos:
+        estados.append(SnapshotInventario.EstadoSnapshot.PROCESANDO)
+    tomados = SnapshotInventario.objects.filter(id=snapshot_id, estado__in=estados).update(
+        estado=SnapshotInventario.EstadoSnapshot.PROCESANDO,
+        fecha_inicio=timezone.now(),
+        mensaje_error=None,
+    )
+    return SnapshotInventario.objects.get(id=snapshot_id) if tomados else None
+
+
+def _escribir_snapshot(archivo_destino):
+    """
+    Lee todo el stock en una transacción consistente, fila a fila con .iterator(), y lo
+    escribe comprimido en 'archivo_destino'. Retorna (fecha_corte, filas, unidades, valor, totales_por_sucursal).
+    """
+    filas = unidades = 0
+    valor = Decimal('0')
+    por_sucursal = defaultdict(lambda: {'filas': 0, 'unidades': 0, 'valor': Decimal('0')})
+    if connection.in_atomic_block and connection.vendor == 'postgresql':
+        # Dentro de otra transacción el atomic sería un savepoint y el aislamiento ya no se puede fijar
+        raise RuntimeError("El snapshot debe generarse fuera de una transacción para leer un estado consistente.")
+    with transaction.atomic():
+        _iniciar_lectura_consistente()
+        fecha_corte = timezone.now()
+        detalles = DetalleInventarioBodega.objects.order_by('bodega__sucursal_id', 'bodega_id', 'producto_id').values_list(
+            'id', 'bodega__sucursal_id', 'bodega_id', 'bodega__tipo_bodega__tipo', 'producto_id', 'producto__sku', 'producto__nombre',
+            'cantidad', 'stock_minimo', 'stock_maximo', 'producto__precio', 'ultima_actualizacion',
+        )
+        with gzip.open(archivo_destino, 'wt', encoding='utf-8', newline='') as salida:
+            escritor = csv.writer(salida)
+            escritor.writerow(COLUMNAS_SNAPSHOT_INVENTARIO)
+            for fila in detalles.iterator(chunk_size=TAMANO_LECTURA_SNAPSHOT):
+                escritor.writerow(fila)
+                sucursal_id, cantidad, precio = fila[1], fila[7], fila[10]
+                valor_fila = cantidad * precio
+                filas += 1
+                unidades += cantidad
+                valor += valor_fila
+                totales = por_sucursal[sucursal_id]
+                totales['filas'] += 1
+                totales['unidades'] += cantidad
+                totales['valor'] += valor_fila
+
+    totales_por_sucursal = {
+        str(sucursal_id): {**totales, 'valor': str(totales['valor'])} for sucursal_id, totales in por_sucursal.items()
+    }
+    return fecha_corte, filas, unidades, valor, totales_por_sucursal
+
+
+def generar_snapshot_inventario(snapshot):
+    """
+    Procesa un snapshot ya reclamado: escribe el CSV comprimido a un archivo temporal,
+    lo guarda en el storage con su checksum y registra los totales. Marca FALLIDO si algo falla.
+    """
+    try:
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, 'snapshot.csv.gz')
+            fecha_corte, filas, unidades, valor, totales_por_sucursal = _escribir_snapshot(ruta)
+
+            sha256 = hashlib.sha256()
+            with open(ruta, 'rb') as archivo:
+                for bloque in iter(lambda: archivo.read(1024 * 1024), b''):
+                    sha256.update(bloque)
+                archivo.seek(0)
+                nombre = f"inventario_{timezone.localtime(fecha_corte):%Y%m%d_%H%M%S}_{snapshot.id}.csv.gz"
+                snapshot.archivo.save(nombre, File(archivo), save=False)
+            snapshot.tamano_bytes = os.path.getsize(ruta)
+    except Exception as e:
+        SnapshotInventario.objects.filter(id=snapshot.id).update(
+            estado=SnapshotInventario.EstadoSnapshot.FALLIDO,
+            mensaje_error=str(e),
+            fecha_fin=timezone.now(),
+        )
+        snapshot.refresh_from_db()
+        return snapshot
+
+    snapshot.checksum_sha256 = sha256.hexdigest()
+    snapshot.fecha_corte = fecha_corte
+    snapshot.total_filas = filas
+    snapshot.total_unidades = unidades
+    snapshot.valor_total = valor
+    snapshot.totales_por_sucursal = totales_por_sucursal
+    snapshot.estado = SnapshotInventario.EstadoSnapshot.COMPLETADO
+    snapshot.fecha_fin = timezone.now()
+    snapshot.save()
+    return snapshot
+
+
+def obtener_snapshot_al(fecha):
+    """Último snapshot completado con corte hasta 'fecha' (o None)."""
+    return SnapshotInventario.objects.filter(
+        estado=SnapshotInventario.EstadoSnapshot.COMPLETADO, fecha_corte__lte=fecha,
+    ).order_by('-fecha_corte').first()
+
+
+def leer_snapshot_inventario(snapshot, sucursal_id=None, bodega_id=None, producto_id=None, desde=0, limite=None):
+    """
+    Filas del snapshot, opcionalmente filtradas por sucursal, bodega o producto. El archivo se
+    lee por bloques y solo se conservan las filas de la ventana [desde, desde + limite), así
+    una consulta paginada no carga el snapshot completo en memoria.
+    Retorna (total_filas_filtradas, DataFrame con la ventana).
+    """
+    filtros = [
+        (columna, valor)
+        for columna, valor in (('sucursal_id', sucursal_id), ('bodega_id', bodega_id), ('producto_id', producto_id))
+        if valor is not None
+    ]
+    hasta = None if limite is None else desde + limite
+    total = 0
+    partes = []
+    with snapshot.archivo.open('rb') as archivo, gzip.GzipFile(fileobj=archivo) as contenido:
+        bloques = pd.read_csv(contenido, chunksize=TAMANO_LECTURA_SNAPSHOT, dtype={
+            'sku': str, 'tipo_bodega': str, 'producto': str, 'precio': str,
+            'stock_minimo': 'Int64', 'stock_maximo': 'Int64',
+        })
+        for bloque in bloques:
+            if sucursal_id is not None and bloque['sucursal_id'].iloc[0] > sucursal_id:
+                break  # El archivo está ordenado por sucursal: no quedan filas de la pedida
+            for columna, valor in filtros:
+                bloque = bloque[bloque[columna] == valor]
+            inicio = total
+            total += len(bloque)
+            if total > desde and (hasta is None or inicio < hasta):
+                partes.append(bloque.iloc[max(desde - inicio, 0):None if hasta is None else hasta - inicio])
+    filas = pd.concat(partes) if partes else pd.DataFrame(columns=COLUMNAS_SNAPSHOT_INVENTARIO)
+    return total, filas
@@ -0,0 +1,176 @@
+from collections import namedtuple
+
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, post_delete, post_init
+from django.dispatch import receiver, Signal
+
+from .models import DetalleInventarioBodega, RegistroEliminacion, TraspasoInternoStock
+from producto_app.models import Producto
+from promocion_app.models import Promocion
+from sucursal_app.models import Bodega
+from bitacora_app.eventos import publicar_al_confirmar, CANAL_STOCK, CANAL_TRASPASOS
+
+# Cambio en una fila de DetalleInventarioBodega. Los valores *_anterior son None si la
+# fila es nueva; 'eliminado' indica que la fila dejó de existir (cantidad_nueva = 0).
+CambioStock = namedtuple('CambioStock', [
+    'producto_id', 'bodega_id',
+    'cantidad_anterior', 'cantidad_nueva',
+    'stock_minimo_anterior', 'stock_minimo_nuevo',
+    'stock_maximo_anterior', 'stock_maximo_nuevo', 'eliminado',
+])
+
+# Se envía (dentro de la transacción que modificó el stock) con cambios=[CambioStock, ...].
+# Los guardados de instancias la envían automáticamente; las escrituras masivas
+# (bulk_create/update) deben enviarla explícitamente con todos sus cambios.
+# Opcionalmente incluye costos={(producto_id, bodega_id): costo_unitario} para los
+# ingresos de costo conocido (recepciones de compra), usado por la valorización.
+stock_modificado = Signal()
+
+
+@receiver(pre_save, sender=DetalleInventarioBodega)
+def capturar_stock_anterior(sender, instance, raw=False, **kwargs):
+    instance._stock_anterior = None
+    if raw or instance.pk is None:
+        return
+    # Releer la fila bloqueada (save() corre en una transacción): los valores con que se cargó la
+    # instancia pueden estar desactualizados si otro guardado se adelantó
+    instance._stock_anterior = sender.objects.select_for_update().filter(pk=instance.pk).values(
+        *sender.CAMPOS_STOCK
+    ).first()
+
+
+@receiver(post_save, sender=DetalleInventarioBodega)
+def notificar_stock_guardado(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_stock_anterior', None) or {}
+    actual = {
+        'cantidad': instance.cantidad,
+        'stock_minimo': instance.stock_minimo,
+        'stock_maximo': instance.stock_maximo,
+    }
+    if any(hasattr(valor, 'resolve_expression') for valor in actual.values()):
+        # Guardado con F(): leer el valor efectivamente escrito
+        actual = sender.objects.filter(pk=instance.pk).values(*sender.CAMPOS_STOCK).first()
+
+    stock_modificado.send(sender=sender, cambios=[CambioStock(
+        producto_id=instance.producto_id,
+        bodega_id=instance.bodega_id,
+        cantidad_anterior=anterior.get('cantidad'),
+        cantidad_nueva=actual['cantidad'],
+        stock_minimo_anterior=anterior.get('stock_minimo'),
+        stock_minimo_nuevo=actual['stock_minimo'],
+        stock_maximo_anterior=anterior.get('stock_maximo'),
+        stock_maximo_nuevo=actual['stock_maximo'],
+        eliminado=False,
+    )])
+
+
+@receiver(post_delete, sender=DetalleInventarioBodega)
+def notificar_stock_eliminado(sender, instance, origin=None, **kwargs):
+    modelo_origen = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if modelo_origen is Producto:
+        return  # Los resúmenes del producto se eliminan en cascada junto con él
+    stock_modificado.send(sender=sender, cambios=[CambioStock(
+        producto_id=instance.producto_id,
+        bodega_id=instance.bodega_id,
+        cantidad_anterior=instance.cantidad,
+        cantidad_nueva=0,
+        stock_minimo_anterior=instance.stock_minimo,
+        stock_minimo_nuevo=None,
+        stock_maximo_anterior=instance.stock_maximo,
+        stock_maximo_nuevo=None,
+        eliminado=True,
+    )])
+
+
+@receiver(stock_modificado)
+def actualizar_resumen_por_cambios(sender, cambios, **kwargs):
+    from .services import actualizar_resumen_stock  # Importación local para evitar ciclos
+    actualizar_resumen_stock(cambios)
+
+
+@receiver(stock_modificado)
+def evaluar_alertas_por_cambios(sender, cambios, **kwargs):
+    from .services import evaluar_alertas_stock  # Importación local para evitar ciclos
+    evaluar_alertas_stock(cambios)
+
+
+@receiver(stock_modificado)
+def valorizar_por_cambios(sender, cambios, costos=None, origen=None, **kwargs):
+    from .services import actualizar_valorizacion_stock  # Importación local para evitar ciclos
+    if origen:
+        actualizar_valorizacion_stock(cambios, costos, origen=origen)
+    else:
+        actualizar_valorizacion_stock(cambios, costos)
+
+
+@receiver(stock_modificado)
+def publicar_cambios_stock(sender, cambios, **kwargs):
+    """Publica los cambios de cantidad en el stream de eventos, un evento por sucursal."""
+    cambios = [c for c in cambios if c.cantidad_anterior != c.cantidad_nueva]
+    if not cambios:
+        return
+    sucursal_por_bodega = dict(
+        Bodega.objects.filter(id__in={c.bodega_id for c in cambios}).values_list('id', 'sucursal_id')
+    )
+    por_sucursal = {}
+    for c in cambios:
+        por_sucursal.setdefault(sucursal_por_bodega.get(c.bodega_id), []).append({
+            'producto_id': c.producto_id,
+            'bodega_id': c.bodega_id,
+            'cantidad_anterior': c.cantidad_anterior or 0,
+            'cantidad_nueva': c.cantidad_nueva,
+            'diferencia': c.cantidad_nueva - (c.cantidad_anterior or 0),
+        })
+    for sucursal_id, detalle in por_sucursal.items():
+        publicar_al_confirmar(CANAL_STOCK, {'sucursal_id': sucursal_id, 'cambios': detalle}, [sucursal_id])
+
+
+# --- Eventos de traspasos ---
+
+@receiver(post_init, sender=TraspasoInternoStock)
+def recordar_estado_traspaso(sender, instance, **kwargs):
+    # __dict__ para no disparar una consulta si el campo fue diferido
+    instance._estado_inicial = instance.__dict__.get('estado')
+
+
+def publicar_evento_traspaso(traspaso, estado_anterior=None):
+    """Publica el alta o el cambio de estado de un traspaso (también para altas masivas)."""
+    publicar_al_confirmar(CANAL_TRASPASOS, {
+        'id': traspaso.id,
+        'estado': traspaso.estado,
+        'estado_anterior': estado_anterior,
+        'sucursal_origen_id': traspaso.sucursal_origen_id,
+        'sucursal_destino_id': traspaso.sucursal_destino_id,
+        'pedido_cliente_origen_id': traspaso.pedido_cliente_origen_id,
+    }, [traspaso.sucursal_origen_id, traspaso.sucursal_destino_id])
+
+
+@receiver(post_save, sender=TraspasoInternoStock)
+def publicar_cambio_traspaso(sender, instance, created, raw=False, **kwargs):
+    if raw or (not created and instance._estado_inicial in (None, instance.estado)):
+        return  # Sin cambio de estado (o estado no cargado: campo diferido)
+    publicar_evento_traspaso(instance, estado_anterior=None if created else instance._estado_inicial)
+    instance._estado_inicial = instance.estado
+
+
+# --- Marcas de borrado para la sincronización incremental ---
+
+@receiver(post_delete, sender=Producto)
+def registrar_eliminacion_producto(sender, instance, **kwargs):
+    RegistroEliminacion.objects.create(entidad=RegistroEliminacion.Entidad.PRODUCTO, objeto_id=instance.pk)
+
+
+@receiver(post_delete, sender=DetalleInventarioBodega)
+def registrar_eliminacion_stock(sender, instance, **kwargs):
+    RegistroEliminacion.objects.create(
+        entidad=RegistroEliminacion.Entidad.STOCK,
+        objeto_id=instance.pk,
+        datos={'producto_id': instance.producto_id, 'bodega_id': instance.bodega_id},
+    )
+
+
+@receiver(post_delete, sender=Promocion)
+def registrar_eliminacion_promocion(sender, instance, **kwargs):
+    RegistroEliminacion.objects.create(entidad=RegistroEliminacion.Entidad.PROMOCION, objeto_id=instance.pk)
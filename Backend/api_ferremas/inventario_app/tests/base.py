@@ -0,0 +1,63 @@
+import shutil
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from inventario_app.models import InventarioSucursal, DetalleInventarioBodega
+from producto_app.models import Producto, Marca, Categoria
+from sucursal_app.models import Sucursal, Bodega, TipoBodega
+from ubicacion_app.models import Region, Comuna
+from usuario_app.models import Personal
+
+
+class InventarioTestCase(TestCase):
+    """Datos base para las pruebas de inventario: dos sucursales con su bodega e inventario y cinco productos."""
+
+    def setUp(self):
+        # Los archivos subidos (importaciones, snapshots) van a un directorio temporal
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+        self.region = Region.objects.create(nombre='Región Metropolitana')
+        self.comuna = Comuna.objects.create(nombre='Santiago', region=self.region)
+        self.tipo_sala = TipoBodega.objects.create(tipo='Sala de Ventas')
+        self.sucursal = Sucursal.objects.create(
+            nombre='Sucursal Centro', region=self.region, comuna=self.comuna, direccion='Alameda 100'
+        )
+        self.otra_sucursal = Sucursal.objects.create(
+            nombre='Sucursal Norte', region=self.region, comuna=self.comuna, direccion='Independencia 200'
+        )
+        self.bodega = Bodega.objects.create(sucursal=self.sucursal, tipo_bodega=self.tipo_sala, direccion='Bodega Centro')
+        self.otra_bodega = Bodega.objects.create(sucursal=self.otra_sucursal, tipo_bodega=self.tipo_sala, direccion='Bodega Norte')
+        self.inventario = InventarioSucursal.objects.create(sucursal=self.sucursal)
+        self.otro_inventario = InventarioSucursal.objects.create(sucursal=self.otra_sucursal)
+
+        marca = Marca.objects.create(nombre='Marca Test')
+        categoria = Categoria.objects.create(nombre='Categoría Test')
+        self.productos = [
+            Producto.objects.create(
+                sku=f'SKU{i}', nombre=f'Producto {i}', marca=marca, categoria=categoria, precio=Decimal('1000') + i
+            )
+            for i in range(5)
+        ]
+
+    def crear_personal(self, nombre, rol, sucursal=None, bodega=None):
+        usuario = get_user_model().objects.create_user(username=nombre, email=f'{nombre}@ferremas.cl', password='x')
+        Personal.objects.create(usuario=usuario, rol=rol, sucursal=sucursal, bodega=bodega)
+        return usuario
+
+    def crear_stock(self, producto, cantidad, bodega=None, **campos):
+        bodega = bodega or self.bodega
+        inventario = self.inventario if bodega.sucursal_id == self.sucursal.id else self.otro_inventario
+        return DetalleInventarioBodega.objects.create(
+            inventario_sucursal=inventario, producto=producto, bodega=bodega, cantidad=cantidad, **campos
+        )
+
+    def stock(self, producto, bodega=None):
+        detalle = DetalleInventarioBodega.objects.filter(producto=producto, bodega=bodega or self.bodega).first()
+        return detalle.cantidad if detalle else None
@@ -0,0 +1,113 @@
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from inventario_app.models import MovimientoStock, ResumenStockProducto, ResumenStockSucursal
+from inventario_app.services import AJUSTE_APLICADO, AJUSTE_OMITIDO, AJUSTE_RECHAZADO
+from inventario_app.signals import stock_modificado
+from .base import InventarioTestCase
+
+
+class AjusteStockLoteTestCase(InventarioTestCase):
+    """Pruebas del ajuste manual de stock en bloque"""
+
+    url = '/api/inventario/ajuste-manual-stock/lote/'
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.crear_personal('bodeguero', 'BODEGUERO', self.sucursal, self.bodega))
+        self.crear_stock(self.productos[0], 10)
+        self.crear_stock(self.productos[1], 2)
+        self.senales = []
+
+        def registrar(sender, cambios, **kwargs):
+            self.senales.append(cambios)
+
+        stock_modificado.connect(registrar, weak=False)
+        self.addCleanup(stock_modificado.disconnect, registrar)
+
+    def item(self, identificador, cantidad, bodega=None, motivo='Pallet mixto'):
+        return {'producto_identificador': identificador, 'bodega_id': (bodega or self.bodega).id, 'cantidad': cantidad, 'motivo': motivo}
+
+    def ajustar(self, items, **datos):
+        return self.client.post(self.url, {'items': items, **datos}, format='json')
+
+    def test_aplica_todo_el_lote_con_una_sola_escritura(self):
+        respuesta = self.ajustar([
+            self.item('SKU0', 5),
+            self.item('producto 1', 3),  # Por nombre, sin distinguir mayúsculas
+            self.item('SKU0', -12),  # Se valida el neto del lote: 10 + 5 - 12
+            self.item('SKU2', 4, bodega=self.otra_bodega),  # Fila nueva en otra sucursal
+        ])
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK, respuesta.data)
+        self.assertEqual((respuesta.data['items_aplicados'], respuesta.data['items_rechazados']), (4, 0))
+        self.assertEqual([r['stock_resultante'] for r in respuesta.data['resultados']], [15, 5, 3, 4])
+        self.assertEqual(
+            [self.stock(self.productos[0]), self.stock(self.productos[1]), self.stock(self.productos[2], self.otra_bodega)],
+            [3, 5, 4],
+        )
+        movimientos = MovimientoStock.objects.filter(producto=self.productos[0]).order_by('id')
+        self.assertEqual(
+            [(m.cantidad_anterior, m.cantidad, m.cantidad_resultante) for m in movimientos], [(10, 5, 15), (15, -12, 3)]
+        )
+
+        # Una sola señal con un cambio neto por (producto, bodega): el resumen se actualiza una vez por lote
+        self.assertEqual(len(self.senales), 1)
+        self.assertEqual(
+            sorted((c.producto_id, c.cantidad_anterior, c.cantidad_nueva) for c in self.senales[0]),
+            sorted([(self.productos[0].id, 10, 3), (self.productos[1].id, 2, 5), (self.productos[2].id, None, 4)]),
+        )
+        self.assertEqual(ResumenStockProducto.objects.get(producto=self.productos[0]).cantidad_total, 3)
+        self.assertEqual(
+            ResumenStockSucursal.objects.get(producto=self.productos[2], sucursal=self.otra_sucursal).cantidad_total, 4
+        )
+
+    def test_un_item_rechazado_anula_el_lote(self):
+        respuesta = self.ajustar([
+            self.item('SKU0', 5),
+            self.item('NO-EXISTE', 1),
+            self.item('SKU1', -3),  # Dejaría el stock en -1
+            self.item('SKU1', 1, bodega=self.otra_bodega, motivo='x') | {'bodega_id': 9999},
+        ])
+
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(respuesta.data['aplicado'])
+        estados = [r['estado'] for r in respuesta.data['resultados']]
+        self.assertEqual(estados, [AJUSTE_OMITIDO, AJUSTE_RECHAZADO, AJUSTE_RECHAZADO, AJUSTE_RECHAZADO])
+        self.assertIn('negativo', respuesta.data['resultados'][2]['error'])
+        self.assertIn('9999', respuesta.data['resultados'][3]['error'])
+        self.assertEqual([self.stock(self.productos[0]), self.stock(self.productos[1])], [10, 2])
+        self.assertFalse(MovimientoStock.objects.exists())
+        self.assertEqual(self.senales, [])
+
+    def test_permitir_parcial_aplica_solo_los_validos(self):
+        respuesta = self.ajustar([
+            self.item('SKU0', -4),
+            self.item('SKU1', -1),
+            self.item('SKU1', -2),  # El neto de SKU1 (-3) deja negativo: se rechazan ambos
+            self.item('NO-EXISTE', 1),
+        ], permitir_parcial=True)
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertEqual((respuesta.data['items_aplicados'], respuesta.data['items_rechazados']), (1, 3))
+        self.assertEqual(
+            [r['estado'] for r in respuesta.data['resultados']],
+            [AJUSTE_APLICADO, AJUSTE_RECHAZADO, AJUSTE_RECHAZADO, AJUSTE_RECHAZADO],
+        )
+        self.assertEqual([self.stock(self.productos[0]), self.stock(self.productos[1])], [6, 2])
+        self.assertEqual(MovimientoStock.objects.count(), 1)
+        self.assertEqual(len(self.senales), 1)
+
+        # Si no queda ningún ítem válido no hay nada que aplicar
+        respuesta = self.ajustar([self.item('SKU1', -5)], permitir_parcial=True)
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.stock(self.productos[1]), 2)
+
+    def test_validacion_de_la_entrada(self):
+        self.assertEqual(self.ajustar([]).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.ajustar([self.item('SKU0', 0)]).status_code, status.HTTP_400_BAD_REQUEST)
+        client = APIClient()
+        client.force_authenticate(self.crear_personal('vendedor', 'VENDEDOR', self.sucursal))
+        respuesta = client.post(self.url, {'items': [self.item('SKU0', 1)]}, format='json')
+        self.assertEqual(respuesta.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,55 @@
+import pandas as pd
+from django.db.models import F
+
+from inventario_app.models import AlertaStock
+from inventario_app.services import sumar_stock_en_bloque
+from .base import InventarioTestCase
+
+
+class AlertaStockTestCase(InventarioTestCase):
+    """Pruebas de apertura y resolución de alertas por cruce de umbrales"""
+
+    def activas(self):
+        return list(AlertaStock.objects.filter(estado=AlertaStock.EstadoAlerta.ACTIVA).values_list(
+            'producto__sku', 'tipo', 'cantidad'
+        ))
+
+    def test_abre_una_sola_alerta_al_cruzar_el_minimo_y_la_resuelve_al_volver(self):
+        detalle = self.crear_stock(self.productos[0], 50, stock_minimo=10, stock_maximo=100)
+        self.assertFalse(AlertaStock.objects.exists())
+
+        detalle.cantidad = 8
+        detalle.save()
+        detalle.cantidad = 5
+        detalle.save()
+        self.assertEqual(self.activas(), [('SKU0', AlertaStock.TipoAlerta.BAJO_MINIMO, 8)])
+
+        detalle.cantidad = F('cantidad') + 20
+        detalle.save()
+        alerta = AlertaStock.objects.get()
+        self.assertEqual(alerta.estado, AlertaStock.EstadoAlerta.RESUELTA)
+        self.assertEqual(alerta.cantidad_resolucion, 25)
+
+    def test_carga_en_bloque_evalua_solo_las_filas_tocadas(self):
+        self.crear_stock(self.productos[0], 50, stock_minimo=10, stock_maximo=100)
+        sumar_stock_en_bloque(pd.DataFrame([
+            dict(inventario_sucursal_id=self.inventario.id, producto_id=self.productos[0].id, bodega_id=self.bodega.id,
+                 cantidad=200, stock_minimo=float('nan'), stock_maximo=float('nan')),
+            dict(inventario_sucursal_id=self.inventario.id, producto_id=self.productos[1].id, bodega_id=self.bodega.id,
+                 cantidad=1, stock_minimo=5, stock_maximo=float('nan')),
+        ]))
+        self.assertCountEqual(self.activas(), [
+            ('SKU0', AlertaStock.TipoAlerta.SOBRE_MAXIMO, 250),
+            ('SKU1', AlertaStock.TipoAlerta.BAJO_MINIMO, 1),
+        ])
+
+    def test_cambio_de_umbral_o_eliminacion_resuelve_la_alerta(self):
+        detalle = self.crear_stock(self.productos[0], 150, stock_maximo=100)
+        otro = self.crear_stock(self.productos[1], 1, stock_minimo=5)
+        self.assertEqual(len(self.activas()), 2)
+
+        detalle.stock_maximo = 500
+        detalle.save()
+        otro.delete()
+        self.assertEqual(self.activas(), [])
+        self.assertEqual(AlertaStock.objects.filter(estado=AlertaStock.EstadoAlerta.RESUELTA).count(), 2)
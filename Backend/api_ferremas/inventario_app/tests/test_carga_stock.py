@@ -0,0 +1,46 @@
+import pandas as pd
+
+from inventario_app.models import DetalleInventarioBodega
+from inventario_app.services import cargar_stock_desde_dataframe
+from .base import InventarioTestCase
+
+
+class CargaStockDataFrameTestCase(InventarioTestCase):
+    """Pruebas del pipeline vectorizado de carga de stock"""
+
+    def test_agrupa_skus_repetidos_y_suma_sobre_stock_existente(self):
+        self.crear_stock(self.productos[0], 5, stock_minimo=3)
+        df = pd.DataFrame({
+            'producto_sku': ['SKU0', 'SKU0', 'SKU1'],
+            'bodega_id': [self.bodega.id, self.bodega.id, self.otra_bodega.id],
+            'cantidad': [10, 2, 7],
+            'stock_minimo': [None, 4, None],
+        })
+
+        registros, errores = cargar_stock_desde_dataframe(df)
+
+        self.assertEqual(errores, [])
+        self.assertEqual(len(registros), 2)
+        detalle = DetalleInventarioBodega.objects.get(producto=self.productos[0], bodega=self.bodega)
+        self.assertEqual(detalle.cantidad, 17)
+        self.assertEqual(detalle.stock_minimo, 4)
+        self.assertEqual(self.stock(self.productos[1], self.otra_bodega), 7)
+
+    def test_reporta_errores_por_fila_sin_abortar_las_validas(self):
+        df = pd.DataFrame({
+            'producto_sku': ['SKU0', 'NOPE', '', 'SKU2', 'SKU3', 'SKU4'],
+            'bodega_id': [self.bodega.id, self.bodega.id, self.bodega.id, 'x', 999, self.bodega.id],
+            'cantidad': [1, 1, 1, 1, 1, 'abc'],
+        })
+
+        registros, errores = cargar_stock_desde_dataframe(df)
+
+        self.assertEqual(len(registros), 1)
+        self.assertCountEqual(errores, [
+            "Fila 3: Producto con SKU 'NOPE' no encontrado.",
+            "Fila 4: producto_sku, bodega_id o cantidad no pueden estar vacíos.",
+            "Fila 5: ID de Bodega 'x' inválido.",
+            "Fila 6: Bodega con ID '999' no encontrada.",
+            "Fila 7: Cantidad 'abc' inválida.",
+        ])
+        self.assertEqual(DetalleInventarioBodega.objects.count(), 1)
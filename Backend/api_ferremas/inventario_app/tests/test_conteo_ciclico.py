@@ -0,0 +1,60 @@
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from inventario_app.models import ConteoCiclico, MovimientoStock
+from .base import InventarioTestCase
+
+
+class ConteoCiclicoTestCase(InventarioTestCase):
+    """Pruebas del endpoint de conciliación de conteos cíclicos"""
+
+    url = '/api/inventario/conteos-ciclicos/'
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.crear_personal('bodeguero', 'BODEGUERO', self.sucursal, self.bodega))
+        for producto in self.productos[:3]:
+            self.crear_stock(producto, 10)
+
+    def test_simular_no_modifica_el_stock(self):
+        respuesta = self.client.post(self.url, {
+            'bodega': self.bodega.id, 'simular': True, 'lineas': [{'sku': 'SKU0', 'cantidad': 7}],
+        }, format='json')
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertEqual(respuesta.data['lineas_con_diferencia'], 3)  # SKU1 y SKU2 no contados cuentan como cero
+        self.assertEqual(self.stock(self.productos[0]), 10)
+        self.assertFalse(ConteoCiclico.objects.exists())
+
+    def test_aplica_diferencias_en_bloque_y_deja_un_movimiento_por_producto(self):
+        respuesta = self.client.post(self.url, {
+            'bodega': self.bodega.id,
+            'motivo': 'Conteo mensual',
+            'conteo_completo': False,
+            'lineas': [
+                {'sku': 'SKU0', 'cantidad': 4}, {'sku': 'SKU0', 'cantidad': 3},  # SKU repetido: se suma
+                {'sku': 'SKU1', 'cantidad': 10},
+                {'sku': 'SKU3', 'cantidad': 2},
+            ],
+        }, format='json')
+
+        self.assertEqual(respuesta.status_code, status.HTTP_201_CREATED, respuesta.data)
+        self.assertEqual((respuesta.data['unidades_faltantes'], respuesta.data['unidades_sobrantes']), (3, 2))
+        self.assertEqual([d['sku'] for d in respuesta.data['diferencias']], ['SKU0', 'SKU3'])
+        self.assertEqual(self.stock(self.productos[0]), 7)
+        self.assertEqual(self.stock(self.productos[2]), 10)  # Conteo parcial: lo no contado no se toca
+        self.assertEqual(self.stock(self.productos[3]), 2)
+        self.assertEqual(
+            sorted(MovimientoStock.objects.values_list('producto__sku', 'cantidad_anterior', 'cantidad_resultante')),
+            [('SKU0', 10, 7), ('SKU3', 0, 2)],
+        )
+
+    def test_sku_desconocido_rechaza_todo_el_conteo(self):
+        respuesta = self.client.post(self.url, {
+            'bodega': self.bodega.id, 'lineas': [{'sku': 'SKU0', 'cantidad': 1}, {'sku': 'NOPE', 'cantidad': 1}],
+        }, format='json')
+
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.stock(self.productos[0]), 10)
+        self.assertFalse(MovimientoStock.objects.exists())
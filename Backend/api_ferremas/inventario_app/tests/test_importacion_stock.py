@@ -0,0 +1,98 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from inventario_app import services
+from inventario_app.models import DetalleInventarioBodega, ImportacionStock
+from inventario_app.services import (
+    procesar_importacion_stock,
+    reclamar_importacion_stock,
+)
+from .base import InventarioTestCase
+
+
+class ImportacionStockTestCase(InventarioTestCase):
+    """Pruebas del procesamiento por lotes reanudable de importaciones de stock"""
+
+    def crear_importacion(self, contenido, tamano_lote=2):
+        importacion = ImportacionStock(nombre_archivo_original='stock.csv', tamano_lote=tamano_lote)
+        importacion.archivo.save('stock.csv', ContentFile(contenido.encode()), save=False)
+        importacion.save()
+        return importacion
+
+    def test_reanuda_desde_el_ultimo_lote_confirmado_sin_duplicar(self):
+        # Las líneas en blanco no cuentan como filas de datos al calcular el punto de reanudación
+        contenido = (
+            'producto_sku,bodega_id,cantidad\n'
+            f'SKU0,{self.bodega.id},1\n\n'
+            f'SKU1,{self.bodega.id},1\n'
+            f'SKU2,{self.bodega.id},1\n\n'
+            f'SKU3,{self.bodega.id},1\n'
+            f'SKU4,{self.bodega.id},1\n'
+        )
+        importacion = reclamar_importacion_stock(self.crear_importacion(contenido).id)
+        original = services.cargar_stock_desde_dataframe
+        llamadas = []
+
+        def falla_en_segundo_lote(df):
+            llamadas.append(len(df))
+            if len(llamadas) == 2:
+                raise RuntimeError('caída del worker')
+            return original(df)
+
+        with mock.patch.object(services, 'cargar_stock_desde_dataframe', side_effect=falla_en_segundo_lote):
+            importacion = procesar_importacion_stock(importacion)
+
+        self.assertEqual(importacion.estado, ImportacionStock.EstadoImportacion.FALLIDO)
+        self.assertEqual(importacion.lotes_completados, 1)
+        self.assertEqual(importacion.total_filas, 5)
+
+        # El reintento vuelve a PENDIENTE y retoma en el segundo lote
+        ImportacionStock.objects.filter(id=importacion.id).update(estado=ImportacionStock.EstadoImportacion.PENDIENTE)
+        importacion = procesar_importacion_stock(reclamar_importacion_stock(importacion.id))
+
+        self.assertEqual(importacion.estado, ImportacionStock.EstadoImportacion.COMPLETADO)
+        self.assertEqual(importacion.filas_procesadas, 5)
+        self.assertEqual(importacion.lotes_completados, 3)
+        for producto in self.productos:
+            self.assertEqual(self.stock(producto), 1)
+
+    def test_registra_filas_con_error_con_su_numero_de_fila(self):
+        contenido = (
+            'producto_sku,bodega_id,cantidad\n'
+            f'SKU0,{self.bodega.id},2\n'
+            f'SKU1,{self.bodega.id},2\n'
+            f'NOPE,{self.bodega.id},2\n'
+        )
+        importacion = procesar_importacion_stock(reclamar_importacion_stock(self.crear_importacion(contenido).id))
+
+        self.assertEqual(importacion.estado, ImportacionStock.EstadoImportacion.COMPLETADO_CON_ERRORES)
+        self.assertEqual((importacion.filas_procesadas, importacion.filas_fallidas), (2, 1))
+        self.assertEqual(importacion.errores, ["Fila 4: Producto con SKU 'NOPE' no encontrado."])
+
+    def test_falta_de_columnas_marca_la_importacion_como_fallida(self):
+        importacion = self.crear_importacion('producto_sku,cantidad\nSKU0,1\n')
+        importacion = procesar_importacion_stock(reclamar_importacion_stock(importacion.id))
+
+        self.assertEqual(importacion.estado, ImportacionStock.EstadoImportacion.FALLIDO)
+        self.assertIn('bodega_id', importacion.mensaje_error)
+
+    def test_una_importacion_solo_la_reclama_un_worker(self):
+        importacion = self.crear_importacion(f'producto_sku,bodega_id,cantidad\nSKU0,{self.bodega.id},1\n')
+
+        self.assertIsNotNone(reclamar_importacion_stock(importacion.id))
+        self.assertIsNone(reclamar_importacion_stock(importacion.id))
+        # Sigue avanzando: tampoco se considera interrumpida
+        self.assertIsNone(reclamar_importacion_stock(importacion.id, incluir_interrumpidas=True))
+
+    def test_importacion_sin_actividad_se_retoma_como_interrumpida(self):
+        importacion = self.crear_importacion(f'producto_sku,bodega_id,cantidad\nSKU0,{self.bodega.id},1\n')
+        reclamar_importacion_stock(importacion.id)
+        ImportacionStock.objects.filter(id=importacion.id).update(
+            fecha_actualizacion=timezone.now() - services.IMPORTACION_SIN_ACTIVIDAD - timedelta(minutes=1)
+        )
+
+        self.assertIsNone(reclamar_importacion_stock(importacion.id))
+        self.assertIsNotNone(reclamar_importacion_stock(importacion.id, incluir_interrumpidas=True))
@@ -0,0 +1,98 @@
+import pandas as pd
+from django.db.models import F, Min, Sum
+
+from inventario_app.models import DetalleInventarioBodega, ResumenStockProducto, ResumenStockSucursal
+from inventario_app.services import reconstruir_resumen_stock, sumar_stock_en_bloque
+from .base import InventarioTestCase
+
+
+class ResumenStockTestCase(InventarioTestCase):
+    """Pruebas del resumen de stock mantenido por deltas"""
+
+    def assertResumenCoincideConDetalle(self):
+        esperado = {
+            (fila['producto_id'], fila['bodega__sucursal_id']): (fila['total'], fila['umbral'])
+            for fila in DetalleInventarioBodega.objects.values('producto_id', 'bodega__sucursal_id').annotate(
+                total=Sum('cantidad'), umbral=Min('stock_minimo')
+            ).order_by()
+        }
+        real = {
+            (r.producto_id, r.sucursal_id): (r.cantidad_total, r.umbral_minimo)
+            for r in ResumenStockSucursal.objects.all()
+        }
+        self.assertEqual(real, esperado)
+        esperado_producto = {
+            fila['producto_id']: (fila['total'], fila['umbral'])
+            for fila in DetalleInventarioBodega.objects.values('producto_id').annotate(
+                total=Sum('cantidad'), umbral=Min('stock_minimo')
+            ).order_by()
+        }
+        real_producto = {r.producto_id: (r.cantidad_total, r.umbral_minimo) for r in ResumenStockProducto.objects.all()}
+        self.assertEqual(real_producto, esperado_producto)
+        for resumen in ResumenStockProducto.objects.all():
+            self.assertEqual(resumen.holgura, resumen.cantidad_total - (resumen.umbral_minimo or 0))
+
+    def test_save_y_expresiones_f_actualizan_por_delta(self):
+        detalle = self.crear_stock(self.productos[0], 10, stock_minimo=5)
+        self.crear_stock(self.productos[0], 4, bodega=self.otra_bodega, stock_minimo=2)
+        self.assertResumenCoincideConDetalle()
+
+        detalle.cantidad = F('cantidad') + 3
+        detalle.save()
+        self.assertResumenCoincideConDetalle()
+        self.assertEqual(ResumenStockProducto.objects.get(producto=self.productos[0]).cantidad_total, 17)
+
+    def test_instancias_desactualizadas_no_desvian_el_resumen(self):
+        detalle = self.crear_stock(self.productos[0], 10, stock_minimo=5)
+        primera = DetalleInventarioBodega.objects.get(pk=detalle.pk)
+        segunda = DetalleInventarioBodega.objects.get(pk=detalle.pk)
+
+        primera.cantidad = 15
+        primera.save()
+        segunda.cantidad = 15  # Cargada con 10: la diferencia real contra la base es 0
+        segunda.save()
+        self.assertResumenCoincideConDetalle()
+
+        primera.cantidad = 7  # Cree que pasa de 15 a 7; la base ya tiene 15 también
+        primera.stock_minimo = 9
+        primera.save()
+        segunda.cantidad = 20
+        segunda.save()
+        self.assertResumenCoincideConDetalle()
+        resumen = ResumenStockProducto.objects.get(producto=self.productos[0])
+        self.assertEqual((resumen.cantidad_total, resumen.umbral_minimo), (20, 5))
+
+    def test_cambio_de_minimo_y_eliminacion_recalculan_el_umbral(self):
+        detalle = self.crear_stock(self.productos[0], 10, stock_minimo=5)
+        otro = self.crear_stock(self.productos[0], 4, bodega=self.otra_bodega, stock_minimo=2)
+
+        otro.stock_minimo = 8
+        otro.save()
+        self.assertEqual(ResumenStockProducto.objects.get(producto=self.productos[0]).umbral_minimo, 5)
+
+        detalle.delete()
+        self.assertResumenCoincideConDetalle()
+        otro.delete()
+        self.assertFalse(ResumenStockProducto.objects.filter(producto=self.productos[0]).exists())
+        self.assertFalse(ResumenStockSucursal.objects.exists())
+
+    def test_carga_en_bloque_y_eliminacion_masiva(self):
+        self.crear_stock(self.productos[1], 3)
+        sumar_stock_en_bloque(pd.DataFrame([
+            dict(inventario_sucursal_id=self.inventario.id, producto_id=p.id, bodega_id=self.bodega.id,
+                 cantidad=5, stock_minimo=3, stock_maximo=float('nan'))
+            for p in self.productos[:3]
+        ]))
+        self.assertResumenCoincideConDetalle()
+
+        DetalleInventarioBodega.objects.filter(producto=self.productos[1]).delete()
+        self.assertResumenCoincideConDetalle()
+
+    def test_reconstruir_repara_desviaciones(self):
+        self.crear_stock(self.productos[0], 10, stock_minimo=5)
+        # Un update() directo no envía la señal y deja el resumen desfasado
+        DetalleInventarioBodega.objects.update(cantidad=99)
+        self.assertEqual(ResumenStockProducto.objects.get().cantidad_total, 10)
+
+        reconstruir_resumen_stock()
+        self.assertResumenCoincideConDetalle()
@@ -0,0 +1,137 @@
+import base64
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from inventario_app.models import DetalleInventarioBodega, RegistroEliminacion
+from inventario_app.services import RETENCION_ELIMINACIONES, purgar_registros_eliminacion
+from producto_app.models import Producto
+from .base import InventarioTestCase
+
+
+class SincronizacionDeltaTestCase(InventarioTestCase):
+    """Pruebas del feed de cambios incremental para dispositivos"""
+
+    url = '/api/inventario/sincronizacion/'
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.crear_personal('vendedor', 'VENDEDOR', self.sucursal))
+
+    def sincronizar(self, **parametros):
+        respuesta = self.client.get(self.url, parametros)
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK, getattr(respuesta, 'data', None))
+        return respuesta.json()
+
+    def paginar(self, **parametros):
+        """Recorre todas las páginas de una pasada; retorna (páginas, última respuesta)."""
+        paginas, cursor = [], None
+        while True:
+            respuesta = self.sincronizar(**parametros, **({'cursor': cursor} if cursor else {}))
+            paginas.append(respuesta)
+            if not respuesta['hay_mas']:
+                return paginas, respuesta
+            self.assertIsNotNone(respuesta['cursor'])
+            cursor = respuesta['cursor']
+
+    def test_paginas_con_marcas_iguales_no_omiten_ni_repiten_filas(self):
+        detalles = [self.crear_stock(producto, i) for i, producto in enumerate(self.productos)]
+        detalles += [self.crear_stock(producto, 1, bodega=self.otra_bodega) for producto in self.productos[:2]]
+        # Todas las filas comparten marca: el corte de página depende solo del id
+        marca = timezone.now() - timedelta(minutes=5)
+        DetalleInventarioBodega.objects.update(ultima_actualizacion=marca)
+        Producto.objects.update(fecha_actualizacion=marca)
+
+        paginas, ultima = self.paginar(limite=2)
+
+        stock = [fila['id'] for pagina in paginas for fila in pagina['stock']]
+        productos = [fila['id'] for pagina in paginas for fila in pagina['productos']]
+        self.assertEqual(stock, sorted(detalle.id for detalle in detalles))
+        self.assertEqual(productos, sorted(producto.id for producto in self.productos))
+        self.assertEqual(len(paginas), 4)  # 7 filas de stock de a 2
+        # La marca solo avanza al terminar la pasada
+        self.assertTrue(all(pagina['marca'] is None for pagina in paginas[:-1]))
+        self.assertIsNotNone(ultima['marca'])
+        self.assertTrue(paginas[0]['sincronizacion_completa'])
+
+        # Con 'sucursal' solo viaja el stock de sus bodegas
+        stock_sucursal = [fila['bodega_id'] for fila in self.sincronizar(sucursal=self.sucursal.id)['stock']]
+        self.assertEqual(stock_sucursal, [self.bodega.id] * 5)
+
+    def test_sincronizacion_incremental_y_marcas_de_borrado(self):
+        detalle = self.crear_stock(self.productos[0], 5)
+        otro = self.crear_stock(self.productos[1], 3)
+        marca = self.sincronizar()['marca']
+        antiguedad = timezone.now() - timedelta(minutes=5)
+        DetalleInventarioBodega.objects.update(ultima_actualizacion=antiguedad)
+        Producto.objects.update(fecha_actualizacion=antiguedad)
+
+        detalle.cantidad = 9
+        detalle.save()
+        otro_id, producto_id = otro.id, self.productos[4].id
+        otro.delete()
+        self.productos[4].delete()
+
+        cambios = self.sincronizar(desde=marca)
+        self.assertFalse(cambios['sincronizacion_completa'])
+        self.assertEqual([(fila['id'], fila['cantidad']) for fila in cambios['stock']], [(detalle.id, 9)])
+        self.assertEqual(cambios['productos'], [])
+        self.assertEqual(cambios['eliminados']['stock'], [
+            {'id': otro_id, 'producto_id': self.productos[1].id, 'bodega_id': self.bodega.id},
+        ])
+        self.assertEqual(cambios['eliminados']['productos'], [{'id': producto_id}])
+
+        # Una marca más antigua que la retención obliga a reemplazar los datos locales
+        antigua = (timezone.now() - RETENCION_ELIMINACIONES - timedelta(days=1)).isoformat()
+        completa = self.sincronizar(desde=antigua)
+        self.assertTrue(completa['sincronizacion_completa'])
+        self.assertEqual(completa['eliminados']['stock'], [])
+        self.assertEqual(len(completa['stock']), 1)
+
+    def test_cursor_o_marca_malformados_responden_400(self):
+        def codificar(datos):
+            return base64.urlsafe_b64encode(json.dumps(datos).encode()).decode()
+
+        invalidos = [
+            'zz', 'no es base64!', codificar('texto'), codificar([1, 2]), codificar({'inicio': 'ayer', 'posiciones': {}}),
+            codificar({'inicio': timezone.now().isoformat(), 'posiciones': {'stock': ['x', 1]}}),
+            codificar({'inicio': timezone.now().isoformat(), 'posiciones': {'stock': [timezone.now().isoformat(), 'x']}}),
+            codificar({'inicio': timezone.now().isoformat(), 'posiciones': []}),
+            codificar({'inicio': '2024-01-01T00:00:00', 'posiciones': {}}),
+        ]
+        for cursor in invalidos:
+            with self.subTest(cursor=cursor):
+                respuesta = self.client.get(self.url, {'cursor': cursor, 'desde': timezone.now().isoformat()})
+                self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn('cursor', respuesta.json())
+
+        self.assertEqual(self.client.get(self.url, {'desde': 'ayer'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'limite': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_purga_de_registros_de_eliminacion(self):
+        self.crear_stock(self.productos[0], 1).delete()
+        self.crear_stock(self.productos[1], 1).delete()
+        vencido = RegistroEliminacion.objects.order_by('id').first()
+        RegistroEliminacion.objects.filter(pk=vencido.pk).update(
+            fecha_eliminacion=timezone.now() - RETENCION_ELIMINACIONES - timedelta(days=1)
+        )
+
+        self.assertEqual(purgar_registros_eliminacion(), 1)
+        self.assertEqual(RegistroEliminacion.objects.count(), 1)
+        self.assertEqual(purgar_registros_eliminacion(), 0)
+
+        # El comando no permite una retención menor a la del endpoint
+        with self.assertRaises(CommandError):
+            call_command('purgar_registros_eliminacion', dias=RETENCION_ELIMINACIONES.days - 1, stdout=StringIO())
+        RegistroEliminacion.objects.update(fecha_eliminacion=timezone.now() - timedelta(days=400))
+        salida = StringIO()
+        call_command('purgar_registros_eliminacion', stdout=salida)
+        self.assertIn('1 registros', salida.getvalue())
+        self.assertFalse(RegistroEliminacion.objects.exists())
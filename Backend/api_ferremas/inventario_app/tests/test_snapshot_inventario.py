@@ -0,0 +1,125 @@
+import hashlib
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+import pandas as pd
+
+from django.core.management import call_command
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from inventario_app import services
+from inventario_app.models import SnapshotInventario
+from inventario_app.services import generar_snapshot_inventario, leer_snapshot_inventario, reclamar_snapshot_inventario
+from .base import InventarioTestCase
+
+
+class SnapshotInventarioTestCase(InventarioTestCase):
+    """Pruebas de la generación y lectura de snapshots de inventario"""
+
+    def setUp(self):
+        super().setUp()
+        for i, producto in enumerate(self.productos[:4]):
+            self.crear_stock(producto, 10 + i, stock_minimo=2 if i % 2 else None)
+        for i, producto in enumerate(self.productos[:3]):
+            self.crear_stock(producto, 5 + i, bodega=self.otra_bodega)
+        # Bloques de lectura pequeños: la paginación y los filtros cruzan límites de bloque
+        lectura = mock.patch.object(services, 'TAMANO_LECTURA_SNAPSHOT', 2)
+        lectura.start()
+        self.addCleanup(lectura.stop)
+
+    def generar(self):
+        snapshot = SnapshotInventario.objects.create(descripcion='Cierre de prueba')
+        return generar_snapshot_inventario(reclamar_snapshot_inventario(snapshot.id))
+
+    def claves(self, filas):
+        return list(zip(filas['bodega_id'], filas['producto_id']))
+
+    def test_ida_y_vuelta_del_archivo_con_totales(self):
+        snapshot = self.generar()
+
+        self.assertEqual(snapshot.estado, SnapshotInventario.EstadoSnapshot.COMPLETADO, snapshot.mensaje_error)
+        self.assertEqual((snapshot.total_filas, snapshot.total_unidades), (7, 64))
+        valor_centro = sum((10 + i) * (Decimal('1000') + i) for i in range(4))
+        valor_norte = sum((5 + i) * (Decimal('1000') + i) for i in range(3))
+        self.assertEqual(snapshot.valor_total, valor_centro + valor_norte)
+        norte = snapshot.totales_por_sucursal[str(self.otra_sucursal.id)]
+        self.assertEqual((norte['filas'], norte['unidades'], Decimal(norte['valor'])), (3, 18, valor_norte))
+        with snapshot.archivo.open('rb') as archivo:
+            self.assertEqual(hashlib.sha256(archivo.read()).hexdigest(), snapshot.checksum_sha256)
+
+        # El snapshot no cambia con el stock vivo
+        self.crear_stock(self.productos[4], 99)
+        total, filas = leer_snapshot_inventario(snapshot)
+        self.assertEqual(total, 7)
+        self.assertEqual(self.claves(filas), [(self.bodega.id, p.id) for p in self.productos[:4]]
+                         + [(self.otra_bodega.id, p.id) for p in self.productos[:3]])
+        primera = filas.iloc[0]
+        self.assertEqual((primera['sku'], primera['cantidad'], primera['tipo_bodega']), ('SKU0', 10, 'Sala de Ventas'))
+        self.assertTrue(pd.isna(primera['stock_minimo']))  # Los vacíos vuelven como nulos, no como 0
+        self.assertEqual(filas.iloc[1]['stock_minimo'], 2)
+
+    def test_filtros_y_ventanas_de_lectura(self):
+        snapshot = self.generar()
+
+        total, filas = leer_snapshot_inventario(snapshot, sucursal_id=self.sucursal.id)
+        self.assertEqual((total, list(filas['producto_id'])), (4, [p.id for p in self.productos[:4]]))
+        total, filas = leer_snapshot_inventario(snapshot, sucursal_id=self.otra_sucursal.id)
+        self.assertEqual((total, list(filas['cantidad'])), (3, [5, 6, 7]))
+        total, filas = leer_snapshot_inventario(snapshot, bodega_id=self.otra_bodega.id, producto_id=self.productos[1].id)
+        self.assertEqual((total, list(filas['cantidad'])), (1, [6]))
+        total, filas = leer_snapshot_inventario(snapshot, producto_id=self.productos[0].id)
+        self.assertEqual((total, self.claves(filas)), (2, [(self.bodega.id, self.productos[0].id), (self.otra_bodega.id, self.productos[0].id)]))
+
+        # Ventanas consecutivas cubren todas las filas una sola vez, también con filtro
+        _, completas = leer_snapshot_inventario(snapshot)
+        paginas = [leer_snapshot_inventario(snapshot, desde=desde, limite=3) for desde in (0, 3, 6, 9)]
+        self.assertEqual([total for total, _ in paginas], [7] * 4)
+        self.assertEqual([len(filas) for _, filas in paginas], [3, 3, 1, 0])
+        self.assertEqual(sum((self.claves(filas) for _, filas in paginas), []), self.claves(completas))
+        total, filas = leer_snapshot_inventario(snapshot, sucursal_id=self.sucursal.id, desde=1, limite=2)
+        self.assertEqual((total, list(filas['producto_id'])), (4, [p.id for p in self.productos[1:3]]))
+
+    def test_endpoint_pagina_las_filas_del_snapshot(self):
+        client = APIClient()
+        client.force_authenticate(self.crear_personal('contable', 'CONTABLE'))
+        url = '/api/inventario/snapshots-inventario/'
+        pendiente = SnapshotInventario.objects.create()
+        self.assertEqual(client.get(f'{url}{pendiente.id}/stock/').status_code, status.HTTP_409_CONFLICT)
+
+        snapshot = self.generar()
+        respuesta = client.get(f'{url}{snapshot.id}/stock/', {'sucursal': self.sucursal.id, 'page_size': 3, 'page': 2})
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertEqual(respuesta.data['count'], 4)
+        self.assertEqual([fila['producto_id'] for fila in respuesta.data['results']], [self.productos[3].id])
+        self.assertEqual(respuesta.data['snapshot']['id'], snapshot.id)
+        self.assertEqual(client.get(f'{url}{snapshot.id}/stock/', {'page': 9}).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_reclamar_retoma_solo_trabajos_interrumpidos_si_se_pide(self):
+        snapshot = SnapshotInventario.objects.create()
+        reclamado = reclamar_snapshot_inventario(snapshot.id)
+        self.assertEqual(reclamado.estado, SnapshotInventario.EstadoSnapshot.PROCESANDO)
+        self.assertIsNotNone(reclamado.fecha_inicio)
+        # Otro worker no lo toma mientras está en proceso
+        self.assertIsNone(reclamar_snapshot_inventario(snapshot.id))
+
+        # El worker se cayó a mitad de camino: solo se retoma con incluir_interrumpidos
+        SnapshotInventario.objects.filter(id=snapshot.id).update(mensaje_error='Worker detenido')
+        call_command('generar_snapshot_inventario', stdout=StringIO())
+        snapshot.refresh_from_db()
+        self.assertEqual(snapshot.estado, SnapshotInventario.EstadoSnapshot.PROCESANDO)
+
+        retomado = reclamar_snapshot_inventario(snapshot.id, incluir_interrumpidos=True)
+        self.assertIsNone(retomado.mensaje_error)
+        self.assertGreaterEqual(retomado.fecha_inicio, reclamado.fecha_inicio)
+
+        SnapshotInventario.objects.filter(id=snapshot.id).update(estado=SnapshotInventario.EstadoSnapshot.PROCESANDO)
+        salida = StringIO()
+        call_command('generar_snapshot_inventario', incluir_interrumpidos=True, stdout=salida)
+        snapshot.refresh_from_db()
+        self.assertEqual(snapshot.estado, SnapshotInventario.EstadoSnapshot.COMPLETADO)
+        self.assertEqual(snapshot.total_filas, 7)
+        self.assertIn(f'Snapshot #{snapshot.id}: 7 filas', salida.getvalue())
+        # Un snapshot completado no se vuelve a reclamar
+        self.assertIsNone(reclamar_snapshot_inventario(snapshot.id, incluir_interrumpidos=True))
@@ -0,0 +1,106 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from inventario_app import services
+from inventario_app.models import DetalleInventarioBodega, DetalleTraspasoStock, ResumenStockProducto, TraspasoInternoStock
+from .base import InventarioTestCase
+
+
+class TraspasoStockTestCase(InventarioTestCase):
+    """Pruebas del efecto en stock de los cambios de estado de un traspaso interno"""
+
+    url = '/api/inventario/traspasos-internos/'
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser(username='admin', email='admin@ferremas.cl', password='x')
+        )
+        for i, producto in enumerate(self.productos):
+            self.crear_stock(producto, 10 + i)
+
+    def crear_traspaso(self, cantidades):
+        traspaso = TraspasoInternoStock.objects.create(
+            sucursal_origen=self.sucursal, sucursal_destino=self.otra_sucursal,
+            motivo=TraspasoInternoStock.MotivoTraspaso.REABASTECIMIENTO,
+        )
+        for producto, cantidad in zip(self.productos, cantidades):
+            DetalleTraspasoStock.objects.create(
+                traspaso=traspaso, producto=producto, cantidad_solicitada=cantidad,
+                bodega_origen=self.bodega, bodega_destino=self.otra_bodega,
+            )
+        return traspaso
+
+    def cambiar_estado(self, traspaso, estado, campo=None, cantidades=()):
+        datos = {'estado': estado}
+        if campo:
+            detalles = traspaso.detalles_traspaso.order_by('id')
+            datos['detalles_traspaso'] = [{'id': d.id, campo: c} for d, c in zip(detalles, cantidades)]
+        return self.client.patch(f'{self.url}{traspaso.id}/', datos, format='json')
+
+    def test_despacho_descuenta_origen_y_recepcion_suma_en_destino(self):
+        traspaso = self.crear_traspaso([5, 3])
+        EstadoTraspaso = TraspasoInternoStock.EstadoTraspaso
+
+        respuesta = self.cambiar_estado(traspaso, EstadoTraspaso.EN_TRANSITO, 'cantidad_enviada', [5, 3])
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK, respuesta.data)
+        self.assertEqual([self.stock(self.productos[0]), self.stock(self.productos[1])], [5, 8])
+        self.assertIsNone(self.stock(self.productos[0], self.otra_bodega))
+
+        # Recibir sin verificar no mueve stock
+        self.cambiar_estado(traspaso, EstadoTraspaso.RECIBIDO_PENDIENTE_VERIFICACION)
+        self.assertIsNone(self.stock(self.productos[0], self.otra_bodega))
+
+        respuesta = self.cambiar_estado(traspaso, EstadoTraspaso.COMPLETADO, 'cantidad_recibida', [4, 3])
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK, respuesta.data)
+        self.assertEqual(
+            [self.stock(self.productos[0], self.otra_bodega), self.stock(self.productos[1], self.otra_bodega)], [4, 3]
+        )
+        self.assertEqual([self.stock(self.productos[0]), self.stock(self.productos[1])], [5, 8])
+        # La unidad no recibida queda fuera del total de la red
+        self.assertEqual(ResumenStockProducto.objects.get(producto=self.productos[0]).cantidad_total, 9)
+
+    def test_stock_insuficiente_revierte_el_despacho(self):
+        traspaso = self.crear_traspaso([5, 50])
+
+        respuesta = self.cambiar_estado(
+            traspaso, TraspasoInternoStock.EstadoTraspaso.EN_TRANSITO, 'cantidad_enviada', [5, 50]
+        )
+
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Stock insuficiente', str(respuesta.data))
+        traspaso.refresh_from_db()
+        self.assertEqual(traspaso.estado, TraspasoInternoStock.EstadoTraspaso.PENDIENTE)
+        # Ni el estado, ni las cantidades enviadas, ni el stock de la línea válida quedan aplicados
+        self.assertEqual(list(traspaso.detalles_traspaso.values_list('cantidad_enviada', flat=True)), [None, None])
+        self.assertEqual([self.stock(self.productos[0]), self.stock(self.productos[1])], [10, 11])
+
+    def test_despacho_bloquea_el_stock_con_una_sola_consulta(self):
+        traspaso = self.crear_traspaso([1, 1, 1, 1, 1])
+        traspaso.detalles_traspaso.update(cantidad_enviada=1)
+        tabla = DetalleInventarioBodega._meta.db_table
+
+        # Sin la escritura en bloque, la única lectura del stock es la que lo bloquea
+        with mock.patch.object(services, 'sumar_stock_en_bloque', return_value=[]), \
+                CaptureQueriesContext(connection) as consultas:
+            services.aplicar_stock_traspaso(traspaso, descontar_origen=True)
+        lecturas_stock = [
+            q['sql'] for q in consultas.captured_queries if q['sql'].startswith('SELECT') and f'"{tabla}"' in q['sql']
+        ]
+        self.assertEqual(len(lecturas_stock), 1)
+
+    def test_consultas_del_despacho_no_crecen_con_las_lineas(self):
+        consultas_por_traspaso = []
+        for lineas in (1, 5):
+            traspaso = self.crear_traspaso([1] * lineas)
+            traspaso.detalles_traspaso.update(cantidad_enviada=1)
+            with CaptureQueriesContext(connection) as consultas:
+                services.aplicar_stock_traspaso(traspaso, descontar_origen=True)
+            consultas_por_traspaso.append(len(consultas))
+        self.assertEqual(consultas_por_traspaso[0], consultas_por_traspaso[1])
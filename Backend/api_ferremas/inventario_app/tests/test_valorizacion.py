@@ -0,0 +1,148 @@
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from inventario_app.models import (
+    CapaCosto, DetalleInventarioBodega, DetalleTraspasoStock, TraspasoInternoStock, ValorizacionStock,
+)
+from inventario_app.services import aplicar_stock_traspaso, sumar_stock_en_bloque
+from .base import InventarioTestCase
+
+
+class ValorizacionStockTestCase(InventarioTestCase):
+    """Pruebas de la valorización FIFO y por promedio ponderado del stock"""
+
+    def movimientos(self, filas):
+        """'filas' es una lista de (producto, cantidad, costo_unitario_o_None, bodega_o_None)."""
+        df = pd.DataFrame.from_records([
+            (
+                (self.inventario if (bodega or self.bodega) == self.bodega else self.otro_inventario).id,
+                producto.id, (bodega or self.bodega).id, cantidad, costo,
+            )
+            for producto, cantidad, costo, bodega in filas
+        ], columns=['inventario_sucursal_id', 'producto_id', 'bodega_id', 'cantidad', 'costo_unitario'])
+        df['stock_minimo'] = np.nan
+        df['stock_maximo'] = np.nan
+        if df['costo_unitario'].isna().all():
+            df = df.drop(columns='costo_unitario')
+        return sumar_stock_en_bloque(df)
+
+    def comprar(self, producto, cantidad, costo, bodega=None):
+        return self.movimientos([(producto, cantidad, Decimal(costo), bodega)])
+
+    def vender(self, producto, cantidad, bodega=None):
+        detalle = DetalleInventarioBodega.objects.get(producto=producto, bodega=bodega or self.bodega)
+        detalle.cantidad -= cantidad
+        detalle.save()
+
+    def capas(self, producto, bodega=None):
+        return list(CapaCosto.objects.filter(producto=producto, bodega=bodega or self.bodega).order_by('id').values_list(
+            'cantidad_restante', 'costo_unitario', 'origen'
+        ))
+
+    def valorizacion(self, producto, bodega=None):
+        return ValorizacionStock.objects.get(producto=producto, bodega=bodega or self.bodega)
+
+    def test_compra_venta_parcial_y_segunda_compra_consumen_fifo(self):
+        producto = self.productos[0]
+        self.comprar(producto, 10, '100')
+        self.vender(producto, 4)
+        self.assertEqual(self.valorizacion(producto).valor_fifo, Decimal('600'))  # Costo de venta: 4 x 100
+        self.comprar(producto, 10, '130')
+
+        self.assertEqual(self.capas(producto), [
+            (6, Decimal('100'), CapaCosto.OrigenCapa.COMPRA), (10, Decimal('130'), CapaCosto.OrigenCapa.COMPRA),
+        ])
+        self.assertEqual(self.valorizacion(producto).valor_fifo, Decimal('1900'))
+
+        # La segunda venta agota la capa antigua y toma 2 unidades de la nueva: 6 x 100 + 2 x 130
+        self.vender(producto, 8)
+        valorizacion = self.valorizacion(producto)
+        self.assertEqual(Decimal('1900') - valorizacion.valor_fifo, Decimal('860'))
+        self.assertEqual(self.capas(producto), [(8, Decimal('130'), CapaCosto.OrigenCapa.COMPRA)])
+        self.assertEqual(valorizacion.cantidad, self.stock(producto))
+
+    def test_promedio_ponderado_se_recalcula_con_cada_ingreso(self):
+        producto = self.productos[0]
+        self.comprar(producto, 10, '100')
+        self.vender(producto, 4)
+        self.comprar(producto, 10, '130')
+
+        valorizacion = self.valorizacion(producto)
+        self.assertEqual(valorizacion.costo_promedio, Decimal('118.75'))  # (6 x 100 + 10 x 130) / 16
+        self.assertEqual(valorizacion.valor_promedio, Decimal('1900'))
+
+        # Las salidas descuentan al promedio vigente, sin cambiarlo
+        self.vender(producto, 8)
+        valorizacion = self.valorizacion(producto)
+        self.assertEqual(valorizacion.costo_promedio, Decimal('118.75'))
+        self.assertEqual(valorizacion.valor_promedio, Decimal('950'))
+        self.assertEqual(valorizacion.valor_fifo, Decimal('1040'))
+
+        self.vender(producto, 8)
+        valorizacion = self.valorizacion(producto)
+        self.assertEqual((valorizacion.cantidad, valorizacion.valor_promedio, valorizacion.valor_fifo), (0, 0, 0))
+        self.assertEqual(self.capas(producto), [])
+
+    def test_traspaso_mueve_capas_al_costo_de_origen(self):
+        producto = self.productos[0]
+        self.comprar(producto, 6, '100')
+        self.comprar(producto, 10, '130')
+        traspaso = TraspasoInternoStock.objects.create(
+            sucursal_origen=self.sucursal, sucursal_destino=self.otra_sucursal,
+            motivo=TraspasoInternoStock.MotivoTraspaso.REABASTECIMIENTO,
+        )
+        detalle = DetalleTraspasoStock.objects.create(
+            traspaso=traspaso, producto=producto, cantidad_solicitada=8, cantidad_enviada=8,
+            bodega_origen=self.bodega, bodega_destino=self.otra_bodega,
+        )
+
+        aplicar_stock_traspaso(traspaso, descontar_origen=True)
+        detalle.refresh_from_db()
+        self.assertEqual(detalle.costo_unitario, Decimal('107.5'))  # (6 x 100 + 2 x 130) / 8, según FIFO
+        self.assertEqual(self.capas(producto), [(8, Decimal('130'), CapaCosto.OrigenCapa.COMPRA)])
+
+        detalle.cantidad_recibida = 8
+        detalle.save()
+        aplicar_stock_traspaso(traspaso, descontar_origen=False)
+        self.assertEqual(
+            self.capas(producto, self.otra_bodega), [(8, Decimal('107.5'), CapaCosto.OrigenCapa.TRASPASO)]
+        )
+        destino = self.valorizacion(producto, self.otra_bodega)
+        self.assertEqual((destino.cantidad, destino.valor_fifo), (8, Decimal('860')))
+        # Entre las dos bodegas se conserva el valor FIFO de lo comprado
+        self.assertEqual(self.valorizacion(producto).valor_fifo + destino.valor_fifo, Decimal('1900'))
+
+    def test_carga_en_bloque_deja_las_mismas_capas_que_el_guardado_por_fila(self):
+        por_fila, en_bloque = self.productos[:2], self.productos[2:4]
+        costos = [('100', '130'), ('50', '80')]
+
+        # Por fila: una carga por producto con su costo; la venta y el ingreso sin costo, con save()
+        for producto, (primero, segundo) in zip(por_fila, costos):
+            self.comprar(producto, 10, primero)
+            self.comprar(producto, 5, segundo)
+            self.vender(producto, 12)
+            detalle = DetalleInventarioBodega.objects.get(producto=producto, bodega=self.bodega)
+            detalle.cantidad += 4
+            detalle.save()
+
+        # En bloque: cada paso es una sola carga con todos los productos
+        for paso in range(2):
+            self.movimientos([
+                (producto, (10, 5)[paso], Decimal(precios[paso]), None) for producto, precios in zip(en_bloque, costos)
+            ])
+        self.movimientos([(producto, -12, None, None) for producto in en_bloque])
+        self.movimientos([(producto, 4, None, None) for producto in en_bloque])
+
+        for producto, equivalente in zip(por_fila, en_bloque):
+            self.assertEqual(self.capas(producto), self.capas(equivalente))
+            a, b = self.valorizacion(producto), self.valorizacion(equivalente)
+            self.assertEqual(
+                (a.cantidad, a.costo_promedio, a.valor_promedio, a.valor_fifo),
+                (b.cantidad, b.costo_promedio, b.valor_promedio, b.valor_fifo),
+            )
+        # 3 unidades que quedan de la compra a 130 y las 4 que vuelven al promedio vigente (1650 / 15)
+        self.assertEqual(self.capas(por_fila[0]), [
+            (3, Decimal('130'), CapaCosto.OrigenCapa.COMPRA), (4, Decimal('110'), CapaCosto.OrigenCapa.TRASPASO),
+        ])
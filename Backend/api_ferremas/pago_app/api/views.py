@@ -16,6 +16,7 @@ from django.conf import settings
 from django.urls import reverse
 # from .filters import PagoFilter # Si creas una clase de filtro dedicada
 from pedido_app.services import modificar_stock_para_pedido # Importar el servicio de stock
+from bitacora_app.idempotencia import idempotente
 from rest_framework.exceptions import ValidationError as DRFValidationError # Para capturar errores de validación del servicio
  
 class ListarMetodosPagoAPIView(APIView):
@@ -34,6 +35,7 @@ class CrearTransaccionConPedidoAPIView(APIView):
     """
     permission_classes = [permissions.IsAuthenticated] # Requiere que el usuario esté logueado
 
+    @idempotente  # Por fuera del atomic: la clave se registra antes de crear el pedido
     @transaction.atomic
     def post(self, request, *args, **kwargs):
 
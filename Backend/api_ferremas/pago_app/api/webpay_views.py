@@ -1,3 +1,5 @@
+import logging
+
 from django.conf import settings
 from django.urls import reverse
 from django.shortcuts import get_object_or_404, redirect # Importar redirect
@@ -12,10 +14,13 @@ from transbank.common.integration_type import IntegrationType
 
 from pedido_app.models import PedidoCliente, EstadoPedidoCliente
 from ..models import Pago, MetodoPago, EstadoPago, TipoCuota # Importar TipoCuota
-from bitacora_app.utils import crear_registro_actividad # Importar el helper
+from bitacora_app.utils import crear_registro_actividad, registrar_actividad_diferida # Importar el helper
+from bitacora_app.idempotencia import idempotente, guardar_respuesta_idempotente
 from pedido_app.services import modificar_stock_para_pedido # Importar el servicio de stock
 from rest_framework.exceptions import ValidationError as DRFValidationError # Para capturar errores de validación del servicio
 
+logger = logging.getLogger(__name__)
+
 class IniciarPagoWebpayView(APIView):
     """
     Vista para iniciar una transacción de pago con Webpay Plus.
@@ -24,6 +29,9 @@ class IniciarPagoWebpayView(APIView):
     """
     permission_classes = [permissions.IsAuthenticated]
 
+    # Un reintento con la misma Idempotency-Key devuelve el mismo token sin abrir otra transacción.
+    # Sin transacción del decorador: la llamada a Transbank no debe mantener una transacción abierta
+    @idempotente(transaccion=False)
     def post(self, request, pedido_id, *args, **kwargs):
         pedido_cliente = get_object_or_404(PedidoCliente, id=pedido_id, cliente=request.user.perfil_cliente)
 
@@ -66,15 +74,13 @@ class IniciarPagoWebpayView(APIView):
             current_integration_type = IntegrationType.TEST if settings.DEBUG else IntegrationType.LIVE
             options = WebpayOptions(settings.WEBPAY_COMMERCE_CODE, settings.WEBPAY_API_KEY_SECRET, current_integration_type)
 
-            # Log detallado antes de la llamada a Transbank
-            print(f"DEBUG Webpay Create Params: buy_order='{buy_order}', session_id='{session_id}', amount={amount}, return_url='{return_url}'")
-            print(f"DEBUG Webpay Options Used: commerce_code='{options.commerce_code}', integration_type='{options.integration_type}'") # No imprimimos la API Key por seguridad, pero asegúrate que es la correcta.
+            # Log detallado antes de la llamada a Transbank (sin la API Key)
+            logger.debug("Webpay create: buy_order=%s session_id=%s amount=%s return_url=%s commerce_code=%s integration_type=%s",
+                         buy_order, session_id, amount, return_url, options.commerce_code, options.integration_type)
 
             tx = WebpayPlusTransaction(options)
             response_transbank = tx.create(buy_order, session_id, amount, return_url)
-
-            print(f"DEBUG Webpay: Tipo de response_transbank: {type(response_transbank)}")
-            print(f"DEBUG Webpay: Contenido de response_transbank: {response_transbank}")
+            logger.debug("Webpay create: respuesta de Transbank (%s): %s", type(response_transbank).__name__, response_transbank)
 
             token_val = None
             url_val = None
@@ -83,46 +89,46 @@ class IniciarPagoWebpayView(APIView):
             if hasattr(response_transbank, 'token') and hasattr(response_transbank, 'url'):
                 token_val = response_transbank.token
                 url_val = response_transbank.url
-                print(f"DEBUG Webpay: Acceso como objeto: token='{token_val}', url='{url_val}'")
             elif isinstance(response_transbank, dict):
                 token_val = response_transbank.get('token')
                 url_val = response_transbank.get('url')
-                print(f"DEBUG Webpay: Acceso como dict: token='{token_val}', url='{url_val}'")
             
             if not token_val or not url_val:
-                print(f"ERROR Webpay: No se pudo extraer 'token' o 'url' de la respuesta. Respuesta original: {response_transbank}")
+                logger.error("Webpay create: no se pudo extraer 'token' o 'url' de la respuesta: %s", response_transbank)
                 # Levantar una excepción más específica podría ser útil si tienes un manejador de errores global
                 raise ValueError(f"Respuesta inesperada de Transbank o atributos no encontrados. Respuesta: {response_transbank}")
 
-            # Registrar actividad
-            crear_registro_actividad(
-                usuario=request.user,
-                accion="INICIAR_PAGO_WEBPAY",
-                descripcion=f"Usuario {request.user.email} inició pago Webpay para pedido #{pedido_cliente.id}. Token Webpay: {token_val}",
-                objeto_relacionado=pedido_cliente,
-                request=request
-            )            
-            # Crear o actualizar un registro de Pago para este intento de transacción Webpay.
-            # Esto permite que un pedido pueda tener varios intentos de pago.
-            # Se busca un pago PENDIENTE para este pedido con método WEBPAY, si no existe, se crea.
-            # Si existen múltiples pagos PENDIENTES para el mismo pedido con Webpay,
-            # esta lógica podría necesitar ser más específica para seleccionar cuál actualizar.
-            # Una opción es siempre crear uno nuevo y que el retorno lo busque por token.
-            pago_obj, created = Pago.objects.update_or_create(
-                pedido_cliente=pedido_cliente,
-                estado_pago=EstadoPago.PENDIENTE, # Solo actualiza/crea si está pendiente
-                metodo_pago=MetodoPago.WEBPAY,    # y es Webpay
-                defaults={
-                    'monto_pagado': amount, # Guardar el monto del intento
-                    'token_webpay_transaccion': token_val,
-                    'datos_adicionales_pasarela': {'buy_order': buy_order, 'session_id': session_id, 'return_url': return_url, 'token_ws_inicial': token_val}
-                }
-            )
+            # Solo las escrituras (y la respuesta idempotente) van en la transacción, después de Transbank
+            with transaction.atomic():
+                # Registrar actividad
+                crear_registro_actividad(
+                    usuario=request.user,
+                    accion="INICIAR_PAGO_WEBPAY",
+                    descripcion=f"Usuario {request.user.email} inició pago Webpay para pedido #{pedido_cliente.id}. Token Webpay: {token_val}",
+                    objeto_relacionado=pedido_cliente,
+                    request=request
+                )
+                # Crear o actualizar un registro de Pago para este intento de transacción Webpay.
+                # Esto permite que un pedido pueda tener varios intentos de pago.
+                # Se busca un pago PENDIENTE para este pedido con método WEBPAY, si no existe, se crea.
+                # Si existen múltiples pagos PENDIENTES para el mismo pedido con Webpay,
+                # esta lógica podría necesitar ser más específica para seleccionar cuál actualizar.
+                # Una opción es siempre crear uno nuevo y que el retorno lo busque por token.
+                pago_obj, created = Pago.objects.update_or_create(
+                    pedido_cliente=pedido_cliente,
+                    estado_pago=EstadoPago.PENDIENTE, # Solo actualiza/crea si está pendiente
+                    metodo_pago=MetodoPago.WEBPAY,    # y es Webpay
+                    defaults={
+                        'monto_pagado': amount, # Guardar el monto del intento
+                        'token_webpay_transaccion': token_val,
+                        'datos_adicionales_pasarela': {'buy_order': buy_order, 'session_id': session_id, 'return_url': return_url, 'token_ws_inicial': token_val}
+                    }
+                )
 
-            return Response({
-                "token": token_val,
-                "url_redirect": url_val
-            }, status=status.HTTP_200_OK)
+                return guardar_respuesta_idempotente(request, Response({
+                    "token": token_val,
+                    "url_redirect": url_val
+                }, status=status.HTTP_200_OK))
 
         except (ValueError, Exception) as e: # Capturar ValueError también
             # Loggear el error
@@ -158,29 +164,34 @@ class WebpayRetornoView(APIView):
         if tbk_token_from_get and not token_ws:
             # Si recibimos TBK_TOKEN en GET y no token_ws, el usuario canceló o hubo timeout.
             # No intentamos hacer commit. Redirigimos directamente a la página de fallo/cancelación.
-            print(f"DEBUG WebpayRetorno (GET): Recepción de TBK_TOKEN ({tbk_token_from_get}). Asumiendo cancelación/timeout por usuario.")
             frontend_cancel_url = f"{settings.FRONTEND_URL}/pago-fallido?error_message=TransaccionCanceladaPorUsuario"
             
             tbk_orden_compra = request.GET.get("TBK_ORDEN_COMPRA")
             if tbk_orden_compra:
                 frontend_cancel_url += f"&pedido_id={tbk_orden_compra}"
                 try:
-                    pedido_cliente_cancelado = PedidoCliente.objects.get(id=tbk_orden_compra)
-                    # Solo cambiar estado si estaba PENDIENTE, para no afectar pedidos ya procesados o fallidos por otras razones.
-                    if pedido_cliente_cancelado.estado == EstadoPedidoCliente.PENDIENTE:
-                        pedido_cliente_cancelado.estado = EstadoPedidoCliente.CANCELADO # O FALLIDO
-                        pedido_cliente_cancelado.save(update_fields=['estado'])
-                        crear_registro_actividad(
-                            usuario=pedido_cliente_cancelado.cliente.usuario if pedido_cliente_cancelado.cliente and hasattr(pedido_cliente_cancelado.cliente, 'usuario') else None,
-                            accion="PAGO_WEBPAY_CANCELADO_USUARIO",
-                            descripcion=f"Usuario canceló/timeout pago Webpay en formulario para pedido #{tbk_orden_compra}. TBK_TOKEN: {tbk_token_from_get}",
-                            objeto_relacionado=pedido_cliente_cancelado,
-                            request=request
-                        )
-                except PedidoCliente.DoesNotExist:
-                    print(f"DEBUG WebpayRetorno (GET): Pedido con ID (TBK_ORDEN_COMPRA) {tbk_orden_compra} no encontrado al procesar cancelación/timeout.")
+                    with transaction.atomic():  # El cambio de estado y su registro en bitácora (outbox) van juntos
+                        pedido_cliente_cancelado = PedidoCliente.objects.get(id=tbk_orden_compra)
+                        # Solo cambiar estado si estaba PENDIENTE, para no afectar pedidos ya procesados o fallidos por otras razones.
+                        if pedido_cliente_cancelado.estado == EstadoPedidoCliente.PENDIENTE:
+                            pedido_cliente_cancelado.estado = EstadoPedidoCliente.CANCELADO # O FALLIDO
+                            pedido_cliente_cancelado.save(update_fields=['estado'])
+                            registrar_actividad_diferida(
+                                usuario=pedido_cliente_cancelado.cliente.usuario if pedido_cliente_cancelado.cliente and hasattr(pedido_cliente_cancelado.cliente, 'usuario') else None,
+                                accion="PAGO_WEBPAY_CANCELADO_USUARIO",
+                                descripcion=f"Usuario canceló/timeout pago Webpay en formulario para pedido #{tbk_orden_compra}. TBK_TOKEN: {tbk_token_from_get}",
+                                objeto_relacionado=pedido_cliente_cancelado,
+                                request=request
+                            )
+                except (PedidoCliente.DoesNotExist, ValueError):
+                    pass  # TBK_ORDEN_COMPRA no corresponde a un pedido: solo se redirige
                 except Exception as e_cancel_save:
-                    print(f"DEBUG WebpayRetorno (GET): Error al actualizar estado del pedido {tbk_orden_compra} a cancelado/fallido: {str(e_cancel_save)}")
+                    registrar_actividad_diferida(
+                        usuario=None,
+                        accion="ERROR_CANCELAR_PAGO_WEBPAY",
+                        descripcion=f"Error al marcar como cancelado el pedido #{tbk_orden_compra} tras cancelación/timeout en Webpay: {str(e_cancel_save)}",
+                        request=request
+                    )
             
             return redirect(frontend_cancel_url)
 
@@ -190,7 +201,6 @@ class WebpayRetornoView(APIView):
         if not token_to_commit:
             # Idealmente, redirigir a una página de error en el frontend
             # Esto se alcanza si no hay token_ws y tampoco se manejó un tbk_token_from_get (es decir, una URL mal formada)
-            print("DEBUG WebpayRetorno (GET): No se recibió token_ws para commit ni TBK_TOKEN para cancelación.")
             return Response({"error": "Token de Webpay no válido o ausente para la operación."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
@@ -200,7 +210,6 @@ class WebpayRetornoView(APIView):
             
             tx = WebpayPlusTransaction(options)
             response_transbank = tx.commit(token_to_commit) # Usar el token_ws para el commit
-            print(f"DEBUG WebpayRetorno: Respuesta de tx.commit(): {response_transbank}")
             buy_order = response_transbank.get('buy_order') # Acceso como dict
             pedido_cliente = get_object_or_404(PedidoCliente, id=buy_order)
 
@@ -248,7 +257,7 @@ class WebpayRetornoView(APIView):
                     if is_approved
                     else f"Pago Webpay fallido/rechazado para pedido #{buy_order}. ResponseCode: {response_transbank.get('response_code')}. Token: {token_to_commit}."
                 )
-                crear_registro_actividad(
+                registrar_actividad_diferida(
                     usuario=pedido_cliente.cliente.usuario if pedido_cliente and pedido_cliente.cliente else None, # Usuario asociado al pedido
                     accion=accion_bitacora,
                     descripcion=descripcion_bitacora,
@@ -277,34 +286,28 @@ class WebpayRetornoView(APIView):
                         if isinstance(e_stock, DRFValidationError) and hasattr(e_stock, 'detail'):
                             error_detail_msg = str(e_stock.detail)
                         
-                        print(f"ERROR CRÍTICO (WebpayRetornoView): Pedido {pedido_cliente.id} PAGADO pero falló la modificación de stock: {error_detail_msg}")
                         pedido_cliente.notas_internas = (pedido_cliente.notas_internas or "") + f"\nError al modificar stock tras pago Webpay: {error_detail_msg}"
                         pedido_cliente.estado = EstadoPedidoCliente.RECHAZADO_STOCK # O un estado de error específico
                         pedido_cliente.save(update_fields=['notas_internas', 'estado'])
                         
                         # Registrar actividad de error de stock post-pago
-                        crear_registro_actividad(usuario=pedido_cliente.cliente.usuario if pedido_cliente.cliente and hasattr(pedido_cliente.cliente, 'usuario') else None, accion="ERROR_STOCK_POST_PAGO", descripcion=f"Pedido {pedido_cliente.id} pagado, pero error al modificar stock: {error_detail_msg}", objeto_relacionado=pedido_cliente, request=request)
+                        registrar_actividad_diferida(usuario=pedido_cliente.cliente.usuario if pedido_cliente.cliente and hasattr(pedido_cliente.cliente, 'usuario') else None, accion="ERROR_STOCK_POST_PAGO", descripcion=f"Pedido {pedido_cliente.id} pagado, pero error al modificar stock: {error_detail_msg}", objeto_relacionado=pedido_cliente, request=request)
 
                         # Considerar cómo manejar esto con el cliente. ¿Reembolso automático? ¿Notificación?
                         frontend_failure_url = f"{settings.FRONTEND_URL}/pago-fallido?pedido_id={pedido_cliente.id}&error_code=StockPostPagoFail"
                         return redirect(frontend_failure_url)
                     
                     frontend_success_url = f"{settings.FRONTEND_URL}/pedido-confirmado/{pedido_cliente.id}" # Cambiado a la ruta de confirmación de pedido
-                    print(f"DEBUG WebpayRetorno: Pago aprobado. Redirigiendo a: {frontend_success_url}")
                     return redirect(frontend_success_url)
                 else:
                     pedido_cliente.estado = EstadoPedidoCliente.FALLIDO # O PENDIENTE si se permite reintento
                     pedido_cliente.save(update_fields=['estado'])
                     # Redirigir a una página de fallo en el frontend
                     frontend_failure_url = f"{settings.FRONTEND_URL}/pago-fallido?pedido_id={pedido_cliente.id}&error_message=TransaccionRechazada"
-                    print(f"DEBUG WebpayRetorno: Pago fallido/rechazado. Redirigiendo a: {frontend_failure_url}")
                     return redirect(frontend_failure_url)
 
         except Exception as e:
-            import traceback
-            tb_str = traceback.format_exc()
             # Intentar obtener el pedido si es posible, para el log
-            print(f"DEBUG WebpayRetorno: Excepción durante el commit o procesamiento: {str(e)}\n{tb_str}")
             buy_order_val_error = response_transbank.get('buy_order') if 'response_transbank' in locals() and isinstance(response_transbank, dict) else "Desconocido"
             pedido_obj_error = None
             if buy_order_val_error != "Desconocido": # Verificar si buy_order_val_error fue definido
@@ -312,7 +315,7 @@ class WebpayRetornoView(APIView):
                     pedido_obj_error = PedidoCliente.objects.get(id=buy_order_val_error)
                 except PedidoCliente.DoesNotExist:
                     pass # No hacer nada si el pedido no se encuentra
-            crear_registro_actividad(
+            registrar_actividad_diferida(
                 usuario=None, # Difícil saber el usuario aquí si todo falla antes de obtener el pedido
                 accion="ERROR_CONFIRMAR_PAGO_WEBPAY",
                 descripcion=f"Error al confirmar pago Webpay. Token: {token_to_commit if token_to_commit else (tbk_token_from_get if tbk_token_from_get else 'No disponible')}. Error: {str(e)}",
@@ -322,5 +325,4 @@ class WebpayRetornoView(APIView):
             frontend_error_url = f"{settings.FRONTEND_URL}/pago-fallido?error_message=ErrorInternoConfirmacion"
             if pedido_obj_error:
                 frontend_error_url += f"&pedido_id={pedido_obj_error.id}"
-            print(f"DEBUG WebpayRetorno: Error general. Redirigiendo a: {frontend_error_url}")
             return redirect(frontend_error_url)
\ No newline at end of file
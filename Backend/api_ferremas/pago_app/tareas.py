@@ -0,0 +1,41 @@
+"""
+Manejadores del outbox (bitacora_app.outbox) para los efectos secundarios de los pagos.
+Los ejecuta el comando `procesar_outbox`, fuera de la solicitud HTTP.
+"""
+from bitacora_app.models import RegistroActividad
+from bitacora_app.outbox import manejador_outbox
+from .models import Pago, EstadoPago, MetodoPago
+
+EVENTO_CAMBIO_PAGO = 'pago.registrar_cambio'
+
+
+@manejador_outbox(EVENTO_CAMBIO_PAGO)
+def registrar_cambio_pago(evento):
+    """Escribe en la bitácora la creación o actualización de un Pago."""
+    datos = evento.payload
+    pago = Pago.objects.select_related('pedido_cliente__cliente').filter(pk=datos['pago_id']).first()
+
+    # Actor: el cliente del pedido, si no quien creó el pedido
+    usuario_id = None
+    if pago:
+        pedido = pago.pedido_cliente
+        usuario_id = (pedido.cliente.usuario_id if pedido.cliente else None) or pedido.creado_por_personal_id
+
+    detalle = (f"registro de pago #{datos['pago_id']} para el pedido #{datos['pedido_id']}. "
+               f"{'Estado' if datos['creado'] else 'Nuevo estado'}: {EstadoPago(datos['estado_pago']).label}, "
+               f"Método: {MetodoPago(datos['metodo_pago']).label}.")
+    if datos['creado']:
+        accion = "CREAR_PAGO"
+        descripcion = f"Se creó el {detalle}"
+    else:
+        accion = "ACTUALIZAR_PAGO"
+        descripcion = f"Se actualizó el {detalle}"
+
+    RegistroActividad.objects.create(
+        usuario_id=usuario_id,
+        accion=accion,
+        descripcion=descripcion,
+        content_type_id=datos['content_type_id'],
+        object_id=datos['pago_id'],
+        fecha_hora=evento.fecha_creacion,
+    )
@@ -1,12 +1,19 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
 from rest_framework import serializers
 from ..models import (
     PedidoProveedor, DetallePedidoProveedor,
-    PedidoCliente, DetallePedidoCliente
+    PedidoCliente, DetallePedidoCliente, SnapshotPedidoEntregado,
+    RecepcionPedidoProveedor, DetalleRecepcionPedidoProveedor,
 )
 from proveedor_app.api.serializers import ProveedorSerializer # Assuming this exists
 from producto_app.api.serializers import ProductoSerializer
 from usuario_app.api.serializers import UsuarioSerializer, ClienteSerializer
 from sucursal_app.api.serializers import SucursalSerializer, BodegaSerializer # Importar BodegaSerializer
+from sucursal_app.models import Sucursal
+from ..services import PLAZO_REPOSICION_DIAS, DIAS_COBERTURA, TRANSICIONES_MASIVAS, MAX_PEDIDOS_TRANSICION_MASIVA
+from promocion_app.services import precios_finales_para_productos
 
 
 class PedidoClienteListSerializer(serializers.ModelSerializer):
@@ -40,7 +47,8 @@ class DetallePedidoProveedorSerializer(serializers.ModelSerializer):
             'subtotal_linea_display',
         ]
         # Hacemos 'pedido_proveedor' de solo lectura para que la validación anidada no lo exija.
-        read_only_fields = ('id', 'pedido_proveedor', 'producto_detalle', 'subtotal_linea_display')
+        # 'cantidad_recibida' solo la escriben las recepciones (endpoint 'recibir' o RECIBIDO_COMPLETO).
+        read_only_fields = ('id', 'pedido_proveedor', 'producto_detalle', 'cantidad_recibida', 'subtotal_linea_display')
 
 class PedidoProveedorSerializer(serializers.ModelSerializer):
     proveedor_detalle = ProveedorSerializer(source='proveedor', read_only=True)
@@ -80,30 +88,121 @@ class PedidoProveedorSerializer(serializers.ModelSerializer):
             'proveedor_detalle', 'creado_por_detalle', 'bodega_recepcion_detalle', 'estado_display'
         )
 
+    @transaction.atomic
     def create(self, validated_data):
         detalles_data = validated_data.pop('detalles_pedido')
         pedido = PedidoProveedor.objects.create(**validated_data)
-        for detalle_data in detalles_data:
-            DetallePedidoProveedor.objects.create(pedido_proveedor=pedido, **detalle_data)
-        pedido.calcular_totales() # Recalcular totales después de crear detalles
+        detalles = DetallePedidoProveedor.objects.bulk_create([
+            DetallePedidoProveedor(pedido_proveedor=pedido, **detalle_data) for detalle_data in detalles_data
+        ])
+        pedido.calcular_totales(detalles) # Recalcular totales con las líneas en memoria
         return pedido
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         detalles_data = validated_data.pop('detalles_pedido', None)
         instance = super().update(instance, validated_data)
+        if detalles_data is None:
+            instance.calcular_totales()
+            return instance
 
-        if detalles_data is not None:
-            # Lógica para actualizar/crear/eliminar detalles.
-            # Por simplicidad, aquí podríamos eliminar los existentes y crear los nuevos.
-            # Una implementación más robusta manejaría cada item individualmente.
-            instance.detalles_pedido.all().delete()
-            for detalle_data in detalles_data:
-                DetallePedidoProveedor.objects.create(pedido_proveedor=instance, **detalle_data)
-        
-        instance.calcular_totales() # Recalcular totales después de actualizar
+        # Se comparan las líneas por producto: las que no cambian no se escriben, las
+        # modificadas y las nuevas se escriben en bloque y las que ya no vienen se eliminan
+        existentes = {detalle.producto_id: detalle for detalle in instance.detalles_pedido.all()}
+        nuevas, modificadas, detalles = [], [], []
+        campos_modificados = set()
+        for detalle_data in detalles_data:
+            valores = {campo: valor for campo, valor in detalle_data.items() if campo != 'producto'}
+            detalle = existentes.pop(detalle_data['producto'].id, None)
+            if detalle is None:
+                detalle = DetallePedidoProveedor(pedido_proveedor=instance, **detalle_data)
+                nuevas.append(detalle)
+            else:
+                cambios = {campo: valor for campo, valor in valores.items() if getattr(detalle, campo) != valor}
+                if cambios:
+                    for campo, valor in cambios.items():
+                        setattr(detalle, campo, valor)
+                    campos_modificados.update(cambios)
+                    modificadas.append(detalle)
+            detalles.append(detalle)
+        if any(detalle.cantidad_solicitada < detalle.cantidad_recibida for detalle in modificadas):
+            raise serializers.ValidationError({'detalles_pedido': "La cantidad solicitada no puede ser menor a la ya recibida."})
+        if any(detalle.cantidad_recibida for detalle in existentes.values()):
+            # Sus recepciones ya ingresaron stock: eliminarlas borraría ese registro
+            raise serializers.ValidationError({'detalles_pedido': "No se pueden quitar líneas que ya tienen unidades recibidas."})
+        if existentes:
+            DetallePedidoProveedor.objects.filter(id__in=[detalle.id for detalle in existentes.values()]).delete()
+        if modificadas:
+            DetallePedidoProveedor.objects.bulk_update(modificadas, sorted(campos_modificados))
+        if nuevas:
+            DetallePedidoProveedor.objects.bulk_create(nuevas)
+        instance.calcular_totales(detalles) # Recalcular totales con las líneas en memoria
         return instance
 
 
+class LineaRecepcionSerializer(serializers.Serializer):
+    producto = serializers.IntegerField(min_value=1)
+    cantidad = serializers.IntegerField(min_value=1)
+
+
+class RegistrarRecepcionSerializer(serializers.Serializer):
+    """Cantidades recibidas en una entrega del proveedor (ver registrar_recepcion_pedido_proveedor)."""
+    lineas = LineaRecepcionSerializer(many=True, allow_empty=False)
+    numero_guia_despacho = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    notas = serializers.CharField(required=False, allow_blank=True)
+
+    def validate_lineas(self, lineas):
+        productos = [linea['producto'] for linea in lineas]
+        if len(productos) != len(set(productos)):
+            raise serializers.ValidationError("Cada producto puede aparecer una sola vez por recepción.")
+        return lineas
+
+
+class DetalleRecepcionPedidoProveedorSerializer(serializers.ModelSerializer):
+    producto = serializers.IntegerField(source='detalle_pedido.producto_id', read_only=True)
+    cantidad_recibida_total = serializers.IntegerField(source='detalle_pedido.cantidad_recibida', read_only=True)
+    cantidad_solicitada = serializers.IntegerField(source='detalle_pedido.cantidad_solicitada', read_only=True)
+
+    class Meta:
+        model = DetalleRecepcionPedidoProveedor
+        fields = ['id', 'detalle_pedido', 'producto', 'cantidad', 'costo_unitario', 'cantidad_recibida_total', 'cantidad_solicitada']
+        read_only_fields = fields
+
+
+class RecepcionPedidoProveedorSerializer(serializers.ModelSerializer):
+    detalles = DetalleRecepcionPedidoProveedorSerializer(many=True, read_only=True)
+    estado_pedido = serializers.CharField(source='pedido_proveedor.estado', read_only=True)
+
+    class Meta:
+        model = RecepcionPedidoProveedor
+        fields = ['id', 'pedido_proveedor', 'estado_pedido', 'recibido_por', 'numero_guia_despacho', 'notas', 'fecha_recepcion', 'detalles']
+        read_only_fields = fields
+
+
+class GenerarReabastecimientoSerializer(serializers.Serializer):
+    """Parámetros del reabastecimiento automático (ver pedido_app.services)."""
+    plazo_dias = serializers.IntegerField(min_value=0, default=PLAZO_REPOSICION_DIAS)
+    dias_cobertura = serializers.IntegerField(min_value=0, default=DIAS_COBERTURA)
+    sucursales = serializers.PrimaryKeyRelatedField(queryset=Sucursal.objects.all(), many=True, required=False)
+    simular = serializers.BooleanField(default=False, help_text="Solo calcula las sugerencias, sin crear pedidos.")
+
+
+
+class TransicionMasivaPedidosSerializer(serializers.Serializer):
+    """Pedidos a los que se aplica una transición masiva de estado (ver pedido_app.services)."""
+    pedido_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=MAX_PEDIDOS_TRANSICION_MASIVA,
+    )
+    estado = serializers.ChoiceField(choices=[(estado.value, estado.label) for estado in TRANSICIONES_MASIVAS])
+
+
+
+class SnapshotPedidoEntregadoSerializer(serializers.BaseSerializer):
+    """Devuelve tal cual el documento congelado al entregar el pedido (forma de PedidoClienteSerializer)."""
+    def to_representation(self, instance: SnapshotPedidoEntregado):
+        return instance.datos
+
+
 from producto_app.models import Producto # Import Product model to get price
 
 class DetallePedidoClienteSerializer(serializers.ModelSerializer):
@@ -178,55 +277,83 @@ class PedidoClienteSerializer(serializers.ModelSerializer):
             'creado_por_personal': {'required': False, 'allow_null': True}
         }
 
+    def validate_detalles_pedido_cliente(self, detalles):
+        productos = [detalle['producto'].id for detalle in detalles]
+        if len(productos) != len(set(productos)):
+            raise serializers.ValidationError("Un producto no puede repetirse en el pedido; indique la cantidad total en una sola línea.")
+        return detalles
+
+    def _precios_lineas(self, detalles_data):
+        """
+        Precio de cada línea según el producto (el backend lo determina para evitar
+        manipulaciones desde el frontend). Todas las promociones se obtienen en una consulta.
+        Retorna {producto_id: (precio_unitario_venta, precio_unitario_con_descuento, descuento_total_linea)}.
+        """
+        precios = precios_finales_para_productos(detalle['producto'] for detalle in detalles_data)
+        resultado = {}
+        for detalle in detalles_data:
+            producto = detalle['producto']
+            precio_con_descuento = precios[producto.id][0].quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            resultado[producto.id] = (
+                producto.precio,  # Guardar el precio original
+                precio_con_descuento,
+                (producto.precio - precio_con_descuento) * detalle['cantidad'],
+            )
+        return resultado
+
+    @transaction.atomic
     def create(self, validated_data):
         # Extraer los datos anidados de los detalles
         detalles_data = validated_data.pop('detalles_pedido_cliente')
         # El usuario que crea el pedido se asigna en la vista (perform_create)
         pedido = PedidoCliente.objects.create(**validated_data)
-        for detalle_data in detalles_data:
-            producto_instance = detalle_data['producto']
-            # El backend determina el precio para evitar manipulaciones desde el frontend
-            precio_final, promocion_aplicada = producto_instance.precio_final_con_info_promo
-            precio_original = producto_instance.precio
-            
-            # Calcular descuentos
-            precio_con_descuento = precio_final  # Este ya es el precio con descuento
-            descuento_total_linea = (precio_original - precio_con_descuento) * detalle_data['cantidad']
-            
-            DetallePedidoCliente.objects.create(
+        precios = self._precios_lineas(detalles_data)
+        detalles = DetallePedidoCliente.objects.bulk_create([
+            DetallePedidoCliente(
                 pedido_cliente=pedido,
-                producto=producto_instance,
+                producto=detalle_data['producto'],
                 cantidad=detalle_data['cantidad'],
-                precio_unitario_venta=precio_original,  # Guardar el precio original
-                precio_unitario_con_descuento=precio_con_descuento,  # Guardar el precio con descuento
-                descuento_total_linea=descuento_total_linea
+                precio_unitario_venta=precios[detalle_data['producto'].id][0],
+                precio_unitario_con_descuento=precios[detalle_data['producto'].id][1],
+                descuento_total_linea=precios[detalle_data['producto'].id][2],
             )
-        pedido.calcular_totales_cliente()
+            for detalle_data in detalles_data
+        ])
+        pedido.calcular_totales_cliente(detalles)
         return pedido
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         detalles_data = validated_data.pop('detalles_pedido_cliente', None)
         instance = super().update(instance, validated_data)
-        if detalles_data is not None:
-            instance.detalles_pedido_cliente.all().delete() # Simplificado
-            for detalle_data in detalles_data:
-                producto_instance = detalle_data['producto']
-                precio_final, promocion_aplicada = producto_instance.precio_final_con_info_promo
-                precio_original = producto_instance.precio
-                
-                # Calcular descuentos
-                precio_con_descuento = precio_final
-                descuento_total_linea = (precio_original - precio_con_descuento) * detalle_data['cantidad']
-                
-                DetallePedidoCliente.objects.create(
-                    pedido_cliente=instance,
-                    producto=producto_instance,
-                    cantidad=detalle_data['cantidad'],
-                    precio_unitario_venta=precio_original,  # Guardar el precio original
-                    precio_unitario_con_descuento=precio_con_descuento,  # Guardar el precio con descuento
-                    descuento_total_linea=descuento_total_linea
-                )
-        instance.calcular_totales_cliente()
+        if detalles_data is None:
+            instance.calcular_totales_cliente()
+            return instance
+
+        # Se comparan las líneas por producto: solo se escriben las que cambian
+        existentes = {detalle.producto_id: detalle for detalle in instance.detalles_pedido_cliente.all()}
+        precios = self._precios_lineas(detalles_data)
+        campos = ['cantidad', 'precio_unitario_venta', 'precio_unitario_con_descuento', 'descuento_total_linea']
+        nuevas, modificadas, detalles = [], [], []
+        for detalle_data in detalles_data:
+            producto = detalle_data['producto']
+            valores = dict(zip(campos, (detalle_data['cantidad'],) + precios[producto.id]))
+            detalle = existentes.pop(producto.id, None)
+            if detalle is None:
+                detalle = DetallePedidoCliente(pedido_cliente=instance, producto=producto, **valores)
+                nuevas.append(detalle)
+            elif any(getattr(detalle, campo) != valor for campo, valor in valores.items()):
+                for campo, valor in valores.items():
+                    setattr(detalle, campo, valor)
+                modificadas.append(detalle)
+            detalles.append(detalle)
+        if existentes:
+            DetallePedidoCliente.objects.filter(id__in=[detalle.id for detalle in existentes.values()]).delete()
+        if modificadas:
+            DetallePedidoCliente.objects.bulk_update(modificadas, campos)
+        if nuevas:
+            DetallePedidoCliente.objects.bulk_create(nuevas)
+        instance.calcular_totales_cliente(detalles)
         return instance
 
     def get_pagos(self, obj):
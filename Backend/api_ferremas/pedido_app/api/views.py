@@ -7,22 +7,33 @@ from django.db import transaction
 from rest_framework.exceptions import ValidationError
 from functools import reduce
 from operator import and_
-from django.db.models import F, Q # Importar F y Q
+from django.db.models import Q # Importar Q
 
 from ..models import (
     PedidoProveedor, DetallePedidoProveedor, EstadoPedidoCliente,
-    PedidoCliente, DetallePedidoCliente, EstadoPreparacionPedido
+    PedidoCliente, DetallePedidoCliente, EstadoPreparacionPedido, SnapshotPedidoEntregado, RecepcionPedidoProveedor
 ) # Asegúrate que MotivoTraspasoInventario se importe correctamente
-from inventario_app.models import DetalleInventarioBodega, InventarioSucursal, TraspasoInternoStock, DetalleTraspasoStock
+from inventario_app.models import InventarioSucursal
 from .pagination import CustomPagination # Importar la paginación personalizada
 from .serializers import ( # Asegúrate que MotivoTraspasoInventario se importe correctamente
     PedidoProveedorSerializer, DetallePedidoProveedorSerializer,
-    PedidoClienteSerializer, DetallePedidoClienteSerializer, PedidoClienteListSerializer
+    PedidoClienteSerializer, DetallePedidoClienteSerializer, PedidoClienteListSerializer,
+    GenerarReabastecimientoSerializer, TransicionMasivaPedidosSerializer, SnapshotPedidoEntregadoSerializer,
+    RegistrarRecepcionSerializer, RecepcionPedidoProveedorSerializer,
 )
 from .permissions import IsClienteOwnerOrStaff
-from usuario_app.api.permissions import EsAdministrador, EsBodeguero, EsVendedor, ROL_ADMINISTRADOR, ROL_VENDEDOR, ROL_BODEGUERO, ROL_CONTABLE # Importar las constantes de rol
+from usuario_app.api.permissions import EsAdministrador, EsBodeguero, EsVendedor, EsPersonalAutorizadoParaPedidos, ROL_ADMINISTRADOR, ROL_VENDEDOR, ROL_BODEGUERO, ROL_CONTABLE # Importar las constantes de rol
 from sucursal_app.models import Bodega
-from pedido_app.services import modificar_stock_para_pedido # Importar el servicio
+from bitacora_app.idempotencia import idempotente
+from bitacora_app.outbox import registrar_evento
+from pedido_app.tareas import EVENTO_CANCELAR_TRASPASOS
+from pedido_app.services import modificar_stock_para_pedido, generar_pedidos_reabastecimiento, recibir_stock_pedido_proveedor # Importar el servicio
+from pedido_app.services import registrar_recepcion_pedido_proveedor
+from pedido_app.services import (
+    filtro_busqueda_pedidos, cola_preparacion, pedidos_activos_bodeguero, tomar_pedidos_preparacion, CAPACIDAD_PREPARACION_BODEGUERO,
+    ESTADOS_PEDIDO_PREPARABLES, ESTADOS_PREPARACION_ACTIVOS, armar_ola_preparacion, TAMANO_MAXIMO_OLA,
+    ESTADOS_CON_STOCK_REDUCIDO, transicionar_pedidos_en_bloque,
+)
 # Asumiremos que crearás filtros específicos si los necesitas
 # from .filters import PedidoClienteFilter, PedidoProveedorFilter
 
@@ -76,12 +87,7 @@ class PedidoClienteViewSet(viewsets.ModelViewSet):
             'cliente__usuario', 'creado_por_personal', 'sucursal_despacho', 'bodeguero_asignado'
         ).prefetch_related('detalles_pedido_cliente__producto').all()
 
-        print(f"\n--- NUEVA BÚSQUEDA ---")
-        print(f"Usuario: {user}, Staff: {user.is_staff}")
-        print(f"Total de pedidos en la DB: {base_queryset.count()}")
-
         if not user.is_authenticated:
-            print("DEBUG: Usuario no autenticado. Retornando queryset vacío.")
             return base_queryset.none()
 
         # 1. Determinar el queryset inicial basado en el rol del usuario autenticado
@@ -96,64 +102,35 @@ class PedidoClienteViewSet(viewsets.ModelViewSet):
                     ).filter(
                         Q(estado_preparacion=EstadoPreparacionPedido.PENDIENTE_ASIGNACION) |
                         Q(estado_preparacion__in=[EstadoPreparacionPedido.ASIGNADO, EstadoPreparacionPedido.EN_PREPARACION], bodeguero_asignado=user)
-                    ).distinct()
-                    print(f"DEBUG: Filtrando para BODEGUERO ({user.email}). Pedidos encontrados: {queryset.count()}")
+                    )
                 else:
-                    print(f"DEBUG: Bodeguero ({user.email}) sin sucursal asignada. Retornando queryset vacío.")
                     queryset = base_queryset.none()
             elif rol_personal in [ROL_ADMINISTRADOR, ROL_VENDEDOR, ROL_CONTABLE]: # Usar ROL_CONTABLE
                 # Administradores, Vendedores y Contadores pueden ver todos los pedidos
                 queryset = base_queryset
-                print(f"DEBUG: Usuario es STAFF ({rol_personal}). Acceso a todos los pedidos. Total inicial: {queryset.count()}")
             else:
                 # Otros roles de Personal no definidos para ver pedidos
-                print(f"DEBUG: Rol de personal '{rol_personal}' no reconocido para ver pedidos. Retornando queryset vacío.")
                 queryset = base_queryset.none()
         elif hasattr(user, 'perfil_cliente'):
             # Los clientes solo pueden ver sus propios pedidos
             queryset = base_queryset.filter(cliente=user.perfil_cliente)
-            print(f"DEBUG: Filtrando para CLIENTE ({user.email}). Pedidos encontrados: {queryset.count()}")
         else:
             # Usuario autenticado sin perfil específico (ni Personal ni Cliente)
-            print(f"DEBUG: Usuario ({user.email}) sin perfil específico (Personal/Cliente). Retornando queryset vacío.")
             queryset = base_queryset.none()
 
-        # 2. Aplicar el filtro de búsqueda sobre el queryset ya filtrado por rol
+        # 2. Aplicar el filtro de búsqueda sobre el queryset ya filtrado por rol.
+        # Usa las columnas de búsqueda normalizadas del pedido (prefijo con índice, sin joins ni distinct)
         search_query = self.request.query_params.get('search', None)
         if search_query:
-            print(f"DEBUG: Término de búsqueda recibido: '{search_query}'")
-            # Búsqueda especial por ID de pedido "PED-XXX"
-            if search_query.upper().startswith('PED-'):
-                try:
-                    pedido_id = int(search_query[4:])
-                    print(f"DEBUG: Buscando por ID de pedido específico: {pedido_id}")
-                    queryset = queryset.filter(id=pedido_id)
-                    print(f"DEBUG: Pedidos encontrados tras búsqueda por ID: {queryset.count()}")
-                    return queryset.order_by('-fecha_pedido')
-                except (ValueError, TypeError):
-                    pass # Si falla, continúa con la búsqueda general
-
-            # Búsqueda general por términos
-            search_terms = search_query.split()
-            print(f"DEBUG: Términos de búsqueda divididos: {search_terms}")
-
-            # Encadenar filtros para cada término (lógica AND)
-            for term in search_terms:
-                # Para cada término, buscar en múltiples campos (lógica OR)
-                term_q = (
-                    Q(cliente__usuario__email__icontains=term) |
-                    Q(cliente__usuario__first_name__icontains=term) |
-                    Q(cliente__usuario__last_name__icontains=term) |
-                    Q(estado__icontains=term)
-                )
-                if term.isdigit():
-                    term_q |= Q(id=int(term))
-                queryset = queryset.filter(term_q)
-            queryset = queryset.distinct()
-            print(f"DEBUG: Pedidos encontrados tras búsqueda general: {queryset.count()}")
+            queryset = queryset.filter(filtro_busqueda_pedidos(search_query))
 
         return queryset.order_by('-fecha_pedido')
 
+    @idempotente
+    def create(self, request, *args, **kwargs):
+        # Con Idempotency-Key, un reintento devuelve el pedido ya creado sin duplicarlo
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         if not serializer.validated_data.get('sucursal_despacho'):
             # Aquí deberías tener una lógica para asignar una sucursal de despacho por defecto si no viene
@@ -191,58 +168,46 @@ class PedidoClienteViewSet(viewsets.ModelViewSet):
                 raise e
 
     def perform_update(self, serializer):
-        estado_anterior = serializer.instance.estado
-        pedido_actualizado = serializer.save()
-        nuevo_estado = pedido_actualizado.estado
-
-        # Escenario 1: Pedido se paga o procesa (y antes no lo estaba o estaba pendiente de reabastecimiento) -> Reducir stock
-        if nuevo_estado in [EstadoPedidoCliente.PAGADO, EstadoPedidoCliente.PROCESANDO] and \
-           estado_anterior in [EstadoPedidoCliente.FALLIDO]: 
-            # Solo intentamos reducir stock si el estado anterior era FALLIDO.
-            # Si era PENDIENTE o PENDIENTE_REABASTECIMIENTO (para Transferencia/Efectivo),
-            # el stock ya se manejó al crear el pedido o al confirmar el pago.
-            # Webpay maneja su propio flujo de stock en su retorno.
-            print(f"DEBUG PedidoClienteViewSet: Pedido ID {pedido_actualizado.id} pasa de FALLIDO a {nuevo_estado}. Intentando modificar stock.")
-            try:
-                usuario_para_traspaso = self.request.user if self.request.user.is_staff else (pedido_actualizado.cliente.usuario if pedido_actualizado.cliente and hasattr(pedido_actualizado.cliente, 'usuario') else None)
-                stock_ok = modificar_stock_para_pedido(pedido_actualizado, anular_reduccion=False, usuario_solicitante_traspaso=usuario_para_traspaso)
-                if not stock_ok: 
-                    pedido_actualizado.estado = EstadoPedidoCliente.PENDIENTE_REABASTECIMIENTO
-                    pedido_actualizado.save(update_fields=['estado'])
-            except ValidationError as e:
-                pedido_actualizado.estado = EstadoPedidoCliente.RECHAZADO_STOCK
-                pedido_actualizado.notas_cliente = (pedido_actualizado.notas_cliente or "") + f"\nError de stock al actualizar desde API: {str(e)}"
-                pedido_actualizado.save(update_fields=['estado', 'notas_cliente'])
-                raise e # Re-lanzar para que el frontend sepa del error
-
-        # Escenario 2: Pedido se cancela o falla (y antes estaba en un estado que redujo stock) -> Devolver stock
-        elif nuevo_estado in [EstadoPedidoCliente.CANCELADO, EstadoPedidoCliente.FALLIDO, EstadoPedidoCliente.RECHAZADO_STOCK]:
-            # Estados desde los cuales se pudo haber reducido stock:
-            estados_con_stock_reducido = [
-                EstadoPedidoCliente.PAGADO,
-                EstadoPedidoCliente.PROCESANDO,
-                EstadoPedidoCliente.ENVIADO,
-                EstadoPedidoCliente.PENDIENTE, # Si era Transferencia/Efectivo
-                EstadoPedidoCliente.PENDIENTE_REABASTECIMIENTO # Si era Transferencia/Efectivo y esperaba stock
-            ]
-            if estado_anterior in estados_con_stock_reducido:
-                # Si el stock ya se había descontado, devolverlo
-                print(f"DEBUG PedidoClienteViewSet: Pedido ID {pedido_actualizado.id} pasa de {estado_anterior} a {nuevo_estado}. Restaurando stock.")
-                usuario_para_traspaso = self.request.user if self.request.user.is_staff else (pedido_actualizado.cliente.usuario if pedido_actualizado.cliente and hasattr(pedido_actualizado.cliente, 'usuario') else None)
-                modificar_stock_para_pedido(pedido_actualizado, anular_reduccion=True, usuario_solicitante_traspaso=usuario_para_traspaso)
+        # El cambio de estado, el stock y los eventos del outbox se confirman juntos
+        error_stock = None
+        with transaction.atomic():
+            estado_anterior = serializer.instance.estado
+            pedido_actualizado = serializer.save()
+            nuevo_estado = pedido_actualizado.estado
+
+            # Escenario 1: Pedido se paga o procesa (y antes no lo estaba o estaba pendiente de reabastecimiento) -> Reducir stock
+            if nuevo_estado in [EstadoPedidoCliente.PAGADO, EstadoPedidoCliente.PROCESANDO] and \
+               estado_anterior in [EstadoPedidoCliente.FALLIDO]: 
+                # Solo intentamos reducir stock si el estado anterior era FALLIDO.
+                # Si era PENDIENTE o PENDIENTE_REABASTECIMIENTO (para Transferencia/Efectivo),
+                # el stock ya se manejó al crear el pedido o al confirmar el pago.
+                # Webpay maneja su propio flujo de stock en su retorno.
+                try:
+                    usuario_para_traspaso = self.request.user if self.request.user.is_staff else (pedido_actualizado.cliente.usuario if pedido_actualizado.cliente and hasattr(pedido_actualizado.cliente, 'usuario') else None)
+                    stock_ok = modificar_stock_para_pedido(pedido_actualizado, anular_reduccion=False, usuario_solicitante_traspaso=usuario_para_traspaso)
+                    if not stock_ok: 
+                        pedido_actualizado.estado = EstadoPedidoCliente.PENDIENTE_REABASTECIMIENTO
+                        pedido_actualizado.save(update_fields=['estado'])
+                except ValidationError as e:
+                    pedido_actualizado.estado = EstadoPedidoCliente.RECHAZADO_STOCK
+                    pedido_actualizado.notas_cliente = (pedido_actualizado.notas_cliente or "") + f"\nError de stock al actualizar desde API: {str(e)}"
+                    pedido_actualizado.save(update_fields=['estado', 'notas_cliente'])
+                    error_stock = e
+
+            # Escenario 2: Pedido se cancela o falla (y antes estaba en un estado que redujo stock) -> Devolver stock
+            elif nuevo_estado in [EstadoPedidoCliente.CANCELADO, EstadoPedidoCliente.FALLIDO, EstadoPedidoCliente.RECHAZADO_STOCK]:
+                # Estados desde los cuales se pudo haber reducido stock
+                if estado_anterior in ESTADOS_CON_STOCK_REDUCIDO:
+                    # Si el stock ya se había descontado, devolverlo
+                    usuario_para_traspaso = self.request.user if self.request.user.is_staff else (pedido_actualizado.cliente.usuario if pedido_actualizado.cliente and hasattr(pedido_actualizado.cliente, 'usuario') else None)
+                    modificar_stock_para_pedido(pedido_actualizado, anular_reduccion=True, usuario_solicitante_traspaso=usuario_para_traspaso)
             
-            if estado_anterior == EstadoPedidoCliente.PENDIENTE_REABASTECIMIENTO:
-                # Si estaba esperando reabastecimiento, intentar cancelar el traspaso automático asociado si aún está PENDIENTE
-                traspasos_pendientes = TraspasoInternoStock.objects.filter(
-                    pedido_cliente_origen=pedido_actualizado,
-                    estado=TraspasoInternoStock.EstadoTraspaso.PENDIENTE,
-                    motivo=TraspasoInternoStock.MotivoTraspaso.PARA_COMPLETAR_PEDIDO
-                )
-                for traspaso in traspasos_pendientes:
-                    traspaso.estado = TraspasoInternoStock.EstadoTraspaso.CANCELADO
-                    traspaso.comentarios = (traspaso.comentarios or "") + f"\nCancelado automáticamente debido a cancelación del Pedido Cliente #{pedido_actualizado.id}."
-                    traspaso.save(update_fields=['estado', 'comentarios'])
-                    print(f"Traspaso {traspaso.id} cancelado debido a cancelación del Pedido Cliente {pedido_actualizado.id}")
+                if estado_anterior == EstadoPedidoCliente.PENDIENTE_REABASTECIMIENTO:
+                    # Si estaba esperando reabastecimiento, los traspasos automáticos asociados que sigan
+                    # PENDIENTE se cancelan fuera de la solicitud (outbox, ver pedido_app.tareas)
+                    registrar_evento(EVENTO_CANCELAR_TRASPASOS, {'pedido_id': pedido_actualizado.id})
+        if error_stock:
+            raise error_stock  # Re-lanzar fuera del bloque para conservar el RECHAZADO_STOCK y que el frontend sepa del error
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated, EsBodeguero])
     def tomar_pedido_preparacion(self, request, pk=None):
@@ -253,30 +218,107 @@ class PedidoClienteViewSet(viewsets.ModelViewSet):
         if not hasattr(bodeguero, 'perfil_personal') or bodeguero.perfil_personal.sucursal != pedido.sucursal_despacho:
             return Response({"error": "No tienes permiso para tomar pedidos de esta sucursal."}, status=status.HTTP_403_FORBIDDEN)
 
-        if pedido.estado not in [EstadoPedidoCliente.PAGADO, EstadoPedidoCliente.PROCESANDO]:
+        if pedido.estado not in ESTADOS_PEDIDO_PREPARABLES:
             return Response({"error": "El pedido no está en un estado válido para ser preparado."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if pedido.bodeguero_asignado and pedido.bodeguero_asignado != bodeguero:
-            return Response({"error": f"El pedido ya está asignado a {pedido.bodeguero_asignado.email}."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if pedido.bodeguero_asignado == bodeguero and pedido.estado_preparacion == EstadoPreparacionPedido.ASIGNADO:
+        if pedido.bodeguero_asignado == bodeguero and pedido.estado_preparacion in ESTADOS_PREPARACION_ACTIVOS:
              return Response({"mensaje": "Ya tienes este pedido asignado."}, status=status.HTTP_200_OK)
 
-        # Validar límite de 3 pedidos activos (excluyendo el actual si ya está asignado a él)
-        pedidos_activos_bodeguero = PedidoCliente.objects.filter(
-            bodeguero_asignado=bodeguero,
-            estado_preparacion__in=[EstadoPreparacionPedido.ASIGNADO, EstadoPreparacionPedido.EN_PREPARACION]
-        ).exclude(pk=pedido.pk).count() # Excluir el pedido actual de la cuenta si ya está asignado a él
-
-        if pedidos_activos_bodeguero >= 3:
-            return Response({"error": "Ya tienes 3 pedidos activos. Completa uno antes de tomar otro."}, status=status.HTTP_400_BAD_REQUEST)
-
-        pedido.bodeguero_asignado = bodeguero
-        pedido.estado_preparacion = EstadoPreparacionPedido.ASIGNADO # O EN_PREPARACION directamente
-        pedido.save(update_fields=['bodeguero_asignado', 'estado_preparacion'])
-        serializer = self.get_serializer(pedido)
+        # La toma es atómica: verifica en la misma sentencia que siga libre y la capacidad del bodeguero
+        tomados = tomar_pedidos_preparacion(bodeguero, pedido.sucursal_despacho_id, pedido_id=pedido.pk)
+        if not tomados:
+            return Response({"error": self._motivo_toma_rechazada(pedido, bodeguero)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.get_serializer(tomados[0])
         return Response(serializer.data)
 
+    def _motivo_toma_rechazada(self, pedido, bodeguero):
+        if pedidos_activos_bodeguero(bodeguero).count() >= CAPACIDAD_PREPARACION_BODEGUERO:
+            return f"Ya tienes {CAPACIDAD_PREPARACION_BODEGUERO} pedidos activos. Completa uno antes de tomar otro."
+        pedido.refresh_from_db(fields=['bodeguero_asignado', 'estado_preparacion'])
+        if pedido.bodeguero_asignado_id:
+            return f"El pedido ya está asignado a {pedido.bodeguero_asignado.email}."
+        return "El pedido no está pendiente de asignación."
+
+    def _sucursal_bodeguero(self, request):
+        sucursal_id = getattr(request.user.perfil_personal, 'sucursal_id', None)
+        if not sucursal_id:
+            raise ValidationError({"error": "No tienes una sucursal asignada."})
+        return sucursal_id
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated, EsBodeguero], url_path='cola-preparacion')
+    def cola_preparacion_sucursal(self, request):
+        """Pedidos de la sucursal del bodeguero que esperan ser tomados, en orden de llegada."""
+        queryset = cola_preparacion(self._sucursal_bodeguero(request)).select_related('cliente__usuario')
+        pagina = self.paginate_queryset(queryset)
+        serializer = PedidoClienteListSerializer(pagina, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated, EsBodeguero], url_path='tomar-siguientes')
+    def tomar_siguientes(self, request):
+        """
+        Toma los siguientes pedidos de la cola de la sucursal del bodeguero.
+        Body opcional: {"cantidad": N} (por defecto 1). Se toman como máximo los que permita la
+        capacidad del bodeguero; si la cola está vacía o ya está completo, 'tomados' viene vacío.
+        """
+        sucursal_id = self._sucursal_bodeguero(request)
+        cantidad = request.data.get('cantidad', 1)
+        try:
+            cantidad = int(cantidad)
+        except (TypeError, ValueError):
+            cantidad = 0
+        if not 1 <= cantidad <= CAPACIDAD_PREPARACION_BODEGUERO:
+            raise ValidationError({"cantidad": f"Debe ser un entero entre 1 y {CAPACIDAD_PREPARACION_BODEGUERO}."})
+
+        tomados = tomar_pedidos_preparacion(request.user, sucursal_id, cantidad=cantidad)
+        return Response({
+            'tomados': PedidoClienteSerializer(tomados, many=True, context=self.get_serializer_context()).data,
+            'pedidos_activos': pedidos_activos_bodeguero(request.user).count(),
+            'capacidad': CAPACIDAD_PREPARACION_BODEGUERO,
+        })
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated, EsBodeguero], url_path='armar-ola')
+    def armar_ola(self, request):
+        """
+        Arma una ola de preparación con los pedidos activos del bodeguero y los siguientes de la
+        cola de su sucursal, y devuelve la lista de recolección consolidada por producto con el
+        casillero del muro de cada pedido. Body opcional: {"tamano": N} (máximo de pedidos de la ola).
+        La ola respeta la capacidad de pedidos activos del bodeguero, igual que 'tomar-siguientes'.
+        """
+        sucursal_id = self._sucursal_bodeguero(request)
+        tamano = request.data.get('tamano', TAMANO_MAXIMO_OLA)
+        try:
+            tamano = int(tamano)
+        except (TypeError, ValueError):
+            tamano = 0
+        if not 1 <= tamano <= TAMANO_MAXIMO_OLA:
+            raise ValidationError({"tamano": f"Debe ser un entero entre 1 y {TAMANO_MAXIMO_OLA}."})
+        ola = armar_ola_preparacion(request.user, sucursal_id, tamano=tamano)
+        ola['capacidad'] = CAPACIDAD_PREPARACION_BODEGUERO
+        return Response(ola)
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated, EsPersonalAutorizadoParaPedidos], url_path='transicion-masiva')
+    def transicion_masiva(self, request):
+        """
+        Pasa varios pedidos a un mismo estado (ENVIADO, ENTREGADO o CANCELADO) en una sola operación.
+        Body: {"pedido_ids": [...], "estado": "ENTREGADO"}. Se aplican todos o ninguno: si algún
+        pedido no admite la transición, responde 400 con el motivo de cada pedido rechazado.
+        Un bodeguero solo puede transicionar pedidos de su sucursal.
+        """
+        serializer = TransicionMasivaPedidosSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        sucursal_id = None
+        if request.user.perfil_personal.rol == ROL_BODEGUERO:
+            sucursal_id = self._sucursal_bodeguero(request)
+        pedidos = transicionar_pedidos_en_bloque(
+            serializer.validated_data['pedido_ids'], serializer.validated_data['estado'],
+            usuario=request.user, sucursal_id=sucursal_id,
+        )
+        return Response({
+            'estado': serializer.validated_data['estado'],
+            'actualizados': len(pedidos),
+            'pedido_ids': [pedido.pk for pedido in pedidos],
+        })
+
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated, EsBodeguero])
     def confirmar_preparacion_pedido(self, request, pk=None):
         pedido = self.get_object()
@@ -310,25 +352,22 @@ class PedidoClienteViewSet(viewsets.ModelViewSet):
 class HistorialEntregasViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet para ver el historial de pedidos entregados.
+    Sirve los snapshots congelados al momento de la entrega (ver SnapshotPedidoEntregado):
+    cada página es una consulta indexada, sin importar cuántas líneas tengan los pedidos.
     """
-    serializer_class = PedidoClienteSerializer
+    serializer_class = SnapshotPedidoEntregadoSerializer
     pagination_class = CustomPagination # Añadir paginación
     permission_classes = [permissions.IsAuthenticated, (EsBodeguero | EsAdministrador)]
 
     def get_queryset(self):
         user = self.request.user
-        # Base queryset for delivered orders
-        queryset = PedidoCliente.objects.filter(
-            estado=EstadoPedidoCliente.ENTREGADO
-        ).select_related(
-            'cliente__usuario', 'sucursal_despacho', 'bodeguero_asignado__perfil_personal'
-        ).prefetch_related('detalles_pedido_cliente__producto').order_by('-fecha_entregado')
+        queryset = SnapshotPedidoEntregado.objects.order_by('-fecha_entregado', '-pedido_id')
 
         # If user is a bodeguero, filter by their sucursal
         if hasattr(user, 'perfil_personal') and user.perfil_personal.rol == 'BODEGUERO':
-            sucursal_bodeguero = getattr(user.perfil_personal, 'sucursal', None)
-            if sucursal_bodeguero:
-                return queryset.filter(sucursal_despacho=sucursal_bodeguero)
+            sucursal_bodeguero_id = getattr(user.perfil_personal, 'sucursal_id', None)
+            if sucursal_bodeguero_id:
+                return queryset.filter(sucursal_despacho_id=sucursal_bodeguero_id)
             return queryset.none()  # Bodeguero without sucursal sees no history
 
         # Admin sees all delivered orders
@@ -387,25 +426,65 @@ class PedidoProveedorViewSet(viewsets.ModelViewSet):
                 raise ValidationError(f"La bodega de recepción '{bodega_destino.nombre}' no está activa.")
 
             try:
-                with transaction.atomic():
-                    inventario_sucursal = InventarioSucursal.objects.get(sucursal=bodega_destino.sucursal)
-                    for detalle_pedido in pedido_actualizado.detalles_pedido.all():
-                        if detalle_pedido.cantidad_recibida > 0:
-                            stock_bodega, _ = DetalleInventarioBodega.objects.get_or_create(
-                                inventario_sucursal=inventario_sucursal,
-                                producto=detalle_pedido.producto,
-                                bodega=bodega_destino,
-                                defaults={'cantidad': 0}
-                            )
-                            stock_bodega.cantidad += detalle_pedido.cantidad_recibida
-                            stock_bodega.save(update_fields=['cantidad'])
-                            print(f"Stock actualizado para {detalle_pedido.producto.nombre} en bodega {bodega_destino.id}: +{detalle_pedido.cantidad_recibida}")
+                # Ingresa solo lo no registrado en recepciones anteriores (parciales), con el precio de compra como costo
+                recibir_stock_pedido_proveedor(pedido_actualizado, usuario=self.request.user)
             except InventarioSucursal.DoesNotExist:
                 raise ValidationError(f"No existe un inventario general para la sucursal '{bodega_destino.sucursal.nombre}'. Por favor, cree uno manualmente.")
             except Exception as e:
                 print(f"ERROR CRÍTICO: Pedido {pedido_actualizado.id} marcado como RECIBIDO_COMPLETO, pero falló la actualización de stock: {str(e)}")
                 raise ValidationError(f"Error al actualizar el stock tras recibir el pedido: {str(e)}")
 
+    @action(detail=True, methods=['post'])
+    @idempotente
+    def recibir(self, request, pk=None):
+        """
+        Registra una entrega del proveedor, total o parcial, de varias líneas a la vez.
+        Body: {"lineas": [{"producto": id, "cantidad": n}, ...], "numero_guia_despacho": "...", "notas": "..."}.
+        Las cantidades son las recibidas en esta entrega y se acumulan sobre las anteriores.
+        Si alguna línea no es válida responde 400 con el motivo de cada una y no registra nada.
+        """
+        pedido = self.get_object()
+        serializer = RegistrarRecepcionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        recepcion = registrar_recepcion_pedido_proveedor(
+            pedido.pk,
+            {linea['producto']: linea['cantidad'] for linea in datos['lineas']},
+            usuario=request.user,
+            numero_guia_despacho=datos.get('numero_guia_despacho') or None,
+            notas=datos.get('notas') or None,
+        )
+        recepcion = RecepcionPedidoProveedor.objects.select_related('pedido_proveedor').prefetch_related(
+            'detalles__detalle_pedido'
+        ).get(pk=recepcion.pk)
+        return Response(RecepcionPedidoProveedorSerializer(recepcion).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def recepciones(self, request, pk=None):
+        """Recepciones registradas del pedido, la más reciente primero."""
+        pedido = self.get_object()
+        recepciones = pedido.recepciones.select_related('pedido_proveedor').prefetch_related('detalles__detalle_pedido')
+        return Response(RecepcionPedidoProveedorSerializer(recepciones, many=True).data)
+
+    @action(detail=False, methods=['post'], url_path='generar-reabastecimiento')
+    def generar_reabastecimiento(self, request):
+        """
+        Calcula la demanda reciente de todo el catálogo en todas las sucursales (o las indicadas)
+        y crea pedidos en BORRADOR por proveedor y bodega con lo que hay que reponer.
+        Con 'simular': true solo devuelve las sugerencias.
+        """
+        serializer = GenerarReabastecimientoSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        reporte = generar_pedidos_reabastecimiento(
+            usuario=request.user,
+            plazo_dias=datos['plazo_dias'],
+            dias_cobertura=datos['dias_cobertura'],
+            sucursal_ids=[sucursal.id for sucursal in datos.get('sucursales', [])],
+            aplicar=not datos['simular'],
+        )
+        return Response(reporte, status=status.HTTP_200_OK if datos['simular'] else status.HTTP_201_CREATED)
+
 class DetallePedidoProveedorViewSet(viewsets.ModelViewSet): # O ReadOnly
     queryset = DetallePedidoProveedor.objects.all()
     serializer_class = DetallePedidoProveedorSerializer
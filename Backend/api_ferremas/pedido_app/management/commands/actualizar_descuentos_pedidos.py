@@ -1,41 +1,60 @@
-from django.core.management.base import BaseCommand
-from pedido_app.models import PedidoCliente, DetallePedidoCliente
-from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from pedido_app.models import TramoRecalculoDescuentos
+from pedido_app.services import (
+    planificar_recalculo_descuentos, ultima_ejecucion_recalculo_pendiente, recalcular_descuentos_pedidos,
+    TAMANO_TRAMO_DESCUENTOS,
+)
 
 
 class Command(BaseCommand):
-    help = 'Actualiza los campos de descuento en pedidos existentes'
+    help = 'Actualiza los campos de descuento en pedidos existentes (por tramos de IDs, reanudable)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tamano-tramo', type=int, default=TAMANO_TRAMO_DESCUENTOS,
+            help='Cantidad de IDs de pedido por tramo (cada tramo se confirma por separado).'
+        )
+        parser.add_argument('--procesos', type=int, default=1, help='Procesos en paralelo para repartir los tramos.')
+        parser.add_argument(
+            '--reanudar', action='store_true',
+            help='Retomar la última ejecución con tramos pendientes en lugar de iniciar una nueva.'
+        )
+        parser.add_argument('--ejecucion', help='Retomar la ejecución con este identificador.')
 
     def handle(self, *args, **options):
-        self.stdout.write('Iniciando actualización de descuentos en pedidos...')
-        
+        if options['tamano_tramo'] < 1 or options['procesos'] < 1:
+            raise CommandError('--tamano-tramo y --procesos deben ser mayores que cero.')
+
+        ejecucion = options['ejecucion']
+        if ejecucion is None and options['reanudar']:
+            ejecucion = ultima_ejecucion_recalculo_pendiente()
+            if ejecucion is None:
+                self.stdout.write('No hay ejecuciones con tramos pendientes.')
+                return
+        if ejecucion is None:
+            ejecucion = planificar_recalculo_descuentos(options['tamano_tramo'])
+            if ejecucion is None:
+                self.stdout.write('No hay pedidos de cliente.')
+                return
+        elif not TramoRecalculoDescuentos.objects.filter(ejecucion=ejecucion).exists():
+            raise CommandError(f'No existe la ejecución {ejecucion}.')
+
+        pendientes = TramoRecalculoDescuentos.objects.filter(ejecucion=ejecucion, completado=False).count()
+        self.stdout.write(f'Iniciando actualización de descuentos en pedidos (ejecución {ejecucion}, {pendientes} tramos pendientes)...')
+
         pedidos_actualizados = 0
         detalles_actualizados = 0
-        
-        # Obtener todos los pedidos de cliente
-        pedidos = PedidoCliente.objects.all()
-        
-        for pedido in pedidos:
-            detalles_actualizados_pedido = 0
-            
-            # Actualizar cada detalle del pedido
-            for detalle in pedido.detalles_pedido_cliente.all():
-                # Usar el nuevo método para calcular descuentos
-                detalle.calcular_descuentos_linea()
-                detalles_actualizados_pedido += 1
-            
-            # Recalcular totales del pedido
-            pedido.calcular_totales_cliente()
-            pedidos_actualizados += 1
-            
+        for tramo, resultado in recalcular_descuentos_pedidos(ejecucion, options['procesos']):
+            if resultado is None:
+                continue  # Otro proceso ya lo completó
+            pedidos_actualizados += resultado[0]
+            detalles_actualizados += resultado[1]
             self.stdout.write(
-                f'Pedido #{pedido.id}: {detalles_actualizados_pedido} detalles actualizados'
+                f'Tramo [{tramo.id_desde}, {tramo.id_hasta}): {resultado[0]} pedidos y {resultado[1]} detalles actualizados'
             )
-            
-            detalles_actualizados += detalles_actualizados_pedido
-        
+
         self.stdout.write(
             self.style.SUCCESS(
                 f'Actualización completada. {pedidos_actualizados} pedidos y {detalles_actualizados} detalles actualizados.'
             )
-        ) 
\ No newline at end of file
+        )
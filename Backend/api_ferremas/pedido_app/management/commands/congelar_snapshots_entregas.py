@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from pedido_app.services import congelar_snapshots_pendientes, TAMANO_LOTE_SNAPSHOTS
+
+
+class Command(BaseCommand):
+    help = 'Congela el snapshot de los pedidos entregados que aún no lo tienen (historial de entregas)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE_SNAPSHOTS, help='Pedidos serializados por lote.')
+
+    def handle(self, *args, **options):
+        escritos = congelar_snapshots_pendientes(options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{escritos} snapshots de pedidos entregados creados.'))
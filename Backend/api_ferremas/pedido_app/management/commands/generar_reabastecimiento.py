@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from pedido_app.services import generar_pedidos_reabastecimiento, PLAZO_REPOSICION_DIAS, DIAS_COBERTURA
+
+
+class Command(BaseCommand):
+    help = 'Genera pedidos a proveedor en BORRADOR según la demanda reciente, el stock y los pedidos abiertos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plazo-dias', type=int, default=PLAZO_REPOSICION_DIAS, help='Días de reposición del proveedor.')
+        parser.add_argument('--dias-cobertura', type=int, default=DIAS_COBERTURA, help='Días de demanda que debe cubrir el pedido.')
+        parser.add_argument('--sucursal', type=int, action='append', dest='sucursales', help='Limitar a esta sucursal (repetible).')
+        parser.add_argument('--simular', action='store_true', help='Solo mostrar las sugerencias, sin crear pedidos.')
+
+    def handle(self, *args, **options):
+        reporte = generar_pedidos_reabastecimiento(
+            plazo_dias=options['plazo_dias'],
+            dias_cobertura=options['dias_cobertura'],
+            sucursal_ids=options['sucursales'],
+            aplicar=not options['simular'],
+        )
+        for pedido in reporte['pedidos']:
+            self.stdout.write(
+                f"Proveedor {pedido['proveedor_id']} -> bodega {pedido['bodega_recepcion_id']}: "
+                f"{pedido['lineas']} líneas, {pedido['unidades']} unidades, total {pedido['total']}"
+                + (f" (pedido #{pedido['pedido_id']})" if pedido['pedido_id'] else '')
+            )
+        if reporte['sin_proveedor']:
+            self.stdout.write(self.style.WARNING(
+                f"{len(reporte['sin_proveedor'])} productos requieren reposición pero no tienen compras previas a un proveedor activo."
+            ))
+        if reporte['sucursales_sin_bodega']:
+            self.stdout.write(self.style.WARNING(
+                f"Sucursales sin bodega activa para recibir: {reporte['sucursales_sin_bodega']}"
+            ))
+        accion = 'sugeridas' if options['simular'] else 'generadas'
+        self.stdout.write(self.style.SUCCESS(
+            f"{reporte['lineas_sugeridas']} líneas {accion} en {len(reporte['pedidos'])} pedidos."
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedido_app', '0005_alter_pedidocliente_metodo_envio'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pedidoproveedor',
+            name='estado',
+            field=models.CharField(choices=[('BORRADOR', 'Borrador'), ('SOLICITADO', 'Solicitado'), ('EN_TRANSITO', 'En Tránsito'), ('RECIBIDO_PARCIAL', 'Recibido Parcialmente'), ('RECIBIDO_COMPLETO', 'Recibido Completamente'), ('CANCELADO', 'Cancelado')], default='SOLICITADO', max_length=20, verbose_name='Estado del Pedido'),
+        ),
+    ]
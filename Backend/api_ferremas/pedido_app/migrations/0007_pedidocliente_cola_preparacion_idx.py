@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedido_app', '0006_pedidoproveedor_estado_borrador'),
+        ('sucursal_app', '0001_initial'),
+        ('ubicacion_app', '0001_initial'),
+        ('usuario_app', '0002_remove_cliente_direccion_calle_numero_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedidocliente',
+            index=models.Index(fields=['sucursal_despacho', 'estado_preparacion', 'fecha_pedido'], name='pedido_cola_preparacion_idx'),
+        ),
+    ]
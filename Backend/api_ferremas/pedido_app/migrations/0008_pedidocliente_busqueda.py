@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:53
+
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Copia de pedido_app.models.normalizar_texto_busqueda: la migración no debe depender del código vigente
+def _normalizar(texto):
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_tildes.lower().split())
+
+
+def poblar_busqueda(apps, schema_editor):
+    PedidoCliente = apps.get_model('pedido_app', 'PedidoCliente')
+    Cliente = apps.get_model('usuario_app', 'Cliente')
+    # Un UPDATE por cliente con pedidos; sin usuario quedan los valores por defecto ('')
+    clientes = Cliente.objects.filter(
+        pedidos_cliente__isnull=False, usuario__isnull=False
+    ).select_related('usuario').distinct()
+    for cliente in clientes.iterator():
+        usuario = cliente.usuario
+        PedidoCliente.objects.filter(cliente=cliente).update(
+            busqueda_nombre=_normalizar(f"{usuario.first_name} {usuario.last_name}")[:150],
+            busqueda_apellido=_normalizar(usuario.last_name)[:150],
+            busqueda_email=_normalizar(usuario.email)[:254],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedido_app', '0007_pedidocliente_cola_preparacion_idx'),
+        ('sucursal_app', '0001_initial'),
+        ('ubicacion_app', '0001_initial'),
+        ('usuario_app', '0002_remove_cliente_direccion_calle_numero_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedidocliente',
+            name='busqueda_apellido',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=150),
+        ),
+        migrations.AddField(
+            model_name='pedidocliente',
+            name='busqueda_email',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='pedidocliente',
+            name='busqueda_nombre',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=150),
+        ),
+        migrations.AddIndex(
+            model_name='pedidocliente',
+            index=models.Index(fields=['estado', 'fecha_pedido'], name='pedido_cliente_estado_idx'),
+        ),
+        migrations.RunPython(poblar_busqueda, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedido_app', '0008_pedidocliente_busqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TramoRecalculoDescuentos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ejecucion', models.CharField(db_index=True, max_length=32, verbose_name='Ejecución')),
+                ('id_desde', models.PositiveBigIntegerField(verbose_name='ID Desde (incluido)')),
+                ('id_hasta', models.PositiveBigIntegerField(verbose_name='ID Hasta (excluido)')),
+                ('completado', models.BooleanField(default=False, verbose_name='Completado')),
+                ('pedidos_actualizados', models.PositiveIntegerField(default=0, verbose_name='Pedidos Actualizados')),
+                ('detalles_actualizados', models.PositiveIntegerField(default=0, verbose_name='Detalles Actualizados')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_procesado', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Procesamiento')),
+            ],
+            options={
+                'verbose_name': 'Tramo de Recálculo de Descuentos',
+                'verbose_name_plural': 'Tramos de Recálculo de Descuentos',
+                'ordering': ['ejecucion', 'id_desde'],
+                'unique_together': {('ejecucion', 'id_desde')},
+            },
+        ),
+    ]
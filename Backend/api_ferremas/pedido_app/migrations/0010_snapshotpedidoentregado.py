@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedido_app', '0009_tramorecalculodescuentos'),
+        ('sucursal_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotPedidoEntregado',
+            fields=[
+                ('pedido', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot_entrega', serialize=False, to='pedido_app.pedidocliente', verbose_name='Pedido Cliente')),
+                ('fecha_entregado', models.DateTimeField(verbose_name='Fecha de Entrega Real')),
+                ('contenido', models.BinaryField(verbose_name='Documento JSON')),
+                ('comprimido', models.BooleanField(default=False, verbose_name='Comprimido')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('sucursal_despacho', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='sucursal_app.sucursal', verbose_name='Sucursal de Despacho')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Pedido Entregado',
+                'verbose_name_plural': 'Snapshots de Pedidos Entregados',
+                'ordering': ['-fecha_entregado', '-pedido_id'],
+                'indexes': [models.Index(fields=['-fecha_entregado', '-pedido'], name='snapshot_entrega_fecha_idx'), models.Index(fields=['sucursal_despacho', '-fecha_entregado', '-pedido'], name='snapshot_entrega_sucursal_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:05
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedido_app', '0010_snapshotpedidoentregado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecepcionPedidoProveedor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero_guia_despacho', models.CharField(blank=True, max_length=100, null=True, verbose_name='Número Guía de Despacho/Factura')),
+                ('notas', models.TextField(blank=True, null=True, verbose_name='Notas')),
+                ('fecha_recepcion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Recepción')),
+                ('pedido_proveedor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recepciones', to='pedido_app.pedidoproveedor', verbose_name='Pedido Asociado')),
+                ('recibido_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recepciones_pedido_proveedor', to=settings.AUTH_USER_MODEL, verbose_name='Recibido Por')),
+            ],
+            options={
+                'verbose_name': 'Recepción de Pedido a Proveedor',
+                'verbose_name_plural': 'Recepciones de Pedidos a Proveedores',
+                'ordering': ['-fecha_recepcion', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DetalleRecepcionPedidoProveedor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)], verbose_name='Cantidad Recibida')),
+                ('costo_unitario', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Costo Unitario')),
+                ('detalle_pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recepciones', to='pedido_app.detallepedidoproveedor', verbose_name='Detalle del Pedido')),
+                ('recepcion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detalles', to='pedido_app.recepcionpedidoproveedor', verbose_name='Recepción')),
+            ],
+            options={
+                'verbose_name': 'Detalle de Recepción de Pedido a Proveedor',
+                'verbose_name_plural': 'Detalles de Recepciones de Pedidos a Proveedores',
+                'unique_together': {('recepcion', 'detalle_pedido')},
+            },
+        ),
+    ]
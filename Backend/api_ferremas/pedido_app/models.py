@@ -1,4 +1,10 @@
+import json
+import unicodedata
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 from django.conf import settings
 from proveedor_app.models import Proveedor
 from producto_app.models import Producto
@@ -27,6 +33,7 @@ class PedidoProveedor(models.Model):
     fecha_pedido = models.DateTimeField(auto_now_add=True, verbose_name="Fecha del Pedido")
 
     class EstadoPedido(models.TextChoices):
+        BORRADOR = 'BORRADOR', 'Borrador' # Sugerido por el reabastecimiento automático, pendiente de aprobar
         SOLICITADO = 'SOLICITADO', 'Solicitado'
         EN_TRANSITO = 'EN_TRANSITO', 'En Tránsito'
         RECIBIDO_PARCIAL = 'RECIBIDO_PARCIAL', 'Recibido Parcialmente'
@@ -78,11 +85,13 @@ class PedidoProveedor(models.Model):
     def __str__(self):
         return f"Pedido #{self.id} a {self.proveedor.razon_social} para Bodega {self.bodega_recepcion.nombre if self.bodega_recepcion else 'N/A'} ({self.get_estado_display()})"
 
-    def calcular_totales(self):
+    def calcular_totales(self, detalles=None):
         # Lógica para recalcular subtotal, impuesto y total basado en los detalles
-        # Este método se llamaría al guardar un detalle o al modificar el pedido
-        detalles = self.detalles_pedido.all()
-        self.subtotal = sum(detalle.subtotal_linea() for detalle in detalles if detalle.subtotal_linea() is not None)
+        # Este método se llamaría al guardar un detalle o al modificar el pedido.
+        # 'detalles' permite pasar las líneas ya en memoria (ej. recién escritas en bloque) sin recargarlas
+        if detalles is None:
+            detalles = self.detalles_pedido.all()
+        self.subtotal = sum(detalle.subtotal_linea() for detalle in detalles)
         # Aquí aplicarías lógica para descuento_total e impuesto_total si es necesario
         # Por ahora, un cálculo simple:
         # from decimal import Decimal
@@ -121,6 +130,63 @@ class DetallePedidoProveedor(models.Model):
         return 0
     subtotal_linea.short_description = "Subtotal Línea"
 
+
+class RecepcionPedidoProveedor(models.Model):
+    """
+    Una entrega del proveedor ingresada a la bodega de recepción (total o parcial).
+    Sus líneas guardan lo que ingresó en esa entrega: el stock se suma solo por estas
+    cantidades, así que registrar varias recepciones parciales nunca cuenta dos veces.
+    """
+    pedido_proveedor = models.ForeignKey(
+        PedidoProveedor,
+        related_name="recepciones",
+        on_delete=models.CASCADE,
+        verbose_name="Pedido Asociado"
+    )
+    recibido_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name="recepciones_pedido_proveedor",
+        verbose_name="Recibido Por"
+    )
+    numero_guia_despacho = models.CharField(max_length=100, blank=True, null=True, verbose_name="Número Guía de Despacho/Factura")
+    notas = models.TextField(blank=True, null=True, verbose_name="Notas")
+    fecha_recepcion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Recepción")
+
+    class Meta:
+        verbose_name = "Recepción de Pedido a Proveedor"
+        verbose_name_plural = "Recepciones de Pedidos a Proveedores"
+        ordering = ['-fecha_recepcion', '-id']
+
+    def __str__(self):
+        return f"Recepción #{self.id} del pedido #{self.pedido_proveedor_id}"
+
+
+class DetalleRecepcionPedidoProveedor(models.Model):
+    recepcion = models.ForeignKey(
+        RecepcionPedidoProveedor,
+        related_name="detalles",
+        on_delete=models.CASCADE,
+        verbose_name="Recepción"
+    )
+    detalle_pedido = models.ForeignKey(
+        DetallePedidoProveedor,
+        related_name="recepciones",
+        on_delete=models.CASCADE,
+        verbose_name="Detalle del Pedido"
+    )
+    cantidad = models.PositiveIntegerField(validators=[MinValueValidator(1)], verbose_name="Cantidad Recibida")
+    costo_unitario = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)], verbose_name="Costo Unitario")
+
+    class Meta:
+        verbose_name = "Detalle de Recepción de Pedido a Proveedor"
+        verbose_name_plural = "Detalles de Recepciones de Pedidos a Proveedores"
+        unique_together = ('recepcion', 'detalle_pedido')
+
+    def __str__(self):
+        return f"{self.cantidad} x línea #{self.detalle_pedido_id} (recepción #{self.recepcion_id})"
+
 # --- Modelos para Pedido de Cliente ---
 
 class EstadoPedidoCliente(models.TextChoices):
@@ -149,6 +215,28 @@ class MetodoEnvio(models.TextChoices):
     # Podrías añadir más como 'COURIER_EXTERNO'
 
 
+def normalizar_texto_busqueda(texto):
+    """Minúsculas, sin tildes y con espacios simples: la forma en que se guardan y comparan las búsquedas."""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_tildes.lower().split())
+
+
+# Columnas de búsqueda de PedidoCliente, derivadas del usuario del cliente
+CAMPOS_BUSQUEDA_PEDIDO = ('busqueda_nombre', 'busqueda_apellido', 'busqueda_email')
+
+
+def valores_busqueda_usuario(usuario):
+    """Valores de CAMPOS_BUSQUEDA_PEDIDO para los pedidos de un cliente con este usuario."""
+    if usuario is None:
+        return dict.fromkeys(CAMPOS_BUSQUEDA_PEDIDO, '')
+    return {
+        'busqueda_nombre': normalizar_texto_busqueda(f"{usuario.first_name} {usuario.last_name}")[:150],
+        'busqueda_apellido': normalizar_texto_busqueda(usuario.last_name)[:150],
+        'busqueda_email': normalizar_texto_busqueda(usuario.email)[:254],
+    }
+
+
 class PedidoCliente(models.Model):
     cliente = models.ForeignKey(
         Cliente,
@@ -219,17 +307,63 @@ class PedidoCliente(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación del Registro")
     fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Fecha de Última Actualización")
 
+    # Copia normalizada (normalizar_texto_busqueda) de los datos del cliente para la búsqueda por
+    # prefijo con índice. Se mantiene al guardar el pedido y al cambiar el usuario del cliente.
+    busqueda_nombre = models.CharField(max_length=150, blank=True, default='', editable=False, db_index=True)
+    busqueda_apellido = models.CharField(max_length=150, blank=True, default='', editable=False, db_index=True)
+    busqueda_email = models.CharField(max_length=254, blank=True, default='', editable=False, db_index=True)
+
     class Meta:
         verbose_name = "Pedido de Cliente"
         verbose_name_plural = "Pedidos de Clientes"
         ordering = ['-fecha_pedido']
+        indexes = [
+            models.Index(fields=['estado', 'fecha_pedido'], name='pedido_cliente_estado_idx'),
+            # Cola de preparación por sucursal (pedidos pendientes de asignación, en orden de llegada)
+            models.Index(fields=['sucursal_despacho', 'estado_preparacion', 'fecha_pedido'], name='pedido_cola_preparacion_idx'),
+        ]
 
     def __str__(self):
         return f"Pedido Cliente #{self.id} - {self.cliente} ({self.get_estado_display()})"
 
-    def calcular_totales_cliente(self):
-        detalles = self.detalles_pedido_cliente.all()
-        self.subtotal = sum(detalle.subtotal_linea_cliente() for detalle in detalles if detalle.subtotal_linea_cliente() is not None)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._cliente_id_cargado = instancia.__dict__.get('cliente_id')
+        return instancia
+
+    def save(self, *args, **kwargs):
+        # Las columnas de búsqueda se recalculan solo si cambia el cliente (o el pedido es nuevo)
+        update_fields = kwargs.get('update_fields')
+        cliente_cambiado = self._state.adding or self.cliente_id != getattr(self, '_cliente_id_cargado', None)
+        if cliente_cambiado and (update_fields is None or 'cliente' in update_fields):
+            self.__dict__.update(valores_busqueda_usuario(self.cliente.usuario if self.cliente_id else None))
+            if update_fields is not None:
+                kwargs['update_fields'] = update_fields = {*update_fields, *CAMPOS_BUSQUEDA_PEDIDO}
+        # La fecha de entrega real se registra al pasar a ENTREGADO
+        if self.__dict__.get('estado') == EstadoPedidoCliente.ENTREGADO and 'fecha_entregado' in self.__dict__ \
+           and self.fecha_entregado is None and (update_fields is None or 'estado' in update_fields):
+            self.fecha_entregado = timezone.now()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'fecha_entregado'}
+        # Estados con que se cargó el pedido: los receptores de post_save comparan contra estos,
+        # fijos durante todo el guardado, y luego pasan a ser los guardados
+        self._estados_previos = getattr(self, '_estados_iniciales', (None, None))
+        super().save(*args, **kwargs)
+        self._cliente_id_cargado = self.cliente_id
+        campos_guardados = kwargs.get('update_fields')
+        self._estados_iniciales = tuple(
+            self.__dict__.get(campo) if campos_guardados is None or campo in campos_guardados else previo
+            for campo, previo in zip(('estado', 'estado_preparacion'), self._estados_previos)
+        )
+
+    def asignar_totales_cliente(self, detalles):
+        """
+        Calcula en memoria los totales a partir de 'detalles', sin guardar.
+        Retorna True si alguno de los totales cambió.
+        """
+        anteriores = (self.subtotal, self.descuento_total, self.total_pedido)
+        self.subtotal = sum(detalle.subtotal_linea_cliente() for detalle in detalles)
         
         # Calcular el descuento total sumando los descuentos de todas las líneas
         self.descuento_total = sum(detalle.descuento_total_linea for detalle in detalles if detalle.descuento_total_linea is not None)
@@ -238,6 +372,13 @@ class PedidoCliente(models.Model):
         # from decimal import Decimal
         # self.impuesto_total = self.subtotal * Decimal('0.19') # Ejemplo IVA 19%
         self.total_pedido = (self.subtotal or 0) - (self.descuento_total or 0) + (self.impuesto_total or 0)
+        return anteriores != (self.subtotal, self.descuento_total, self.total_pedido)
+
+    def calcular_totales_cliente(self, detalles=None):
+        # 'detalles' permite pasar las líneas ya en memoria (ej. recién creadas en bloque) sin recargarlas
+        if detalles is None:
+            detalles = self.detalles_pedido_cliente.all()
+        self.asignar_totales_cliente(detalles)
         self.save(update_fields=['subtotal', 'descuento_total', 'impuesto_total', 'total_pedido'])
 
 
@@ -278,12 +419,102 @@ class DetallePedidoCliente(models.Model):
         return 0
     subtotal_linea_cliente.short_description = "Subtotal Línea"
 
+    def asignar_descuentos_linea(self, precio_original):
+        """
+        Calcula en memoria los campos de descuento a partir del precio de lista del producto,
+        sin guardar. Retorna True si alguno cambió.
+        """
+        if not self.cantidad:
+            return False
+        anteriores = (self.precio_unitario_con_descuento, self.descuento_total_linea)
+        precio_con_descuento = self.precio_unitario_venta  # Este ya tiene el descuento aplicado
+
+        self.precio_unitario_con_descuento = precio_con_descuento
+        self.descuento_total_linea = (precio_original - precio_con_descuento) * self.cantidad
+        return anteriores != (self.precio_unitario_con_descuento, self.descuento_total_linea)
+
     def calcular_descuentos_linea(self):
         """Calcula y actualiza los campos de descuento para esta línea"""
-        if self.producto and self.cantidad:
-            precio_original = self.producto.precio
-            precio_con_descuento = self.precio_unitario_venta  # Este ya tiene el descuento aplicado
-            
-            self.precio_unitario_con_descuento = precio_con_descuento
-            self.descuento_total_linea = (precio_original - precio_con_descuento) * self.cantidad
+        if self.producto and self.asignar_descuentos_linea(self.producto.precio):
             self.save(update_fields=['precio_unitario_con_descuento', 'descuento_total_linea'])
+
+
+class TramoRecalculoDescuentos(models.Model):
+    """
+    Rango de IDs de PedidoCliente [id_desde, id_hasta) de una ejecución del recálculo masivo
+    de descuentos (comando actualizar_descuentos_pedidos). Cada tramo se marca completado en
+    la misma transacción que sus escrituras, así que una ejecución interrumpida se reanuda
+    procesando solo los tramos pendientes.
+    """
+    ejecucion = models.CharField(max_length=32, db_index=True, verbose_name="Ejecución")
+    id_desde = models.PositiveBigIntegerField(verbose_name="ID Desde (incluido)")
+    id_hasta = models.PositiveBigIntegerField(verbose_name="ID Hasta (excluido)")
+    completado = models.BooleanField(default=False, verbose_name="Completado")
+    pedidos_actualizados = models.PositiveIntegerField(default=0, verbose_name="Pedidos Actualizados")
+    detalles_actualizados = models.PositiveIntegerField(default=0, verbose_name="Detalles Actualizados")
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
+    fecha_procesado = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de Procesamiento")
+
+    class Meta:
+        verbose_name = "Tramo de Recálculo de Descuentos"
+        verbose_name_plural = "Tramos de Recálculo de Descuentos"
+        ordering = ['ejecucion', 'id_desde']
+        unique_together = ('ejecucion', 'id_desde')
+
+    def __str__(self):
+        return f"{self.ejecucion} [{self.id_desde}, {self.id_hasta})"
+
+
+class SnapshotPedidoEntregado(models.Model):
+    """
+    Copia inmutable del pedido tal como se entregó (documento JSON con la forma de
+    PedidoClienteSerializer), congelada al pasar a ENTREGADO. El historial de entregas se
+    sirve desde aquí: los precios, productos y datos del cliente no cambian con el catálogo.
+    Los documentos grandes se guardan comprimidos con zlib.
+    """
+    UMBRAL_COMPRESION = 1024  # Bytes de JSON a partir de los cuales se comprime
+
+    pedido = models.OneToOneField(
+        PedidoCliente,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="snapshot_entrega",
+        verbose_name="Pedido Cliente"
+    )
+    # Copias del pedido para filtrar y ordenar el historial sin join
+    sucursal_despacho = models.ForeignKey(
+        Sucursal,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name="+",
+        verbose_name="Sucursal de Despacho"
+    )
+    fecha_entregado = models.DateTimeField(verbose_name="Fecha de Entrega Real")
+    contenido = models.BinaryField(verbose_name="Documento JSON")
+    comprimido = models.BooleanField(default=False, verbose_name="Comprimido")
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
+
+    class Meta:
+        verbose_name = "Snapshot de Pedido Entregado"
+        verbose_name_plural = "Snapshots de Pedidos Entregados"
+        ordering = ['-fecha_entregado', '-pedido_id']
+        indexes = [
+            models.Index(fields=['-fecha_entregado', '-pedido'], name='snapshot_entrega_fecha_idx'),
+            models.Index(fields=['sucursal_despacho', '-fecha_entregado', '-pedido'], name='snapshot_entrega_sucursal_idx'),
+        ]
+
+    def __str__(self):
+        return f"Snapshot de entrega del pedido #{self.pedido_id}"
+
+    @classmethod
+    def codificar(cls, datos):
+        """Retorna (contenido, comprimido) para el documento 'datos'."""
+        contenido = json.dumps(datos, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+        if len(contenido) >= cls.UMBRAL_COMPRESION:
+            return zlib.compress(contenido), True
+        return contenido, False
+
+    @property
+    def datos(self):
+        contenido = bytes(self.contenido)
+        return json.loads(zlib.decompress(contenido) if self.comprimido else contenido)
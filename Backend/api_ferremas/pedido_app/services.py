@@ -1,61 +1,179 @@
-from django.db import transaction
+import logging
+import uuid
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import django
+from django.db import connection, connections, transaction
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
 from rest_framework.exceptions import ValidationError
-from django.db.models import F
+from django.db.models import Count, F, Max, Min, Prefetch, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 
-from .models import PedidoCliente, EstadoPedidoCliente
+from .models import (
+    PedidoCliente, EstadoPedidoCliente, EstadoPreparacionPedido, PedidoProveedor, DetallePedidoProveedor,
+    DetallePedidoCliente, TramoRecalculoDescuentos, SnapshotPedidoEntregado, normalizar_texto_busqueda,
+    RecepcionPedidoProveedor, DetalleRecepcionPedidoProveedor,
+)
+from .signals import encolar_registro_pedido, publicar_evento_pedido
+from .tareas import EVENTO_CANCELAR_TRASPASOS
+from bitacora_app.models import RegistroActividad
+from bitacora_app.outbox import registrar_eventos
 from inventario_app.models import DetalleInventarioBodega, InventarioSucursal, TraspasoInternoStock, DetalleTraspasoStock
+from inventario_app.signals import publicar_evento_traspaso
+from inventario_app.services import sumar_stock_en_bloque
 from sucursal_app.models import Bodega
+from sucursal_app.services import obtener_matriz_distancias_sucursales, DISTANCIA_REGION_DESCONOCIDA
 
-def intentar_crear_traspaso_automatico(pedido_cliente, producto, cantidad_faltante, bodega_destino_traspaso, usuario_solicitante=None):
+logger = logging.getLogger(__name__)
+
+ESTADOS_TRASPASO_VIGENTES = [
+    TraspasoInternoStock.EstadoTraspaso.PENDIENTE,
+    TraspasoInternoStock.EstadoTraspaso.EN_TRANSITO,
+    TraspasoInternoStock.EstadoTraspaso.RECIBIDO_PENDIENTE_VERIFICACION,
+]
+
+
+def _elegir_origenes_traspaso(pendientes, stock_por_sucursal, distancia):
     """
-    Intenta crear un traspaso automático para cubrir el stock faltante.
-    Retorna True si el traspaso se crea o se identifica uno existente, False si no.
-    'usuario_solicitante' es el usuario que se asignará como 'creado_por' en el traspaso.
-    """
-    sucursal_despacho_actual = pedido_cliente.sucursal_despacho
-    bodega_origen_traspaso = None
-    sucursal_origen_traspaso = None
-
-    detalles_stock_disponibles = DetalleInventarioBodega.objects.filter(
-        producto=producto,
-        cantidad__gte=cantidad_faltante
-    ).exclude(bodega=bodega_destino_traspaso).order_by('-cantidad')
-
-    for stock_disponible in detalles_stock_disponibles:
-        bodega_origen_traspaso = stock_disponible.bodega
-        sucursal_origen_traspaso = stock_disponible.bodega.sucursal
-        break
-
-    if not bodega_origen_traspaso:
-        return False
-
-    traspaso_existente = TraspasoInternoStock.objects.filter(
-        pedido_cliente_origen=pedido_cliente,
-        sucursal_destino=sucursal_despacho_actual,
-        estado=TraspasoInternoStock.EstadoTraspaso.PENDIENTE,
-        detalles_traspaso__producto=producto,
-        detalles_traspaso__bodega_destino=bodega_destino_traspaso
-    ).first()
+    Reparte las cantidades pendientes entre sucursales de origen buscando el menor número
+    de traspasos: si una sucursal cubre todo lo pendiente se usa la más cercana de ellas;
+    si no, se toma la que más unidades cubre (desempate por cercanía) y se repite.
+    'stock_por_sucursal' es {sucursal_id: {producto_id: [(bodega_id, cantidad), ...]}}.
+    Retorna (plan, no_cubiertos) con plan = {sucursal_id: [(producto_id, bodega_id, cantidad), ...]}.
+    """
+    restantes = dict(pendientes)
+    candidatas = set(stock_por_sucursal)
+    plan = {}
+
+    def cobertura(sucursal_id):
+        stock = stock_por_sucursal[sucursal_id]
+        return sum(
+            min(faltante, sum(cantidad for _, cantidad in stock.get(producto_id, [])))
+            for producto_id, faltante in restantes.items()
+        )
+
+    while restantes and candidatas:
+        coberturas = {sucursal_id: cobertura(sucursal_id) for sucursal_id in candidatas}
+        total_restante = sum(restantes.values())
+        completas = [s for s, cubierto in coberturas.items() if cubierto == total_restante]
+        if completas:
+            elegida = min(completas, key=lambda s: (distancia(s), s))
+        else:
+            elegida = max(candidatas, key=lambda s: (coberturas[s], -distancia(s), -s))
+        if not coberturas[elegida]:
+            break
+        candidatas.discard(elegida)
 
-    if traspaso_existente:
-        return True
+        asignaciones = []
+        for producto_id in list(restantes):
+            # Primero las bodegas con más stock, para usar el menor número de líneas
+            for bodega_id, cantidad in sorted(stock_por_sucursal[elegida].get(producto_id, []), key=lambda b: -b[1]):
+                tomar = min(cantidad, restantes[producto_id])
+                asignaciones.append((producto_id, bodega_id, tomar))
+                restantes[producto_id] -= tomar
+                if not restantes[producto_id]:
+                    del restantes[producto_id]
+                    break
+        plan[elegida] = asignaciones
+    return plan, restantes
 
-    traspaso = TraspasoInternoStock.objects.create(
-        sucursal_origen=sucursal_origen_traspaso,
-        sucursal_destino=sucursal_despacho_actual,
-        estado=TraspasoInternoStock.EstadoTraspaso.PENDIENTE,
-        motivo=TraspasoInternoStock.MotivoTraspaso.PARA_COMPLETAR_PEDIDO,
-        creado_por=usuario_solicitante,
-        pedido_cliente_origen=pedido_cliente
+
+def planificar_traspasos_pedido(pedido_cliente, faltantes, bodega_destino_traspaso, usuario_solicitante=None):
+    """
+    Planifica y crea los traspasos para cubrir todos los faltantes de un pedido a la vez.
+    'faltantes' es {producto_id: cantidad}. Descuenta lo ya solicitado en traspasos vigentes
+    del pedido, busca stock candidato con una sola consulta y genera un TraspasoInternoStock
+    por sucursal de origen (con una línea por producto y bodega), priorizando pocas
+    sucursales y las más cercanas según la matriz de distancias.
+    Retorna (traspasos_creados, no_cubiertos) con no_cubiertos = {producto_id: cantidad}.
+    'usuario_solicitante' es el usuario que se asignará como 'creado_por' en los traspasos.
+    """
+    sucursal_destino = pedido_cliente.sucursal_despacho
+    ya_solicitado = dict(
+        DetalleTraspasoStock.objects.filter(
+            traspaso__pedido_cliente_origen=pedido_cliente,
+            traspaso__estado__in=ESTADOS_TRASPASO_VIGENTES,
+            bodega_destino=bodega_destino_traspaso,
+            producto_id__in=list(faltantes),
+        ).values('producto_id').annotate(total=Sum('cantidad_solicitada')).values_list('producto_id', 'total')
     )
-    DetalleTraspasoStock.objects.create(
-        traspaso=traspaso,
-        producto=producto,
-        cantidad_solicitada=cantidad_faltante,
-        bodega_origen=bodega_origen_traspaso,
-        bodega_destino=bodega_destino_traspaso
+    pendientes = {
+        producto_id: cantidad - ya_solicitado.get(producto_id, 0)
+        for producto_id, cantidad in faltantes.items()
+        if cantidad > ya_solicitado.get(producto_id, 0)
+    }
+    if not pendientes:
+        return [], {}
+
+    stock_por_sucursal = defaultdict(lambda: defaultdict(list))
+    candidatos = DetalleInventarioBodega.objects.filter(
+        producto_id__in=list(pendientes),
+        cantidad__gt=0,
+        bodega__is_active=True,
+        bodega__sucursal__is_active=True,
+    ).exclude(bodega=bodega_destino_traspaso).values_list('producto_id', 'bodega_id', 'bodega__sucursal_id', 'cantidad')
+    for producto_id, bodega_id, sucursal_id, cantidad in candidatos:
+        stock_por_sucursal[sucursal_id][producto_id].append((bodega_id, cantidad))
+
+    matriz = obtener_matriz_distancias_sucursales()
+    distancia = lambda sucursal_id: matriz.get((sucursal_id, sucursal_destino.id), DISTANCIA_REGION_DESCONOCIDA)
+    plan, no_cubiertos = _elegir_origenes_traspaso(pendientes, stock_por_sucursal, distancia)
+    if not plan:
+        return [], no_cubiertos
+
+    origenes = sorted(plan, key=distancia)
+    traspasos = TraspasoInternoStock.objects.bulk_create([
+        TraspasoInternoStock(
+            sucursal_origen_id=sucursal_id,
+            sucursal_destino=sucursal_destino,
+            estado=TraspasoInternoStock.EstadoTraspaso.PENDIENTE,
+            motivo=TraspasoInternoStock.MotivoTraspaso.PARA_COMPLETAR_PEDIDO,
+            creado_por=usuario_solicitante,
+            pedido_cliente_origen=pedido_cliente,
+        )
+        for sucursal_id in origenes
+    ])
+    DetalleTraspasoStock.objects.bulk_create([
+        DetalleTraspasoStock(
+            traspaso=traspaso,
+            producto_id=producto_id,
+            cantidad_solicitada=cantidad,
+            bodega_origen_id=bodega_id,
+            bodega_destino=bodega_destino_traspaso,
+        )
+        for traspaso, sucursal_id in zip(traspasos, origenes)
+        for producto_id, bodega_id, cantidad in plan[sucursal_id]
+    ])
+    for traspaso in traspasos:
+        publicar_evento_traspaso(traspaso)  # bulk_create no envía post_save
+    return traspasos, no_cubiertos
+
+
+def intentar_crear_traspaso_automatico(pedido_cliente, producto, cantidad_faltante, bodega_destino_traspaso, usuario_solicitante=None):
+    """
+    Intenta crear traspasos automáticos para cubrir el stock faltante de un solo producto.
+    Retorna True si el faltante queda cubierto (por traspasos nuevos o existentes), False si no.
+    Para varios productos usar planificar_traspasos_pedido directamente.
+    """
+    _, no_cubiertos = planificar_traspasos_pedido(
+        pedido_cliente, {producto.id: cantidad_faltante}, bodega_destino_traspaso, usuario_solicitante
     )
-    return True
+    return not no_cubiertos
+
+def bodega_operativa_sucursal(sucursal):
+    """
+    Bodega desde la que se descuenta (y se prepara) el stock de los pedidos de la sucursal:
+    la Sala de Ventas activa o, si no hay, la primera bodega activa. None si no tiene.
+    """
+    bodega = Bodega.objects.filter(sucursal=sucursal, is_active=True, tipo_bodega__tipo='Sala de Ventas').first()
+    return bodega or Bodega.objects.filter(sucursal=sucursal, is_active=True).first()
+
 
 def modificar_stock_para_pedido(pedido_cliente, anular_reduccion=False, usuario_solicitante_traspaso=None):
     """
@@ -63,47 +181,878 @@ def modificar_stock_para_pedido(pedido_cliente, anular_reduccion=False, usuario_
     Si anular_reduccion es True, devuelve el stock (suma).
     Si anular_reduccion es False, reduce el stock (resta).
     Retorna True si el stock se modificó completamente, False si se requiere reabastecimiento.
+    Los faltantes de todas las líneas se planifican juntos en un solo paso de traspasos.
     """
     stock_modificado_completamente = True
     with transaction.atomic():
-        for detalle_pedido in pedido_cliente.detalles_pedido_cliente.all():
-            producto = detalle_pedido.producto
-            cantidad_a_modificar = detalle_pedido.cantidad
-            bodega_operativa = None
-
-            if not pedido_cliente.sucursal_despacho:
-                raise ValueError(f"Pedido {pedido_cliente.id} no tiene sucursal de despacho asignada.")
-            
-            inventario_sucursal_despacho = InventarioSucursal.objects.get(sucursal=pedido_cliente.sucursal_despacho)
-            
-            bodega_operativa = Bodega.objects.filter(sucursal=pedido_cliente.sucursal_despacho, is_active=True, tipo_bodega__tipo='Sala de Ventas').first()
-            if not bodega_operativa:
-                bodega_operativa = Bodega.objects.filter(sucursal=pedido_cliente.sucursal_despacho, is_active=True).first()
-            if not bodega_operativa:
-                raise ValidationError(f"No se encontró bodega operativa para la sucursal de despacho {pedido_cliente.sucursal_despacho.nombre}.")
-
-            stock_bodega, _ = DetalleInventarioBodega.objects.get_or_create(
+        detalles_pedido = list(pedido_cliente.detalles_pedido_cliente.select_related('producto'))
+        if not detalles_pedido:
+            return stock_modificado_completamente
+
+        if not pedido_cliente.sucursal_despacho:
+            raise ValueError(f"Pedido {pedido_cliente.id} no tiene sucursal de despacho asignada.")
+
+        inventario_sucursal_despacho = InventarioSucursal.objects.get(sucursal=pedido_cliente.sucursal_despacho)
+
+        bodega_operativa = bodega_operativa_sucursal(pedido_cliente.sucursal_despacho)
+        if not bodega_operativa:
+            raise ValidationError(f"No se encontró bodega operativa para la sucursal de despacho {pedido_cliente.sucursal_despacho.nombre}.")
+
+        # Cantidades agregadas por producto: un solo bloqueo de las filas y una sola suma en
+        # bloque (una señal stock_modificado por pedido, no una por línea)
+        necesarios = defaultdict(int)
+        productos = {}
+        for detalle_pedido in detalles_pedido:
+            necesarios[detalle_pedido.producto_id] += detalle_pedido.cantidad
+            productos[detalle_pedido.producto_id] = detalle_pedido.producto
+
+        disponibles = {}
+        if not anular_reduccion:
+            disponibles = dict(DetalleInventarioBodega.objects.select_for_update().filter(
                 inventario_sucursal=inventario_sucursal_despacho,
-                producto=producto,
                 bodega=bodega_operativa,
-                defaults={'cantidad': 0}
-            )
+                producto_id__in=list(necesarios),
+            ).values_list('producto_id', 'cantidad'))
 
+        faltantes = defaultdict(int)
+        movimientos = []
+        for producto_id, cantidad_a_modificar in necesarios.items():
             if anular_reduccion:
-                stock_bodega.cantidad = F('cantidad') + cantidad_a_modificar
-                stock_bodega.save(update_fields=['cantidad'])
-            else: # Reducir stock
-                if stock_bodega.cantidad < cantidad_a_modificar:
-                    cantidad_faltante = cantidad_a_modificar - stock_bodega.cantidad
-                    if stock_bodega.cantidad > 0:
-                        stock_bodega.cantidad = 0
-                        stock_bodega.save(update_fields=['cantidad'])
-                    
-                    if intentar_crear_traspaso_automatico(pedido_cliente, producto, cantidad_faltante, bodega_operativa, usuario_solicitante_traspaso):
-                        stock_modificado_completamente = False
-                    else:
-                        raise ValidationError(f"Stock insuficiente para '{producto.nombre}' en la bodega '{bodega_operativa}' y no se pudo generar traspaso.")
+                delta = cantidad_a_modificar
+            else: # Reducir stock; lo que no alcanza se pide por traspaso
+                disponible = disponibles.get(producto_id, 0)
+                if disponible < cantidad_a_modificar:
+                    faltantes[producto_id] += cantidad_a_modificar - disponible
+                delta = -min(disponible, cantidad_a_modificar)
+            movimientos.append((inventario_sucursal_despacho.id, producto_id, bodega_operativa.id, delta))
+        sumar_stock_en_bloque(pd.DataFrame.from_records(
+            movimientos, columns=['inventario_sucursal_id', 'producto_id', 'bodega_id', 'cantidad'],
+        ).assign(stock_minimo=np.nan, stock_maximo=np.nan))
+
+        if faltantes:
+            _, no_cubiertos = planificar_traspasos_pedido(
+                pedido_cliente, faltantes, bodega_operativa, usuario_solicitante_traspaso
+            )
+            if no_cubiertos:
+                detalle = ", ".join(
+                    f"'{productos[producto_id].nombre}' (faltan {cantidad})" for producto_id, cantidad in no_cubiertos.items()
+                )
+                raise ValidationError(f"Stock insuficiente en la bodega '{bodega_operativa}' y no se pudo generar traspaso para: {detalle}.")
+            stock_modificado_completamente = False
+    return stock_modificado_completamente
+
+
+# --- Transiciones masivas de estado ---
+
+# Estados desde los que ya se descontó el stock del pedido (PENDIENTE y PENDIENTE_REABASTECIMIENTO
+# para Transferencia/Efectivo): cancelar desde ellos devuelve el stock
+ESTADOS_CON_STOCK_REDUCIDO = [
+    EstadoPedidoCliente.PAGADO,
+    EstadoPedidoCliente.PROCESANDO,
+    EstadoPedidoCliente.ENVIADO,
+    EstadoPedidoCliente.PENDIENTE,
+    EstadoPedidoCliente.PENDIENTE_REABASTECIMIENTO,
+]
+# Estado destino -> estados de origen permitidos en una transición masiva
+TRANSICIONES_MASIVAS = {
+    EstadoPedidoCliente.ENVIADO: [EstadoPedidoCliente.PAGADO, EstadoPedidoCliente.PROCESANDO],
+    EstadoPedidoCliente.ENTREGADO: [EstadoPedidoCliente.PAGADO, EstadoPedidoCliente.PROCESANDO, EstadoPedidoCliente.ENVIADO],
+    EstadoPedidoCliente.CANCELADO: [EstadoPedidoCliente.POR_CONFIRMAR] + ESTADOS_CON_STOCK_REDUCIDO,
+}
+MAX_PEDIDOS_TRANSICION_MASIVA = 500
+
+
+def _devolver_stock_pedidos(pedidos, bodegas=None):
+    """
+    Devuelve a la bodega operativa de cada sucursal el stock de los pedidos, con las
+    cantidades agregadas por (sucursal, producto) en la base de datos y una sola suma en bloque.
+    'bodegas' {sucursal_id: bodega} evita volver a resolver las bodegas ya conocidas.
+    """
+    lineas = pd.DataFrame.from_records(
+        DetallePedidoCliente.objects.filter(pedido_cliente__in=pedidos).values(
+            'pedido_cliente__sucursal_despacho_id', 'producto_id'
+        ).annotate(cantidad=Sum('cantidad')).values_list('pedido_cliente__sucursal_despacho_id', 'producto_id', 'cantidad'),
+        columns=['sucursal_id', 'producto_id', 'cantidad'],
+    )
+    if lineas.empty:
+        return []
+    sucursal_ids = lineas['sucursal_id'].unique().tolist()
+    inventarios = dict(InventarioSucursal.objects.filter(sucursal_id__in=sucursal_ids).values_list('sucursal_id', 'id'))
+    bodegas = dict(bodegas or {})
+    for sucursal_id in sucursal_ids:
+        if sucursal_id not in bodegas:
+            bodegas[sucursal_id] = bodega_operativa_sucursal(sucursal_id)
+    lineas = lineas.assign(
+        inventario_sucursal_id=lineas['sucursal_id'].map(inventarios),
+        bodega_id=lineas['sucursal_id'].map(lambda sucursal_id: bodegas[sucursal_id].id),
+        stock_minimo=np.nan, stock_maximo=np.nan,
+    )
+    return sumar_stock_en_bloque(lineas.drop(columns='sucursal_id'))
+
+
+def transicionar_pedidos_en_bloque(pedido_ids, estado_destino, usuario=None, sucursal_id=None):
+    """
+    Pasa todos los pedidos indicados a 'estado_destino' (ver TRANSICIONES_MASIVAS), o ninguno.
+
+    Los pedidos se bloquean y se validan como conjunto; si alguno no existe, no pertenece a
+    'sucursal_id' (si se indica) o no admite la transición, se lanza ValidationError con el
+    motivo de cada pedido rechazado. Si todos son válidos se aplica un solo UPDATE; una
+    cancelación devuelve en bloque el stock de los pedidos que lo tenían descontado y encola
+    la cancelación de sus traspasos pendientes. La bitácora se escribe con un solo INSERT.
+    Retorna la lista de pedidos actualizados.
+    """
+    pedido_ids = list(dict.fromkeys(pedido_ids))
+    origenes = TRANSICIONES_MASIVAS[estado_destino]
+    with transaction.atomic():
+        pedidos = list(
+            PedidoCliente.objects.select_for_update().filter(pk__in=pedido_ids).select_related('sucursal_despacho').order_by('pk')
+        )
+        encontrados = {pedido.pk: pedido for pedido in pedidos}
+        rechazados = {}
+        for pedido_id in pedido_ids:
+            pedido = encontrados.get(pedido_id)
+            if pedido is None or (sucursal_id is not None and pedido.sucursal_despacho_id != sucursal_id):
+                rechazados[pedido_id] = "El pedido no existe o no pertenece a tu sucursal."
+            elif pedido.estado not in origenes:
+                rechazados[pedido_id] = (f"No se puede pasar de {pedido.get_estado_display()} "
+                                         f"a {EstadoPedidoCliente(estado_destino).label}.")
+
+        con_stock = []
+        if estado_destino == EstadoPedidoCliente.CANCELADO:
+            con_stock = [p for p in pedidos if p.pk not in rechazados and p.estado in ESTADOS_CON_STOCK_REDUCIDO]
+            sucursales = {p.sucursal_despacho_id: p.sucursal_despacho for p in con_stock}
+            sin_inventario = set(sucursales) - set(
+                InventarioSucursal.objects.filter(sucursal_id__in=list(sucursales)).values_list('sucursal_id', flat=True)
+            )
+            # Una consulta por sucursal distinta, no por pedido
+            bodegas = {
+                sucursal_id: bodega_operativa_sucursal(sucursal)
+                for sucursal_id, sucursal in sucursales.items() if sucursal is not None
+            }
+            for pedido in con_stock:
+                if pedido.sucursal_despacho is None:
+                    rechazados[pedido.pk] = "El pedido no tiene sucursal de despacho asignada."
+                elif pedido.sucursal_despacho_id in sin_inventario or not bodegas[pedido.sucursal_despacho_id]:
+                    rechazados[pedido.pk] = (f"No se encontró inventario o bodega operativa para la sucursal "
+                                             f"{pedido.sucursal_despacho.nombre}.")
+        if rechazados:
+            raise ValidationError({'pedidos_rechazados': {str(k): v for k, v in rechazados.items()}})
+
+        ahora = timezone.now()
+        cambios = {'estado': estado_destino, 'fecha_actualizacion': ahora}
+        if estado_destino == EstadoPedidoCliente.ENTREGADO:
+            cambios['fecha_entregado'] = ahora
+        PedidoCliente.objects.filter(pk__in=pedido_ids).update(**cambios)
+
+        if con_stock:
+            _devolver_stock_pedidos(con_stock, bodegas=bodegas)
+            registrar_eventos(EVENTO_CANCELAR_TRASPASOS, [
+                {'pedido_id': p.pk} for p in con_stock if p.estado == EstadoPedidoCliente.PENDIENTE_REABASTECIMIENTO
+            ])
+
+        # update() no envía post_save: la bitácora y el stream de eventos se emiten aquí
+        content_type = ContentType.objects.get_for_model(PedidoCliente)
+        destino = EstadoPedidoCliente(estado_destino).label
+        RegistroActividad.objects.bulk_create([
+            RegistroActividad(
+                usuario=usuario,
+                accion="ACTUALIZAR_PEDIDO_CLIENTE",
+                descripcion=(f"Se actualizó el pedido de cliente #{pedido.pk} (transición masiva). "
+                             f"Estado anterior: {pedido.get_estado_display()}. Nuevo estado: {destino}."),
+                content_type=content_type,
+                object_id=pedido.pk,
+                fecha_hora=ahora,
+            )
+            for pedido in pedidos
+        ])
+        if estado_destino == EstadoPedidoCliente.ENTREGADO:
+            congelar_snapshots_al_confirmar(pedido_ids)
+        for pedido in pedidos:
+            estado_anterior = pedido.estado
+            pedido.estado = estado_destino
+            pedido.fecha_actualizacion = ahora
+            if 'fecha_entregado' in cambios:
+                pedido.fecha_entregado = ahora
+            publicar_evento_pedido(pedido, estado_anterior=estado_anterior, preparacion_anterior=pedido.estado_preparacion)
+    return pedidos
+
+
+# --- Snapshots de pedidos entregados ---
+
+TAMANO_LOTE_SNAPSHOTS = 200
+
+
+def congelar_snapshots_entrega(pedido_ids, tamano_lote=TAMANO_LOTE_SNAPSHOTS):
+    """
+    Guarda el snapshot de entrega de los pedidos ENTREGADO indicados, serializados con
+    PedidoClienteSerializer en lotes con sus relaciones precargadas. Los que no están ENTREGADO
+    o ya tienen snapshot se omiten. Retorna la cantidad de snapshots escritos.
+    """
+    from .api.serializers import PedidoClienteSerializer  # Importación local para evitar ciclos
+
+    pedido_ids = list(pedido_ids)
+    escritos = 0
+    for inicio in range(0, len(pedido_ids), tamano_lote):
+        pedidos = PedidoCliente.objects.filter(
+            pk__in=pedido_ids[inicio:inicio + tamano_lote], estado=EstadoPedidoCliente.ENTREGADO,
+            snapshot_entrega__isnull=True,
+        ).select_related(
+            'cliente__usuario', 'creado_por_personal', 'sucursal_despacho', 'bodeguero_asignado',
+        ).prefetch_related('detalles_pedido_cliente__producto', 'pagos')
+        snapshots = []
+        for pedido, datos in ((p, PedidoClienteSerializer(p).data) for p in pedidos):
+            contenido, comprimido = SnapshotPedidoEntregado.codificar(datos)
+            snapshots.append(SnapshotPedidoEntregado(
+                pedido=pedido, sucursal_despacho_id=pedido.sucursal_despacho_id,
+                fecha_entregado=pedido.fecha_entregado or pedido.fecha_actualizacion,
+                contenido=contenido, comprimido=comprimido,
+            ))
+        # Inmutable: un pedido que ya tiene snapshot conserva el primero
+        SnapshotPedidoEntregado.objects.bulk_create(snapshots, ignore_conflicts=True)
+        escritos += len(snapshots)
+    return escritos
+
+
+def congelar_snapshots_al_confirmar(pedido_ids):
+    """
+    Congela los snapshots cuando se confirme la transacción en curso, una vez guardadas
+    todas las líneas y totales del pedido. Un fallo se registra en el log y no se propaga.
+    """
+    pedido_ids = list(pedido_ids)
+    transaction.on_commit(lambda: _congelar_snapshots_tras_commit(pedido_ids))
+
+
+def _congelar_snapshots_tras_commit(pedido_ids):
+    try:
+        congelar_snapshots_entrega(pedido_ids)
+    except Exception:
+        # La entrega ya está confirmada: el error no debe llegar a la respuesta. Los pedidos
+        # sin snapshot los congela después el comando congelar_snapshots_entregas.
+        logger.exception("No se pudieron congelar los snapshots de entrega de los pedidos %s", pedido_ids)
+
+
+def congelar_snapshots_pendientes(tamano_lote=TAMANO_LOTE_SNAPSHOTS):
+    """Congela los pedidos ENTREGADO que aún no tienen snapshot. Retorna la cantidad escrita."""
+    pendientes = PedidoCliente.objects.filter(
+        estado=EstadoPedidoCliente.ENTREGADO, snapshot_entrega__isnull=True,
+    ).order_by('pk').values_list('pk', flat=True)
+    return congelar_snapshots_entrega(list(pendientes), tamano_lote)
+
+
+# --- Búsqueda de pedidos de cliente ---
+
+def _por_prefijo(campo, termino):
+    # Prefijo como rango [termino, siguiente): lo resuelve un índice B-tree común en SQLite y PostgreSQL,
+    # a diferencia de LIKE 'x%' (que no usa el índice en SQLite y requiere otro opclass en PostgreSQL)
+    siguiente = termino[:-1] + chr(ord(termino[-1]) + 1)
+    return Q(**{f'{campo}__gte': termino, f'{campo}__lt': siguiente})
+
+
+def filtro_busqueda_pedidos(texto):
+    """
+    Q de la búsqueda libre de pedidos de cliente. 'PED-<id>' busca exactamente ese pedido.
+    Si no, todos los términos deben coincidir, cada uno por prefijo con el nombre completo, el
+    apellido o el email del cliente (columnas busqueda_* del pedido), con el estado del pedido
+    o, si es numérico, con su ID. No requiere joins, por lo que no hace falta distinct().
+    """
+    texto = (texto or '').strip()
+    if texto.upper().startswith('PED-') and texto[4:].isdigit():
+        return Q(id=int(texto[4:]))
+
+    filtro = Q()
+    for termino in normalizar_texto_busqueda(texto).split():
+        filtro_termino = (
+            _por_prefijo('busqueda_nombre', termino)
+            | _por_prefijo('busqueda_apellido', termino)
+            | _por_prefijo('busqueda_email', termino)
+        )
+        estados = [valor for valor in EstadoPedidoCliente.values if termino in valor.lower()]
+        if estados:
+            filtro_termino |= Q(estado__in=estados)
+        if termino.isdigit():
+            filtro_termino |= Q(id=int(termino))
+        filtro &= filtro_termino
+    return filtro
+
+
+# --- Cola de preparación (picking) ---
+
+CAPACIDAD_PREPARACION_BODEGUERO = 3  # Pedidos activos (asignados o en preparación) por bodeguero
+ESTADOS_PEDIDO_PREPARABLES = [EstadoPedidoCliente.PAGADO, EstadoPedidoCliente.PROCESANDO]
+ESTADOS_PREPARACION_ACTIVOS = [EstadoPreparacionPedido.ASIGNADO, EstadoPreparacionPedido.EN_PREPARACION]
+
+
+def cola_preparacion(sucursal_id):
+    """Pedidos de la sucursal listos para preparar y sin bodeguero, en orden de llegada."""
+    return PedidoCliente.objects.filter(
+        sucursal_despacho_id=sucursal_id,
+        estado__in=ESTADOS_PEDIDO_PREPARABLES,
+        estado_preparacion=EstadoPreparacionPedido.PENDIENTE_ASIGNACION,
+        bodeguero_asignado__isnull=True,
+    ).order_by('fecha_pedido', 'id')
+
+
+def pedidos_activos_bodeguero(bodeguero):
+    return PedidoCliente.objects.filter(bodeguero_asignado=bodeguero, estado_preparacion__in=ESTADOS_PREPARACION_ACTIVOS)
+
+
+def tomar_pedidos_preparacion(bodeguero, sucursal_id, cantidad=1, pedido_id=None, capacidad=CAPACIDAD_PREPARACION_BODEGUERO):
+    """
+    Asigna al bodeguero hasta 'cantidad' pedidos de la cola de su sucursal (o solo 'pedido_id').
+    Cada toma es un UPDATE condicional que exige, en la misma sentencia, que el pedido siga en
+    la cola (sin bodeguero) y que el bodeguero tenga menos de 'capacidad' pedidos activos: dos
+    bodegueros nunca toman el mismo pedido y la capacidad no se supera. Con SKIP LOCKED
+    (PostgreSQL) los candidatos se leen saltando los que otra toma en curso tiene bloqueados.
+    Retorna la lista de pedidos tomados, en orden de llegada (vacía si no se tomó ninguno).
+    """
+    activos = pedidos_activos_bodeguero(bodeguero).order_by().values('bodeguero_asignado').annotate(
+        total=Count('id')
+    ).values('total')
+    candidatos = cola_preparacion(sucursal_id)
+    if pedido_id is not None:
+        candidatos = candidatos.filter(pk=pedido_id)
+
+    tomados = []
+    with transaction.atomic():
+        # Serializa las tomas simultáneas del mismo bodeguero (en SQLite las escrituras ya son secuenciales)
+        list(get_user_model().objects.select_for_update().filter(pk=bodeguero.pk).values_list('pk'))
+        descartados = set()
+        while len(tomados) < cantidad:
+            lote = candidatos.exclude(pk__in=descartados)
+            if connection.features.has_select_for_update_skip_locked:
+                lote = lote.select_for_update(skip_locked=True, of=('self',))
+            ids = list(lote.values_list('id', flat=True)[:cantidad - len(tomados)])
+            if not ids:
+                break
+            for candidato_id in ids:
+                asignado = cola_preparacion(sucursal_id).filter(pk=candidato_id).alias(
+                    activos=Coalesce(Subquery(activos), 0)
+                ).filter(activos__lt=capacidad).update(
+                    bodeguero_asignado=bodeguero,
+                    estado_preparacion=EstadoPreparacionPedido.ASIGNADO,
+                    fecha_actualizacion=timezone.now(),
+                )
+                if asignado:
+                    tomados.append(candidato_id)
+                elif pedidos_activos_bodeguero(bodeguero).count() >= capacidad:
+                    return _confirmar_tomas(tomados, bodeguero)
                 else:
-                    stock_bodega.cantidad = F('cantidad') - cantidad_a_modificar
-                    stock_bodega.save(update_fields=['cantidad'])
-    return stock_modificado_completamente
\ No newline at end of file
+                    descartados.add(candidato_id)  # Lo tomó otro bodeguero entre la lectura y el UPDATE
+        return _confirmar_tomas(tomados, bodeguero)
+
+
+def _confirmar_tomas(pedido_ids, bodeguero):
+    # update() no envía post_save: se publican los cambios y se encola la bitácora explícitamente
+    pedidos = list(
+        PedidoCliente.objects.filter(pk__in=pedido_ids).select_related(
+            'cliente__usuario', 'creado_por_personal', 'sucursal_despacho', 'bodeguero_asignado'
+        ).prefetch_related('detalles_pedido_cliente__producto').order_by('fecha_pedido', 'id')
+    )
+    for pedido in pedidos:
+        publicar_evento_pedido(
+            pedido, estado_anterior=pedido.estado, preparacion_anterior=EstadoPreparacionPedido.PENDIENTE_ASIGNACION
+        )
+        encolar_registro_pedido(pedido, usuario=bodeguero)
+    return pedidos
+
+
+# --- Preparación por olas (wave picking) ---
+
+TAMANO_MAXIMO_OLA = 12  # Casilleros del muro de consolidación (put wall): un pedido por casillero
+
+
+def armar_ola_preparacion(bodeguero, sucursal_id, tamano=TAMANO_MAXIMO_OLA, capacidad=CAPACIDAD_PREPARACION_BODEGUERO):
+    """
+    Arma una ola de preparación para el bodeguero: sus pedidos activos en la sucursal más los
+    siguientes de la cola hasta completar 'tamano', y los pasa a EN_PREPARACION. Los nuevos se
+    toman con la misma toma atómica de la cola y su capacidad por bodeguero: la ola nunca deja
+    al bodeguero con más de 'capacidad' pedidos activos (ni más de 'tamano' casilleros).
+
+    Retorna la lista consolidada: una fila por (producto, bodega) con la cantidad total a
+    recoger en un solo recorrido y su reparto por pedido, donde cada pedido tiene asignado un
+    casillero del muro (en orden de llegada). Las cantidades se agregan en la base de datos.
+    """
+    with transaction.atomic():
+        tomar_pedidos_preparacion(bodeguero, sucursal_id, cantidad=tamano, capacidad=min(tamano, capacidad))
+        pedidos = list(
+            pedidos_activos_bodeguero(bodeguero).filter(sucursal_despacho_id=sucursal_id)
+            .order_by('fecha_pedido', 'id')[:tamano]
+        )
+        por_iniciar = [p for p in pedidos if p.estado_preparacion == EstadoPreparacionPedido.ASIGNADO]
+        if por_iniciar:
+            PedidoCliente.objects.filter(pk__in=[p.pk for p in por_iniciar]).update(
+                estado_preparacion=EstadoPreparacionPedido.EN_PREPARACION, fecha_actualizacion=timezone.now(),
+            )
+            for pedido in por_iniciar:
+                pedido.estado_preparacion = EstadoPreparacionPedido.EN_PREPARACION
+                publicar_evento_pedido(pedido, estado_anterior=pedido.estado, preparacion_anterior=EstadoPreparacionPedido.ASIGNADO)
+                encolar_registro_pedido(pedido, usuario=bodeguero)
+
+    bodega = bodega_operativa_sucursal(sucursal_id)
+    casilleros = {pedido.pk: numero for numero, pedido in enumerate(pedidos, start=1)}
+    lineas = DetallePedidoCliente.objects.filter(pedido_cliente_id__in=list(casilleros))
+    totales = lineas.values('producto_id', 'producto__sku', 'producto__nombre').annotate(
+        cantidad_total=Sum('cantidad'), cantidad_pedidos=Count('pedido_cliente_id'),
+    ).order_by('producto__sku', 'producto_id')
+    reparto = defaultdict(list)
+    for pedido_id, producto_id, cantidad in lineas.order_by('pedido_cliente_id').values_list('pedido_cliente_id', 'producto_id', 'cantidad'):
+        reparto[producto_id].append({'pedido_id': pedido_id, 'casillero': casilleros[pedido_id], 'cantidad': cantidad})
+
+    lista = [
+        {
+            'producto_id': fila['producto_id'],
+            'sku': fila['producto__sku'],
+            'nombre': fila['producto__nombre'],
+            'bodega_id': bodega.id if bodega else None,
+            'cantidad_total': fila['cantidad_total'],
+            'cantidad_pedidos': fila['cantidad_pedidos'],
+            'reparto': sorted(reparto[fila['producto_id']], key=lambda r: r['casillero']),
+        }
+        for fila in totales
+    ]
+    return {
+        'sucursal_id': sucursal_id,
+        'bodega_id': bodega.id if bodega else None,
+        'pedidos': [{'pedido_id': pedido.pk, 'casillero': casilleros[pedido.pk]} for pedido in pedidos],
+        'lista_preparacion': lista,
+        'total_unidades': sum(item['cantidad_total'] for item in lista),
+    }
+
+
+# --- Reabastecimiento automático ---
+
+VENTANA_DEMANDA_DIAS = 28  # Ventana larga: demanda media y variabilidad
+VENTANA_DEMANDA_CORTA_DIAS = 7  # Ventana corta: detecta aceleraciones recientes de la demanda
+PLAZO_REPOSICION_DIAS = 7  # Días que tarda un proveedor en entregar (no hay dato por proveedor)
+DIAS_COBERTURA = 14  # Días de demanda que debe cubrir cada reposición
+FACTOR_SEGURIDAD = 1.65  # ~95% de nivel de servicio
+
+ESTADOS_PEDIDO_PROVEEDOR_ABIERTOS = [
+    PedidoProveedor.EstadoPedido.BORRADOR,
+    PedidoProveedor.EstadoPedido.SOLICITADO,
+    PedidoProveedor.EstadoPedido.EN_TRANSITO,
+    PedidoProveedor.EstadoPedido.RECIBIDO_PARCIAL,
+]
+ESTADOS_PEDIDO_CLIENTE_SIN_DEMANDA = [EstadoPedidoCliente.CANCELADO, EstadoPedidoCliente.FALLIDO]
+
+CLAVE_SERIE = ['producto_id', 'sucursal_id']
+
+
+ESTADOS_PEDIDO_PROVEEDOR_RECIBIBLES = [
+    PedidoProveedor.EstadoPedido.SOLICITADO,
+    PedidoProveedor.EstadoPedido.EN_TRANSITO,
+    PedidoProveedor.EstadoPedido.RECIBIDO_PARCIAL,
+]
+
+
+def _ingresar_recepcion(pedido, cantidades, usuario=None, numero_guia_despacho=None, notas=None):
+    """
+    Registra una recepción con las cantidades indicadas [(detalle, cantidad), ...] y las suma
+    en bloque al stock de la bodega de recepción. El precio de compra de cada línea es el
+    costo de la capa que se crea en la valorización.
+    Lanza InventarioSucursal.DoesNotExist si la sucursal de la bodega no tiene inventario.
+    """
+    bodega = pedido.bodega_recepcion
+    inventario_sucursal = InventarioSucursal.objects.get(sucursal_id=bodega.sucursal_id)
+    recepcion = RecepcionPedidoProveedor.objects.create(
+        pedido_proveedor=pedido, recibido_por=usuario, numero_guia_despacho=numero_guia_despacho, notas=notas,
+    )
+    DetalleRecepcionPedidoProveedor.objects.bulk_create([
+        DetalleRecepcionPedidoProveedor(
+            recepcion=recepcion, detalle_pedido=detalle, cantidad=cantidad, costo_unitario=detalle.precio_unitario_compra,
+        )
+        for detalle, cantidad in cantidades
+    ])
+    sumar_stock_en_bloque(pd.DataFrame({
+        'inventario_sucursal_id': inventario_sucursal.id,
+        'producto_id': [detalle.producto_id for detalle, _ in cantidades],
+        'bodega_id': bodega.id,
+        'cantidad': [cantidad for _, cantidad in cantidades],
+        'costo_unitario': [detalle.precio_unitario_compra for detalle, _ in cantidades],
+        'stock_minimo': np.nan,
+        'stock_maximo': np.nan,
+    }))
+    return recepcion
+
+
+@transaction.atomic
+def recibir_stock_pedido_proveedor(pedido, usuario=None):
+    """
+    Completa la recepción de un pedido marcado como RECIBIDO_COMPLETO: ingresa al stock lo que
+    falta de cada línea (lo solicitado menos lo ya ingresado en recepciones anteriores, ej.
+    parciales por el endpoint de recepción), sin volver a sumar lo ya recibido, y deja
+    'cantidad_recibida' igual a lo solicitado.
+    Retorna la recepción creada o None si no había nada pendiente.
+    Lanza InventarioSucursal.DoesNotExist si la sucursal de la bodega no tiene inventario.
+    """
+    # El bloqueo del pedido serializa las recepciones del mismo pedido
+    PedidoProveedor.objects.select_for_update().filter(pk=pedido.pk).exists()
+    detalles = list(pedido.detalles_pedido.annotate(
+        ya_ingresado=Coalesce(Sum('recepciones__cantidad'), 0),
+    ).filter(cantidad_solicitada__gt=F('ya_ingresado')).order_by('pk'))
+    if not detalles:
+        return None
+    cantidades = [(detalle, detalle.cantidad_solicitada - detalle.ya_ingresado) for detalle in detalles]
+    for detalle in detalles:
+        detalle.cantidad_recibida = detalle.cantidad_solicitada
+    DetallePedidoProveedor.objects.bulk_update(detalles, ['cantidad_recibida'])
+    return _ingresar_recepcion(pedido, cantidades, usuario=usuario)
+
+
+def registrar_recepcion_pedido_proveedor(pedido_id, cantidades, usuario=None, numero_guia_despacho=None, notas=None):
+    """
+    Registra una recepción (total o parcial) de varias líneas del pedido a la vez.
+    'cantidades' es {producto_id: cantidad recibida en esta entrega}.
+
+    El pedido y sus líneas se bloquean y las cantidades se validan como conjunto: si alguna
+    línea no es del pedido o, sumada a sus recepciones anteriores, superaría lo solicitado, se
+    lanza ValidationError con el motivo de cada línea rechazada y no se registra nada. Si todas
+    son válidas, 'cantidad_recibida' se escribe con un solo UPDATE en bloque, el stock de la
+    bodega de recepción se suma en bloque y el pedido pasa a RECIBIDO_COMPLETO cuando todas las
+    líneas están completas o a RECIBIDO_PARCIAL si no. Retorna la recepción creada.
+    """
+    with transaction.atomic():
+        pedido = PedidoProveedor.objects.select_for_update(of=('self',)).select_related(
+            'bodega_recepcion__sucursal'
+        ).filter(pk=pedido_id).first()
+        if pedido is None:
+            raise ValidationError({'pedido': "El pedido no existe."})
+        if pedido.estado not in ESTADOS_PEDIDO_PROVEEDOR_RECIBIBLES:
+            raise ValidationError({'estado': f"No se pueden registrar recepciones de un pedido {pedido.get_estado_display()}."})
+        bodega = pedido.bodega_recepcion
+        if not bodega.is_active:
+            raise ValidationError({'bodega_recepcion': f"La bodega de recepción '{bodega.nombre}' no está activa."})
+
+        detalles = {
+            detalle.producto_id: detalle
+            for detalle in pedido.detalles_pedido.select_for_update().order_by('pk')
+        }
+        # Lo ya recibido se suma desde las recepciones registradas (el registro del que sale el
+        # stock), no desde 'cantidad_recibida'. Consulta aparte: FOR UPDATE no admite GROUP BY.
+        ya_recibido = dict(
+            DetalleRecepcionPedidoProveedor.objects.filter(detalle_pedido__pedido_proveedor=pedido)
+            .values('detalle_pedido_id').annotate(total=Sum('cantidad')).values_list('detalle_pedido_id', 'total')
+        )
+        rechazadas = {}
+        for producto_id, cantidad in cantidades.items():
+            detalle = detalles.get(producto_id)
+            if detalle is None:
+                rechazadas[producto_id] = "El producto no es parte del pedido."
+                continue
+            recibido = ya_recibido.get(detalle.pk, 0)
+            if recibido + cantidad > detalle.cantidad_solicitada:
+                rechazadas[producto_id] = (f"Se recibirían {recibido + cantidad} unidades y se "
+                                           f"solicitaron {detalle.cantidad_solicitada} (ya recibidas: {recibido}).")
+        if rechazadas:
+            raise ValidationError({'lineas_rechazadas': {str(k): v for k, v in rechazadas.items()}})
+
+        recibidas = []
+        for producto_id, cantidad in cantidades.items():
+            detalle = detalles[producto_id]
+            ya_recibido[detalle.pk] = ya_recibido.get(detalle.pk, 0) + cantidad
+            detalle.cantidad_recibida = ya_recibido[detalle.pk]
+            recibidas.append((detalle, cantidad))
+        DetallePedidoProveedor.objects.bulk_update([detalle for detalle, _ in recibidas], ['cantidad_recibida'])
+        try:
+            recepcion = _ingresar_recepcion(
+                pedido, recibidas, usuario=usuario, numero_guia_despacho=numero_guia_despacho, notas=notas,
+            )
+        except InventarioSucursal.DoesNotExist:
+            raise ValidationError(f"No existe un inventario general para la sucursal '{bodega.sucursal.nombre}'. Por favor, cree uno manualmente.")
+
+        if all(ya_recibido.get(detalle.pk, 0) >= detalle.cantidad_solicitada for detalle in detalles.values()):
+            pedido.estado = PedidoProveedor.EstadoPedido.RECIBIDO_COMPLETO
+            pedido.fecha_recepcion = recepcion.fecha_recepcion
+        else:
+            pedido.estado = PedidoProveedor.EstadoPedido.RECIBIDO_PARCIAL
+        if numero_guia_despacho and not pedido.numero_guia_despacho:
+            pedido.numero_guia_despacho = numero_guia_despacho
+        pedido.save(update_fields=['estado', 'fecha_recepcion', 'numero_guia_despacho', 'fecha_actualizacion'])
+    return recepcion
+
+
+def _demanda_por_serie(ahora, sucursal_ids=None):
+    """
+    Demanda diaria por (producto, sucursal) en las ventanas móviles que terminan hoy:
+    media larga, media corta y desviación estándar diaria. Se arma una matriz
+    series x días con numpy y las ventanas se calculan por columnas, sin iterar por serie.
+    """
+    ventas = DetallePedidoCliente.objects.filter(
+        pedido_cliente__fecha_pedido__gt=ahora - timedelta(days=VENTANA_DEMANDA_DIAS),
+        pedido_cliente__fecha_pedido__lte=ahora,
+    ).exclude(pedido_cliente__estado__in=ESTADOS_PEDIDO_CLIENTE_SIN_DEMANDA)
+    if sucursal_ids:
+        ventas = ventas.filter(pedido_cliente__sucursal_despacho_id__in=sucursal_ids)
+    df = pd.DataFrame.from_records(
+        ventas.values_list('producto_id', 'pedido_cliente__sucursal_despacho_id', 'pedido_cliente__fecha_pedido', 'cantidad'),
+        columns=CLAVE_SERIE + ['fecha', 'cantidad'],
+    )
+    if df.empty:
+        return pd.DataFrame(columns=CLAVE_SERIE + ['demanda_diaria', 'desviacion_diaria'])
+
+    antiguedad = ((pd.Timestamp(ahora) - pd.to_datetime(df['fecha'], utc=True)) // pd.Timedelta(days=1)).to_numpy()
+    dia = VENTANA_DEMANDA_DIAS - 1 - np.clip(antiguedad, 0, VENTANA_DEMANDA_DIAS - 1)
+    codigos, series = pd.MultiIndex.from_frame(df[CLAVE_SERIE]).factorize()
+    matriz = np.zeros((len(series), VENTANA_DEMANDA_DIAS))
+    np.add.at(matriz, (codigos, dia), df['cantidad'].to_numpy())
+
+    media_larga = matriz.mean(axis=1)
+    media_corta = matriz[:, -VENTANA_DEMANDA_CORTA_DIAS:].mean(axis=1)
+    resultado = series.to_frame(index=False)
+    resultado.columns = CLAVE_SERIE
+    # No subestimar la demanda cuando se acelera: se usa la mayor de las dos ventanas
+    resultado['demanda_diaria'] = np.maximum(media_larga, media_corta)
+    resultado['desviacion_diaria'] = matriz.std(axis=1)
+    return resultado
+
+
+def _ultimo_proveedor_por_producto():
+    """Proveedor (activo) y precio de compra de la última compra de cada producto."""
+    compras = DetallePedidoProveedor.objects.filter(
+        pedido_proveedor__proveedor__activo=True,
+    ).exclude(
+        pedido_proveedor__estado=PedidoProveedor.EstadoPedido.CANCELADO,
+    ).order_by('producto_id', '-pedido_proveedor__fecha_pedido', '-id').values_list(
+        'producto_id', 'pedido_proveedor__proveedor_id', 'precio_unitario_compra'
+    )
+    df = pd.DataFrame.from_records(compras, columns=['producto_id', 'proveedor_id', 'precio_unitario_compra'])
+    return df.drop_duplicates('producto_id')
+
+
+def _bodega_recepcion_por_sucursal():
+    """Bodega que recibe las compras de cada sucursal: la 'Principal' activa o, si no hay, la primera activa."""
+    bodegas = pd.DataFrame.from_records(
+        Bodega.objects.filter(is_active=True, sucursal__is_active=True).values_list('id', 'sucursal_id', 'tipo_bodega__tipo'),
+        columns=['bodega_id', 'sucursal_id', 'tipo'],
+    )
+    bodegas['es_principal'] = bodegas['tipo'] == 'Principal'
+    bodegas = bodegas.sort_values(['es_principal', 'bodega_id'], ascending=[False, True])
+    return bodegas.drop_duplicates('sucursal_id')[['sucursal_id', 'bodega_id']]
+
+
+def calcular_sugerencias_reabastecimiento(plazo_dias=PLAZO_REPOSICION_DIAS, dias_cobertura=DIAS_COBERTURA,
+                                          sucursal_ids=None, ahora=None):
+    """
+    Calcula en bloque, para todo el catálogo y todas las sucursales, cuánto comprar de cada
+    (producto, sucursal). Se pide cuando la posición (stock + pedidos a proveedor abiertos,
+    incluidos borradores) cae al punto de pedido, hasta el nivel objetivo:
+
+      seguridad    = FACTOR_SEGURIDAD * desviación diaria * sqrt(plazo)
+      punto pedido = max(stock mínimo, demanda diaria * plazo + seguridad)
+      objetivo     = stock máximo si está definido; si no, demanda * (plazo + cobertura) + seguridad
+
+    Retorna un DataFrame con una fila por serie a reponer (con su proveedor, precio y bodega de
+    recepción, que quedan vacíos si no se conocen).
+    """
+    ahora = ahora or timezone.now()
+
+    stock = DetalleInventarioBodega.objects.filter(bodega__is_active=True)
+    abiertos = DetallePedidoProveedor.objects.filter(pedido_proveedor__estado__in=ESTADOS_PEDIDO_PROVEEDOR_ABIERTOS)
+    if sucursal_ids:
+        stock = stock.filter(bodega__sucursal_id__in=sucursal_ids)
+        abiertos = abiertos.filter(pedido_proveedor__bodega_recepcion__sucursal_id__in=sucursal_ids)
+    stock = pd.DataFrame.from_records(
+        stock.values_list('producto_id', 'bodega__sucursal_id').annotate(
+            Sum('cantidad'), Sum('stock_minimo'), Sum('stock_maximo')
+        ),
+        columns=CLAVE_SERIE + ['cantidad', 'stock_minimo', 'stock_maximo'],
+    )
+    abiertos = pd.DataFrame.from_records(
+        abiertos.values_list('producto_id', 'pedido_proveedor__bodega_recepcion__sucursal_id').annotate(
+            en_camino=Sum(F('cantidad_solicitada') - F('cantidad_recibida'))
+        ),
+        columns=CLAVE_SERIE + ['en_camino'],
+    )
+
+    series = stock.merge(_demanda_por_serie(ahora, sucursal_ids), on=CLAVE_SERIE, how='outer')
+    series = series.merge(abiertos, on=CLAVE_SERIE, how='left')
+    columnas = ['cantidad', 'stock_minimo', 'stock_maximo', 'en_camino', 'demanda_diaria', 'desviacion_diaria']
+    series[columnas] = series[columnas].astype(float).fillna(0)
+    series['en_camino'] = series['en_camino'].clip(lower=0)
+
+    seguridad = FACTOR_SEGURIDAD * series['desviacion_diaria'] * np.sqrt(plazo_dias)
+    punto_pedido = np.maximum(series['stock_minimo'], series['demanda_diaria'] * plazo_dias + seguridad)
+    objetivo = np.where(
+        series['stock_maximo'] > 0,
+        series['stock_maximo'],
+        np.maximum(punto_pedido, series['demanda_diaria'] * (plazo_dias + dias_cobertura) + seguridad),
+    )
+    posicion = series['cantidad'] + series['en_camino']
+    series['punto_pedido'] = np.ceil(punto_pedido)
+    series['cantidad_sugerida'] = np.where(
+        (posicion <= series['punto_pedido']) & (objetivo > posicion), np.ceil(objetivo - posicion), 0
+    ).astype(int)
+
+    sugerencias = series[series['cantidad_sugerida'] > 0]
+    sugerencias = sugerencias.merge(_ultimo_proveedor_por_producto(), on='producto_id', how='left')
+    sugerencias = sugerencias.merge(_bodega_recepcion_por_sucursal(), on='sucursal_id', how='left')
+    return sugerencias.sort_values(CLAVE_SERIE).reset_index(drop=True)
+
+
+def generar_pedidos_reabastecimiento(usuario=None, plazo_dias=PLAZO_REPOSICION_DIAS, dias_cobertura=DIAS_COBERTURA,
+                                     sucursal_ids=None, aplicar=True):
+    """
+    Crea, en bloque, un PedidoProveedor en estado BORRADOR por (proveedor, bodega de recepción)
+    con las sugerencias de reabastecimiento. Como los borradores cuentan como pedidos abiertos,
+    volver a ejecutarlo solo agrega lo que falte. Los productos sin compras previas a un
+    proveedor activo (o sucursales sin bodega activa) se informan pero no se piden.
+    Con aplicar=False solo devuelve el reporte.
+    """
+    sugerencias = calcular_sugerencias_reabastecimiento(plazo_dias, dias_cobertura, sucursal_ids)
+    sin_proveedor = sugerencias[sugerencias['proveedor_id'].isna()]
+    sin_bodega = sugerencias[sugerencias['proveedor_id'].notna() & sugerencias['bodega_id'].isna()]
+    sugerencias = sugerencias.dropna(subset=['proveedor_id', 'bodega_id'])
+    sugerencias = sugerencias.astype({'proveedor_id': int, 'bodega_id': int})
+
+    grupos = []
+    for (proveedor_id, bodega_id), lineas in sugerencias.groupby(['proveedor_id', 'bodega_id'], sort=True):
+        # Enteros de Python: np.int64 * Decimal da float y los totales deben quedar en Decimal
+        detalles = [
+            (int(producto_id), int(cantidad), precio)
+            for producto_id, cantidad, precio in zip(
+                lineas['producto_id'], lineas['cantidad_sugerida'], lineas['precio_unitario_compra']
+            )
+        ]
+        grupos.append({
+            'proveedor_id': proveedor_id,
+            'bodega_id': bodega_id,
+            'detalles': detalles,
+            'total': sum(cantidad * precio for _, cantidad, precio in detalles),
+        })
+
+    if aplicar and grupos:
+        with transaction.atomic():
+            pedidos = PedidoProveedor.objects.bulk_create([
+                PedidoProveedor(
+                    proveedor_id=grupo['proveedor_id'],
+                    bodega_recepcion_id=grupo['bodega_id'],
+                    estado=PedidoProveedor.EstadoPedido.BORRADOR,
+                    subtotal=grupo['total'],
+                    total_pedido=grupo['total'],
+                    creado_por=usuario,
+                    notas="Generado por el reabastecimiento automático.",
+                )
+                for grupo in grupos
+            ])
+            DetallePedidoProveedor.objects.bulk_create([
+                DetallePedidoProveedor(
+                    pedido_proveedor=pedido,
+                    producto_id=producto_id,
+                    cantidad_solicitada=cantidad,
+                    precio_unitario_compra=precio,
+                )
+                for pedido, grupo in zip(pedidos, grupos)
+                for producto_id, cantidad, precio in grupo['detalles']
+            ])
+        for pedido, grupo in zip(pedidos, grupos):
+            grupo['pedido_id'] = pedido.id
+
+    return {
+        'pedidos': [
+            {
+                'pedido_id': grupo.get('pedido_id'),
+                'proveedor_id': grupo['proveedor_id'],
+                'bodega_recepcion_id': grupo['bodega_id'],
+                'lineas': len(grupo['detalles']),
+                'unidades': sum(cantidad for _, cantidad, _ in grupo['detalles']),
+                'total': grupo['total'],
+            }
+            for grupo in grupos
+        ],
+        'lineas_sugeridas': int(len(sugerencias)),
+        'sin_proveedor': sorted(int(producto_id) for producto_id in sin_proveedor['producto_id'].unique()),
+        'sucursales_sin_bodega': sorted(int(sucursal_id) for sucursal_id in sin_bodega['sucursal_id'].unique()),
+    }
+
+
+# --- Recálculo masivo de descuentos de pedidos ---
+
+TAMANO_TRAMO_DESCUENTOS = 1000  # IDs de pedido por tramo (unidad de trabajo y de avance)
+TAMANO_LOTE_ESCRITURA_DESCUENTOS = 1000
+CAMPOS_DESCUENTO_LINEA = ['precio_unitario_con_descuento', 'descuento_total_linea']
+CAMPOS_TOTALES_PEDIDO = ['subtotal', 'descuento_total', 'total_pedido']
+
+
+def planificar_recalculo_descuentos(tamano_tramo=TAMANO_TRAMO_DESCUENTOS):
+    """
+    Divide el rango de IDs de PedidoCliente en tramos de 'tamano_tramo' y los registra como
+    una nueva ejecución. Retorna el identificador de la ejecución (None si no hay pedidos).
+    """
+    limites = PedidoCliente.objects.aggregate(minimo=Min('id'), maximo=Max('id'))
+    if limites['minimo'] is None:
+        return None
+    ejecucion = uuid.uuid4().hex
+    TramoRecalculoDescuentos.objects.bulk_create([
+        TramoRecalculoDescuentos(ejecucion=ejecucion, id_desde=desde, id_hasta=desde + tamano_tramo)
+        for desde in range(limites['minimo'], limites['maximo'] + 1, tamano_tramo)
+    ])
+    return ejecucion
+
+
+def ultima_ejecucion_recalculo_pendiente():
+    """Ejecución más reciente que aún tiene tramos sin completar, o None."""
+    return TramoRecalculoDescuentos.objects.filter(completado=False).order_by('-fecha_creacion', '-id').values_list(
+        'ejecucion', flat=True
+    ).first()
+
+
+def procesar_tramo_descuentos(tramo_id, tamano_lote=TAMANO_LOTE_ESCRITURA_DESCUENTOS):
+    """
+    Recalcula en memoria los descuentos de las líneas y los totales de los pedidos del tramo
+    (una consulta por pedidos y otra por líneas, con el precio del producto anotado) y escribe
+    solo lo que cambió con bulk_update. No envía post_save: es un recálculo de campos derivados.
+    El tramo se marca completado en la misma transacción. Retorna (pedidos, detalles)
+    actualizados, o None si el tramo ya estaba completado.
+    """
+    with transaction.atomic():
+        tramo = TramoRecalculoDescuentos.objects.select_for_update().filter(pk=tramo_id, completado=False).first()
+        if tramo is None:
+            return None
+        detalles = DetallePedidoCliente.objects.annotate(precio_producto=F('producto__precio')).only(
+            'id', 'pedido_cliente_id', 'cantidad', 'precio_unitario_venta', *CAMPOS_DESCUENTO_LINEA,
+        )
+        pedidos = PedidoCliente.objects.filter(id__gte=tramo.id_desde, id__lt=tramo.id_hasta).only(
+            'id', 'impuesto_total', *CAMPOS_TOTALES_PEDIDO,
+        ).prefetch_related(Prefetch('detalles_pedido_cliente', queryset=detalles)).order_by()
+
+        pedidos_cambiados, detalles_cambiados = [], []
+        for pedido in pedidos:
+            lineas = pedido.detalles_pedido_cliente.all()
+            detalles_cambiados.extend(linea for linea in lineas if linea.asignar_descuentos_linea(linea.precio_producto))
+            if pedido.asignar_totales_cliente(lineas):
+                pedidos_cambiados.append(pedido)
+
+        DetallePedidoCliente.objects.bulk_update(detalles_cambiados, CAMPOS_DESCUENTO_LINEA, batch_size=tamano_lote)
+        PedidoCliente.objects.bulk_update(pedidos_cambiados, CAMPOS_TOTALES_PEDIDO, batch_size=tamano_lote)
+        TramoRecalculoDescuentos.objects.filter(pk=tramo.pk).update(
+            completado=True,
+            pedidos_actualizados=len(pedidos_cambiados),
+            detalles_actualizados=len(detalles_cambiados),
+            fecha_procesado=timezone.now(),
+        )
+    return len(pedidos_cambiados), len(detalles_cambiados)
+
+
+def _inicializar_proceso_recalculo():
+    # Con el método 'spawn' el proceso hijo no hereda la configuración de Django
+    django.setup()
+
+
+def recalcular_descuentos_pedidos(ejecucion, procesos=1):
+    """
+    Procesa los tramos pendientes de la ejecución, en este proceso o repartidos en un pool de
+    'procesos' procesos (en SQLite siempre en este proceso). Genera (tramo, resultado) a medida que se completa cada tramo, donde
+    resultado es el de procesar_tramo_descuentos.
+    """
+    tramos = {
+        tramo.pk: tramo for tramo in TramoRecalculoDescuentos.objects.filter(ejecucion=ejecucion, completado=False)
+    }
+    if procesos <= 1 or connection.vendor == 'sqlite':  # SQLite admite un solo escritor a la vez
+        for tramo_id, tramo in tramos.items():
+            yield tramo, procesar_tramo_descuentos(tramo_id)
+        return
+    # Los hijos abren sus propias conexiones: no deben compartir las del padre
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_proceso_recalculo) as pool:
+        for tramo_id, resultado in zip(tramos, pool.map(procesar_tramo_descuentos, tramos)):
+            yield tramos[tramo_id], resultado
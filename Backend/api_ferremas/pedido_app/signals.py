@@ -1,8 +1,12 @@
-from django.db.models.signals import post_save
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_save, post_init
 from django.dispatch import receiver
 from inventario_app.models import TraspasoInternoStock # Importar solo TraspasoInternoStock
-from .models import PedidoCliente, EstadoPedidoCliente
-from bitacora_app.utils import crear_registro_actividad # Importar el helper de bitácora
+from django.contrib.auth import get_user_model
+from .models import PedidoCliente, EstadoPedidoCliente, SnapshotPedidoEntregado, valores_busqueda_usuario
+from .tareas import EVENTO_CAMBIO_PEDIDO
+from bitacora_app.outbox import registrar_evento
+from bitacora_app.eventos import publicar_al_confirmar, CANAL_PEDIDOS
 
 @receiver(post_save, sender=TraspasoInternoStock)
 def manejar_completitud_traspaso_para_pedido_cliente(sender, instance, created, **kwargs):
@@ -38,33 +42,95 @@ def manejar_completitud_traspaso_para_pedido_cliente(sender, instance, created,
             print(f"Pedido Cliente {pedido_cliente.id} actualizado a {pedido_cliente.estado} tras completarse traspaso {instance.id}")
 
 
+def encolar_registro_pedido(pedido, creado=False, usuario=None):
+    """
+    Encola el registro en bitácora de la creación o actualización de un PedidoCliente.
+    Lo escribe el procesador del outbox (pedido_app.tareas), fuera de la solicitud.
+    También para las escrituras masivas (update), que no envían post_save.
+    """
+    registrar_evento(EVENTO_CAMBIO_PEDIDO, {
+        'pedido_id': pedido.id,
+        'creado': creado,
+        'estado': pedido.estado,
+        'usuario_id': usuario.pk if usuario else None,
+        'content_type_id': ContentType.objects.get_for_model(PedidoCliente).id,
+    })
+
+
 @receiver(post_save, sender=PedidoCliente)
 def registrar_cambio_pedido_cliente(sender, instance: PedidoCliente, created, **kwargs):
+    """Encola el registro en bitácora de cada guardado de un PedidoCliente."""
+    # Si la vista adjuntó el usuario al guardar, es el actor; si no, el manejador lo deduce
+    encolar_registro_pedido(instance, created, getattr(instance, '_request_user', None))
+
+
+@receiver(post_init, sender=PedidoCliente)
+def recordar_estados_pedido_cliente(sender, instance, **kwargs):
+    # PedidoCliente.save() los pasa a '_estados_previos' (lo que leen los receptores de post_save)
+    # y los actualiza tras guardar. __dict__ para no disparar una consulta si el campo fue diferido
+    instance._estados_iniciales = (instance.__dict__.get('estado'), instance.__dict__.get('estado_preparacion'))
+
+
+@receiver(post_save, sender=PedidoCliente)
+def congelar_snapshot_entrega(sender, instance: PedidoCliente, created, raw=False, **kwargs):
     """
-    Registra en la bitácora la creación o actualización de un PedidoCliente.
+    Congela el snapshot del pedido al pasar a ENTREGADO (al confirmarse la transacción) y lo
+    descarta si el pedido deja de estar ENTREGADO.
     """
-    usuario_actor = None
-    request_obj = None # No disponible directamente en post_save, a menos que se pase de otra forma
+    from .services import congelar_snapshots_al_confirmar  # Importación local para evitar ciclos
+    if raw:
+        return
+    estado_anterior, estado = instance._estados_previos[0], instance.__dict__.get('estado')
+    if estado == estado_anterior:
+        return
+    if estado == EstadoPedidoCliente.ENTREGADO:
+        congelar_snapshots_al_confirmar([instance.pk])
+    elif estado_anterior == EstadoPedidoCliente.ENTREGADO:
+        SnapshotPedidoEntregado.objects.filter(pedido=instance).delete()
 
-    # Intentar deducir el usuario actor
-    if hasattr(instance, '_request_user') and instance._request_user: # Si se adjuntó al guardar desde la vista
-        usuario_actor = instance._request_user
-    elif instance.creado_por_personal:
-        usuario_actor = instance.creado_por_personal
-    elif instance.cliente and instance.cliente.usuario:
-        usuario_actor = instance.cliente.usuario
 
+def publicar_evento_pedido(pedido, creado=False, estado_anterior=None, preparacion_anterior=None):
+    """Publica el alta o el cambio de estado de un pedido (también para escrituras masivas)."""
+    publicar_al_confirmar(CANAL_PEDIDOS, {
+        'id': pedido.id,
+        'creado': creado,
+        'estado': pedido.estado,
+        'estado_anterior': estado_anterior,
+        'estado_preparacion': pedido.estado_preparacion,
+        'estado_preparacion_anterior': preparacion_anterior,
+        'sucursal_id': pedido.sucursal_despacho_id,
+        'bodeguero_asignado_id': pedido.bodeguero_asignado_id,
+    }, [pedido.sucursal_despacho_id])
+
+
+@receiver(post_save, sender=PedidoCliente)
+def publicar_cambio_pedido_cliente(sender, instance: PedidoCliente, created, raw=False, **kwargs):
+    """
+    Publica en el stream de eventos la creación del pedido o el cambio de su estado
+    o de su estado de preparación.
+    """
+    if raw:
+        return
+    estado_anterior, preparacion_anterior = instance._estados_previos
+    # Un estado que no se cargó (campo diferido) no cuenta como cambiado
+    cambio = any(
+        inicial is not None and inicial != actual
+        for inicial, actual in zip(instance._estados_previos, (instance.estado, instance.estado_preparacion))
+    )
+    if not created and not cambio:
+        return
     if created:
-        accion = "CREAR_PEDIDO_CLIENTE"
-        descripcion = f"Se creó el pedido de cliente #{instance.id} para {instance.cliente}."
+        publicar_evento_pedido(instance, creado=True)
     else:
-        accion = "ACTUALIZAR_PEDIDO_CLIENTE"
-        descripcion = f"Se actualizó el pedido de cliente #{instance.id}. Nuevo estado: {instance.get_estado_display()}."
-
-    crear_registro_actividad(
-        usuario=usuario_actor,
-        accion=accion,
-        descripcion=descripcion,
-        objeto_relacionado=instance,
-        request=request_obj # Será None aquí
-    )
\ No newline at end of file
+        publicar_evento_pedido(instance, estado_anterior=estado_anterior, preparacion_anterior=preparacion_anterior)
+
+
+@receiver(post_save, sender=get_user_model())
+def actualizar_busqueda_pedidos_usuario(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Mantiene las columnas de búsqueda de los pedidos cuando cambia el nombre o el email del cliente."""
+    if raw or created or (update_fields is not None and not {'first_name', 'last_name', 'email'} & set(update_fields)):
+        return
+    valores = valores_busqueda_usuario(instance)
+    # Un solo UPDATE, que no toca los pedidos ya al día
+    PedidoCliente.objects.filter(cliente__usuario=instance).exclude(**valores).update(**valores)
+
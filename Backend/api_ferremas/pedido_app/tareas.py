@@ -0,0 +1,62 @@
+"""
+Manejadores del outbox (bitacora_app.outbox) para los efectos secundarios de los pedidos
+de cliente. Los ejecuta el comando `procesar_outbox`, fuera de la solicitud HTTP; pueden
+repetirse, por lo que cada uno tolera volver a ejecutarse sobre el mismo evento.
+"""
+from bitacora_app.models import RegistroActividad
+from bitacora_app.outbox import manejador_outbox
+from inventario_app.models import TraspasoInternoStock
+from .models import PedidoCliente, EstadoPedidoCliente
+
+EVENTO_CAMBIO_PEDIDO = 'pedido.registrar_cambio'
+EVENTO_CANCELAR_TRASPASOS = 'pedido.cancelar_traspasos_pendientes'
+
+
+@manejador_outbox(EVENTO_CAMBIO_PEDIDO)
+def registrar_cambio_pedido(evento):
+    """Escribe en la bitácora la creación o actualización de un PedidoCliente."""
+    datos = evento.payload
+    pedido = PedidoCliente.objects.select_related('cliente__usuario').filter(pk=datos['pedido_id']).first()
+
+    # Actor: quien guardó desde la vista, si no quien creó el pedido, si no el cliente
+    usuario_id = datos.get('usuario_id')
+    if pedido and not usuario_id:
+        usuario_id = pedido.creado_por_personal_id or (pedido.cliente.usuario_id if pedido.cliente else None)
+
+    if datos['creado']:
+        accion = "CREAR_PEDIDO_CLIENTE"
+        cliente = f" para {pedido.cliente}" if pedido and pedido.cliente else ""
+        descripcion = f"Se creó el pedido de cliente #{datos['pedido_id']}{cliente}."
+    else:
+        accion = "ACTUALIZAR_PEDIDO_CLIENTE"
+        descripcion = (f"Se actualizó el pedido de cliente #{datos['pedido_id']}. "
+                       f"Nuevo estado: {EstadoPedidoCliente(datos['estado']).label}.")
+
+    RegistroActividad.objects.create(
+        usuario_id=usuario_id,
+        accion=accion,
+        descripcion=descripcion,
+        content_type_id=datos['content_type_id'],
+        object_id=datos['pedido_id'],
+        fecha_hora=evento.fecha_creacion,
+    )
+
+
+@manejador_outbox(EVENTO_CANCELAR_TRASPASOS)
+def cancelar_traspasos_pendientes(evento):
+    """
+    Cancela los traspasos automáticos (PARA_COMPLETAR_PEDIDO) que seguían PENDIENTE cuando
+    se canceló el pedido. Los que ya avanzaron de estado no se tocan.
+    """
+    pedido_id = evento.payload['pedido_id']
+    traspasos_pendientes = TraspasoInternoStock.objects.select_for_update().filter(
+        pedido_cliente_origen_id=pedido_id,
+        estado=TraspasoInternoStock.EstadoTraspaso.PENDIENTE,
+        motivo=TraspasoInternoStock.MotivoTraspaso.PARA_COMPLETAR_PEDIDO,
+    )
+    for traspaso in traspasos_pendientes:
+        # save() por traspaso para que se publique el cambio de estado (post_save)
+        traspaso.estado = TraspasoInternoStock.EstadoTraspaso.CANCELADO
+        traspaso.comentarios = (traspaso.comentarios or "") + \
+            f"\nCancelado automáticamente debido a cancelación del Pedido Cliente #{pedido_id}."
+        traspaso.save(update_fields=['estado', 'comentarios'])
@@ -0,0 +1,76 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from inventario_app.models import InventarioSucursal, DetalleInventarioBodega
+from pedido_app.models import PedidoCliente, DetallePedidoCliente, EstadoPedidoCliente, MetodoEnvio
+from producto_app.models import Producto, Marca, Categoria
+from sucursal_app.models import Sucursal, Bodega, TipoBodega
+from ubicacion_app.models import Region, Comuna
+from usuario_app.models import Cliente, Personal
+
+
+class PedidoTestCase(TestCase):
+    """Datos base para las pruebas de pedidos: dos sucursales con bodega de sala de ventas e inventario, un cliente y productos."""
+
+    def setUp(self):
+        cache.clear()  # La matriz de distancias entre sucursales se guarda en caché
+        self.region = Region.objects.create(nombre='Región Metropolitana')
+        self.comuna = Comuna.objects.create(nombre='Santiago', region=self.region)
+        self.tipo_sala = TipoBodega.objects.create(tipo='Sala de Ventas')
+        self.sucursal = self.crear_sucursal('Sucursal Centro', self.comuna)
+        self.bodega = self.sucursal.bodegas.get()
+        self.otra_sucursal = self.crear_sucursal('Sucursal Norte', self.comuna)
+        self.otra_bodega = self.otra_sucursal.bodegas.get()
+
+        marca = Marca.objects.create(nombre='Marca Test')
+        categoria = Categoria.objects.create(nombre='Categoría Test')
+        self.productos = [
+            Producto.objects.create(
+                sku=f'SKU{i}', nombre=f'Producto {i}', marca=marca, categoria=categoria, precio=Decimal('1000')
+            )
+            for i in range(5)
+        ]
+        self.cliente = self.crear_cliente('cliente')
+
+    def crear_sucursal(self, nombre, comuna):
+        sucursal = Sucursal.objects.create(nombre=nombre, region=comuna.region, comuna=comuna, direccion=f'{nombre} 100')
+        Bodega.objects.create(sucursal=sucursal, tipo_bodega=self.tipo_sala, direccion=f'Bodega {nombre}')
+        InventarioSucursal.objects.create(sucursal=sucursal)
+        return sucursal
+
+    def crear_cliente(self, nombre, **campos_usuario):
+        usuario = get_user_model().objects.create_user(
+            username=nombre, email=f'{nombre}@cliente.cl', password='x', **campos_usuario
+        )
+        return Cliente.objects.create(usuario=usuario)
+
+    def crear_personal(self, nombre, rol, sucursal=None, bodega=None):
+        usuario = get_user_model().objects.create_user(username=nombre, email=f'{nombre}@ferremas.cl', password='x')
+        Personal.objects.create(usuario=usuario, rol=rol, sucursal=sucursal, bodega=bodega)
+        return usuario
+
+    def crear_stock(self, producto, cantidad, bodega=None, **campos):
+        bodega = bodega or self.bodega
+        return DetalleInventarioBodega.objects.create(
+            inventario_sucursal=bodega.sucursal.inventario_general, producto=producto, bodega=bodega, cantidad=cantidad,
+            **campos
+        )
+
+    def stock(self, producto, bodega=None):
+        detalle = DetalleInventarioBodega.objects.filter(producto=producto, bodega=bodega or self.bodega).first()
+        return detalle.cantidad if detalle else None
+
+    def crear_pedido(self, estado=EstadoPedidoCliente.PENDIENTE, sucursal=None, cliente=None, lineas=((0, 1),)):
+        """'lineas' es una secuencia de (índice de producto, cantidad)."""
+        pedido = PedidoCliente.objects.create(
+            cliente=cliente or self.cliente, sucursal_despacho=sucursal or self.sucursal,
+            estado=estado, metodo_envio=MetodoEnvio.RETIRO_TIENDA,
+        )
+        for indice, cantidad in lineas:
+            DetallePedidoCliente.objects.create(
+                pedido_cliente=pedido, producto=self.productos[indice], cantidad=cantidad, precio_unitario_venta=Decimal('900')
+            )
+        return pedido
@@ -0,0 +1,56 @@
+from rest_framework.test import APIClient
+
+from pedido_app.models import PedidoCliente, EstadoPedidoCliente
+from .base import PedidoTestCase
+
+
+class BusquedaPedidosTestCase(PedidoTestCase):
+    """Pruebas de la búsqueda de pedidos por prefijo sobre columnas normalizadas"""
+
+    def setUp(self):
+        super().setUp()
+        jose = self.crear_cliente('jp', first_name='José', last_name='Pérez Soto')
+        maria = self.crear_cliente('ma', first_name='María', last_name='Ñuñez')
+        jorge = self.crear_cliente('jo', first_name='Jorge', last_name='Alvarez')
+        self.jose = self.crear_pedido(EstadoPedidoCliente.PAGADO, cliente=jose)
+        self.maria = self.crear_pedido(EstadoPedidoCliente.PENDIENTE, cliente=maria)
+        self.jorge = self.crear_pedido(EstadoPedidoCliente.PAGADO, cliente=jorge)
+        self.jose_cancelado = self.crear_pedido(EstadoPedidoCliente.CANCELADO, cliente=jose)
+        self.client = APIClient()
+        self.client.force_authenticate(self.crear_personal('admin', 'ADMINISTRADOR'))
+
+    def buscar(self, texto):
+        respuesta = self.client.get('/api/pedidos/pedidos-cliente/', {'search': texto})
+        return sorted(p['id'] for p in respuesta.data['results'])
+
+    def test_columnas_normalizadas_sin_tildes_ni_mayusculas(self):
+        self.jose.refresh_from_db()
+        self.assertEqual(
+            (self.jose.busqueda_nombre, self.jose.busqueda_apellido, self.jose.busqueda_email),
+            ('jose perez soto', 'perez soto', 'jp@cliente.cl'),
+        )
+
+    def test_todos_los_terminos_deben_coincidir_por_prefijo(self):
+        jose = sorted([self.jose.id, self.jose_cancelado.id])
+        self.assertEqual(self.buscar('JOSÉ pe'), jose)
+        self.assertEqual(self.buscar('perez jo'), jose)
+        self.assertEqual(self.buscar('nunez'), [self.maria.id])
+        self.assertEqual(self.buscar('jo'), sorted(jose + [self.jorge.id]))
+        self.assertEqual(self.buscar('jp@'), jose)
+        self.assertEqual(self.buscar('soto'), [])  # Solo prefijos: no busca en medio del texto
+        self.assertEqual(self.buscar('xyz'), [])
+
+    def test_busqueda_por_id_y_estado(self):
+        self.assertEqual(self.buscar(f'PED-{self.jorge.id}'), [self.jorge.id])
+        self.assertEqual(self.buscar(str(self.maria.id)), [self.maria.id])
+        self.assertEqual(self.buscar('cancel'), [self.jose_cancelado.id])
+
+    def test_cambios_del_usuario_o_del_cliente_actualizan_las_columnas(self):
+        usuario = self.maria.cliente.usuario
+        usuario.first_name = 'Marisol'
+        usuario.save(update_fields=['first_name'])
+        self.assertEqual(self.buscar('marisol'), [self.maria.id])
+
+        self.jorge.cliente = self.maria.cliente
+        self.jorge.save()
+        self.assertEqual(PedidoCliente.objects.get(pk=self.jorge.pk).busqueda_nombre, 'marisol nunez')
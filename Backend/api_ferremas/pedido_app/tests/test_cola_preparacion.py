@@ -0,0 +1,83 @@
+from unittest import mock
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from pedido_app import services
+from pedido_app.models import PedidoCliente, EstadoPedidoCliente, EstadoPreparacionPedido
+from pedido_app.services import (
+    CAPACIDAD_PREPARACION_BODEGUERO, pedidos_activos_bodeguero, tomar_pedidos_preparacion,
+)
+from .base import PedidoTestCase
+
+
+class ColaPreparacionTestCase(PedidoTestCase):
+    """Pruebas de la cola de preparación sin contención entre bodegueros"""
+
+    def setUp(self):
+        super().setUp()
+        self.pedidos = [self.crear_pedido(EstadoPedidoCliente.PAGADO) for _ in range(6)]
+        self.crear_pedido(EstadoPedidoCliente.PENDIENTE)  # Aún no pagado: fuera de la cola
+        self.crear_pedido(EstadoPedidoCliente.PAGADO, sucursal=self.otra_sucursal)
+        self.bodeguero_a = self.crear_personal('bodeguero_a', 'BODEGUERO', self.sucursal, self.bodega)
+        self.bodeguero_b = self.crear_personal('bodeguero_b', 'BODEGUERO', self.sucursal, self.bodega)
+
+    def ids(self, pedidos):
+        return [p.id for p in pedidos]
+
+    def test_toma_en_orden_de_llegada_sin_superar_la_capacidad(self):
+        tomados = tomar_pedidos_preparacion(self.bodeguero_a, self.sucursal.id, cantidad=2)
+        self.assertEqual(self.ids(tomados), self.ids(self.pedidos[:2]))
+
+        tomados = tomar_pedidos_preparacion(self.bodeguero_a, self.sucursal.id, cantidad=3)
+        self.assertEqual(self.ids(tomados), [self.pedidos[2].id])
+        self.assertEqual(pedidos_activos_bodeguero(self.bodeguero_a).count(), CAPACIDAD_PREPARACION_BODEGUERO)
+        self.assertEqual(tomar_pedidos_preparacion(self.bodeguero_a, self.sucursal.id), [])
+
+    def test_dos_bodegueros_nunca_toman_el_mismo_pedido(self):
+        tomar_pedidos_preparacion(self.bodeguero_a, self.sucursal.id, cantidad=2)
+        tomados_b = tomar_pedidos_preparacion(self.bodeguero_b, self.sucursal.id, cantidad=2)
+
+        self.assertEqual(self.ids(tomados_b), self.ids(self.pedidos[2:4]))
+        self.assertEqual(tomar_pedidos_preparacion(self.bodeguero_b, self.sucursal.id, pedido_id=self.pedidos[0].id), [])
+        self.assertEqual(PedidoCliente.objects.get(pk=self.pedidos[0].pk).bodeguero_asignado, self.bodeguero_a)
+
+    def test_pedido_tomado_por_otro_entre_la_lectura_y_el_update_se_salta(self):
+        cola_original = services.cola_preparacion
+        llamadas = []
+
+        def cola_con_carrera(sucursal_id):
+            llamadas.append(sucursal_id)
+            if len(llamadas) == 2:  # Candidatos ya leídos, justo antes del primer UPDATE
+                PedidoCliente.objects.filter(pk=self.pedidos[0].pk).update(
+                    bodeguero_asignado=self.bodeguero_a, estado_preparacion=EstadoPreparacionPedido.ASIGNADO,
+                )
+            return cola_original(sucursal_id)
+
+        with mock.patch.object(services, 'cola_preparacion', side_effect=cola_con_carrera):
+            tomados = tomar_pedidos_preparacion(self.bodeguero_b, self.sucursal.id, cantidad=2)
+
+        self.assertEqual(self.ids(tomados), self.ids(self.pedidos[1:3]))
+        self.assertEqual(PedidoCliente.objects.get(pk=self.pedidos[0].pk).bodeguero_asignado, self.bodeguero_a)
+
+    def test_endpoints_de_toma(self):
+        client_a = APIClient()
+        client_a.force_authenticate(self.bodeguero_a)
+        client_b = APIClient()
+        client_b.force_authenticate(self.bodeguero_b)
+
+        respuesta = client_a.get('/api/pedidos/pedidos-cliente/cola-preparacion/')
+        self.assertEqual(respuesta.data['count'], 6)
+
+        respuesta = client_a.post('/api/pedidos/pedidos-cliente/tomar-siguientes/', {'cantidad': 2}, format='json')
+        self.assertEqual([p['id'] for p in respuesta.data['tomados']], self.ids(self.pedidos[:2]))
+        self.assertEqual(respuesta.data['pedidos_activos'], 2)
+
+        # Un pedido ya asignado a otro bodeguero deja de ser visible para el resto
+        respuesta = client_b.post(f'/api/pedidos/pedidos-cliente/{self.pedidos[0].id}/tomar_pedido_preparacion/')
+        self.assertEqual(respuesta.status_code, status.HTTP_404_NOT_FOUND)
+        respuesta = client_b.post(f'/api/pedidos/pedidos-cliente/{self.pedidos[2].id}/tomar_pedido_preparacion/')
+        self.assertEqual(respuesta.data['bodeguero_asignado'], self.bodeguero_b.id)
+
+        respuesta = client_a.post('/api/pedidos/pedidos-cliente/tomar-siguientes/', {'cantidad': 9}, format='json')
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,165 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.db import connection
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from bitacora_app.idempotencia import TIEMPO_MAXIMO_EN_PROCESO, purgar_claves_idempotencia
+from bitacora_app.models import SolicitudIdempotente
+from pedido_app.api.views import PedidoClienteViewSet
+from pago_app.models import Pago
+from pedido_app.models import PedidoCliente, MetodoEnvio
+from .base import PedidoTestCase
+
+
+class IdempotenciaCreacionPedidoTestCase(PedidoTestCase):
+    """Pruebas de la cabecera Idempotency-Key en la creación de pedidos"""
+
+    url = '/api/pedidos/pedidos-cliente/'
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.cliente.usuario)
+        self.datos = {
+            'cliente': self.cliente.pk,
+            'sucursal_despacho': self.sucursal.id,
+            'metodo_envio': MetodoEnvio.RETIRO_TIENDA,
+            'detalles_pedido_cliente': [{'producto': self.productos[0].id, 'cantidad': 2}],
+        }
+
+    def crear(self, datos=None, clave='clave-1', client=None):
+        return (client or self.client).post(self.url, datos or self.datos, format='json', HTTP_IDEMPOTENCY_KEY=clave)
+
+    def test_reintento_con_la_misma_clave_repite_la_respuesta_sin_duplicar(self):
+        primera = self.crear()
+        repetida = self.crear()
+
+        self.assertEqual(primera.status_code, status.HTTP_201_CREATED, primera.data)
+        self.assertEqual(repetida.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(repetida['Idempotent-Replayed'], 'true')
+        self.assertEqual(repetida.json(), primera.json())
+        self.assertEqual(PedidoCliente.objects.count(), 1)
+
+    def test_misma_clave_con_otro_cuerpo_es_rechazada(self):
+        self.crear()
+        respuesta = self.crear(dict(self.datos, notas_cliente='Otra solicitud'))
+
+        self.assertEqual(respuesta.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(PedidoCliente.objects.count(), 1)
+
+    def test_sin_cabecera_no_hay_deduplicacion(self):
+        self.client.post(self.url, self.datos, format='json')
+        self.client.post(self.url, self.datos, format='json')
+
+        self.assertEqual(PedidoCliente.objects.count(), 2)
+        self.assertFalse(SolicitudIdempotente.objects.exists())
+
+    def test_duplicado_concurrente_recibe_409_mientras_la_original_esta_en_proceso(self):
+        respuestas_duplicado = []
+        perform_create_original = PedidoClienteViewSet.perform_create
+
+        def perform_create_con_duplicado(vista, serializer):
+            # El duplicado llega mientras la primera solicitud aún no termina
+            duplicado = APIClient()
+            duplicado.force_authenticate(self.cliente.usuario)
+            respuestas_duplicado.append(self.crear(client=duplicado))
+            return perform_create_original(vista, serializer)
+
+        with mock.patch.object(PedidoClienteViewSet, 'perform_create', autospec=True, side_effect=perform_create_con_duplicado):
+            primera = self.crear()
+
+        self.assertEqual(primera.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(respuestas_duplicado[0].status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(respuestas_duplicado[0]['Retry-After'], '1')
+        self.assertEqual(PedidoCliente.objects.count(), 1)
+        # Terminada la original, el reintento recibe la respuesta guardada
+        self.assertEqual(self.crear().json()['id'], primera.json()['id'])
+
+    def test_error_en_la_vista_libera_la_clave(self):
+        invalidos = dict(self.datos, detalles_pedido_cliente=[{'producto': 9999, 'cantidad': 1}])
+        respuesta = self.crear(invalidos)
+
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(SolicitudIdempotente.objects.exists())
+        self.assertEqual(self.crear().status_code, status.HTTP_201_CREATED)
+
+    def test_claves_abandonadas_o_vencidas_se_reemplazan(self):
+        self.crear()
+        SolicitudIdempotente.objects.update(
+            estado=SolicitudIdempotente.EstadoSolicitud.EN_PROCESO,
+            fecha_creacion=timezone.now() - TIEMPO_MAXIMO_EN_PROCESO - timedelta(seconds=1),
+        )
+        self.assertEqual(self.crear().status_code, status.HTTP_201_CREATED)
+
+        SolicitudIdempotente.objects.update(fecha_expiracion=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.crear().status_code, status.HTTP_201_CREATED)
+        self.assertEqual(PedidoCliente.objects.count(), 3)
+
+        SolicitudIdempotente.objects.update(fecha_expiracion=timezone.now())
+        self.assertEqual(purgar_claves_idempotencia(), 1)
+
+    def test_la_clave_es_por_usuario(self):
+        self.crear()
+        otro = self.crear_cliente('otro')
+        client = APIClient()
+        client.force_authenticate(otro.usuario)
+
+        respuesta = self.crear(dict(self.datos, cliente=otro.pk), client=client)
+
+        self.assertEqual(respuesta.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', respuesta)
+        self.assertEqual(PedidoCliente.objects.count(), 2)
+
+
+class IdempotenciaPagoWebpayTestCase(PedidoTestCase):
+    """Pruebas de la cabecera Idempotency-Key al iniciar un pago Webpay"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.cliente.usuario)
+        self.pedido = self.crear_pedido(lineas=((0, 2),))
+        PedidoCliente.objects.filter(pk=self.pedido.pk).update(total_pedido=Decimal('1800'))
+        self.url = f'/api/pagos/pedidos/{self.pedido.id}/iniciar-pago-webpay/'
+        self.profundidad_inicial = len(connection.atomic_blocks)  # Transacciones propias del TestCase
+
+    def iniciar(self, crear):
+        with mock.patch('pago_app.api.webpay_views.WebpayPlusTransaction') as transaccion_webpay:
+            transaccion_webpay.return_value.create.side_effect = crear
+            respuesta = self.client.post(self.url, {}, format='json', HTTP_IDEMPOTENCY_KEY='pago-1')
+        return respuesta, transaccion_webpay.return_value.create
+
+    def test_transbank_se_llama_fuera_de_la_transaccion_y_el_reintento_no_repite_la_llamada(self):
+        profundidad_en_llamada = []
+
+        def crear(*args):
+            profundidad_en_llamada.append(len(connection.atomic_blocks))
+            return {'token': 'tok-1', 'url': 'https://webpay.test/init'}
+
+        respuesta, llamada = self.iniciar(crear)
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK, respuesta.data)
+        self.assertEqual(profundidad_en_llamada, [self.profundidad_inicial])
+        self.assertEqual(Pago.objects.get(pedido_cliente=self.pedido).token_webpay_transaccion, 'tok-1')
+        self.assertEqual(SolicitudIdempotente.objects.get().estado, SolicitudIdempotente.EstadoSolicitud.COMPLETADA)
+
+        repetida, llamada = self.iniciar(crear)
+        self.assertEqual(repetida['Idempotent-Replayed'], 'true')
+        self.assertEqual(repetida.json(), respuesta.json())
+        llamada.assert_not_called()
+        self.assertEqual(Pago.objects.count(), 1)
+
+    def test_error_de_transbank_libera_la_clave_sin_escrituras(self):
+        respuesta, _ = self.iniciar(ConnectionError('Transbank no responde'))
+
+        self.assertEqual(respuesta.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertFalse(SolicitudIdempotente.objects.exists())
+        self.assertFalse(Pago.objects.exists())
+
+        respuesta, _ = self.iniciar(lambda *args: {'token': 'tok-2', 'url': 'https://webpay.test/init'})
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertEqual(respuesta.data['token'], 'tok-2')
@@ -0,0 +1,52 @@
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from pedido_app.models import PedidoCliente, EstadoPedidoCliente, EstadoPreparacionPedido
+from pedido_app.services import (
+    CAPACIDAD_PREPARACION_BODEGUERO, armar_ola_preparacion, pedidos_activos_bodeguero, tomar_pedidos_preparacion,
+)
+from .base import PedidoTestCase
+
+
+class OlaPreparacionTestCase(PedidoTestCase):
+    """Pruebas de la preparación por olas con lista de recolección consolidada"""
+
+    def setUp(self):
+        super().setUp()
+        self.bodeguero = self.crear_personal('bodeguero', 'BODEGUERO', self.sucursal, self.bodega)
+        self.pedidos = [
+            self.crear_pedido(EstadoPedidoCliente.PAGADO, lineas=((0, 2), (1, 1))),
+            self.crear_pedido(EstadoPedidoCliente.PAGADO, lineas=((0, 3),)),
+            self.crear_pedido(EstadoPedidoCliente.PAGADO, lineas=((1, 4), (2, 1))),
+            self.crear_pedido(EstadoPedidoCliente.PAGADO, lineas=((0, 1),)),
+            self.crear_pedido(EstadoPedidoCliente.PAGADO, lineas=((2, 5),)),
+        ]
+
+    def test_la_ola_respeta_la_capacidad_y_consolida_por_producto(self):
+        ola = armar_ola_preparacion(self.bodeguero, self.sucursal.id, tamano=5)
+
+        self.assertEqual([p['pedido_id'] for p in ola['pedidos']], [p.id for p in self.pedidos[:CAPACIDAD_PREPARACION_BODEGUERO]])
+        self.assertEqual(
+            [(l['sku'], l['cantidad_total'], l['cantidad_pedidos']) for l in ola['lista_preparacion']],
+            [('SKU0', 5, 2), ('SKU1', 5, 2), ('SKU2', 1, 1)],
+        )
+        self.assertEqual(ola['lista_preparacion'][0]['reparto'], [
+            {'pedido_id': self.pedidos[0].id, 'casillero': 1, 'cantidad': 2},
+            {'pedido_id': self.pedidos[1].id, 'casillero': 2, 'cantidad': 3},
+        ])
+        self.assertEqual(ola['total_unidades'], 11)
+        self.assertEqual(
+            set(PedidoCliente.objects.filter(bodeguero_asignado=self.bodeguero).values_list('estado_preparacion', flat=True)),
+            {EstadoPreparacionPedido.EN_PREPARACION},
+        )
+
+    def test_la_ola_incluye_los_pedidos_ya_asignados_sin_tomar_otros(self):
+        tomar_pedidos_preparacion(self.bodeguero, self.sucursal.id, cantidad=2)
+        client = APIClient()
+        client.force_authenticate(self.bodeguero)
+
+        respuesta = client.post('/api/pedidos/pedidos-cliente/armar-ola/', {'tamano': 2}, format='json')
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['pedido_id'] for p in respuesta.data['pedidos']], [p.id for p in self.pedidos[:2]])
+        self.assertEqual(pedidos_activos_bodeguero(self.bodeguero).count(), 2)
@@ -0,0 +1,53 @@
+from io import StringIO
+
+from django.core.management import call_command
+from rest_framework.test import APIClient
+
+from bitacora_app.models import EventoOutbox, RegistroActividad
+from bitacora_app.outbox import procesar_lote
+from inventario_app.models import TraspasoInternoStock
+from pedido_app.models import EstadoPedidoCliente
+from pedido_app.tareas import EVENTO_CAMBIO_PEDIDO, EVENTO_CANCELAR_TRASPASOS
+from .base import PedidoTestCase
+
+
+class OutboxPedidoTestCase(PedidoTestCase):
+    """Pruebas de los efectos secundarios de pedidos diferidos al outbox"""
+
+    def test_la_bitacora_se_escribe_al_procesar_el_outbox(self):
+        pedido = self.crear_pedido()
+
+        self.assertTrue(EventoOutbox.objects.filter(tipo=EVENTO_CAMBIO_PEDIDO).exists())
+        self.assertFalse(RegistroActividad.objects.exists())
+
+        call_command('procesar_outbox', stdout=StringIO())
+        registro = RegistroActividad.objects.get(accion='CREAR_PEDIDO_CLIENTE')
+        self.assertEqual((registro.object_id, registro.usuario), (pedido.id, self.cliente.usuario))
+
+    def test_cancelar_pedido_cancela_sus_traspasos_pendientes_de_forma_diferida(self):
+        administrador = self.crear_personal('admin', 'ADMINISTRADOR')
+        pedido = self.crear_pedido(EstadoPedidoCliente.PENDIENTE_REABASTECIMIENTO)
+        pendiente = TraspasoInternoStock.objects.create(
+            sucursal_origen=self.otra_sucursal, sucursal_destino=self.sucursal, pedido_cliente_origen=pedido,
+            motivo=TraspasoInternoStock.MotivoTraspaso.PARA_COMPLETAR_PEDIDO,
+        )
+        en_transito = TraspasoInternoStock.objects.create(
+            sucursal_origen=self.otra_sucursal, sucursal_destino=self.sucursal, pedido_cliente_origen=pedido,
+            motivo=TraspasoInternoStock.MotivoTraspaso.PARA_COMPLETAR_PEDIDO,
+            estado=TraspasoInternoStock.EstadoTraspaso.EN_TRANSITO,
+        )
+        client = APIClient()
+        client.force_authenticate(administrador)
+
+        respuesta = client.patch(f'/api/pedidos/pedidos-cliente/{pedido.id}/', {'estado': 'CANCELADO'}, format='json')
+
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        pendiente.refresh_from_db()
+        self.assertEqual(pendiente.estado, TraspasoInternoStock.EstadoTraspaso.PENDIENTE)
+        self.assertTrue(EventoOutbox.objects.filter(tipo=EVENTO_CANCELAR_TRASPASOS).exists())
+
+        procesar_lote()
+        pendiente.refresh_from_db()
+        en_transito.refresh_from_db()
+        self.assertEqual(pendiente.estado, TraspasoInternoStock.EstadoTraspaso.CANCELADO)
+        self.assertEqual(en_transito.estado, TraspasoInternoStock.EstadoTraspaso.EN_TRANSITO)
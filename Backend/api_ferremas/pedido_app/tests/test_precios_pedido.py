@@ -0,0 +1,126 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from pedido_app.api.serializers import PedidoClienteSerializer
+from pedido_app.models import DetallePedidoCliente, MetodoEnvio
+from producto_app.models import Categoria, Marca
+from promocion_app.models import Promocion
+from promocion_app.services import precios_finales_para_productos
+from .base import PedidoTestCase
+
+
+class PreciosPedidoTestCase(PedidoTestCase):
+    """Pruebas del cálculo en bloque de precios de las líneas del pedido y de su actualización por diferencias"""
+
+    def setUp(self):
+        super().setUp()
+        # Producto 1 en otra categoría y producto 2 en otra marca, cada una con su promoción
+        otra_categoria = Categoria.objects.create(nombre='Categoría en oferta')
+        otra_marca = Marca.objects.create(nombre='Marca en oferta')
+        self.productos[1].categoria = otra_categoria
+        self.productos[1].save()
+        self.productos[2].marca = otra_marca
+        self.productos[2].save()
+
+        TipoPromocion = Promocion.TipoPromocion
+        self.crear_promocion(self.productos[0], TipoPromocion.DESCUENTO_PORCENTAJE, '15')
+        self.crear_promocion(otra_categoria, TipoPromocion.DESCUENTO_PORCENTAJE, '20')
+        self.crear_promocion(otra_marca, TipoPromocion.DESCUENTO_MONTO_FIJO, '150')
+        # Una promoción vencida no se aplica
+        self.crear_promocion(self.productos[3], TipoPromocion.DESCUENTO_PORCENTAJE, '50', vigente=False)
+
+    def crear_promocion(self, objetivo, tipo, valor, vigente=True):
+        ahora = timezone.now()
+        desplazamiento = timedelta() if vigente else timedelta(days=30)
+        return Promocion.objects.create(
+            titulo=f'Promo {objetivo}', tipo_promocion=tipo, valor=Decimal(valor),
+            fecha_inicio=ahora - timedelta(days=1) - desplazamiento, fecha_fin=ahora + timedelta(days=1) - desplazamiento,
+            content_type=ContentType.objects.get_for_model(objetivo), object_id=objetivo.id,
+        )
+
+    def guardar(self, lineas, instancia=None):
+        datos = {
+            'cliente': self.cliente.id, 'sucursal_despacho': self.sucursal.id, 'metodo_envio': MetodoEnvio.RETIRO_TIENDA,
+            'detalles_pedido_cliente': [
+                {'producto': self.productos[indice].id, 'cantidad': cantidad} for indice, cantidad in lineas
+            ],
+        }
+        serializer = PedidoClienteSerializer(instancia, data=datos, partial=instancia is not None)
+        return serializer, serializer.is_valid() and serializer.save()
+
+    def lineas(self, pedido):
+        return {d.producto_id: d for d in DetallePedidoCliente.objects.filter(pedido_cliente=pedido)}
+
+    def test_precios_en_bloque_coinciden_con_los_del_producto(self):
+        with self.assertNumQueries(1):
+            precios = precios_finales_para_productos(self.productos)
+
+        for producto in self.productos:
+            self.assertEqual(precios[producto.id], producto.precio_final_con_info_promo)
+        self.assertEqual(
+            [precios[producto.id][0] for producto in self.productos],
+            [Decimal('850'), Decimal('800'), Decimal('850'), Decimal('1000'), Decimal('1000')],
+        )
+        self.assertEqual(precios_finales_para_productos([]), {})
+
+    def test_crear_pedido_usa_los_precios_con_promocion(self):
+        serializer, pedido = self.guardar([(0, 2), (1, 1), (2, 1), (4, 3)])
+
+        self.assertTrue(pedido, serializer.errors)
+        lineas = self.lineas(pedido)
+        for indice, cantidad in [(0, 2), (1, 1), (2, 1), (4, 3)]:
+            producto = self.productos[indice]
+            linea = lineas[producto.id]
+            precio_final = producto.precio_final_con_info_promo[0]
+            self.assertEqual(
+                (linea.precio_unitario_venta, linea.precio_unitario_con_descuento, linea.descuento_total_linea),
+                (producto.precio, precio_final, (producto.precio - precio_final) * cantidad),
+            )
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.descuento_total, Decimal('650'))  # 2 x 150 + 200 + 150
+
+    def test_actualizar_pedido_solo_escribe_las_lineas_que_cambian(self):
+        _, pedido = self.guardar([(0, 1), (1, 1), (3, 2)])
+        antes = self.lineas(pedido)
+
+        serializer, pedido = self.guardar([(0, 1), (1, 4), (4, 2)], instancia=pedido)
+
+        self.assertTrue(pedido, serializer.errors)
+        despues = self.lineas(pedido)
+        self.assertEqual(set(despues), {self.productos[0].id, self.productos[1].id, self.productos[4].id})
+        # Las líneas que se mantienen conservan su id; la modificada se actualiza en su lugar
+        self.assertEqual(despues[self.productos[0].id].id, antes[self.productos[0].id].id)
+        self.assertEqual(despues[self.productos[1].id].id, antes[self.productos[1].id].id)
+        self.assertEqual(
+            (despues[self.productos[1].id].cantidad, despues[self.productos[1].id].descuento_total_linea),
+            (4, Decimal('800')),
+        )
+        # La quitada se elimina y la nueva se crea
+        self.assertFalse(DetallePedidoCliente.objects.filter(id=antes[self.productos[3].id].id).exists())
+        self.assertNotIn(despues[self.productos[4].id].id, {d.id for d in antes.values()})
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.descuento_total, Decimal('950'))
+
+    def test_producto_repetido_es_rechazado(self):
+        client = APIClient()
+        client.force_authenticate(self.cliente.usuario)
+        respuesta = client.post('/api/pedidos/pedidos-cliente/', {
+            'cliente': self.cliente.id, 'sucursal_despacho': self.sucursal.id, 'metodo_envio': MetodoEnvio.RETIRO_TIENDA,
+            'detalles_pedido_cliente': [
+                {'producto': self.productos[0].id, 'cantidad': 1}, {'producto': self.productos[0].id, 'cantidad': 2},
+            ],
+        }, format='json')
+
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('detalles_pedido_cliente', respuesta.data)
+        self.assertFalse(DetallePedidoCliente.objects.exists())
+
+        _, pedido = self.guardar([(0, 1)])
+        serializer, resultado = self.guardar([(1, 1), (1, 1)], instancia=pedido)
+        self.assertFalse(resultado)
+        self.assertEqual(list(self.lineas(pedido)), [self.productos[0].id])
@@ -0,0 +1,153 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from pedido_app.models import PedidoCliente, PedidoProveedor, DetallePedidoProveedor, EstadoPedidoCliente
+from pedido_app.services import calcular_sugerencias_reabastecimiento, generar_pedidos_reabastecimiento
+from proveedor_app.models import Proveedor
+from .base import PedidoTestCase
+
+
+class ReabastecimientoTestCase(PedidoTestCase):
+    """Pruebas del cálculo de sugerencias y la generación de pedidos de reabastecimiento"""
+
+    url = '/api/pedidos/pedidos-proveedor/generar-reabastecimiento/'
+
+    def setUp(self):
+        super().setUp()
+        self.proveedor = Proveedor.objects.create(razon_social='Proveedor A', rut='11111111-1', comuna=self.comuna)
+        self.otro_proveedor = Proveedor.objects.create(razon_social='Proveedor B', rut='22222222-2', comuna=self.comuna)
+
+    def registrar_compra(self, proveedor, indices, precio='100.00', estado=PedidoProveedor.EstadoPedido.RECIBIDO_COMPLETO,
+                         cantidad=1, recibida=None):
+        pedido = PedidoProveedor.objects.create(proveedor=proveedor, bodega_recepcion=self.bodega, estado=estado)
+        for indice in indices:
+            DetallePedidoProveedor.objects.create(
+                pedido_proveedor=pedido, producto=self.productos[indice], cantidad_solicitada=cantidad,
+                cantidad_recibida=cantidad if recibida is None else recibida, precio_unitario_compra=Decimal(precio),
+            )
+        return pedido
+
+    def vender(self, indice, cantidad, hace_dias, sucursal=None, estado=EstadoPedidoCliente.PENDIENTE):
+        pedido = self.crear_pedido(estado=estado, sucursal=sucursal, lineas=((indice, cantidad),))
+        PedidoCliente.objects.filter(pk=pedido.pk).update(
+            fecha_pedido=timezone.now() - timedelta(days=hace_dias, hours=1)
+        )
+
+    def vender_a_diario(self, indice, cantidad, sucursal=None):
+        for dia in range(28):
+            self.vender(indice, cantidad, dia, sucursal=sucursal)
+
+    def sugerencias(self, **kwargs):
+        return {
+            (fila['producto_id'], fila['sucursal_id']): fila
+            for fila in calcular_sugerencias_reabastecimiento(**kwargs).to_dict('records')
+        }
+
+    def test_ventana_de_demanda_y_cantidad_sugerida(self):
+        # 2 unidades diarias durante 28 días: demanda 2, sin desviación
+        self.vender_a_diario(0, 2)
+        self.vender(0, 50, 40)  # Fuera de la ventana
+        self.vender(0, 50, 1, estado=EstadoPedidoCliente.CANCELADO)  # Sin demanda
+        self.crear_stock(self.productos[0], 10)
+        # La ventana corta prevalece si la demanda se acelera: 14 unidades en los últimos 3 días
+        self.vender(1, 7, 0)
+        self.vender(1, 7, 2)
+        self.crear_stock(self.productos[1], 100)
+
+        sugerencias = self.sugerencias(plazo_dias=7, dias_cobertura=14)
+
+        fila = sugerencias[(self.productos[0].id, self.sucursal.id)]
+        self.assertAlmostEqual(fila['demanda_diaria'], 2)
+        self.assertAlmostEqual(fila['desviacion_diaria'], 0)
+        self.assertEqual(fila['punto_pedido'], 14)  # 2 * 7
+        self.assertEqual(fila['cantidad_sugerida'], 32)  # 2 * (7 + 14) - 10
+        self.assertNotIn((self.productos[1].id, self.sucursal.id), sugerencias)  # 100 en stock cubren la demanda
+        self.assertAlmostEqual(
+            calcular_sugerencias_reabastecimiento(sucursal_ids=[self.sucursal.id], plazo_dias=100)
+            .set_index('producto_id').loc[self.productos[1].id, 'demanda_diaria'],
+            2,  # 14 / 7 (ventana corta) y no 14 / 28
+        )
+
+    def test_pedidos_abiertos_se_descuentan_de_la_posicion(self):
+        self.vender_a_diario(0, 2)
+        self.crear_stock(self.productos[0], 4)
+        self.registrar_compra(self.proveedor, [0], estado=PedidoProveedor.EstadoPedido.RECIBIDO_PARCIAL, cantidad=10, recibida=4)
+        self.registrar_compra(self.proveedor, [0], estado=PedidoProveedor.EstadoPedido.CANCELADO, cantidad=30, recibida=0)
+
+        fila = self.sugerencias(plazo_dias=7, dias_cobertura=14)[(self.productos[0].id, self.sucursal.id)]
+        self.assertEqual(fila['en_camino'], 6)  # 10 - 4 del parcial; el cancelado no cuenta
+        self.assertEqual(fila['cantidad_sugerida'], 32)  # 42 - (4 + 6)
+
+        self.registrar_compra(self.proveedor, [0], estado=PedidoProveedor.EstadoPedido.SOLICITADO, cantidad=20, recibida=0)
+        self.assertNotIn((self.productos[0].id, self.sucursal.id), self.sugerencias(plazo_dias=7, dias_cobertura=14))
+
+    def test_stock_maximo_define_el_objetivo(self):
+        self.registrar_compra(self.proveedor, [3])
+        self.crear_stock(self.productos[3], 5, stock_minimo=5, stock_maximo=30)
+        self.crear_stock(self.productos[2], 6, stock_minimo=5, stock_maximo=30)  # Sobre el punto de pedido
+
+        sugerencias = self.sugerencias()
+        self.assertEqual(sugerencias[(self.productos[3].id, self.sucursal.id)]['cantidad_sugerida'], 25)
+        self.assertNotIn((self.productos[2].id, self.sucursal.id), sugerencias)
+
+    def test_agrupa_por_proveedor_y_bodega_e_informa_los_sin_proveedor(self):
+        self.registrar_compra(self.proveedor, [0, 1], precio='100.00')
+        self.registrar_compra(self.otro_proveedor, [2], precio='250.50')
+        for indice in (0, 1, 2):
+            self.crear_stock(self.productos[indice], 0, stock_minimo=5, stock_maximo=10)
+        self.crear_stock(self.productos[0], 0, bodega=self.otra_bodega, stock_minimo=3, stock_maximo=8)
+        self.crear_stock(self.productos[4], 0, stock_minimo=5, stock_maximo=10)  # Nunca se le compró
+
+        reporte = generar_pedidos_reabastecimiento()
+
+        self.assertEqual(reporte['sin_proveedor'], [self.productos[4].id])
+        pedidos = {(p['proveedor_id'], p['bodega_recepcion_id']): p for p in reporte['pedidos']}
+        self.assertEqual(set(pedidos), {
+            (self.proveedor.id, self.bodega.id), (self.proveedor.id, self.otra_bodega.id),
+            (self.otro_proveedor.id, self.bodega.id),
+        })
+        self.assertEqual(pedidos[(self.proveedor.id, self.bodega.id)]['unidades'], 20)
+        self.assertEqual(pedidos[(self.proveedor.id, self.otra_bodega.id)]['unidades'], 8)
+        total = pedidos[(self.otro_proveedor.id, self.bodega.id)]['total']
+        self.assertIsInstance(total, Decimal)
+        self.assertEqual(total, Decimal('2505.00'))
+
+        pedido = PedidoProveedor.objects.get(pk=pedidos[(self.otro_proveedor.id, self.bodega.id)]['pedido_id'])
+        self.assertEqual(pedido.estado, PedidoProveedor.EstadoPedido.BORRADOR)
+        self.assertEqual((pedido.subtotal, pedido.total_pedido), (Decimal('2505.00'), Decimal('2505.00')))
+        self.assertEqual(
+            list(pedido.detalles_pedido.values_list('producto_id', 'cantidad_solicitada')), [(self.productos[2].id, 10)]
+        )
+
+    def test_endpoint_simula_y_no_duplica_borradores(self):
+        self.registrar_compra(self.proveedor, [0, 1])
+        self.crear_stock(self.productos[0], 1, stock_minimo=5, stock_maximo=10)
+        self.crear_stock(self.productos[1], 2, stock_minimo=5, stock_maximo=10)
+        client = APIClient()
+        client.force_authenticate(self.crear_personal('admin', 'ADMINISTRADOR'))
+        borradores = PedidoProveedor.objects.filter(estado=PedidoProveedor.EstadoPedido.BORRADOR)
+
+        respuesta = client.post(self.url, {'simular': True}, format='json')
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertEqual(respuesta.data['lineas_sugeridas'], 2)
+        self.assertIsNone(respuesta.data['pedidos'][0]['pedido_id'])
+        self.assertFalse(borradores.exists())
+
+        respuesta = client.post(self.url, {}, format='json')
+        self.assertEqual(respuesta.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(respuesta.data['pedidos'][0]['unidades'], 17)
+        self.assertEqual(respuesta.data['pedidos'][0]['total'], Decimal('1700.00'))
+        self.assertEqual(borradores.count(), 1)
+
+        # Los borradores cuentan como pedidos abiertos: la segunda ejecución no crea nada
+        respuesta = client.post(self.url, {}, format='json')
+        self.assertEqual(respuesta.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((respuesta.data['pedidos'], respuesta.data['lineas_sugeridas']), ([], 0))
+        self.assertEqual(borradores.count(), 1)
+
+        respuesta = client.post(self.url, {'plazo_dias': -1}, format='json')
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
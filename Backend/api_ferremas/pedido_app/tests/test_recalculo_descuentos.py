@@ -0,0 +1,57 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+
+from pedido_app.models import PedidoCliente, DetallePedidoCliente, TramoRecalculoDescuentos
+from pedido_app.services import planificar_recalculo_descuentos, procesar_tramo_descuentos
+from .base import PedidoTestCase
+
+
+class RecalculoDescuentosTestCase(PedidoTestCase):
+    """Pruebas del recálculo de descuentos por tramos reanudable"""
+
+    def setUp(self):
+        super().setUp()
+        # Precio de lista 1000, vendido a 900: 100 de descuento por unidad
+        self.pedidos = [self.crear_pedido(lineas=((0, 1), (1, 2), (2, 3))) for _ in range(7)]
+        DetallePedidoCliente.objects.update(descuento_total_linea=0, precio_unitario_con_descuento=None)
+        PedidoCliente.objects.update(subtotal=0, descuento_total=0, total_pedido=0)
+
+    def ejecutar(self, *args):
+        salida = StringIO()
+        call_command('actualizar_descuentos_pedidos', *args, stdout=salida)
+        return salida.getvalue()
+
+    def assertTotalesCorrectos(self):
+        for pedido in PedidoCliente.objects.all():
+            self.assertEqual(
+                (pedido.subtotal, pedido.descuento_total, pedido.total_pedido),
+                (Decimal('5400'), Decimal('600'), Decimal('4800')),
+            )
+        self.assertEqual(
+            sorted(DetallePedidoCliente.objects.filter(pedido_cliente=self.pedidos[0]).values_list('descuento_total_linea', flat=True)),
+            [Decimal('100'), Decimal('200'), Decimal('300')],
+        )
+
+    def test_recalcula_todos_los_pedidos_por_tramos(self):
+        salida = self.ejecutar('--tamano-tramo', '3')
+
+        self.assertTotalesCorrectos()
+        self.assertEqual(TramoRecalculoDescuentos.objects.filter(completado=True).count(), 3)
+        self.assertIn('7 pedidos y 21 detalles actualizados', salida)
+        # Sin cambios pendientes no se escribe nada
+        self.assertIn('0 pedidos y 0 detalles actualizados', self.ejecutar('--tamano-tramo', '3'))
+
+    def test_reanuda_solo_los_tramos_pendientes(self):
+        ejecucion = planificar_recalculo_descuentos(3)
+        primero = TramoRecalculoDescuentos.objects.filter(ejecucion=ejecucion).order_by('id_desde').first()
+        self.assertEqual(procesar_tramo_descuentos(primero.id), (3, 9))
+        self.assertIsNone(procesar_tramo_descuentos(primero.id))  # Un tramo completado no se repite
+
+        salida = self.ejecutar('--reanudar')
+
+        self.assertIn(ejecucion, salida)
+        self.assertIn('4 pedidos y 12 detalles actualizados', salida)
+        self.assertTotalesCorrectos()
+        self.assertIn('No hay ejecuciones con tramos pendientes', self.ejecutar('--reanudar'))
@@ -0,0 +1,153 @@
+from decimal import Decimal
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from pedido_app.models import DetallePedidoProveedor, PedidoProveedor, RecepcionPedidoProveedor
+from proveedor_app.models import Proveedor
+from .base import PedidoTestCase
+
+
+class RecepcionPedidoProveedorTestCase(PedidoTestCase):
+    """Pruebas de la recepción en bloque de pedidos a proveedor"""
+
+    url = '/api/pedidos/pedidos-proveedor/'
+
+    def setUp(self):
+        super().setUp()
+        self.proveedor = Proveedor.objects.create(razon_social='Proveedor Test SPA', rut='12345678-9', comuna=self.comuna)
+        self.client = APIClient()
+        self.client.force_authenticate(self.crear_personal('admin', 'ADMINISTRADOR'))
+
+    def crear_pedido_proveedor(self, cantidades, **datos):
+        respuesta = self.client.post(self.url, {
+            'proveedor': self.proveedor.id,
+            'bodega_recepcion': self.bodega.id,
+            'estado': PedidoProveedor.EstadoPedido.SOLICITADO,
+            'detalles_pedido': [
+                {'producto': self.productos[i].id, 'cantidad_solicitada': cantidad, 'precio_unitario_compra': '100.00', **datos}
+                for i, cantidad in cantidades
+            ],
+        }, format='json')
+        self.assertEqual(respuesta.status_code, status.HTTP_201_CREATED, respuesta.data)
+        return respuesta.data['id']
+
+    def recibir(self, pedido_id, cantidades, **extra):
+        return self.client.post(f'{self.url}{pedido_id}/recibir/', {
+            'lineas': [{'producto': self.productos[i].id, 'cantidad': cantidad} for i, cantidad in cantidades],
+            'numero_guia_despacho': 'G-1',
+        }, format='json', **extra)
+
+    def stock_bodega(self):
+        return [self.stock(producto) for producto in self.productos[:3]]
+
+    def test_recepciones_parciales_hasta_completar_el_pedido(self):
+        pedido_id = self.crear_pedido_proveedor([(0, 10), (1, 10), (2, 10)])
+
+        respuesta = self.recibir(pedido_id, [(0, 4), (1, 10)])
+        self.assertEqual(respuesta.status_code, status.HTTP_201_CREATED, respuesta.data)
+        self.assertEqual(respuesta.data['estado_pedido'], PedidoProveedor.EstadoPedido.RECIBIDO_PARCIAL)
+        self.assertEqual(self.stock_bodega(), [4, 10, None])
+
+        respuesta = self.recibir(pedido_id, [(0, 6), (2, 10)])
+        self.assertEqual(respuesta.data['estado_pedido'], PedidoProveedor.EstadoPedido.RECIBIDO_COMPLETO)
+        self.assertEqual(self.stock_bodega(), [10, 10, 10])
+        pedido = PedidoProveedor.objects.get(pk=pedido_id)
+        self.assertIsNotNone(pedido.fecha_recepcion)
+        self.assertEqual(pedido.numero_guia_despacho, 'G-1')
+        self.assertEqual(len(self.client.get(f'{self.url}{pedido_id}/recepciones/').data), 2)
+
+        respuesta = self.recibir(pedido_id, [(0, 1)])
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_reintento_con_la_misma_clave_no_ingresa_dos_veces(self):
+        pedido_id = self.crear_pedido_proveedor([(0, 10)])
+
+        primera = self.recibir(pedido_id, [(0, 4)], HTTP_IDEMPOTENCY_KEY='recepcion-1')
+        repetida = self.recibir(pedido_id, [(0, 4)], HTTP_IDEMPOTENCY_KEY='recepcion-1')
+
+        self.assertEqual(repetida.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(repetida['Idempotent-Replayed'], 'true')
+        self.assertEqual(repetida.json(), primera.json())
+        self.assertEqual(self.stock(self.productos[0]), 4)
+        self.assertEqual(RecepcionPedidoProveedor.objects.count(), 1)
+
+    def test_una_linea_invalida_rechaza_toda_la_recepcion(self):
+        pedido_id = self.crear_pedido_proveedor([(0, 10), (1, 10)])
+        self.recibir(pedido_id, [(0, 4)])
+
+        respuesta = self.recibir(pedido_id, [(0, 7), (1, 1), (4, 1)])
+
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(respuesta.data['lineas_rechazadas']), {str(self.productos[0].id), str(self.productos[4].id)})
+        self.assertEqual(self.stock_bodega(), [4, None, None])
+
+        respuesta = self.recibir(pedido_id, [(1, 1), (1, 1)])
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cantidad_recibida_solo_la_escriben_las_recepciones(self):
+        pedido_id = self.crear_pedido_proveedor([(0, 5)], cantidad_recibida=5)
+        self.assertEqual(PedidoProveedor.objects.get(pk=pedido_id).detalles_pedido.get().cantidad_recibida, 0)
+
+        self.recibir(pedido_id, [(0, 3)])
+        respuesta = self.client.patch(f'{self.url}{pedido_id}/', {'detalles_pedido': [
+            {'producto': self.productos[0].id, 'cantidad_solicitada': 2, 'precio_unitario_compra': '100.00'},
+        ]}, format='json')
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_marcar_recibido_completo_ingresa_solo_lo_pendiente(self):
+        pedido_id = self.crear_pedido_proveedor([(0, 5)])
+        self.recibir(pedido_id, [(0, 2)])
+
+        respuesta = self.client.patch(f'{self.url}{pedido_id}/', {'estado': PedidoProveedor.EstadoPedido.RECIBIDO_COMPLETO}, format='json')
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK, respuesta.data)
+        self.assertEqual(self.stock(self.productos[0]), 5)
+        self.assertEqual(PedidoProveedor.objects.get(pk=pedido_id).detalles_pedido.get().cantidad_recibida, 5)
+
+    def actualizar_detalles(self, pedido_id, lineas):
+        """'lineas' es una secuencia de (índice de producto, cantidad solicitada, precio, campos extra)."""
+        return self.client.patch(f'{self.url}{pedido_id}/', {'detalles_pedido': [
+            {'producto': self.productos[i].id, 'cantidad_solicitada': cantidad, 'precio_unitario_compra': precio, **extra}
+            for i, cantidad, precio, extra in lineas
+        ]}, format='json')
+
+    def test_actualizar_detalles_conserva_modifica_y_elimina_por_producto(self):
+        pedido_id = self.crear_pedido_proveedor([(0, 5), (1, 5), (2, 5)])
+        pedido = PedidoProveedor.objects.get(pk=pedido_id)
+        antes = {d.producto_id: d.id for d in pedido.detalles_pedido.all()}
+        self.recibir(pedido_id, [(0, 2)])
+
+        respuesta = self.actualizar_detalles(pedido_id, [
+            (0, 5, '100.00', {'cantidad_recibida': 0}),  # Sin cambios; 'cantidad_recibida' se ignora
+            (1, 8, '90.00', {}),
+            (3, 4, '50.00', {}),
+        ])
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK, respuesta.data)
+        despues = {
+            d.producto_id: d for d in DetallePedidoProveedor.objects.filter(pedido_proveedor_id=pedido_id)
+        }
+        self.assertEqual(set(despues), {self.productos[i].id for i in (0, 1, 3)})
+        # Las líneas que se mantienen conservan su id y su cantidad recibida
+        self.assertEqual(despues[self.productos[0].id].id, antes[self.productos[0].id])
+        self.assertEqual(despues[self.productos[0].id].cantidad_recibida, 2)
+        self.assertEqual(despues[self.productos[1].id].id, antes[self.productos[1].id])
+        self.assertEqual(
+            (despues[self.productos[1].id].cantidad_solicitada, despues[self.productos[1].id].precio_unitario_compra),
+            (8, Decimal('90.00')),
+        )
+        # La quitada se elimina y la nueva se crea
+        self.assertFalse(DetallePedidoProveedor.objects.filter(id=antes[self.productos[2].id]).exists())
+        self.assertNotIn(despues[self.productos[3].id].id, antes.values())
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.subtotal, Decimal('1420.00'))  # 5 x 100 + 8 x 90 + 4 x 50
+
+    def test_no_se_quitan_lineas_con_unidades_recibidas(self):
+        pedido_id = self.crear_pedido_proveedor([(0, 5), (1, 5)])
+        self.recibir(pedido_id, [(0, 1)])
+
+        respuesta = self.actualizar_detalles(pedido_id, [(1, 5, '100.00', {})])
+
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(DetallePedidoProveedor.objects.filter(pedido_proveedor_id=pedido_id).count(), 2)
@@ -0,0 +1,85 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from pedido_app.models import PedidoCliente, EstadoPedidoCliente, SnapshotPedidoEntregado
+from .base import PedidoTestCase
+
+
+class SnapshotsEntregaTestCase(PedidoTestCase):
+    """Pruebas de los snapshots inmutables de pedidos entregados"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.crear_personal('admin', 'ADMINISTRADOR'))
+
+    def entregar(self, pedido):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.patch(f'/api/pedidos/pedidos-cliente/{pedido.id}/', {'estado': 'ENTREGADO'}, format='json')
+
+    def test_se_congela_al_entregar_y_no_cambia_con_el_catalogo(self):
+        pedido = self.crear_pedido(EstadoPedidoCliente.ENVIADO, lineas=((0, 1), (1, 2)))
+
+        respuesta = self.entregar(pedido)
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK, respuesta.data)
+        snapshot = SnapshotPedidoEntregado.objects.get(pedido=pedido)
+        self.assertEqual(snapshot.datos['estado'], EstadoPedidoCliente.ENTREGADO)
+        self.assertEqual(len(snapshot.datos['detalles_pedido_cliente']), 2)
+        self.assertIsNotNone(snapshot.datos['fecha_entregado'])
+
+        producto = self.productos[0]
+        producto.nombre = 'Nombre cambiado'
+        producto.save()
+        historial = self.client.get(f'/api/pedidos/historial-entregas/{pedido.id}/')
+        nombres = {linea['producto_detalle']['nombre'] for linea in historial.data['detalles_pedido_cliente']}
+        self.assertEqual(nombres, {'Producto 0', 'Producto 1'})
+
+    def test_transicion_masiva_congela_todos_los_pedidos(self):
+        pedidos = [self.crear_pedido(EstadoPedidoCliente.PAGADO, sucursal=s) for s in (self.sucursal, self.otra_sucursal)]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post('/api/pedidos/pedidos-cliente/transicion-masiva/', {
+                'pedido_ids': [p.id for p in pedidos], 'estado': 'ENTREGADO',
+            }, format='json')
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK, respuesta.data)
+        self.assertEqual(SnapshotPedidoEntregado.objects.count(), 2)
+        bodeguero = APIClient()
+        bodeguero.force_authenticate(self.crear_personal('bodeguero', 'BODEGUERO', self.sucursal, self.bodega))
+        self.assertEqual(
+            [s['id'] for s in bodeguero.get('/api/pedidos/historial-entregas/').data['results']], [pedidos[0].id]
+        )
+
+    def test_fallo_al_congelar_no_afecta_la_entrega_y_el_comando_lo_repara(self):
+        pedido = self.crear_pedido(EstadoPedidoCliente.ENVIADO)
+
+        with mock.patch('pedido_app.services.congelar_snapshots_entrega', side_effect=RuntimeError('falla')), \
+                self.assertLogs('pedido_app.services', level='ERROR'):
+            respuesta = self.entregar(pedido)
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertEqual(PedidoCliente.objects.get(pk=pedido.pk).estado, EstadoPedidoCliente.ENTREGADO)
+        self.assertFalse(SnapshotPedidoEntregado.objects.exists())
+
+        call_command('congelar_snapshots_entregas', stdout=StringIO())
+        self.assertTrue(SnapshotPedidoEntregado.objects.filter(pedido=pedido).exists())
+
+    def test_el_snapshot_es_inmutable_y_se_elimina_al_salir_de_entregado(self):
+        pedido = self.crear_pedido(EstadoPedidoCliente.ENVIADO)
+        self.entregar(pedido)
+        original = bytes(SnapshotPedidoEntregado.objects.get(pedido=pedido).contenido)
+
+        pedido = PedidoCliente.objects.get(pk=pedido.pk)
+        pedido.notas_cliente = 'Nota posterior a la entrega'
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido.save()
+        self.assertEqual(bytes(SnapshotPedidoEntregado.objects.get(pedido=pedido).contenido), original)
+
+        pedido.estado = EstadoPedidoCliente.PROCESANDO
+        pedido.save()
+        self.assertFalse(SnapshotPedidoEntregado.objects.filter(pedido=pedido).exists())
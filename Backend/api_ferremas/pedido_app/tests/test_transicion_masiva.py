@@ -0,0 +1,91 @@
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from bitacora_app.models import EventoOutbox, RegistroActividad
+from pedido_app.models import PedidoCliente, EstadoPedidoCliente
+from pedido_app.tareas import EVENTO_CANCELAR_TRASPASOS
+from .base import PedidoTestCase
+
+
+class TransicionMasivaTestCase(PedidoTestCase):
+    """Pruebas del endpoint de transición de estado en bloque"""
+
+    url = '/api/pedidos/pedidos-cliente/transicion-masiva/'
+
+    def setUp(self):
+        super().setUp()
+        self.crear_stock(self.productos[0], 10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.crear_personal('admin', 'ADMINISTRADOR'))
+
+    def transicionar(self, pedidos, estado, client=None):
+        return (client or self.client).post(self.url, {'pedido_ids': [p.id for p in pedidos], 'estado': estado}, format='json')
+
+    def estados(self, pedidos):
+        return [PedidoCliente.objects.get(pk=p.pk).estado for p in pedidos]
+
+    def test_aplica_la_transicion_a_todos_y_registra_la_bitacora(self):
+        pedidos = [self.crear_pedido(EstadoPedidoCliente.PAGADO) for _ in range(3)]
+
+        respuesta = self.transicionar(pedidos, EstadoPedidoCliente.ENVIADO)
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK, respuesta.data)
+        self.assertEqual(respuesta.data['actualizados'], 3)
+        self.assertEqual(self.estados(pedidos), [EstadoPedidoCliente.ENVIADO] * 3)
+        self.assertEqual(
+            sorted(RegistroActividad.objects.filter(accion='ACTUALIZAR_PEDIDO_CLIENTE').values_list('object_id', flat=True)),
+            [p.id for p in pedidos],
+        )
+
+    def test_un_pedido_invalido_rechaza_todo_el_lote(self):
+        valido = self.crear_pedido(EstadoPedidoCliente.PAGADO)
+        entregado = self.crear_pedido(EstadoPedidoCliente.ENTREGADO)
+
+        respuesta = self.client.post(self.url, {
+            'pedido_ids': [valido.id, entregado.id, 999999], 'estado': EstadoPedidoCliente.ENVIADO,
+        }, format='json')
+
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(respuesta.data['pedidos_rechazados']), {str(entregado.id), '999999'})
+        self.assertEqual(self.estados([valido]), [EstadoPedidoCliente.PAGADO])
+
+    def test_cancelacion_devuelve_el_stock_solo_de_los_pedidos_que_lo_descontaron(self):
+        pagado = self.crear_pedido(EstadoPedidoCliente.PAGADO, lineas=((0, 2),))
+        en_reabastecimiento = self.crear_pedido(EstadoPedidoCliente.PENDIENTE_REABASTECIMIENTO, lineas=((0, 3),))
+        por_confirmar = self.crear_pedido(EstadoPedidoCliente.POR_CONFIRMAR, lineas=((0, 4),))
+        EventoOutbox.objects.all().delete()
+
+        respuesta = self.transicionar([pagado, en_reabastecimiento, por_confirmar], EstadoPedidoCliente.CANCELADO)
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK, respuesta.data)
+        self.assertEqual(self.stock(self.productos[0]), 15)
+        self.assertEqual(
+            list(EventoOutbox.objects.filter(tipo=EVENTO_CANCELAR_TRASPASOS).values_list('payload', flat=True)),
+            [{'pedido_id': en_reabastecimiento.id}],
+        )
+
+    def test_cancelacion_sin_inventario_en_la_sucursal_no_aplica_nada(self):
+        self.otra_sucursal.inventario_general.delete()
+        otro = self.crear_pedido(EstadoPedidoCliente.PAGADO, sucursal=self.otra_sucursal)
+        pagado = self.crear_pedido(EstadoPedidoCliente.PAGADO, lineas=((0, 2),))
+
+        respuesta = self.transicionar([pagado, otro], EstadoPedidoCliente.CANCELADO)
+
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(respuesta.data['pedidos_rechazados']), [str(otro.id)])
+        self.assertEqual(self.estados([pagado, otro]), [EstadoPedidoCliente.PAGADO] * 2)
+        self.assertEqual(self.stock(self.productos[0]), 10)
+
+    def test_bodeguero_solo_puede_transicionar_pedidos_de_su_sucursal(self):
+        bodeguero = APIClient()
+        bodeguero.force_authenticate(self.crear_personal('bodeguero', 'BODEGUERO', self.sucursal, self.bodega))
+        otro = self.crear_pedido(EstadoPedidoCliente.PAGADO, sucursal=self.otra_sucursal)
+
+        respuesta = self.transicionar([otro], EstadoPedidoCliente.ENVIADO, client=bodeguero)
+
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.estados([otro]), [EstadoPedidoCliente.PAGADO])
+
+        cliente = APIClient()
+        cliente.force_authenticate(self.cliente.usuario)
+        self.assertEqual(self.transicionar([otro], EstadoPedidoCliente.ENVIADO, client=cliente).status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,75 @@
+from rest_framework.exceptions import ValidationError
+
+from inventario_app.models import TraspasoInternoStock
+from pedido_app.services import _elegir_origenes_traspaso, modificar_stock_para_pedido
+from sucursal_app.models import Bodega, TipoBodega
+from ubicacion_app.models import Region, Comuna
+from .base import PedidoTestCase
+
+
+class PlanificadorTraspasosTestCase(PedidoTestCase):
+    """Pruebas del planificador de traspasos multi-origen para pedidos con faltantes"""
+
+    def setUp(self):
+        super().setUp()
+        self.region.orden_geografico = 7
+        self.region.save()
+        valparaiso = Region.objects.create(nombre='Valparaíso', orden_geografico=6)
+        los_lagos = Region.objects.create(nombre='Los Lagos', orden_geografico=14)
+        self.maipu = self.crear_sucursal('Sucursal Maipú', Comuna.objects.create(nombre='Maipú', region=self.region))
+        self.vina = self.crear_sucursal('Sucursal Viña', Comuna.objects.create(nombre='Viña del Mar', region=valparaiso))
+        self.puerto_montt = self.crear_sucursal('Sucursal Puerto Montt', Comuna.objects.create(nombre='Puerto Montt', region=los_lagos))
+        self.bodega_principal_vina = Bodega.objects.create(
+            sucursal=self.vina, tipo_bodega=TipoBodega.objects.create(tipo='Principal'), direccion='Principal Viña'
+        )
+
+    def lineas_traspaso(self, pedido):
+        return {
+            traspaso.sucursal_origen_id: sorted(traspaso.detalles_traspaso.values_list('producto__sku', 'bodega_origen_id', 'cantidad_solicitada'))
+            for traspaso in TraspasoInternoStock.objects.filter(pedido_cliente_origen=pedido)
+        }
+
+    def test_prefiere_una_sola_sucursal_que_cubra_todo_y_la_mas_cercana(self):
+        p0, p1, p2 = self.productos[:3]
+        self.crear_stock(p0, 2)
+        self.crear_stock(p0, 3, bodega=self.maipu.bodegas.get())
+        self.crear_stock(p1, 5, bodega=self.maipu.bodegas.get())
+        bodega_vina = self.vina.bodegas.get(tipo_bodega=self.tipo_sala)
+        self.crear_stock(p0, 50, bodega=bodega_vina)
+        self.crear_stock(p1, 50, bodega=bodega_vina)
+        self.crear_stock(p2, 10, bodega=self.bodega_principal_vina)
+        for producto in (p0, p1, p2):
+            self.crear_stock(producto, 100, bodega=self.puerto_montt.bodegas.get())
+        pedido = self.crear_pedido(lineas=((0, 10), (1, 4), (2, 5)))
+
+        self.assertFalse(modificar_stock_para_pedido(pedido))
+
+        self.assertEqual(self.lineas_traspaso(pedido), {self.vina.id: [
+            ('SKU0', bodega_vina.id, 8), ('SKU1', bodega_vina.id, 4), ('SKU2', self.bodega_principal_vina.id, 5),
+        ]})
+        self.assertEqual(self.stock(p0), 0)
+
+    def test_no_vuelve_a_solicitar_lo_ya_pedido_en_traspasos_vigentes(self):
+        self.crear_stock(self.productos[0], 20, bodega=self.maipu.bodegas.get())
+        pedido = self.crear_pedido(lineas=((0, 6),))
+
+        modificar_stock_para_pedido(pedido)
+        modificar_stock_para_pedido(pedido)
+
+        self.assertEqual(TraspasoInternoStock.objects.filter(pedido_cliente_origen=pedido).count(), 1)
+
+    def test_faltante_sin_stock_en_la_red_aborta_sin_crear_traspasos(self):
+        pedido = self.crear_pedido(lineas=((4, 3),))
+
+        with self.assertRaises(ValidationError):
+            modificar_stock_para_pedido(pedido)
+        self.assertFalse(TraspasoInternoStock.objects.exists())
+
+    def test_reparte_entre_sucursales_cuando_ninguna_cubre_todo(self):
+        plan, no_cubiertos = _elegir_origenes_traspaso(
+            {1: 10, 2: 10},
+            {7: {1: [(1, 10)]}, 8: {2: [(2, 6)]}, 9: {2: [(3, 4), (4, 10)]}},
+            lambda sucursal_id: {7: 3, 8: 1, 9: 5}[sucursal_id],
+        )
+        self.assertEqual(plan, {7: [(1, 1, 10)], 9: [(2, 4, 10)]})
+        self.assertEqual(no_cubiertos, {})
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='producto',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Fecha de Actualización'),
+        ),
+    ]
@@ -29,6 +29,124 @@ class Marca(models.Model):
     def __str__(self):
         return self.nombre
 
+
+def calcular_precio_con_promociones(precio_original, promociones_aplicables):
+    """
+    Elige la mejor combinación de promociones para un precio base y devuelve una tupla
+    (precio_final, instancia_promocion_aplicada | None). 'promociones_aplicables' son las
+    promociones vigentes del producto (propias, de su categoría y de su marca).
+    """
+    from promocion_app.models import Promocion # Importación local para acceder a Promocion.TipoPromocion
+
+    precio_actual = precio_original
+    promociones_efectivas_info = [] # Guardará info de las promos apiladas
+
+    if not promociones_aplicables:
+        return precio_original, None
+
+    # 1. Aplicar el mejor descuento porcentual
+    mejor_promo_porcentaje = None
+    precio_despues_porcentaje = precio_actual
+    
+    promos_porcentaje = [p for p in promociones_aplicables if p.tipo_promocion == Promocion.TipoPromocion.DESCUENTO_PORCENTAJE and p.valor is not None]
+    if promos_porcentaje:
+        precio_temporal_mejor_porcentaje = precio_actual
+        for promo_p in promos_porcentaje:
+            # Aplicar sobre el precio_original para esta etapa de selección de la mejor promo de %
+            precio_con_esta_promo_p = promo_p.aplicar_a_precio(precio_original) 
+            if precio_con_esta_promo_p < precio_temporal_mejor_porcentaje:
+                precio_temporal_mejor_porcentaje = precio_con_esta_promo_p
+                mejor_promo_porcentaje = promo_p
+        
+        if mejor_promo_porcentaje:
+            precio_actual = precio_temporal_mejor_porcentaje
+            promociones_efectivas_info.append({
+                "titulo": mejor_promo_porcentaje.titulo, 
+                "tipo": "Porcentaje", 
+                "valor_aplicado": mejor_promo_porcentaje.valor,
+                "id": mejor_promo_porcentaje.id
+            })
+
+    # 2. Aplicar el mejor descuento de monto fijo sobre el precio ya ajustado (si hubo descuento porcentual)
+    mejor_promo_monto_fijo = None
+    # Asumiendo que tienes Promocion.TipoPromocion.DESCUENTO_MONTO_FIJO
+    promos_monto_fijo = [p for p in promociones_aplicables if p.tipo_promocion == Promocion.TipoPromocion.DESCUENTO_MONTO_FIJO and p.valor is not None]
+    if promos_monto_fijo:
+        precio_temporal_mejor_monto = precio_actual
+        for promo_mf in promos_monto_fijo:
+            # Aplicar al precio actual (ya posiblemente rebajado por porcentaje)
+            # para seleccionar el mejor descuento de monto fijo
+            precio_con_esta_promo_mf = promo_mf.aplicar_a_precio(precio_actual)
+            if precio_con_esta_promo_mf < precio_temporal_mejor_monto:
+                precio_temporal_mejor_monto = precio_con_esta_promo_mf
+                mejor_promo_monto_fijo = promo_mf
+        
+        if mejor_promo_monto_fijo:
+            precio_actual = precio_temporal_mejor_monto
+            promociones_efectivas_info.append({
+                "titulo": mejor_promo_monto_fijo.titulo, 
+                "tipo": "Monto Fijo", 
+                "valor_aplicado": mejor_promo_monto_fijo.valor,
+                "id": mejor_promo_monto_fijo.id
+            })
+
+    # 3. Considerar promociones de PRECIO_FIJO. Estas anulan los descuentos apilados si resultan en un precio menor.
+    # Esta lógica se mantiene si PRECIO_FIJO es un precio final absoluto que compite.
+    mejor_promo_precio_fijo_obj = None 
+    precio_final_considerando_fijo = precio_actual
+
+    promos_precio_fijo = [p for p in promociones_aplicables if p.tipo_promocion == Promocion.TipoPromocion.PRECIO_FIJO and p.valor is not None]
+    if promos_precio_fijo:
+        mejor_precio_fijo_val = precio_actual # Empezar con el precio ya apilado
+        for promo_f in promos_precio_fijo:
+            # aplicar_a_precio para PRECIO_FIJO devuelve el valor de la promo (el precio final)
+            precio_con_esta_promo_f = promo_f.aplicar_a_precio(precio_original) # PRECIO_FIJO es absoluto
+            if precio_con_esta_promo_f < mejor_precio_fijo_val:
+                mejor_precio_fijo_val = precio_con_esta_promo_f
+                mejor_promo_precio_fijo_obj = promo_f
+        
+        if mejor_promo_precio_fijo_obj and mejor_precio_fijo_val < precio_actual:
+            # Si el precio fijo es mejor que el apilado, se usa el precio fijo.
+            precio_actual = mejor_precio_fijo_val
+            # La única promoción "efectiva" en este caso es la de precio fijo.
+            promociones_efectivas_info = [{
+                "titulo": mejor_promo_precio_fijo_obj.titulo, 
+                "tipo": "Precio Fijo", 
+                "valor_aplicado": mejor_promo_precio_fijo_obj.valor, # El valor es el precio final
+                "id": mejor_promo_precio_fijo_obj.id
+            }]
+
+    # Si el precio final no cambió respecto al original, no se considera que se aplicó una promoción efectiva.
+    if precio_actual >= precio_original: # Usar >= por si alguna promo resulta en precio mayor (aunque max(0,...) lo evita)
+         return precio_original, None
+
+    # Devolver el precio final y la información de la(s) promoción(es) aplicada(s).
+    # Para simplificar, si hubo múltiples, podríamos crear un título combinado o devolver la info de la más impactante/última.
+    # O, idealmente, el serializer y el frontend manejarían una lista de promociones aplicadas.
+    # Por ahora, si hay múltiples, creamos un título genérico.
+    # Y para 'info_promocion_aplicada' en el serializer, necesitarás decidir qué objeto Promocion enviar
+    # o si cambias el serializer para enviar esta nueva estructura 'promociones_efectivas_info'.
+    
+    # Para este ejemplo, si se aplicaron promociones, intentaremos devolver la "más relevante"
+    # o la que resultó en el precio_actual si fue una de PRECIO_FIJO.
+    # Esta parte es la más compleja de mapear al 'info_promocion_aplicada' actual.
+    
+    promocion_principal_para_api = None
+    if promociones_efectivas_info:
+        # Si la última promo efectiva fue de tipo Precio Fijo (porque anuló las otras)
+        # y ese precio fijo es el precio_actual
+        if mejor_promo_precio_fijo_obj and precio_actual == mejor_promo_precio_fijo_obj.valor:
+            promocion_principal_para_api = mejor_promo_precio_fijo_obj
+        # Si no, y hubo un descuento de monto fijo aplicado
+        elif mejor_promo_monto_fijo:
+             promocion_principal_para_api = mejor_promo_monto_fijo
+        # Si no, y hubo un descuento porcentual aplicado
+        elif mejor_promo_porcentaje:
+            promocion_principal_para_api = mejor_promo_porcentaje
+
+    return precio_actual, promocion_principal_para_api
+
+
 class Producto(models.Model):
     # id_producto es automático (id)
     sku = models.CharField(max_length=100, unique=True, verbose_name="SKU", help_text="Stock Keeping Unit, código único del producto.")
@@ -41,7 +159,7 @@ class Producto(models.Model):
     # y también instalar Pillow: pip install Pillow
     imagen = models.ImageField(upload_to='productos_imagenes/', blank=True, null=True, verbose_name="Imagen del Producto")
     fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
-    fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Fecha de Actualización")
+    fecha_actualizacion = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Fecha de Actualización")
     # Podrías añadir un campo para indicar si el producto está activo/disponible
     # activo = models.BooleanField(default=True, verbose_name="Activo")
 
@@ -89,118 +207,9 @@ class Producto(models.Model):
         """
         Calcula el precio final aplicando la mejor promoción (la que resulte en el menor precio)
         y devuelve una tupla: (precio_final, instancia_promocion_aplicada | None).
+        Para muchos productos a la vez usar promocion_app.services.precios_finales_para_productos.
         """
-        from promocion_app.models import Promocion # Importación local para acceder a Promocion.TipoPromocion
-        
-        promociones_aplicables = self.get_promociones_aplicables()
-        precio_original = self.precio # El precio base del producto
-        precio_actual = precio_original
-        promociones_efectivas_info = [] # Guardará info de las promos apiladas
-
-        if not promociones_aplicables:
-            return precio_original, None
-
-        # 1. Aplicar el mejor descuento porcentual
-        mejor_promo_porcentaje = None
-        precio_despues_porcentaje = precio_actual
-        
-        promos_porcentaje = [p for p in promociones_aplicables if p.tipo_promocion == Promocion.TipoPromocion.DESCUENTO_PORCENTAJE and p.valor is not None]
-        if promos_porcentaje:
-            precio_temporal_mejor_porcentaje = precio_actual
-            for promo_p in promos_porcentaje:
-                # Aplicar sobre el precio_original para esta etapa de selección de la mejor promo de %
-                precio_con_esta_promo_p = promo_p.aplicar_a_precio(precio_original) 
-                if precio_con_esta_promo_p < precio_temporal_mejor_porcentaje:
-                    precio_temporal_mejor_porcentaje = precio_con_esta_promo_p
-                    mejor_promo_porcentaje = promo_p
-            
-            if mejor_promo_porcentaje:
-                precio_actual = precio_temporal_mejor_porcentaje
-                promociones_efectivas_info.append({
-                    "titulo": mejor_promo_porcentaje.titulo, 
-                    "tipo": "Porcentaje", 
-                    "valor_aplicado": mejor_promo_porcentaje.valor,
-                    "id": mejor_promo_porcentaje.id
-                })
-
-        # 2. Aplicar el mejor descuento de monto fijo sobre el precio ya ajustado (si hubo descuento porcentual)
-        mejor_promo_monto_fijo = None
-        # Asumiendo que tienes Promocion.TipoPromocion.DESCUENTO_MONTO_FIJO
-        promos_monto_fijo = [p for p in promociones_aplicables if p.tipo_promocion == Promocion.TipoPromocion.DESCUENTO_MONTO_FIJO and p.valor is not None]
-        if promos_monto_fijo:
-            precio_temporal_mejor_monto = precio_actual
-            for promo_mf in promos_monto_fijo:
-                # Aplicar al precio actual (ya posiblemente rebajado por porcentaje)
-                # para seleccionar el mejor descuento de monto fijo
-                precio_con_esta_promo_mf = promo_mf.aplicar_a_precio(precio_actual)
-                if precio_con_esta_promo_mf < precio_temporal_mejor_monto:
-                    precio_temporal_mejor_monto = precio_con_esta_promo_mf
-                    mejor_promo_monto_fijo = promo_mf
-            
-            if mejor_promo_monto_fijo:
-                precio_actual = precio_temporal_mejor_monto
-                promociones_efectivas_info.append({
-                    "titulo": mejor_promo_monto_fijo.titulo, 
-                    "tipo": "Monto Fijo", 
-                    "valor_aplicado": mejor_promo_monto_fijo.valor,
-                    "id": mejor_promo_monto_fijo.id
-                })
-
-        # 3. Considerar promociones de PRECIO_FIJO. Estas anulan los descuentos apilados si resultan en un precio menor.
-        # Esta lógica se mantiene si PRECIO_FIJO es un precio final absoluto que compite.
-        mejor_promo_precio_fijo_obj = None 
-        precio_final_considerando_fijo = precio_actual
-
-        promos_precio_fijo = [p for p in promociones_aplicables if p.tipo_promocion == Promocion.TipoPromocion.PRECIO_FIJO and p.valor is not None]
-        if promos_precio_fijo:
-            mejor_precio_fijo_val = precio_actual # Empezar con el precio ya apilado
-            for promo_f in promos_precio_fijo:
-                # aplicar_a_precio para PRECIO_FIJO devuelve el valor de la promo (el precio final)
-                precio_con_esta_promo_f = promo_f.aplicar_a_precio(precio_original) # PRECIO_FIJO es absoluto
-                if precio_con_esta_promo_f < mejor_precio_fijo_val:
-                    mejor_precio_fijo_val = precio_con_esta_promo_f
-                    mejor_promo_precio_fijo_obj = promo_f
-            
-            if mejor_promo_precio_fijo_obj and mejor_precio_fijo_val < precio_actual:
-                # Si el precio fijo es mejor que el apilado, se usa el precio fijo.
-                precio_actual = mejor_precio_fijo_val
-                # La única promoción "efectiva" en este caso es la de precio fijo.
-                promociones_efectivas_info = [{
-                    "titulo": mejor_promo_precio_fijo_obj.titulo, 
-                    "tipo": "Precio Fijo", 
-                    "valor_aplicado": mejor_promo_precio_fijo_obj.valor, # El valor es el precio final
-                    "id": mejor_promo_precio_fijo_obj.id
-                }]
-
-        # Si el precio final no cambió respecto al original, no se considera que se aplicó una promoción efectiva.
-        if precio_actual >= precio_original: # Usar >= por si alguna promo resulta en precio mayor (aunque max(0,...) lo evita)
-             return precio_original, None
-
-        # Devolver el precio final y la información de la(s) promoción(es) aplicada(s).
-        # Para simplificar, si hubo múltiples, podríamos crear un título combinado o devolver la info de la más impactante/última.
-        # O, idealmente, el serializer y el frontend manejarían una lista de promociones aplicadas.
-        # Por ahora, si hay múltiples, creamos un título genérico.
-        # Y para 'info_promocion_aplicada' en el serializer, necesitarás decidir qué objeto Promocion enviar
-        # o si cambias el serializer para enviar esta nueva estructura 'promociones_efectivas_info'.
-        
-        # Para este ejemplo, si se aplicaron promociones, intentaremos devolver la "más relevante"
-        # o la que resultó en el precio_actual si fue una de PRECIO_FIJO.
-        # Esta parte es la más compleja de mapear al 'info_promocion_aplicada' actual.
-        
-        promocion_principal_para_api = None
-        if promociones_efectivas_info:
-            # Si la última promo efectiva fue de tipo Precio Fijo (porque anuló las otras)
-            # y ese precio fijo es el precio_actual
-            if mejor_promo_precio_fijo_obj and precio_actual == mejor_promo_precio_fijo_obj.valor:
-                promocion_principal_para_api = mejor_promo_precio_fijo_obj
-            # Si no, y hubo un descuento de monto fijo aplicado
-            elif mejor_promo_monto_fijo:
-                 promocion_principal_para_api = mejor_promo_monto_fijo
-            # Si no, y hubo un descuento porcentual aplicado
-            elif mejor_promo_porcentaje:
-                promocion_principal_para_api = mejor_promo_porcentaje
-
-        return precio_actual, promocion_principal_para_api
+        return calcular_precio_con_promociones(self.precio, self.get_promociones_aplicables())
 
 # Podrías considerar un modelo para "Características del Producto" si necesitas
 # atributos más dinámicos (ej. color, tamaño, material) que varían por categoría.
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promocion_app', '0002_promocion_limite_uso_por_cliente_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promocion',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Fecha de Actualización'),
+        ),
+    ]
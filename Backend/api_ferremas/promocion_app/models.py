@@ -71,6 +71,7 @@ class Promocion(models.Model):
     limite_uso_por_cliente = models.PositiveIntegerField(blank=True, null=True, verbose_name="Límite de Uso por Cliente")
     solo_para_clientes_registrados = models.BooleanField(default=False, verbose_name="Solo para Clientes Registrados") # Renombrado de solo_para_clientes_vip
     producto_regalo = models.ForeignKey(Producto, on_delete=models.SET_NULL, blank=True, null=True, related_name="promociones_como_regalo", verbose_name="Producto de Regalo (si aplica)")
+    fecha_actualizacion = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Fecha de Actualización")
 
     class Meta:
         verbose_name = "Promoción"
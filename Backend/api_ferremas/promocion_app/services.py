@@ -1,9 +1,10 @@
 from decimal import Decimal, ROUND_HALF_UP
 from django.utils import timezone
 from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
 from .models import Promocion # Asumiendo que Promocion está en la misma app (promocion_app)
 # Para type hinting y acceso a modelos de producto si es necesario:
-from producto_app.models import Producto as ProductoModel, Categoria as CategoriaModel, Marca as MarcaModel
+from producto_app.models import Producto as ProductoModel, Categoria as CategoriaModel, Marca as MarcaModel, calcular_precio_con_promociones
 
 
 def obtener_promociones_aplicables_para_producto(producto: ProductoModel, cliente=None):
@@ -73,6 +74,45 @@ def obtener_promociones_aplicables_para_producto(producto: ProductoModel, client
     return promociones_finales
 
 
+def precios_finales_para_productos(productos):
+    """
+    Versión en bloque de Producto.precio_final_con_info_promo: obtiene con una sola consulta
+    las promociones vigentes de todos los productos (propias, de su categoría y de su marca)
+    y aplica a cada uno las mismas reglas de selección.
+
+    Args:
+        productos (iterable de ProductoModel): Instancias con precio, categoria_id y marca_id cargados.
+
+    Returns:
+        dict: {producto_id: (precio_final, promocion_aplicada | None)}
+    """
+    productos = {producto.id: producto for producto in productos}
+    if not productos:
+        return {}
+    ct_producto = ContentType.objects.get_for_model(ProductoModel)
+    ct_categoria = ContentType.objects.get_for_model(CategoriaModel)
+    ct_marca = ContentType.objects.get_for_model(MarcaModel)
+
+    now = timezone.now()
+    promociones = Promocion.objects.filter(activo=True, fecha_inicio__lte=now, fecha_fin__gte=now).filter(
+        Q(content_type=ct_producto, object_id__in=list(productos))
+        | Q(content_type=ct_categoria, object_id__in={p.categoria_id for p in productos.values()})
+        | Q(content_type=ct_marca, object_id__in={p.marca_id for p in productos.values()})
+    )
+    por_objetivo = {}
+    for promo in promociones:
+        por_objetivo.setdefault((promo.content_type_id, promo.object_id), []).append(promo)
+
+    return {
+        producto_id: calcular_precio_con_promociones(producto.precio, (
+            por_objetivo.get((ct_producto.id, producto_id), [])
+            + por_objetivo.get((ct_categoria.id, producto.categoria_id), [])
+            + por_objetivo.get((ct_marca.id, producto.marca_id), [])
+        ))
+        for producto_id, producto in productos.items()
+    }
+
+
 def aplicar_promociones_a_item_carrito(
     producto_id: int, # Usamos ID para evitar pasar el objeto completo si no es necesario aquí
     cantidad: int,
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SucursalAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sucursal_app'
+
+    def ready(self):
+        import sucursal_app.signals # Importar las señales para que se registren
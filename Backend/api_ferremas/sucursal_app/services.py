@@ -0,0 +1,56 @@
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import Sucursal
+
+CLAVE_CACHE_MATRIZ_DISTANCIAS = 'sucursal_app:matriz_distancias'
+DURACION_CACHE_MATRIZ = 60 * 60  # Acota la desactualización si hay varios procesos con caché local
+
+DISTANCIA_MISMA_SUCURSAL = 0
+DISTANCIA_MISMA_COMUNA = 1
+DISTANCIA_MISMA_REGION = 2
+# Mayor que cualquier diferencia de Region.orden_geografico (PositiveSmallIntegerField)
+DISTANCIA_REGION_DESCONOCIDA = DISTANCIA_MISMA_REGION + 2 ** 15
+
+
+def calcular_distancia_sucursales(origen, destino):
+    """
+    Distancia relativa entre dos sucursales (dicts con id, comuna_id, region_id y
+    posicion_region = Region.orden_geografico). Misma sucursal < misma comuna < misma región
+    < regiones más alejadas en el orden norte-sur < regiones sin orden asignado.
+    """
+    if origen['id'] == destino['id']:
+        return DISTANCIA_MISMA_SUCURSAL
+    if origen['comuna_id'] == destino['comuna_id']:
+        return DISTANCIA_MISMA_COMUNA
+    if origen['region_id'] == destino['region_id']:
+        return DISTANCIA_MISMA_REGION
+    if origen['posicion_region'] is None or destino['posicion_region'] is None:
+        return DISTANCIA_REGION_DESCONOCIDA
+    return DISTANCIA_MISMA_REGION + abs(origen['posicion_region'] - destino['posicion_region'])
+
+
+def obtener_matriz_distancias_sucursales():
+    """
+    Matriz {(sucursal_origen_id, sucursal_destino_id): distancia} de todas las sucursales.
+    Se calcula con una sola consulta y queda en caché hasta que cambie alguna sucursal o
+    región (ver signals.py) o expire DURACION_CACHE_MATRIZ.
+    """
+    matriz = cache.get(CLAVE_CACHE_MATRIZ_DISTANCIAS)
+    if matriz is not None:
+        return matriz
+
+    sucursales = list(Sucursal.objects.values(
+        'id', 'comuna_id', 'region_id', posicion_region=F('region__orden_geografico'),
+    ))
+    matriz = {
+        (origen['id'], destino['id']): calcular_distancia_sucursales(origen, destino)
+        for origen in sucursales
+        for destino in sucursales
+    }
+    cache.set(CLAVE_CACHE_MATRIZ_DISTANCIAS, matriz, DURACION_CACHE_MATRIZ)
+    return matriz
+
+
+def invalidar_matriz_distancias_sucursales():
+    cache.delete(CLAVE_CACHE_MATRIZ_DISTANCIAS)
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Sucursal
+from ubicacion_app.models import Region
+from .services import invalidar_matriz_distancias_sucursales
+
+
+@receiver(post_save, sender=Sucursal)
+@receiver(post_delete, sender=Sucursal)
+def invalidar_distancias_al_cambiar_sucursal(sender, instance, **kwargs):
+    """La matriz de distancias depende de la comuna/región de cada sucursal."""
+    invalidar_matriz_distancias_sucursales()
+
+
+@receiver(post_save, sender=Region)
+@receiver(post_delete, sender=Region)
+def invalidar_distancias_al_cambiar_region(sender, instance, **kwargs):
+    """Cambiar el orden geográfico de una región cambia las distancias entre regiones."""
+    invalidar_matriz_distancias_sucursales()
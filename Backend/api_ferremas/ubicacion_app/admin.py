@@ -3,7 +3,8 @@ from .models import Region, Comuna
 
 @admin.register(Region)
 class RegionAdmin(admin.ModelAdmin):
-    list_display = ('nombre',)
+    list_display = ('nombre', 'orden_geografico')
+    list_editable = ('orden_geografico',)
     search_fields = ('nombre',)
     ordering = ('nombre',)
 
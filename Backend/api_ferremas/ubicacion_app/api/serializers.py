@@ -7,7 +7,7 @@ class RegionSerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = Region
-        fields = ['id', 'nombre']
+        fields = ['id', 'nombre', 'orden_geografico']
 
 class ComunaSerializer(serializers.ModelSerializer):
     """
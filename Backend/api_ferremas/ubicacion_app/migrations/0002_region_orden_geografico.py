@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:16
+
+import unicodedata
+
+from django.db import migrations, models
+
+# Regiones de Chile de norte a sur: (código romano, palabras con que puede aparecer el nombre)
+REGIONES_NORTE_A_SUR = [
+    ('XV', ['arica', 'parinacota']),
+    ('I', ['tarapaca']),
+    ('II', ['antofagasta']),
+    ('III', ['atacama']),
+    ('IV', ['coquimbo']),
+    ('V', ['valparaiso']),
+    ('RM', ['metropolitana', 'santiago']),
+    ('VI', ['higgins']),
+    ('VII', ['maule']),
+    ('XVI', ['nuble']),
+    ('VIII', ['biobio', 'bio bio', 'bio-bio']),
+    ('IX', ['araucania']),
+    ('XIV', ['los rios']),
+    ('X', ['los lagos']),
+    ('XI', ['aysen', 'aisen']),
+    ('XII', ['magallanes']),
+]
+
+
+def _normalizar(texto):
+    return ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c)).lower()
+
+
+def orden_para_nombre(nombre):
+    nombre = _normalizar(nombre)
+    codigo = nombre.split('-')[0].strip().upper()
+    for posicion, (codigo_region, palabras) in enumerate(REGIONES_NORTE_A_SUR, start=1):
+        if codigo == codigo_region or any(palabra in nombre for palabra in palabras):
+            return posicion
+    return None
+
+
+def poblar_orden_geografico(apps, schema_editor):
+    # Punto de partida para las regiones existentes; las no reconocidas quedan sin orden
+    # y se completan desde el admin
+    Region = apps.get_model('ubicacion_app', 'Region')
+    for region in Region.objects.all():
+        orden = orden_para_nombre(region.nombre)
+        if orden is not None:
+            Region.objects.filter(pk=region.pk).update(orden_geografico=orden)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ubicacion_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='region',
+            name='orden_geografico',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Orden Geográfico (norte a sur)'),
+        ),
+        migrations.RunPython(poblar_orden_geografico, migrations.RunPython.noop),
+    ]
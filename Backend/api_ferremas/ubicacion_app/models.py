@@ -3,6 +3,9 @@ from django.db import models
 
 class Region(models.Model):
     nombre = models.CharField(max_length=100, unique=True, verbose_name="Nombre de la Región")
+    # Posición de norte a sur: define qué tan cerca están las sucursales de distintas regiones
+    # al planificar traspasos (la numeración oficial de las regiones no sigue la geografía)
+    orden_geografico = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Orden Geográfico (norte a sur)")
     
     class Meta:
         verbose_name = "Región"
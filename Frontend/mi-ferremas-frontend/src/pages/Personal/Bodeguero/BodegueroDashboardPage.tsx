@@ -126,8 +126,9 @@ const BodegueroDashboardPage: React.FC = () => {
     setLoadingStock(true);
     setErrorStock(null);
     try {
-      const stockRes = await apiClient.get<StockItem[]>('/inventario/resumen-stock-bodeguero/');
-      setResumenStock(stockRes.data);
+      // El resumen viene paginado y ordenado con el stock más bajo primero
+      const stockRes = await apiClient.get('/inventario/resumen-stock-bodeguero/', { params: { page_size: 100 } });
+      setResumenStock(stockRes.data.results || stockRes.data);
     } catch (err: any) {
           setErrorStock(
         err.response?.data?.detail ||